@@ -27,6 +27,7 @@ from algorithm.ppo.model import Model
 from algorithm.agent import Agent
 from framework.common.utils.common_func import TimeIt, get_local_rank
 from framework.common.config.config_control import CONFIG
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 
 os.environ["CUDA_DEVICE_ORDER"] = "PCI_BUS_ID"
 os.environ['CUDA_VISIBLE_DEVICES'] = "0"
@@ -64,11 +65,11 @@ class Graphs(object):
             list_shapes.append(data_list[i].get_shape())
         return list_shapes
 
-    def build_model(self, input_datas):
+    def build_model(self, input_datas, sample_weight=None):
         '''
-        build main function
+        build main function, sample_weight is the optional per-sample importance weight
 
-        创建模型主函数
+        创建模型主函数, sample_weight为可选的每条样本的重要性权重
         '''
         enqueue_ops = list()
         fetches = dict()
@@ -82,7 +83,7 @@ class Graphs(object):
         with tf.variable_scope('', reuse=tf.AUTO_REUSE), tf.name_scope('tower_0') as name_scope:
             with tf.xla.experimental.jit_scope(CONFIG.use_xla):
                 loss, info_list, gradvars, max_noisescale, gpu_copy_stage_op, gpu_compute_stage_op = \
-                    self._add_forward_pass_and_gradients(datas)
+                    self._add_forward_pass_and_gradients(datas, sample_weight)
 
             enqueue_ops.append(gpu_copy_stage_op)
             enqueue_ops.append(gpu_compute_stage_op)
@@ -116,26 +117,34 @@ class Graphs(object):
         self.grad_has_inf_nan = tf.reduce_all(has_inf_nan_list)
         assert self.grad_has_inf_nan is not None
   
-    def _add_forward_pass_and_gradients(self, datas):
+    def _add_forward_pass_and_gradients(self, datas, sample_weight=None):
         '''
         Create ops for storing intermediate copies, loss, gradients, etc.
 
         创建存储间拷贝的ops，loss、gradient等ops
         '''
+        # 权重和样本一起经过StagingArea, 保证两者属于同一个批次
+        key_types = self.key_types
+        if sample_weight is not None:
+            datas = list(datas) + [sample_weight]
+            key_types = key_types + [tf.float32]
+
         with tf.device(self.cpu_device):
-            gpu_copy_stage = data_flow_ops.StagingArea(self.key_types, \
+            gpu_copy_stage = data_flow_ops.StagingArea(key_types, \
                                                        shapes=self.get_data_list_shape(datas))
             gpu_copy_stage_op = gpu_copy_stage.put(datas)
             datas = gpu_copy_stage.get()
 
         with tf.device(self.device):
-            gpu_compute_stage = data_flow_ops.StagingArea(self.key_types, \
+            gpu_compute_stage = data_flow_ops.StagingArea(key_types, \
                                                           shapes=self.get_data_list_shape(datas))
             gpu_compute_stage_op = gpu_compute_stage.put(datas)
             datas = gpu_compute_stage.get()
 
         with tf.device(self.device):
-            loss, info_list = self.network.build_graph(datas[0], self.global_step)
+            if sample_weight is not None:
+                sample_weight = datas[-1]
+            loss, info_list = self.network.build_graph(datas[0], self.global_step, sample_weight)
             params = tf.trainable_variables()
             aggmeth = tf.AggregationMethod.DEFAULT
 
@@ -299,8 +308,10 @@ class GameController(object):
     def build_learner_model(self):
         with tf.device(self.cpu_device):
             input_datas = self.dataset.dataset_from_generator()
+            # 开启sample_staleness_use_importance_weight时, 按照样本陈旧程度衰减的权重
+            sample_weight = self.dataset.extra_tensors().get(KaiwuDRLDefine.SAMPLE_IMPORTANCE_WEIGHT)
 
-        (self.enqueue_ops, self.fetches) = self.graph.build_model(input_datas)
+        (self.enqueue_ops, self.fetches) = self.graph.build_model(input_datas, sample_weight)
         info_list = self.fetches['info_list']
         fetches_list = nest.flatten(list(self.fetches.values()))
         main_fetch_group = tf.group(*fetches_list)
@@ -140,11 +140,11 @@ class Model():
             # self.sess.run(tf.global_variables_initializer())
         return self.graph
 
-    def build_graph(self, datas, update):
+    def build_graph(self, datas, update, sample_weight=None):
         '''
-        build model function
+        build model function, sample_weight is the optional per-sample importance weight
 
-        创建模型主函数
+        创建模型主函数, sample_weight为可选的每条样本的重要性权重
         '''
         # add split datas
         # 添加分割数据
@@ -181,6 +181,14 @@ class Model():
             weight_list[shape_index] = tf.reshape(weight_list[shape_index], [-1, self.data_split_shape[
                 3 + 2 * len(self.label_size_list) + shape_index]])
 
+        # importance weight multiplies the weight of each label, used in policy and entropy loss
+        # 重要性权重乘到每个label的权重上, 作用于policy和entropy loss, 每条样本有多行数据时按照行数复制
+        if sample_weight is not None:
+            sample_weight = tf.reshape(tf.cast(sample_weight, dtype=tf.float32), [-1, 1])
+            repeats = tf.shape(weight_list[0])[0] // tf.shape(sample_weight)[0]
+            sample_weight = tf.reshape(tf.tile(sample_weight, [1, repeats]), [-1, 1])
+            weight_list = [weight * sample_weight for weight in weight_list]
+
         is_train = data_list[-3]
         is_train = tf.reshape(is_train, [-1, self.data_split_shape[-3]])
 
@@ -32,6 +32,8 @@ class ModelWrapperPytorch:
         self.predict_count = 0
         self.save_model_count = 0
 
+        self.replay_buffer_wrapper = None
+
         # 主learner
         self.is_chief = (CONFIG.svr_name == KaiwuDRLDefine.SERVER_LEARNER)
 
@@ -75,9 +77,15 @@ class ModelWrapperPytorch:
     def train(self, extra_tensors=None):
         self.before_train()
 
-        # 具体的训练流程
-        data = self.sess.run(self.next_tensors)
-        values = self.model.learn(data)
+        # 具体的训练流程, 开启预取时直接使用后台线程准备好的批次
+        extras = None
+        if self.replay_buffer_wrapper and self.replay_buffer_wrapper.use_prefetch:
+            data, extras = self.replay_buffer_wrapper.split_batch(self.replay_buffer_wrapper.next_batch())
+        else:
+            data = self.sess.run(self.next_tensors)
+
+        # 开启use_sample_staleness时, model_version和重要性权重按照KaiwuDRLDefine的名字放在extras里传给业务
+        values = self.model.learn(data, extras) if extras else self.model.learn(data)
 
         # 返回是否更新了model文件, 更新的model文件的ID
         has_model_file_changed, model_file_id = self.after_train()
@@ -128,6 +136,23 @@ class ModelWrapperPytorch:
     def tf_sess(self):
         return self.sess
 
+    '''
+    直接调用业务类的get_weights/set_weights, 用于learner --> actor之间内存里同步模型参数, 格式为{名字: ndarray}
+    业务类没有实现时get_weights返回None, set_weights返回False, 调用方回退到model文件同步
+    '''
+    def get_weights(self):
+        if not hasattr(self.model, 'get_weights'):
+            return None
+
+        return self.model.get_weights()
+
+    def set_weights(self, weights):
+        if not hasattr(self.model, 'set_weights'):
+            return False
+
+        self.model.set_weights(weights)
+        return True
+
     '''
     直接调用业务类的load_last_new_model
     '''
@@ -179,4 +204,8 @@ class ModelWrapperPytorch:
 
         self.sess = tf.Session()
         self.next_tensors = replay_buffer_wrapper.dataset_from_generator()
-        self.sess.run(replay_buffer_wrapper.extra_initializer_ops())
\ No newline at end of file
+        self.sess.run(replay_buffer_wrapper.extra_initializer_ops())
+
+        self.replay_buffer_wrapper = replay_buffer_wrapper
+        if int(CONFIG.use_learner_prefetch):
+            replay_buffer_wrapper.start_prefetch(self.sess, self.next_tensors)
\ No newline at end of file
@@ -346,6 +346,27 @@ class ModelWrapperTensorflowComplex:
     def is_chief(self):
         return self.is_chief
     
+    '''
+    learner --> actor之间内存里同步模型参数, learner和actor上的network参数都在%s/global/network下, 名字一致
+    设置参数采用Variable.load, 不新增op, 适用于已经finalize的图
+    '''
+    def get_weights(self):
+        params = tf.compat.v1.trainable_variables("%s/global/network" % self.model.name)
+        values = self.sess._tf_sess().run(params)
+
+        return {param.name: value for param, value in zip(params, values)}
+
+    def set_weights(self, weights):
+        params = tf.compat.v1.trainable_variables("%s/global/network" % self.model.name)
+        for param in params:
+            if param.name not in weights:
+                return False
+
+        for param in params:
+            param.load(weights[param.name], self.sess._tf_sess())
+
+        return True
+
     '''
     加载最新的model文件
     '''
@@ -119,6 +119,9 @@ class ModelWrapperTensorflowSimple:
             self.model.init_model()
     
     def set_dataset(self, dataset):
+        # 开启预取时, 业务调用dataset_from_generator拿到的是后台线程预取的批次
+        if int(CONFIG.use_learner_prefetch):
+            dataset.start_prefetch()
         self.model.set_dataset(dataset)
 
     def should_stop(self):
@@ -226,6 +229,23 @@ class ModelWrapperTensorflowSimple:
     def load_last_new_model(self, models_path):
         return self.model.load_last_new_model(models_path)
 
+    '''
+    直接调用业务类的get_weights/set_weights, 用于learner --> actor之间内存里同步模型参数, 格式为{名字: ndarray}
+    业务类没有实现时get_weights返回None, set_weights返回False, 调用方回退到model文件同步
+    '''
+    def get_weights(self):
+        if not hasattr(self.model, 'get_weights'):
+            return None
+
+        return self.model.get_weights()
+
+    def set_weights(self, weights):
+        if not hasattr(self.model, 'set_weights'):
+            return False
+
+        self.model.set_weights(weights)
+        return True
+
     # 预加载模型文件, 对于tensorflow来说, 可以直接放在引擎文件目录下即可
     def preload_model_file(self, preload_model_file, id):
         pass
\ No newline at end of file
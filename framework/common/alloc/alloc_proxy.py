@@ -193,6 +193,10 @@ class AllocProxy(multiprocessing.Process):
                 CONFIG.write_to_config(to_change_key_values)
                 CONFIG.save_to_file(KaiwuDRLDefine.SERVER_AISRV, to_change_key_values)
 
+                # 配置文件只用于进程重启, 运行中的进程通过共享内存段感知修改
+                if CONFIG.publish_shared_config(to_change_key_values):
+                    self.logger.info(f"alloc_proxy {KaiwuDRLDefine.SERVER_AISRV} CONFIG publish_shared_config success", g_not_server_label)
+
                 self.logger.info(f"alloc_proxy {KaiwuDRLDefine.SERVER_AISRV} CONFIG save_to_file success", g_not_server_label)
 
         else:
@@ -233,6 +237,9 @@ class AllocProxy(multiprocessing.Process):
                 CONFIG.write_to_config(to_change_key_values)
                 CONFIG.save_to_file(KaiwuDRLDefine.SERVER_AISRV, to_change_key_values)
 
+                if CONFIG.publish_shared_config(to_change_key_values):
+                    self.logger.info(f"alloc_proxy {KaiwuDRLDefine.SERVER_AISRV} CONFIG publish_shared_config success", g_not_server_label)
+
                 self.logger.info(f"alloc_proxy {KaiwuDRLDefine.SERVER_AISRV} CONFIG save_to_file success", g_not_server_label)
     
     '''
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import os
+import mmap
+import json
+import hashlib
+import collections
+
+
+'''
+learner --> actor之间增量同步model文件, 替代每次打tar包, 计算整体md5, 上传和解压的流程
+1. checkpoint的每个文件按照固定大小(页对齐)切分成chunk, 每个chunk计算hash, 生成manifest
+2. chunk按照hash作为key存放在modelpool里, learner只上传modelpool里不存在的chunk, 最后上传manifest
+3. actor拉取manifest, 本地已有的chunk(上一次同步的文件里)直接拷贝, 只拉取本地没有的chunk, 还原出原始文件
+4. 还原出的文件是普通文件, 可以直接加载或者mmap
+
+manifest格式:
+{
+    "checkpoint_id": 3247,
+    "chunk_size": 4194304,
+    "files": [{"name": "model.ckpt-3247.data-00000-of-00001", "size": 10485760, "chunks": ["hash1", "hash2", "hash3"]}]
+}
+'''
+
+# chunk大小按照页对齐, 文件里每个chunk的偏移也是页对齐的
+CHUNK_ALIGNMENT = mmap.PAGESIZE
+
+# actor本地保存的上一次同步的manifest文件名
+MANIFEST_FILE = 'model_delta_manifest.json'
+
+
+def align_chunk_size(chunk_size):
+    return max(CHUNK_ALIGNMENT, (int(chunk_size) + CHUNK_ALIGNMENT - 1) // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+
+
+def chunk_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+'''
+按照chunk_size遍历文件, 返回(偏移, chunk内容), 采用mmap规避整个文件读入内存
+'''
+def iter_file_chunks(file_path, chunk_size):
+    size = os.path.getsize(file_path)
+    if not size:
+        return
+
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for offset in range(0, size, chunk_size):
+            yield offset, mm[offset:offset + chunk_size]
+
+
+def read_chunk(location):
+    file_path, offset, length = location
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+'''
+生成manifest, 同时返回每个chunk所在的位置{hash: (文件路径, 偏移, 长度)}
+'''
+def make_manifest(checkpoint_id, file_paths, chunk_size):
+    chunk_size = align_chunk_size(chunk_size)
+
+    files = []
+    locations = {}
+    for file_path in file_paths:
+        chunks = []
+        for offset, data in iter_file_chunks(file_path, chunk_size):
+            digest = chunk_hash(data)
+            chunks.append(digest)
+            locations.setdefault(digest, (file_path, offset, len(data)))
+
+        files.append({'name': os.path.basename(file_path), 'size': os.path.getsize(file_path), 'chunks': chunks})
+
+    manifest = {'checkpoint_id': checkpoint_id, 'chunk_size': chunk_size, 'files': files}
+    return manifest, locations
+
+
+'''
+manifest里所有chunk的位置, 相对于文件所在目录
+'''
+def manifest_chunk_locations(manifest, dir_path):
+    chunk_size = manifest['chunk_size']
+
+    locations = {}
+    for file in manifest['files']:
+        file_path = os.path.join(dir_path, file['name'])
+        for i, digest in enumerate(file['chunks']):
+            offset = i * chunk_size
+            locations.setdefault(digest, (file_path, offset, min(chunk_size, file['size'] - offset)))
+
+    return locations
+
+
+def manifest_chunks(manifest):
+    return {digest for file in manifest['files'] for digest in file['chunks']}
+
+
+'''
+learner侧, 记录已经上传到modelpool的chunk, 只上传新的chunk
+保留最近keep_manifests个manifest引用的chunk, 保证actor在拉取过程中learner推送了新版本时依旧能拿到旧版本的chunk
+'''
+class ModelDeltaPusher(object):
+
+    def __init__(self, chunk_size, keep_manifests=2) -> None:
+        self.chunk_size = align_chunk_size(chunk_size)
+        self.pushed_chunks = set()
+        self.manifests = collections.deque(maxlen=keep_manifests)
+
+    '''
+    返回manifest和需要上传的chunk位置{hash: (文件路径, 偏移, 长度)}
+    '''
+    def prepare(self, checkpoint_id, file_paths):
+        manifest, locations = make_manifest(checkpoint_id, file_paths, self.chunk_size)
+        new_chunks = {digest: location for digest, location in locations.items() if digest not in self.pushed_chunks}
+
+        return manifest, new_chunks
+
+    '''
+    manifest上传成功后调用, 返回不再被引用, 可以从modelpool删除的chunk
+    '''
+    def commit(self, manifest, pushed_chunks):
+        self.pushed_chunks.update(pushed_chunks)
+        self.manifests.append(manifest)
+
+        referenced = set()
+        for kept_manifest in self.manifests:
+            referenced |= manifest_chunks(kept_manifest)
+
+        stale_chunks = self.pushed_chunks - referenced
+        self.pushed_chunks -= stale_chunks
+
+        return stale_chunks
+
+
+'''
+actor侧, 根据manifest还原文件, 本地上一次同步的文件里已有的chunk直接拷贝, 其他的chunk通过fetch_chunk拉取
+'''
+class ModelDeltaPuller(object):
+
+    def __init__(self, models_path) -> None:
+        self.models_path = models_path
+
+    '''
+    本地上一次同步的manifest, 不存在或者损坏时返回None
+    '''
+    def local_manifest(self):
+        try:
+            with open(os.path.join(self.models_path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    '''
+    在output_dir下还原manifest里的文件和manifest文件, 返回(还原的文件路径列表, 拉取的chunk数目, 拉取的字节数)
+    本地chunk需要校验hash, 因为本地文件可能被修改过(比如checkpoint文件里的路径)
+    '''
+    def apply(self, manifest, fetch_chunk, output_dir):
+        local_locations = {}
+        local_manifest = self.local_manifest()
+        if local_manifest:
+            local_locations = manifest_chunk_locations(local_manifest, self.models_path)
+
+        fetched_chunks = {}
+        fetched_bytes = 0
+        file_paths = []
+        for file in manifest['files']:
+            file_path = os.path.join(output_dir, file['name'])
+            with open(file_path, 'wb') as f:
+                for digest in file['chunks']:
+                    data = None
+                    location = local_locations.get(digest)
+                    if location:
+                        try:
+                            data = read_chunk(location)
+                        except OSError:
+                            data = None
+                        if data is not None and chunk_hash(data) != digest:
+                            data = None
+
+                    if data is None:
+                        data = fetched_chunks.get(digest)
+                        if data is None:
+                            data = fetch_chunk(digest)
+                            if chunk_hash(data) != digest:
+                                raise ValueError(f'model delta chunk {digest} hash mismatch')
+
+                            fetched_chunks[digest] = data
+                            fetched_bytes += len(data)
+
+                    f.write(data)
+
+            if os.path.getsize(file_path) != file['size']:
+                raise ValueError(f"model delta file {file['name']} size {os.path.getsize(file_path)} is not {file['size']}")
+
+            file_paths.append(file_path)
+
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+        return file_paths, len(fetched_chunks), fetched_bytes
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from framework.common.checkpoint.model_delta import CHUNK_ALIGNMENT, MANIFEST_FILE, align_chunk_size, make_manifest, read_chunk
+from framework.common.checkpoint.model_delta import ModelDeltaPusher, ModelDeltaPuller
+
+
+class ModelDeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.learner_dir = tempfile.mkdtemp()
+        self.models_dir = tempfile.mkdtemp()
+        self.plugins_dir = tempfile.mkdtemp()
+
+        # 模拟modelpool, key为chunk的hash
+        self.model_pool = {}
+        self.fetched = []
+
+    def tearDown(self):
+        for dir_path in (self.learner_dir, self.models_dir, self.plugins_dir):
+            shutil.rmtree(dir_path, ignore_errors=True)
+
+    def write_checkpoint(self, checkpoint_id, data):
+        data_file = os.path.join(self.learner_dir, f'model.ckpt-{checkpoint_id}.data')
+        with open(data_file, 'wb') as f:
+            f.write(data)
+
+        checkpoint_file = os.path.join(self.learner_dir, 'checkpoint')
+        with open(checkpoint_file, 'w') as f:
+            f.write(f'model_checkpoint_path: "model.ckpt-{checkpoint_id}"\n')
+
+        return [data_file, checkpoint_file]
+
+    def push(self, pusher, checkpoint_id, file_paths):
+        manifest, new_chunks = pusher.prepare(checkpoint_id, file_paths)
+        for digest, location in new_chunks.items():
+            self.model_pool[digest] = read_chunk(location)
+
+        for digest in pusher.commit(manifest, new_chunks.keys()):
+            del self.model_pool[digest]
+
+        return manifest, new_chunks
+
+    def fetch_chunk(self, digest):
+        self.fetched.append(digest)
+        return self.model_pool[digest]
+
+    def pull(self, manifest):
+        for file_name in os.listdir(self.plugins_dir):
+            os.remove(os.path.join(self.plugins_dir, file_name))
+
+        result = ModelDeltaPuller(self.models_dir).apply(manifest, self.fetch_chunk, self.plugins_dir)
+
+        for file_name in os.listdir(self.models_dir):
+            os.remove(os.path.join(self.models_dir, file_name))
+        for file_name in os.listdir(self.plugins_dir):
+            shutil.move(os.path.join(self.plugins_dir, file_name), self.models_dir)
+
+        return result
+
+    def test_manifest(self):
+        self.assertEqual(align_chunk_size(1), CHUNK_ALIGNMENT)
+        self.assertEqual(align_chunk_size(CHUNK_ALIGNMENT + 1), 2 * CHUNK_ALIGNMENT)
+
+        file_paths = self.write_checkpoint(1, b'a' * CHUNK_ALIGNMENT * 2 + b'b' * 10)
+        manifest, locations = make_manifest(1, file_paths, CHUNK_ALIGNMENT)
+
+        data_file = manifest['files'][0]
+        self.assertEqual(data_file['size'], CHUNK_ALIGNMENT * 2 + 10)
+        self.assertEqual(len(data_file['chunks']), 3)
+
+        # 相同内容的chunk只记录1次
+        self.assertEqual(data_file['chunks'][0], data_file['chunks'][1])
+        self.assertEqual(len(locations), 3)
+
+    def test_push_and_pull_delta(self):
+        pusher = ModelDeltaPusher(CHUNK_ALIGNMENT)
+        chunks = [bytes([i]) * CHUNK_ALIGNMENT for i in range(4)]
+
+        manifest, new_chunks = self.push(pusher, 1, self.write_checkpoint(1, b''.join(chunks)))
+        self.assertEqual(len(new_chunks), 5)
+
+        file_paths, fetched_count, _ = self.pull(manifest)
+        self.assertEqual(fetched_count, 5)
+        self.assertEqual(len(file_paths), 2)
+
+        # 只修改1个chunk, learner只上传修改的chunk和checkpoint文件, actor也只拉取这些chunk
+        chunks[2] = b'x' * CHUNK_ALIGNMENT
+        manifest, new_chunks = self.push(pusher, 2, self.write_checkpoint(2, b''.join(chunks)))
+        self.assertEqual(len(new_chunks), 2)
+
+        self.fetched = []
+        _, fetched_count, fetched_bytes = self.pull(manifest)
+        self.assertEqual(fetched_count, 2)
+        self.assertEqual(set(self.fetched), set(new_chunks))
+
+        with open(os.path.join(self.models_dir, 'model.ckpt-2.data'), 'rb') as f:
+            self.assertEqual(f.read(), b''.join(chunks))
+        self.assertTrue(os.path.exists(os.path.join(self.models_dir, MANIFEST_FILE)))
+
+        # 保留最近2个manifest引用的chunk, 更早的chunk被删除
+        chunks[2] = b'y' * CHUNK_ALIGNMENT
+        self.push(pusher, 3, self.write_checkpoint(3, b''.join(chunks)))
+        self.push(pusher, 4, self.write_checkpoint(4, b''.join(chunks)))
+        self.assertEqual(len(self.model_pool), 6)
+
+    def test_local_file_modified(self):
+        pusher = ModelDeltaPusher(CHUNK_ALIGNMENT)
+        manifest, _ = self.push(pusher, 1, self.write_checkpoint(1, b'a' * CHUNK_ALIGNMENT))
+        self.pull(manifest)
+
+        # 本地文件被修改后需要重新拉取, 而不是使用本地的内容
+        with open(os.path.join(self.models_dir, 'model.ckpt-1.data'), 'wb') as f:
+            f.write(b'b' * CHUNK_ALIGNMENT)
+
+        self.fetched = []
+        _, fetched_count, _ = self.pull(manifest)
+        self.assertEqual(fetched_count, 1)
+        with open(os.path.join(self.models_dir, 'model.ckpt-1.data'), 'rb') as f:
+            self.assertEqual(f.read(), b'a' * CHUNK_ALIGNMENT)
+
+    def test_hash_mismatch(self):
+        pusher = ModelDeltaPusher(CHUNK_ALIGNMENT)
+        manifest, new_chunks = self.push(pusher, 1, self.write_checkpoint(1, b'a' * CHUNK_ALIGNMENT))
+        for digest in new_chunks:
+            self.model_pool[digest] = b'broken'
+
+        with self.assertRaises(ValueError):
+            ModelDeltaPuller(self.models_dir).apply(manifest, self.fetch_chunk, self.plugins_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
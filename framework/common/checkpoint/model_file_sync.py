@@ -11,6 +11,7 @@ import time
 import traceback
 import schedule
 import re
+import json
 import datetime
 from multiprocessing import Process, Queue, Value
 from framework.common.utils.tf_utils import *
@@ -22,6 +23,7 @@ from framework.common.logging.kaiwu_logger import KaiwuLogger, g_not_server_labe
 from framework.common.monitor.monitor_proxy import MonitorProxy
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.checkpoint.model_path_manager import MODEL_PATH_MANGER
+from framework.common.checkpoint.model_delta import ModelDeltaPusher, ModelDeltaPuller, read_chunk
 
 # 如果是tensorrt的加载dump_weights
 if CONFIG.use_which_deep_learning_framework == KaiwuDRLDefine().MODEL_TENSORRT:
@@ -51,6 +53,13 @@ class ModelFileSync(Process):
             self.pull_from_model_pool_succ_cnt = 0
             self.pull_from_model_pool_err_cnt = 0
 
+        # 增量同步model文件, 见model_delta.py, learner上记录已经上传的chunk, actor上记录最近1次还原的checkpoint_id
+        self.use_model_delta_sync = int(CONFIG.use_model_delta_sync)
+        if self.use_model_delta_sync:
+            self.model_delta_key = f'{KaiwuDRLDefine.KAIWU_MODEL_CKPT}_{CONFIG.app}_{CONFIG.algo}_delta'
+            self.model_delta_pusher = ModelDeltaPusher(int(CONFIG.model_delta_chunk_size))
+            self.model_delta_checkpoint_id = None
+
     '''  
     创建上传和下载model文件的临时目录
     1. learner上的上传目录为/tmp下临时目录, 需要代码里删除, 形如/tmp/tmpyiu2tmhp/
@@ -187,6 +196,31 @@ class ModelFileSync(Process):
         # 获取到Model文件路径所在的路径
         model_path = f'{CONFIG.restore_dir}/{CONFIG.app}_{CONFIG.algo}'
 
+        checkpoint_id, file_paths = self.get_newest_checkpoint_files()
+        if not file_paths:
+            return None
+
+        target_dir = tempfile.mkdtemp()
+        for file_path in file_paths:
+            shutil.copy(file_path, target_dir)
+        
+        # 放在/tmp目录下生成tar文件
+        output_file_name = f'{model_path}/{KaiwuDRLDefine.KAIWU_CHECK_POINT_FILE}_{CONFIG.app}_{CONFIG.algo}_{checkpoint_id}.tar.gz'
+        make_tar_file(output_file_name, target_dir)
+
+        # 删除/tmp的临时文件
+        remove_tree(target_dir)
+
+        return output_file_name
+
+    '''
+    最新的checkpoint_id和对应的文件路径, 包括meta, data, index和checkpoint文件, 不存在时返回(None, [])
+    '''
+    def get_newest_checkpoint_files(self):
+
+        # 获取到Model文件路径所在的路径
+        model_path = f'{CONFIG.restore_dir}/{CONFIG.app}_{CONFIG.algo}'
+
         checkpoint_file = f'{model_path}/{KaiwuDRLDefine.CHECK_POINT_FILE}'
 
         last_line = None
@@ -196,37 +230,29 @@ class ModelFileSync(Process):
             pass
 
         if not last_line or (KaiwuDRLDefine.KAIWU_MODEL_CKPT not in last_line):
-            return None
+            return None, []
 
         # 格式形如all_model_checkpoint_paths: "/data/ckpt//sgame_ppo/model.ckpt-4841", 注意不要采用正则匹配, 因为app可能会有具体的数字
         checkpoint_id = re.search(r'(?<={}-)\d+'.format(KaiwuDRLDefine.KAIWU_MODEL_CKPT), last_line)
         if not checkpoint_id:
-            return None
+            return None, []
         checkpoint_id = int(checkpoint_id.group())
         if checkpoint_id < 0:
-            return None
+            return None, []
 
-        target_dir = tempfile.mkdtemp()
-   
         # 寻找包含checkpoint_id的meta, data, index
+        file_paths = []
         for root, dirs, file_list in os.walk(model_path):
             # 排除指定目录
             dirs[:] = [d for d in dirs if d not in MODEL_PATH_MANGER.exclude_directories()]
             for file_name in file_list:
                 if f'{KaiwuDRLDefine.KAIWU_MODEL_CKPT}-{checkpoint_id}' in file_name:
-                    shutil.copy(os.path.join(root, file_name), target_dir)
-        
-        # 需要增加checkpoint文件
-        shutil.copy(checkpoint_file, target_dir)
-        
-        # 放在/tmp目录下生成tar文件
-        output_file_name = f'{model_path}/{KaiwuDRLDefine.KAIWU_CHECK_POINT_FILE}_{CONFIG.app}_{CONFIG.algo}_{checkpoint_id}.tar.gz'
-        make_tar_file(output_file_name, target_dir)
+                    file_paths.append(os.path.join(root, file_name))
 
-        # 删除/tmp的临时文件
-        remove_tree(target_dir)
+        # 需要增加checkpoint文件
+        file_paths.append(checkpoint_file)
 
-        return output_file_name
+        return checkpoint_id, file_paths
 
     def make_old_model_tar_file(self):
         
@@ -450,6 +476,9 @@ class ModelFileSync(Process):
         if CONFIG.svr_name != KaiwuDRLDefine.SERVER_LEARNER:
             return False
 
+        if self.use_model_delta_sync:
+            return self.push_checkpoint_delta_to_model_pool(logger)
+
         try:
             # 生成checkpoint的tar文件
             output_file_name = self.make_model_tar_file()
@@ -481,6 +510,47 @@ class ModelFileSync(Process):
                  as {str(e)}, traceback.print_exc() is {traceback.format_exc()}', g_not_server_label)
             return False
     
+    '''
+    增量推送, 流程如下:
+    1. 最新checkpoint的文件按照chunk切分生成manifest
+    2. 上传modelpool里不存在的chunk, key为chunk的hash
+    3. 最后上传manifest, 保证actor拉取到manifest时其引用的chunk都已经存在
+    4. 删除不再被引用的chunk
+    '''
+    def push_checkpoint_delta_to_model_pool(self, logger):
+        try:
+            checkpoint_id, file_paths = self.get_newest_checkpoint_files()
+            if not file_paths:
+                logger.error(f'model_file_sync checkpoint files is None', g_not_server_label)
+                return False
+
+            with TimeIt() as ti:
+                manifest, new_chunks = self.model_delta_pusher.prepare(checkpoint_id, file_paths)
+                for digest, location in new_chunks.items():
+                    self.model_pool_apis.push_model(model=read_chunk(location), key=f'{self.model_delta_key}_chunk_{digest}', save_file_name=digest)
+
+                self.model_pool_apis.push_model(model=json.dumps(manifest).encode(), key=f'{self.model_delta_key}_manifest',
+                                                save_file_name=f'{self.model_delta_key}_manifest_{checkpoint_id}.json')
+
+            stale_chunks = self.model_delta_pusher.commit(manifest, new_chunks.keys())
+            if stale_chunks:
+                self.model_pool_apis.delete_models([f'{self.model_delta_key}_chunk_{digest}' for digest in stale_chunks])
+
+            self.push_to_model_pool_succ_cnt += 1
+
+            logger.info(f'model_file_sync push checkpoint {checkpoint_id} delta to modelpool success, push {len(new_chunks)} chunks, \
+            delete {len(stale_chunks)} chunks, cost {ti.interval * 1000:.1f} ms, \
+            total push to modelpool succ cnt is {self.push_to_model_pool_succ_cnt} \
+            total push to modelpool err cnt is {self.push_to_model_pool_err_cnt}', g_not_server_label)
+
+            return True
+
+        except Exception as e:
+            self.push_to_model_pool_err_cnt += 1
+            logger.error(f'model_file_sync push checkpoint delta to modelpool error, \
+                 as {str(e)}, traceback.print_exc() is {traceback.format_exc()}', g_not_server_label)
+            return False
+
     # push旧的模型checkpoint到model_pool
     def push_old_checkpoint_to_model_pool(self):
         if CONFIG.svr_name != KaiwuDRLDefine.SERVER_LEARNER:
@@ -606,6 +676,9 @@ class ModelFileSync(Process):
         if CONFIG.svr_name != KaiwuDRLDefine.SERVER_ACTOR:
             return False
 
+        if self.use_model_delta_sync:
+            return self.pull_checkpoint_delta_from_model_pool(logger)
+
         try:
             # 拉取checkpoint的tar文件
             model_name = f'{KaiwuDRLDefine.KAIWU_MODEL_CKPT}_{CONFIG.app}_{CONFIG.algo}'
@@ -668,6 +741,48 @@ class ModelFileSync(Process):
             logger.error(f'model_file_sync pull checkpoint from modelpool error, as {str(e)}, traceback.print_exc() is {traceback.format_exc()}', g_not_server_label)
             return False
 
+    '''
+    增量拉取, 流程如下:
+    1. 拉取manifest, 和本地最近1次还原的checkpoint_id相同时不需要处理
+    2. 在plugins下还原文件, models下已有的chunk直接拷贝, 只拉取本地没有的chunk
+    3. 修改checkpoint文件内容, 替换models下的文件
+    '''
+    def pull_checkpoint_delta_from_model_pool(self, logger):
+        try:
+            manifest = json.loads(self.model_pool_apis.pull_model(f'{self.model_delta_key}_manifest'))
+            checkpoint_id = manifest['checkpoint_id']
+            if checkpoint_id == self.model_delta_checkpoint_id:
+                return True
+
+            with TimeIt() as ti:
+                clean_dir(self.plugins_path)
+
+                fetch_chunk = lambda digest: self.model_pool_apis.pull_model(f'{self.model_delta_key}_chunk_{digest}')
+                file_paths, fetched_count, fetched_bytes = ModelDeltaPuller(self.models_path).apply(manifest, fetch_chunk, self.plugins_path)
+
+                # 需要修改checkpoint内容, 使其在self.modes_path下面能找到引擎文件
+                for file_path in file_paths:
+                    if KaiwuDRLDefine.CHECK_POINT_FILE == os.path.basename(file_path):
+                        self.rename_checkpoint_file(file_path)
+
+                clean_dir(self.models_path)
+                for file_name in os.listdir(self.plugins_path):
+                    shutil.move(os.path.join(self.plugins_path, file_name), self.models_path)
+
+            self.model_delta_checkpoint_id = checkpoint_id
+            self.pull_from_model_pool_succ_cnt += 1
+
+            logger.info(f'model_file_sync pull checkpoint {checkpoint_id} delta from modelpool to {self.models_path} success, \
+                            pull {fetched_count} chunks {fetched_bytes} bytes, cost {ti.interval * 1000:.1f} ms, \
+                            total pull from modelpool succ cnt is {self.pull_from_model_pool_succ_cnt} \
+                            total pull from modelpool err cnt is {self.pull_from_model_pool_err_cnt}', g_not_server_label)
+            return True
+
+        except Exception as e:
+            self.pull_from_model_pool_err_cnt += 1
+            logger.error(f'model_file_sync pull checkpoint delta from modelpool error, as {str(e)}, traceback.print_exc() is {traceback.format_exc()}', g_not_server_label)
+            return False
+
     # 加载旧模型wight
     def pull_old_wight_from_model_pool(self):
         if CONFIG.svr_name != KaiwuDRLDefine.SERVER_ACTOR:
@@ -59,6 +59,10 @@ class ModelPoolAPIs(object):
         client.upload(path, extraKey=key)
         client.delete(deleteNoKeys=True)
 
+    def delete_models(self, keys):
+        client = ModelPoolClient(self._model_pool_addr)
+        return client.delete(extraKeys=keys)
+
     def pull_keys(self, model_num=100):
         client = ModelPoolClient(self._model_pool_addr)
         rsp = client.getFileInfo(newest=model_num)
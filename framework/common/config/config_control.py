@@ -7,6 +7,7 @@ import toml
 from dynaconf import Dynaconf
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.utils.singleton import Singleton
+from framework.common.config.config_snapshot import ConfigSnapshot
 
 
 @Singleton
@@ -42,6 +43,9 @@ class ConfigControl(object):
         # 支持业务自定义的配置文件
         self.app_configure_file = None
 
+        # 配置热更新的共享内存段, 见shared_config.py
+        self.shared_config = None
+
     def check_option_valid(self, option) -> bool:
         if option not in ['main', 'aisrv', 'actor', 'learner', 'client']:
             return False
@@ -301,6 +305,39 @@ class ConfigControl(object):
         except AttributeError:
             return KaiwuDRLDefine.CONFIG_DEFAULT_STRING
 
+    '''
+    设置配置热更新的共享内存段, 需要在fork子进程之前设置, 子进程继承
+    '''
+    def attach_shared_config(self, shared_config):
+        self.shared_config = shared_config
+
+    '''
+    发布修改的配置项到共享内存段, 没有设置共享内存段时返回False
+    '''
+    def publish_shared_config(self, key_values) -> bool:
+        if not self.shared_config or not key_values:
+            return False
+
+        self.shared_config.publish(key_values)
+        return True
+
+    '''
+    按照observer记录的版本号检查共享内存段, 有修改时更新到内存里并返回修改的配置项, 否则返回None
+    版本号没有变化时只是1次共享内存读取, 可以周期性调用
+    '''
+    def reload_from_shared_config(self, observer):
+        key_values = observer.poll()
+        if key_values:
+            self.write_to_config(key_values)
+
+        return key_values
+
+    '''
+    生成当前配置的只读快照, 热点循环里采用快照替代CONFIG的属性访问, 配置修改后需要重新生成
+    '''
+    def snapshot(self):
+        return ConfigSnapshot(self)
+
     # 下面是控制replaybuff类型
     def use_reverb(self):
         return CONFIG.replay_buffer_type == 'reverb'
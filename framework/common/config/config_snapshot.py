@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+'''
+配置的只读快照, 用于热点循环里替代CONFIG的属性访问和每次的int()/字符串比较
+1. 在进程启动时和显式重新加载配置(比如七彩石拉取到新配置)时生成, 生成后不可修改
+2. 字段在生成时完成类型转换, 缺省或者非法值采用默认值
+3. 和KaiwuDRLDefine常量的字符串比较在生成时完成, 形成is_on_policy等布尔字段
+
+使用方式:
+self.config_snapshot = CONFIG.snapshot()
+if self.config_snapshot.distributed_tracing:
+    ...
+
+需要在热点循环里使用的配置项在SNAPSHOT_FIELDS里增加即可
+'''
+
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes')
+
+    return bool(value)
+
+
+def to_str(value):
+    return str(value)
+
+
+# 字段名字, 类型转换函数, 默认值
+SNAPSHOT_FIELDS = (
+    ('app', to_str, ''),
+    ('svr_name', to_str, ''),
+    ('algorithm_on_policy_or_off_policy', to_str, ''),
+    ('use_which_deep_learning_framework', to_str, ''),
+    ('aisrv_actor_communication_way', to_str, ''),
+    ('server_use_processes', to_str, ''),
+    ('predict_batch_size', int, 1),
+    ('actor_receive_cost_time_ms', int, 0),
+    ('pipeline_process_sync', to_bool, False),
+    ('actor_server_predict_server_different_queue', to_bool, False),
+    ('distributed_tracing', to_bool, False),
+    ('use_rnn', to_bool, False),
+    ('idle_sleep_count', int, 1),
+    ('idle_sleep_second', float, 0.0),
+)
+
+# 由上面字段计算得到的字段
+DERIVED_FIELDS = ('is_on_policy', 'is_sgame_5v5', 'use_zmq_ops', 'run_as_thread')
+
+
+class ConfigSnapshot(object):
+    __slots__ = tuple(name for name, _, _ in SNAPSHOT_FIELDS) + DERIVED_FIELDS
+
+    def __init__(self, config) -> None:
+        for name, convert, default in SNAPSHOT_FIELDS:
+            value = getattr(config, name, default)
+
+            # CONFIG里不存在的配置项返回的是KaiwuDRLDefine.CONFIG_DEFAULT_STRING
+            if value is None or value == KaiwuDRLDefine.CONFIG_DEFAULT_STRING:
+                value = default
+
+            try:
+                value = convert(value)
+            except (TypeError, ValueError):
+                value = default
+
+            object.__setattr__(self, name, value)
+
+        object.__setattr__(self, 'is_on_policy', self.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY)
+        object.__setattr__(self, 'is_sgame_5v5', self.app == KaiwuDRLDefine.APP_SGAME_5V5)
+        object.__setattr__(self, 'use_zmq_ops', self.aisrv_actor_communication_way == KaiwuDRLDefine.COMMUNICATION_WAY_ZMQ_OPS)
+        object.__setattr__(self, 'run_as_thread', self.server_use_processes == KaiwuDRLDefine.RUN_AS_THREAD)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'ConfigSnapshot is read only, can not set {name}, please change CONFIG and make a new snapshot')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'ConfigSnapshot is read only, can not delete {name}')
+
+    def __repr__(self) -> str:
+        return 'ConfigSnapshot(' + ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__) + ')'
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+from types import SimpleNamespace
+
+from framework.common.config.config_snapshot import ConfigSnapshot
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+
+
+class ConfigSnapshotTest(unittest.TestCase):
+    def test_snapshot(self):
+        config = SimpleNamespace(app=KaiwuDRLDefine.APP_SGAME_5V5, predict_batch_size='32', actor_receive_cost_time_ms=5,
+                                 pipeline_process_sync='False', distributed_tracing=True, idle_sleep_second='0.001',
+                                 idle_sleep_count=KaiwuDRLDefine.CONFIG_DEFAULT_STRING,
+                                 algorithm_on_policy_or_off_policy=KaiwuDRLDefine.ALGORITHM_ON_POLICY,
+                                 aisrv_actor_communication_way=KaiwuDRLDefine.COMMUNICATION_WAY_ZMQ_OPS)
+
+        config_snapshot = ConfigSnapshot(config)
+        self.assertEqual(config_snapshot.predict_batch_size, 32)
+        self.assertEqual(config_snapshot.actor_receive_cost_time_ms, 5)
+        self.assertFalse(config_snapshot.pipeline_process_sync)
+        self.assertTrue(config_snapshot.distributed_tracing)
+        self.assertEqual(config_snapshot.idle_sleep_second, 0.001)
+
+        # 缺省的配置项采用默认值
+        self.assertEqual(config_snapshot.idle_sleep_count, 1)
+        self.assertFalse(config_snapshot.use_rnn)
+        self.assertEqual(config_snapshot.use_which_deep_learning_framework, '')
+
+        self.assertTrue(config_snapshot.is_on_policy)
+        self.assertTrue(config_snapshot.is_sgame_5v5)
+        self.assertTrue(config_snapshot.use_zmq_ops)
+        self.assertFalse(config_snapshot.run_as_thread)
+
+        # 配置修改后不影响已经生成的快照
+        config.predict_batch_size = 64
+        self.assertEqual(config_snapshot.predict_batch_size, 32)
+        self.assertEqual(ConfigSnapshot(config).predict_batch_size, 64)
+
+    def test_read_only(self):
+        config_snapshot = ConfigSnapshot(SimpleNamespace())
+        with self.assertRaises(AttributeError):
+            config_snapshot.predict_batch_size = 64
+        with self.assertRaises(AttributeError):
+            config_snapshot.new_field = 1
+        with self.assertRaises(AttributeError):
+            del config_snapshot.use_rnn
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+from multiprocessing import Lock
+from multiprocessing import RawArray
+try:
+    import _pickle as pickle
+except ImportError:
+    import pickle
+
+
+'''
+带版本号的共享内存配置段, 用于替代配置的热更新时写配置文件, 其他进程周期性读取和解析配置文件
+1. 在主进程里创建, fork出的子进程(AllocProxy, aisrv handler等)继承同一块共享内存
+2. 发布方将修改的配置项合并到当前内容后整体写入, 观察方只需要比较版本号, 版本号没有变化时不需要读取和反序列化
+3. 版本号采用seqlock方式, 写入过程中为奇数, 读方读到的版本号前后不一致则重读, 保证读到的是完整的一次发布
+4. 多个发布方之间采用进程锁互斥, 读方不加锁
+
+配置项需要能被pickle序列化, 整体大小不超过size
+'''
+class SharedConfigSegment(object):
+
+    def __init__(self, size=1024 * 1024) -> None:
+        self.size = int(size)
+        self.lock = Lock()
+
+        # 下标0是版本号, 下标1是数据长度
+        self.header = RawArray('q', 2)
+        self.payload = memoryview(RawArray('b', self.size)).cast('B')
+
+        # 本进程最近一次发布的内容, 发布时合并, 只在发布方使用
+        self.key_values = {}
+
+    '''
+    当前版本号, 偶数, 为发布次数的2倍, 用于观察方快速判断是否有修改
+    '''
+    def version(self):
+        return self.header[0] & ~1
+
+    '''
+    将修改的配置项合并后整体发布, 返回新的版本号
+    '''
+    def publish(self, key_values):
+        with self.lock:
+            # 其他进程可能发布过, 以共享内存里的内容为准
+            _, current = self.read()
+            current.update(key_values)
+
+            data = pickle.dumps(current, protocol=-1)
+            data_len = len(data)
+            if data_len > self.size:
+                raise ValueError(f'shared config size {data_len} is larger than segment size {self.size}')
+
+            self.header[0] += 1
+            self.payload[:data_len] = data
+            self.header[1] = data_len
+            self.header[0] += 1
+
+            self.key_values = current
+            return self.header[0]
+
+    '''
+    读取完整的配置内容, 返回(版本号, 配置项), 没有发布过时返回(0, {})
+    '''
+    def read(self):
+        while True:
+            version = self.header[0]
+            if version & 1:
+                continue
+
+            if not version:
+                return 0, {}
+
+            data = bytes(self.payload[:self.header[1]])
+            if self.header[0] == version:
+                return version, pickle.loads(data)
+
+
+'''
+观察方, 每个进程1个, 记录本进程已经应用的版本号
+'''
+class SharedConfigObserver(object):
+
+    def __init__(self, segment) -> None:
+        self.segment = segment
+        self.applied_version = 0
+
+    '''
+    版本号有变化时返回最新的配置项, 否则返回None, 不做读取和反序列化
+    '''
+    def poll(self):
+        if self.segment.version() == self.applied_version:
+            return None
+
+        self.applied_version, key_values = self.segment.read()
+        return key_values
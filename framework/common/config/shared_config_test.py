@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+import multiprocessing
+
+from framework.common.config.shared_config import SharedConfigSegment, SharedConfigObserver
+
+
+def publish_in_child(segment):
+    segment.publish({'actor_addrs': {'train_one': ['127.0.0.1:8001', '127.0.0.1:8002']}, 'actor_proxy_num': 2})
+
+
+class SharedConfigTest(unittest.TestCase):
+    def test_publish_and_poll(self):
+        segment = SharedConfigSegment(4096)
+        observer = SharedConfigObserver(segment)
+        self.assertEqual(segment.read(), (0, {}))
+        self.assertIsNone(observer.poll())
+
+        segment.publish({'predict_batch_size': 32})
+        self.assertEqual(observer.poll(), {'predict_batch_size': 32})
+
+        # 版本号没有变化时不读取
+        self.assertIsNone(observer.poll())
+
+        # 发布时合并之前的配置项
+        segment.publish({'actor_proxy_num': 1})
+        self.assertEqual(observer.poll(), {'predict_batch_size': 32, 'actor_proxy_num': 1})
+        self.assertEqual(segment.version(), 4)
+
+    def test_publish_from_child_process(self):
+        segment = SharedConfigSegment(4096)
+        observer = SharedConfigObserver(segment)
+
+        process = multiprocessing.get_context('fork').Process(target=publish_in_child, args=(segment, ))
+        process.start()
+        process.join()
+
+        key_values = observer.poll()
+        self.assertEqual(key_values['actor_proxy_num'], 2)
+        self.assertEqual(key_values['actor_addrs']['train_one'], ['127.0.0.1:8001', '127.0.0.1:8002'])
+
+    def test_publish_too_large(self):
+        segment = SharedConfigSegment(64)
+        with self.assertRaises(ValueError):
+            segment.publish({'actor_addrs': ['127.0.0.1:8001'] * 100})
+
+        self.assertEqual(segment.version(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -41,41 +41,66 @@ class Connection(object):
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
         self.recv_buff = bytearray(Connection.DEF_BUF_SIZE)
+        self.recv_header_buff = bytearray(Connection.HEADER_TOTAL_LEN)
         self.send_header_buff = bytearray(Connection.HEADER_TOTAL_LEN)
         self.send_header_buff[0:Connection.MAGIC_LEN] = Connection.MAGIC_NUM.to_bytes(Connection.MAGIC_LEN, byteorder='big')
 
         
     
+    '''
+    发送1个消息, 采用sendmsg分散写, 消息头和消息体不做拼接
+    '''
     def send_msg(self, send_msg):
-        def send_msg_impl(send_buff, total_bytes):
-            retry = 0
-            left_bytes = total_bytes
-            while retry < CONFIG.socket_retry_times and left_bytes > 0:
-                bytes_written = self.sock.send(send_buff[total_bytes - left_bytes:])
-                left_bytes -= bytes_written
-                retry += 1
-            if left_bytes > 0:
-                raise RuntimeError("failed to send message: msg len %d send len %d, retry %d" % (
-                    total_bytes, total_bytes - left_bytes, retry))
-        
         msg_len = len(send_msg)
         self.send_header_buff[Connection.MAGIC_LEN:Connection.HEADER_TOTAL_LEN] = msg_len.to_bytes(Connection.DATA_LEN, byteorder='big')
 
-        # send magic + header length
-        send_msg_impl(self.send_header_buff + send_msg, Connection.HEADER_TOTAL_LEN+msg_len)
-        # send data
-        # send_msg_impl(send_msg, msg_len)
+        # send magic + header length + data
+        buffers = [memoryview(self.send_header_buff), memoryview(send_msg).cast('B')]
+        total_bytes = Connection.HEADER_TOTAL_LEN + msg_len
+        left_bytes = total_bytes
+
+        retry = 0
+        while retry < CONFIG.socket_retry_times and left_bytes > 0:
+            bytes_written = self.sock.sendmsg(buffers)
+            left_bytes -= bytes_written
+            retry += 1
 
+            # 部分发送时, 跳过已经发送的数据
+            while bytes_written > 0 and buffers:
+                if bytes_written >= len(buffers[0]):
+                    bytes_written -= len(buffers[0])
+                    buffers.pop(0)
+                else:
+                    buffers[0] = buffers[0][bytes_written:]
+                    bytes_written = 0
+
+        if left_bytes > 0:
+            raise RuntimeError("failed to send message: msg len %d send len %d, retry %d" % (
+                total_bytes, total_bytes - left_bytes, retry))
+
+    '''
+    接收1个消息, 返回的是接收缓冲区上的memoryview, 不做拷贝
+    接收缓冲区会被复用, 返回值只在下一次调用recv_msg之前有效, 需要保留时由调用方拷贝
+    '''
     def recv_msg(self):
-        magic_number = self.sock.recv(Connection.MAGIC_LEN, socket.MSG_WAITALL)
-        if not magic_number:
-            raise ClientQuitException(client_id = str(self.sock.getpeername()),quit_code=0, message="magic_number is {}, peer {} close connection.".format(magic_number, str(self.sock.getpeername())))
-        magic_number = int.from_bytes(magic_number, byteorder="big")
+        header = memoryview(self.recv_header_buff)
+        pos = self.sock.recv_into(header, Connection.HEADER_TOTAL_LEN, socket.MSG_WAITALL)
+        if not pos:
+            raise ClientQuitException(client_id = str(self.sock.getpeername()),quit_code=0, message="peer {} close connection.".format(str(self.sock.getpeername())))
+
+        retry = 0
+        while retry < CONFIG.socket_retry_times and pos < Connection.HEADER_TOTAL_LEN:
+            recv_bytes = self.sock.recv_into(header[pos:], Connection.HEADER_TOTAL_LEN - pos)
+            if not recv_bytes:
+                raise ClientQuitException(client_id = str(self.sock.getpeername()),quit_code=0, message="peer {} close connection.".format(str(self.sock.getpeername())))
+            pos += recv_bytes
+            retry += 1
+
+        magic_number = int.from_bytes(header[:Connection.MAGIC_LEN], byteorder="big")
         if magic_number != Connection.MAGIC_NUM:
             raise RuntimeError("magic number %x is error, right is %x, peer ip: %s" % (magic_number, Connection.MAGIC_NUM, str(self.sock.getpeername())))
 
-        msg_len = self.sock.recv(Connection.DATA_LEN)
-        msg_len = int.from_bytes(msg_len, byteorder="big")
+        msg_len = int.from_bytes(header[Connection.MAGIC_LEN:Connection.HEADER_TOTAL_LEN], byteorder="big")
         if msg_len <= 0 or msg_len > Connection.MAX_MSG_SIZE:
             raise RuntimeError("invalid msg len: %d" % msg_len)
 
@@ -92,13 +117,3 @@ class Connection(object):
                 msg_len, pos, retry))
 
         return raw_msg
-
-
-
-
-    
-
-        
-
-
-    
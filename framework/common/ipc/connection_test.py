@@ -23,9 +23,36 @@ class ConnectionTest(unittest.TestCase):
         self.msg = b'a' * 1000
 
     def test_send_msg(self):
-        self.sock.configure_mock(**{'send.return_value': 1012})
+        self.sock.configure_mock(**{'sendmsg.return_value': 1008})
         self.conn.send_msg(self.msg)
-        self.sock.send.assert_called()
+        self.sock.sendmsg.assert_called_once()
+
+    def test_send_msg_partial(self):
+        # 第一次只发送了消息头和部分消息体
+        # send_msg会修改传入sendmsg的buffers列表, 这里记录每次调用时的拷贝
+        calls = []
+        ret = [Connection.HEADER_TOTAL_LEN + 100, 900]
+        self.sock.configure_mock(**{'sendmsg.side_effect': lambda bufs: calls.append([bytes(b) for b in bufs]) or ret.pop(0)})
+        self.conn.send_msg(self.msg)
+        self.assertEqual(self.sock.sendmsg.call_count, 2)
+        self.assertEqual(calls[0][1], self.msg)
+        self.assertEqual(calls[1], [self.msg[100:]])
+
+    def test_socketpair(self):
+        left, right = socket.socketpair()
+        sender, receiver = Connection(left), Connection(right)
+
+        sender.send_msg(self.msg)
+        recv_msg = receiver.recv_msg()
+        self.assertIsInstance(recv_msg, memoryview)
+        self.assertEqual(bytes(recv_msg), self.msg)
+
+        # 接收缓冲区复用
+        sender.send_msg(b'b' * 10)
+        self.assertEqual(bytes(receiver.recv_msg()), b'b' * 10)
+
+        left.close()
+        right.close()
 
     def test_send_receive_msg(self):
         self.new_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -2,6 +2,7 @@
 # -*- coding:utf-8 -*-
 
 
+import time
 import traceback
 import reverb
 from framework.common.config.config_control import CONFIG
@@ -25,6 +26,14 @@ class RevervbUtil():
         self.max_sequence_length = int(CONFIG.reverb_client_max_sequence_length)
         self.chunk_length = int(CONFIG.reverb_client_chunk_length)
 
+        # 批量写入, 长期复用同一个writer, 多条样本组成一个chunk, 达到flush_size条或者超过flush_interval_ms后flush
+        self.batch_writer = None
+        self.batch_chunk_length = int(CONFIG.reverb_batch_chunk_length)
+        self.batch_flush_size = int(CONFIG.reverb_batch_flush_size)
+        self.batch_flush_interval_sec = float(CONFIG.reverb_batch_flush_interval_ms) / 1000
+        self.batch_pending_cnt = 0
+        self.batch_last_flush_time = time.monotonic()
+
     def get_send_to_reverb_server_stat(self):
         tmp_send_to_reverb_server_succ_cnt = self.send_to_reverb_server_succ_cnt
         tmp_send_to_reverb_server_error_cnt = self.send_to_reverb_server_error_cnt
@@ -119,4 +128,80 @@ class RevervbUtil():
 
         except Exception as e:
             self.send_to_reverb_server_error_cnt += 1
-            self.logger.error(f'learner_proxy send one data to reverb server error as {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
\ No newline at end of file
+            self.logger.error(f'learner_proxy send one data to reverb server error as {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
+
+    '''
+    批量写入reverb server, 和write_to_reverb_server_simple的参数一致
+    1. 每条样本只append一次, 多个table的item引用同一个step, 不重复append
+    2. writer长期复用, 多条样本组成一个chunk, 减少gRPC交互和每个item的开销
+    3. 达到reverb_batch_flush_size条或者超过reverb_batch_flush_interval_ms后flush
+    '''
+    def write_to_reverb_server_batch(self, reverb_table_names, train_data, prioritezeds=None):
+        if not train_data:
+            return
+        
+        if self.has_prioritezed:
+            if not prioritezeds or len(train_data) != len(prioritezeds):
+                return
+        
+        try:
+            # reverb要求chunk_length不能超过max_sequence_length, item只引用最后1个step, 不受max_sequence_length影响
+            if not self.batch_writer:
+                self.batch_writer = self.reverb_client.writer(max_sequence_length=self.batch_chunk_length, chunk_length=self.batch_chunk_length)
+
+            for count, sample in enumerate(train_data):
+                self.batch_writer.append(sample)
+
+                prioritezed = 1.0
+                if self.has_prioritezed:
+                    prioritezed = prioritezeds[count]
+
+                for table in reverb_table_names:
+                    self.batch_writer.create_item(table, 1, prioritezed)
+            
+            self.batch_pending_cnt += len(train_data)
+            self.flush_batch_writer(force=False)
+        
+        except Exception as e:
+            self.send_to_reverb_server_error_cnt += 1
+            self.close_batch_writer()
+            self.logger.error(f'learner_proxy send batch data to reverb server error as {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
+
+    '''
+    force为False时, 只有达到flush条件才flush, 调用方可以在主循环里周期性调用, 避免样本长时间滞留在writer
+    '''
+    def flush_batch_writer(self, force=True):
+        if not self.batch_writer or not self.batch_pending_cnt:
+            return
+        
+        now = time.monotonic()
+        if not force and self.batch_pending_cnt < self.batch_flush_size and now - self.batch_last_flush_time < self.batch_flush_interval_sec:
+            return
+        
+        try:
+            self.batch_writer.flush()
+
+            self.send_to_reverb_server_succ_cnt += self.batch_pending_cnt
+            self.batch_pending_cnt = 0
+            self.batch_last_flush_time = now
+
+        except Exception as e:
+            self.send_to_reverb_server_error_cnt += 1
+            self.close_batch_writer()
+            self.logger.error(f'learner_proxy flush batch data to reverb server error as {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
+    
+    '''
+    关闭批量写入的writer, 未flush的样本会在close时发送, 异常时丢弃
+    '''
+    def close_batch_writer(self):
+        if not self.batch_writer:
+            return
+        
+        try:
+            self.batch_writer.close()
+        except Exception as e:
+            pass
+        
+        self.batch_writer = None
+        self.batch_pending_cnt = 0
+        self.batch_last_flush_time = time.monotonic()
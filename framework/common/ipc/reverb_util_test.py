@@ -4,6 +4,7 @@
 
 import datetime
 import unittest
+from unittest import mock
 from framework.common.config.config_control import CONFIG
 from framework.common.logging.kaiwu_logger import KaiwuLogger
 from framework.common.ipc.reverb_util import RevervbUtil
@@ -18,6 +19,70 @@ class ReverbUtilTest(unittest.TestCase):
 
     def test_insert_data(self):
         pass
+
+
+class ReverbUtilBatchWriterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        CONFIG.reverb_sampler = 'reverb.selectors.Uniform'
+        CONFIG.reverb_client_max_sequence_length = 1
+        CONFIG.reverb_client_chunk_length = 1
+        CONFIG.reverb_batch_chunk_length = 64
+        CONFIG.reverb_batch_flush_size = 4
+        CONFIG.reverb_batch_flush_interval_ms = 100000
+
+        self.writer = mock.MagicMock()
+
+        # 和reverb.Client.writer的参数检查一致
+        def writer(max_sequence_length, chunk_length=None, **kwargs):
+            if chunk_length is not None and chunk_length > max_sequence_length:
+                raise ValueError(f'chunk_length ({chunk_length}) must be <= max_sequence_length ({max_sequence_length})')
+            return self.writer
+
+        patcher = mock.patch('framework.common.ipc.reverb_util.reverb.Client')
+        self.client = patcher.start().return_value
+        self.client.writer.side_effect = writer
+        self.addCleanup(patcher.stop)
+
+        self.logger = mock.MagicMock()
+        self.reverb_util = RevervbUtil('127.0.0.1:9999', self.logger)
+
+    def test_writer_args(self):
+        self.reverb_util.write_to_reverb_server_batch(['table_0'], [{'a': 1}])
+
+        self.client.writer.assert_called_once()
+        kwargs = self.client.writer.call_args.kwargs
+        self.assertEqual(kwargs['chunk_length'], 64)
+        self.assertGreaterEqual(kwargs['max_sequence_length'], kwargs['chunk_length'])
+        self.logger.error.assert_not_called()
+
+    def test_batch_insert(self):
+        tables = ['table_0', 'table_1']
+        samples = [{'a': i} for i in range(3)]
+
+        # 未达到flush条件, 样本留在writer里
+        self.reverb_util.write_to_reverb_server_batch(tables, samples)
+        self.assertEqual(self.writer.append.call_count, 3)
+        self.assertEqual(self.writer.create_item.call_count, 6)
+        self.writer.create_item.assert_any_call('table_1', 1, 1.0)
+        self.writer.flush.assert_not_called()
+        self.assertEqual(self.reverb_util.get_send_to_reverb_server_stat(), (0, 0))
+
+        # 达到flush_size后flush, writer复用
+        self.reverb_util.write_to_reverb_server_batch(tables, [{'a': 3}])
+        self.writer.flush.assert_called_once()
+        self.client.writer.assert_called_once()
+        self.assertEqual(self.reverb_util.get_send_to_reverb_server_stat(), (4, 0))
+
+        # 强制flush剩下的样本
+        self.reverb_util.write_to_reverb_server_batch(tables, [{'a': 4}])
+        self.reverb_util.flush_batch_writer()
+        self.assertEqual(self.writer.flush.call_count, 2)
+        self.assertEqual(self.reverb_util.get_send_to_reverb_server_stat(), (1, 0))
+        self.logger.error.assert_not_called()
+
+        self.reverb_util.close_batch_writer()
+        self.writer.close.assert_called_once()
+
         
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import struct
+import time
+
+try:
+    import _pickle as pickle
+except ImportError:
+    import pickle
+
+# need pip install pyzmq
+import zmq
+import numpy as np
+
+
+'''
+on-policy场景下learner --> actor之间内存里同步模型参数, 替代learner推送modelpool, actor拉取model文件再加载的流程
+1. learner将参数序列化成1块连续的buffer, 按照chunk_size切分后通过zmq PUB发送, 每个分片带上版本号
+2. actor通过zmq SUB接收分片, 按照偏移拷贝到预分配的buffer里, 收齐后还原参数, 由model_wrapper直接设置到session里
+3. actor bind, learner connect, 和learner主动连接actor的方向一致, learner发现新的actor时connect即可
+
+每个分片是1个multipart消息: [header, meta, data]
+header: 版本号, 分片下标, 分片总数, buffer总长度, 本分片偏移
+meta: 每个参数的(名字, dtype, shape, 偏移, 字节数), 只在第1个分片里携带, 其他分片为空
+'''
+
+WEIGHT_HEADER = struct.Struct('<qIIQQ')
+
+
+'''
+参数序列化, weights格式为{名字: ndarray}, 返回(meta, buffer)
+'''
+def flatten_weights(weights):
+    arrays = [(name, np.ascontiguousarray(value)) for name, value in weights.items()]
+
+    meta = []
+    offset = 0
+    for name, array in arrays:
+        meta.append((name, array.dtype.str, array.shape, offset, array.nbytes))
+        offset += array.nbytes
+
+    buffer = bytearray(offset)
+    view = memoryview(buffer)
+    for (name, _, _, offset, nbytes), (_, array) in zip(meta, arrays):
+        view[offset:offset + nbytes] = memoryview(array).cast('B')
+
+    return meta, buffer
+
+
+'''
+参数反序列化, 返回的ndarray是buffer上的视图, 不做拷贝
+'''
+def unflatten_weights(meta, buffer):
+    weights = {}
+    for name, dtype, shape, offset, nbytes in meta:
+        dtype = np.dtype(dtype)
+        weights[name] = np.frombuffer(buffer, dtype=dtype, count=nbytes // dtype.itemsize, offset=offset).reshape(shape)
+
+    return weights
+
+
+'''
+将1次发布切分成分片, 返回multipart消息列表, 分片数据是buffer上的memoryview, 不做拷贝
+'''
+def split_weight_chunks(version, meta, buffer, chunk_size):
+    total_len = len(buffer)
+    chunk_count = max(1, (total_len + chunk_size - 1) // chunk_size)
+    view = memoryview(buffer)
+
+    frames = []
+    for index in range(chunk_count):
+        offset = index * chunk_size
+        header = WEIGHT_HEADER.pack(version, index, chunk_count, total_len, offset)
+        frames.append([header, pickle.dumps(meta, protocol=-1) if index == 0 else b'', view[offset:offset + chunk_size]])
+
+    return frames
+
+
+'''
+分片组装, 只保留最新版本, 旧版本的分片直接丢弃, 收到更新版本的分片时放弃未收齐的版本
+'''
+class WeightAssembler(object):
+
+    def __init__(self) -> None:
+        self.version = -1
+        self.buffer = None
+        self.meta = None
+        self.received = set()
+        self.chunk_count = 0
+        self.completed = False
+
+    '''
+    收齐时返回(版本号, meta, buffer), 否则返回None
+    '''
+    def add(self, frames):
+        header, meta, data = frames
+        version, index, chunk_count, total_len, offset = WEIGHT_HEADER.unpack(bytes(header))
+        if version < self.version:
+            return None
+
+        if version > self.version:
+            self.version = version
+            self.buffer = bytearray(total_len)
+            self.meta = None
+            self.received = set()
+            self.chunk_count = chunk_count
+            self.completed = False
+
+        # 已经收齐的版本, 后续重复的分片不再处理
+        if self.completed or index in self.received:
+            return None
+
+        data = memoryview(data)
+        self.buffer[offset:offset + len(data)] = data
+        if index == 0:
+            self.meta = pickle.loads(bytes(meta))
+        self.received.add(index)
+
+        if len(self.received) != self.chunk_count:
+            return None
+
+        result = (self.version, self.meta, self.buffer)
+        self.completed = True
+        self.buffer = None
+        return result
+
+
+'''
+learner侧, zmq PUB, 发送缓冲区不设上限, 规避PUB在达到高水位时丢弃分片
+'''
+class WeightBroadcastPublisher(object):
+
+    def __init__(self, chunk_size) -> None:
+        self.chunk_size = int(chunk_size)
+        self._context = zmq.Context()
+        self._socket = self._context.socket(zmq.PUB)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        self._socket.setsockopt(zmq.SNDHWM, 0)
+
+        self.addresses = set()
+
+    def connect(self, ip, port):
+        address = f'tcp://{ip}:{port}'
+        if address in self.addresses:
+            return
+
+        self._socket.connect(address)
+        self.addresses.add(address)
+
+    '''
+    发布参数, 返回发送的字节数
+    '''
+    def publish(self, version, weights):
+        meta, buffer = flatten_weights(weights)
+        for frames in split_weight_chunks(version, meta, buffer, self.chunk_size):
+            self._socket.send_multipart(frames, copy=False)
+
+        return len(buffer)
+
+    def close(self):
+        self._socket.close()
+        self._context.term()
+
+
+'''
+actor侧, zmq SUB, 订阅所有消息
+'''
+class WeightBroadcastSubscriber(object):
+
+    def __init__(self, ip, port) -> None:
+        self._context = zmq.Context()
+        self._socket = self._context.socket(zmq.SUB)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        self._socket.setsockopt(zmq.RCVHWM, 0)
+        self._socket.setsockopt(zmq.SUBSCRIBE, b'')
+        self._socket.bind(f'tcp://{ip}:{port}')
+
+        self.assembler = WeightAssembler()
+
+    '''
+    等待版本号不小于version的参数收齐, 返回(版本号, {名字: ndarray}), 超时返回None
+    '''
+    def recv_weights(self, version, timeout_seconds):
+        deadline = time.monotonic() + timeout_seconds
+        while True:
+            timeout_ms = max(0, int((deadline - time.monotonic()) * 1000))
+            if not self._socket.poll(timeout_ms, flags=zmq.POLLIN):
+                return None
+
+            result = self.assembler.add(self._socket.recv_multipart(copy=False))
+            if result and result[0] >= version:
+                recv_version, meta, buffer = result
+                return recv_version, unflatten_weights(meta, buffer)
+
+    def close(self):
+        self._socket.close()
+        self._context.term()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import time
+import unittest
+import numpy as np
+from framework.common.ipc.weight_broadcast import flatten_weights, unflatten_weights, split_weight_chunks, WeightAssembler
+from framework.common.ipc.weight_broadcast import WeightBroadcastPublisher, WeightBroadcastSubscriber
+
+
+class TestWeightBroadcast(unittest.TestCase):
+    def setUp(self):
+        self.weights = {
+            'policy/dense/kernel:0': np.arange(12, dtype=np.float32).reshape(3, 4),
+            'policy/dense/bias:0': np.ones(4, dtype=np.float32),
+            'value/step:0': np.array(7, dtype=np.int64),
+        }
+
+    def assert_weights_equal(self, weights):
+        self.assertEqual(set(weights), set(self.weights))
+        for name, value in self.weights.items():
+            self.assertEqual(weights[name].dtype, value.dtype)
+            np.testing.assert_array_equal(weights[name], value)
+
+    def test_flatten_and_unflatten(self):
+        meta, buffer = flatten_weights(self.weights)
+        self.assertEqual(len(buffer), 12 * 4 + 4 * 4 + 8)
+        self.assert_weights_equal(unflatten_weights(meta, buffer))
+
+    def test_assembler(self):
+        meta, buffer = flatten_weights(self.weights)
+        frames = split_weight_chunks(1, meta, buffer, 16)
+        self.assertEqual(len(frames), 5)
+
+        # 乱序, 重复, 旧版本的分片
+        assembler = WeightAssembler()
+        for chunk in reversed(frames[1:]):
+            self.assertIsNone(assembler.add(chunk))
+        self.assertIsNone(assembler.add(frames[1]))
+
+        version, recv_meta, recv_buffer = assembler.add(frames[0])
+        self.assertEqual(version, 1)
+        self.assert_weights_equal(unflatten_weights(recv_meta, recv_buffer))
+        self.assertIsNone(assembler.add(frames[0]))
+
+        old_frames = split_weight_chunks(0, meta, buffer, len(buffer))
+        self.assertIsNone(assembler.add(old_frames[0]))
+
+        # 没有收齐时收到新版本, 放弃旧版本
+        new_frames = split_weight_chunks(3, meta, buffer, 32)
+        self.assertIsNone(assembler.add(split_weight_chunks(2, meta, buffer, 32)[0]))
+        for chunk in new_frames[:-1]:
+            self.assertIsNone(assembler.add(chunk))
+        self.assertEqual(assembler.add(new_frames[-1])[0], 3)
+
+    def test_publish_and_subscribe(self):
+        subscriber = WeightBroadcastSubscriber('127.0.0.1', 31100)
+        publisher = WeightBroadcastPublisher(16)
+        publisher.connect('127.0.0.1', 31100)
+
+        # PUB/SUB建立连接之前发送的消息会被丢弃
+        time.sleep(0.2)
+
+        self.assertEqual(publisher.publish(5, self.weights), 12 * 4 + 4 * 4 + 8)
+        version, weights = subscriber.recv_weights(5, 1)
+        self.assertEqual(version, 5)
+        self.assert_weights_equal(weights)
+
+        self.assertIsNone(subscriber.recv_weights(6, 0.1))
+
+        publisher.close()
+        subscriber.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -328,6 +328,13 @@ class ZmqClient:
         self._socket.setsockopt(zmq.IDENTITY, bytes(self.client_id, 'utf-8'))
         self._socket.connect("tcp://" + self.ip + ":" + str(self.port))
 
+    '''
+    关闭socket, context保留, 之后可以再次调用connect重新建立连接
+    '''
+    def close(self):
+        with self._lock:
+            self._socket.close()
+
     def readable(self):
         return self._socket.poll(0, flags=zmq.POLLIN) == zmq.POLLIN
 
@@ -424,6 +431,9 @@ class ZmqOpsClient:
     def send(self, data):
         self._socket.send(data, copy=False)
 
+    def close(self):
+        self._socket.close()
+
 
 '''
 zmq Poller
@@ -25,14 +25,20 @@ setLoggerFormat(f"/actor/actor_server_log_{datetime.datetime.now().strftime('%Y-
 self.logger.info('actor_server process is pid is {}', os.getpid())
 
 系统会对进程aisrv、actor、learner的日志内容增加进程名字样, 其他的日志内容不会增加
+
+热点路径上打日志时采用'{}'占位符传参, 不要提前拼接f-string, 低于配置级别的日志在构造消息前直接返回
+log_mode配置为ring_buffer时, 日志写入进程内的环形缓冲区, 由后台线程格式化和写文件, 见ring_buffer_logger.py
 '''
 
+import os
 import sys
+import traceback
 from loguru import logger
 from framework.common.config.config_control import CONFIG
 from framework.common.utils.singleton import Singleton
 from framework.common.utils.common_func import stop_process_by_name
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+from framework.common.logging.ring_buffer_logger import RingBufferLogger, LEVEL_NOS, parse_rotation_size
 
 g_not_server_label = 'not_server'
 
@@ -47,6 +53,18 @@ class KaiwuLogger(object):
         # 返回的路径深度
         self.depth = 1
 
+        # 低于该级别的日志直接返回, 不构造消息
+        self.level_no = LEVEL_NOS.get(str(CONFIG.level).upper(), 0)
+
+        # ring_buffer模式下的环形缓冲区, 每个进程1个, 在第一次setLoggerFormat时创建, fork出的子进程里需要重新创建
+        self.ring_logger = None
+        self.use_ring_buffer = (CONFIG.log_mode == KaiwuDRLDefine.LOG_MODE_RING_BUFFER)
+        if self.use_ring_buffer:
+            os.register_at_fork(after_in_child=self.reset_ring_logger)
+
+    def reset_ring_logger(self):
+        self.ring_logger = None
+
     '''
     调用设置日志各种参数
     1. file_name是必须的, 即日志生成的配置文件
@@ -58,6 +76,13 @@ class KaiwuLogger(object):
             # 开发测试阶段, 可以采用 filter=lambda x: print(x, filter_content) or filter_content in x['message']打印日志
             filter_func = lambda x: filter_content in x['message']
 
+        if self.use_ring_buffer:
+            if not self.ring_logger:
+                self.ring_logger = RingBufferLogger(int(CONFIG.log_ring_buffer_size), int(CONFIG.log_drain_interval_ms),
+                                                    parse_rotation_size(CONFIG.rotation), CONFIG.encoding)
+            self.ring_logger.add_sink(f'{CONFIG.log_dir}/{file_name}', filter_content)
+            return
+
         logger.add(f'{CONFIG.log_dir}/{file_name}', rotation=CONFIG.rotation, 
                             encoding=CONFIG.encoding, enqueue=True, compression=CONFIG.compression, retention=CONFIG.retention, 
                                 level=CONFIG.level, filter=filter_func, serialize=CONFIG.serialize)
@@ -77,23 +102,60 @@ class KaiwuLogger(object):
     def is_not_server(self, *args):
         return g_not_server_label in args
 
+    '''
+    ring_buffer模式下写入环形缓冲区, 只传递消息模板和参数, 格式化由后台线程完成
+    exc_info不为空时追加到消息后面, 有参数时需要转义其中的大括号, 避免参数替换失败
+    '''
+    def write_ring(self, level_no, msg, args, kwargs, exc_info=None):
+        not_server = self.is_not_server(*args)
+        if not_server:
+            args = tuple(arg for arg in args if arg != g_not_server_label)
+
+        msg = self.make_msg_content(msg, not_server)
+        if exc_info:
+            if args or kwargs:
+                exc_info = exc_info.replace('{', '{{').replace('}', '}}')
+            msg = f'{msg}\n{exc_info}'
+
+        self.ring_logger.write(level_no, msg, args, kwargs)
+
 
     def debug(self, msg, *args, **kwargs):
+        if self.level_no > LEVEL_NOS['DEBUG']:
+            return
+        if self.ring_logger:
+            return self.write_ring(LEVEL_NOS['DEBUG'], msg, args, kwargs)
         return logger.opt(depth=self.depth).debug(self.make_msg_content(msg, self.is_not_server(*args)), *args, **kwargs)
 
 
     def info(self, msg, *args, **kwargs):
+        if self.level_no > LEVEL_NOS['INFO']:
+            return
+        if self.ring_logger:
+            return self.write_ring(LEVEL_NOS['INFO'], msg, args, kwargs)
         return logger.opt(depth=self.depth).info(self.make_msg_content(msg, self.is_not_server(*args)), *args, **kwargs)
 
 
     def warning(self, msg, *args, **kwargs):
+        if self.level_no > LEVEL_NOS['WARNING']:
+            return
+        if self.ring_logger:
+            return self.write_ring(LEVEL_NOS['WARNING'], msg, args, kwargs)
         return logger.opt(depth=self.depth).warning(self.make_msg_content(msg, self.is_not_server(*args)), *args, **kwargs)
 
 
     def error(self, msg, *args, **kwargs):
 
-        logger_opt = logger.opt(depth=self.depth).error(self.make_msg_content(msg, self.is_not_server(*args)), *args, **kwargs)
+        if self.ring_logger:
+            logger_opt = self.write_ring(LEVEL_NOS['ERROR'], msg, args, kwargs)
+        else:
+            logger_opt = logger.opt(depth=self.depth).error(self.make_msg_content(msg, self.is_not_server(*args)), *args, **kwargs)
+
         if CONFIG.stop_process_when_error:
+            # 停掉进程前先把缓冲区里的日志写到文件
+            if self.ring_logger:
+                self.ring_logger.flush()
+
             # actor,aisrv,learner的进程名字是python3, 注意和容器上的其他进程隔离开, 以免误杀其他进程
             stop_process_by_name(KaiwuDRLDefine.SERVER_MODELPOOL)
             stop_process_by_name(KaiwuDRLDefine.SERVER_MODELPOOL_PROXY)
@@ -103,12 +165,21 @@ class KaiwuLogger(object):
 
 
     def critical(self, msg, *args, **kwargs):
+        if self.ring_logger:
+            return self.write_ring(LEVEL_NOS['CRITICAL'], msg, args, kwargs)
         return logger.opt(depth=self.depth).critical(self.make_msg_content(msg, self.is_not_server(*args)), *args, **kwargs)
 
 
     def exception(self, msg, *args, **kwargs):
+        if self.ring_logger:
+            return self.write_ring(LEVEL_NOS['CRITICAL'], msg, args, kwargs, traceback.format_exc())
         return logger.opt(depth=self.depth).critical(self.make_msg_content(msg, self.is_not_server(*args)), *args, **kwargs)
 
 
     def log(self, level, msg, *args, **kwargs):
+        level_no = LEVEL_NOS.get(level, level) if isinstance(level, str) else level
+        if isinstance(level_no, int) and self.level_no > level_no:
+            return
+        if self.ring_logger and isinstance(level_no, int):
+            return self.write_ring(level_no, msg, args, kwargs)
         return logger.opt(depth=self.depth).log(level, self.make_msg_content(msg, self.is_not_server(*args)), *args, **kwargs)
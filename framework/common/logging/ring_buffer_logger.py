@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+'''
+高吞吐的日志模式, 替代loguru的enqueue=True
+1. 打日志的线程只做级别判断, 将时间戳, 级别, 消息模板和参数写成二进制记录放入环形缓冲区, 不做格式化
+2. 环形缓冲区为本进程的匿名共享内存(mmap), 头部记录写位置和读位置, 记录不跨越缓冲区尾部
+3. 后台drainer线程周期性批量取出记录, 完成格式化后按照sink写文件, 文件超过rotation大小时滚动
+4. 缓冲区满时丢弃新的记录并计数, 不阻塞打日志的线程, drainer在日志里输出丢弃数目
+
+记录格式, 小端序, 按照8字节对齐:
+记录长度(4字节) + 消息长度(4字节) + 参数长度(4字节) + 级别(1字节) + 时间戳(8字节) + 消息(utf-8) + 参数(pickle)
+记录长度为0表示缓冲区尾部剩余空间不足, 读方从头部继续读取
+'''
+
+import os
+import re
+import sys
+import mmap
+import time
+import atexit
+import struct
+import datetime
+import threading
+import traceback
+try:
+    import _pickle as pickle
+except ImportError:
+    import pickle
+
+
+# 和loguru的级别数值保持一致
+LEVEL_NOS = {
+    'TRACE': 5,
+    'DEBUG': 10,
+    'INFO': 20,
+    'SUCCESS': 25,
+    'WARNING': 30,
+    'ERROR': 40,
+    'CRITICAL': 50,
+}
+LEVEL_NAMES = {level_no: name for name, level_no in LEVEL_NOS.items()}
+
+# 写位置和读位置, 均为单调递增的字节数, 对缓冲区大小取模得到偏移
+POSITION = struct.Struct('<QQ')
+RECORD_HEADER = struct.Struct('<IIIBd')
+WRAP_MARKER = struct.Struct('<I')
+ALIGNMENT = 8
+
+ROTATION_UNITS = {'B': 1, 'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30}
+
+
+def _align(length):
+    return (length + ALIGNMENT - 1) & ~(ALIGNMENT - 1)
+
+
+'''
+解析形如"100MB"的rotation配置, 只支持按照大小滚动, 其他格式返回0即不滚动
+'''
+def parse_rotation_size(rotation):
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?B)\s*', str(rotation), re.IGNORECASE)
+    if not match:
+        return 0
+
+    return int(float(match.group(1)) * ROTATION_UNITS[match.group(2).upper()])
+
+
+class RingBufferLogger(object):
+
+    def __init__(self, buffer_size=8 * 1024 * 1024, drain_interval_ms=50, rotation_size=0, encoding='utf-8') -> None:
+        self.capacity = _align(int(buffer_size))
+        self.buffer = mmap.mmap(-1, POSITION.size + self.capacity)
+        POSITION.pack_into(self.buffer, 0, 0, 0)
+
+        # 写位置只由持有lock的写方修改, 读位置只由drainer修改
+        self.write_pos = 0
+        self.read_pos = 0
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.reported_dropped = 0
+
+        # 每个sink为[文件路径, 过滤内容, 文件句柄, 当前大小]
+        self.sinks = []
+        self.rotation_size = rotation_size
+        self.encoding = encoding
+
+        self.drain_interval = drain_interval_ms / 1000
+        self.drain_lock = threading.Lock()
+        self.exit_event = threading.Event()
+        self.drainer = None
+
+        # 进程正常退出时写出剩余的日志
+        atexit.register(self.flush)
+
+    '''
+    增加输出文件, filter_content不为空时只输出包括该内容的日志, 和KaiwuLogger.setLoggerFormat的语义一致
+    '''
+    def add_sink(self, file_path, filter_content=None):
+        dir_name = os.path.dirname(file_path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+
+        with self.drain_lock:
+            file = open(file_path, 'a', encoding=self.encoding)
+            self.sinks.append([file_path, filter_content, file, file.tell()])
+
+        if not self.drainer:
+            self.drainer = threading.Thread(target=self.run, name='ring_buffer_logger_drainer', daemon=True)
+            self.drainer.start()
+
+    '''
+    写入1条记录, 只做编码和拷贝, 缓冲区满时丢弃并返回False
+    '''
+    def write(self, level_no, msg, args=None, kwargs=None):
+        msg_bytes = msg.encode(self.encoding, 'replace')
+
+        args_bytes = b''
+        if args or kwargs:
+            try:
+                args_bytes = pickle.dumps((args or (), kwargs or {}), -1)
+            except Exception:
+                args_bytes = pickle.dumps((tuple(str(arg) for arg in args or ()), {k: str(v) for k, v in (kwargs or {}).items()}), -1)
+
+        # 单条记录不超过缓冲区的一半, 超过时截断消息
+        max_length = self.capacity // 2
+        if RECORD_HEADER.size + len(msg_bytes) + len(args_bytes) > max_length:
+            msg_bytes = msg_bytes[:max_length - RECORD_HEADER.size]
+            args_bytes = b''
+
+        length = _align(RECORD_HEADER.size + len(msg_bytes) + len(args_bytes))
+        timestamp = time.time()
+
+        with self.lock:
+            write_pos = self.write_pos
+            offset = write_pos % self.capacity
+            tail = self.capacity - offset
+            need = length if tail >= length else length + tail
+
+            if write_pos + need - self.read_pos > self.capacity:
+                self.dropped += 1
+                return False
+
+            buffer = self.buffer
+            if tail < length:
+                WRAP_MARKER.pack_into(buffer, POSITION.size + offset, 0)
+                write_pos += tail
+                offset = 0
+
+            start = POSITION.size + offset
+            RECORD_HEADER.pack_into(buffer, start, length, len(msg_bytes), len(args_bytes), level_no, timestamp)
+            start += RECORD_HEADER.size
+            buffer[start:start + len(msg_bytes)] = msg_bytes
+            start += len(msg_bytes)
+            buffer[start:start + len(args_bytes)] = args_bytes
+
+            self.write_pos = write_pos + length
+            POSITION.pack_into(buffer, 0, self.write_pos, self.read_pos)
+
+        return True
+
+    '''
+    格式化单条记录, 和loguru一致采用str.format做参数替换, 失败时直接拼接参数
+    '''
+    def format_record(self, timestamp, level_no, msg, args_bytes):
+        if args_bytes:
+            args, kwargs = pickle.loads(args_bytes)
+            try:
+                msg = msg.format(*args, **kwargs)
+            except Exception:
+                msg = f'{msg} {args} {kwargs}'
+
+        time_str = datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        return f'{time_str} | {LEVEL_NAMES.get(level_no, level_no):<8} | {msg}\n'
+
+    '''
+    取出缓冲区里的所有记录, 格式化后写入各个sink
+    '''
+    def drain(self):
+        with self.drain_lock:
+            write_pos = self.write_pos
+            read_pos = self.read_pos
+            if read_pos == write_pos and self.dropped == self.reported_dropped:
+                return 0
+
+            buffer = self.buffer
+            lines = []
+            while read_pos < write_pos:
+                offset = read_pos % self.capacity
+                start = POSITION.size + offset
+
+                length = WRAP_MARKER.unpack_from(buffer, start)[0]
+                if not length:
+                    read_pos += self.capacity - offset
+                    continue
+
+                length, msg_len, args_len, level_no, timestamp = RECORD_HEADER.unpack_from(buffer, start)
+                start += RECORD_HEADER.size
+                msg = buffer[start:start + msg_len].decode(self.encoding, 'replace')
+                start += msg_len
+                args_bytes = buffer[start:start + args_len] if args_len else b''
+
+                read_pos += length
+                try:
+                    lines.append(self.format_record(timestamp, level_no, msg, args_bytes))
+                except Exception as e:
+                    lines.append(self.format_record(timestamp, level_no, f'{msg} format error {e}', b''))
+
+            # 格式化完成后再归还空间
+            with self.lock:
+                self.read_pos = read_pos
+                POSITION.pack_into(buffer, 0, self.write_pos, read_pos)
+                dropped = self.dropped
+
+            if dropped != self.reported_dropped:
+                lines.append(self.format_record(time.time(), LEVEL_NOS['WARNING'],
+                                                f'ring_buffer_logger buffer is full, dropped {dropped - self.reported_dropped} records', b''))
+                self.reported_dropped = dropped
+
+            for sink in self.sinks:
+                self.write_sink(sink, lines)
+
+            return len(lines)
+
+    def write_sink(self, sink, lines):
+        file_path, filter_content, file, size = sink
+        if filter_content:
+            lines = [line for line in lines if filter_content in line]
+        if not lines:
+            return
+
+        data = ''.join(lines)
+        file.write(data)
+        file.flush()
+        size += len(data)
+
+        # 按照大小滚动, 旧文件加上时间后缀
+        if self.rotation_size and size >= self.rotation_size:
+            file.close()
+            os.rename(file_path, f"{file_path}.{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S_%f')}")
+            file = open(file_path, 'a', encoding=self.encoding)
+            size = 0
+
+        sink[2], sink[3] = file, size
+
+    '''
+    drainer线程, drain失败时(比如sink所在磁盘写满)继续重试, 只在第一次失败时输出到stderr, 避免刷屏
+    '''
+    def run(self):
+        reported = False
+        while not self.exit_event.wait(self.drain_interval):
+            try:
+                self.drain()
+            except Exception:
+                if not reported:
+                    reported = True
+                    sys.stderr.write(f'ring_buffer_logger drain error, traceback.print_exc() is {traceback.format_exc()}')
+                    sys.stderr.flush()
+
+    '''
+    同步写出缓冲区里的记录, 用于进程退出前或者ERROR日志后需要立即落盘的场景
+    '''
+    def flush(self):
+        self.drain()
+
+    def close(self):
+        self.exit_event.set()
+        if self.drainer and self.drainer is not threading.current_thread():
+            self.drainer.join()
+
+        self.drain()
+        with self.drain_lock:
+            for sink in self.sinks:
+                sink[2].close()
+            self.sinks = []
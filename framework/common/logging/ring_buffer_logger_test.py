@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import io
+import os
+import time
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+from framework.common.logging.ring_buffer_logger import RingBufferLogger, LEVEL_NOS, parse_rotation_size
+
+
+class RingBufferLoggerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'actor', 'actor_log.log')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def read_lines(self, file_path=None):
+        with open(file_path or self.file_path, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def test_write_and_drain(self):
+        ring_logger = RingBufferLogger(buffer_size=4096, drain_interval_ms=60 * 1000)
+        ring_logger.add_sink(self.file_path)
+
+        ring_logger.write(LEVEL_NOS['INFO'], 'actor predict {} cost {cost} us', (3, ), {'cost': 12})
+        ring_logger.write(LEVEL_NOS['ERROR'], 'no args {}')
+        ring_logger.write(LEVEL_NOS['INFO'], 'bad template {0} {1}', (1, ))
+        ring_logger.flush()
+
+        lines = self.read_lines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].endswith('| INFO     | actor predict 3 cost 12 us'))
+        self.assertTrue(lines[1].endswith('| ERROR    | no args {}'))
+        self.assertIn('bad template {0} {1} (1,)', lines[2])
+
+        ring_logger.close()
+
+    def test_wrap_around(self):
+        ring_logger = RingBufferLogger(buffer_size=256, drain_interval_ms=60 * 1000)
+        ring_logger.add_sink(self.file_path)
+
+        # 每次写入后读出, 写位置多次绕过缓冲区尾部
+        for i in range(100):
+            self.assertTrue(ring_logger.write(LEVEL_NOS['INFO'], 'message {}', (i, )))
+            ring_logger.flush()
+
+        self.assertEqual([line.split('| ')[-1] for line in self.read_lines()], [f'message {i}' for i in range(100)])
+        ring_logger.close()
+
+    def test_drop_when_full(self):
+        ring_logger = RingBufferLogger(buffer_size=256, drain_interval_ms=60 * 1000)
+        ring_logger.add_sink(self.file_path)
+
+        results = [ring_logger.write(LEVEL_NOS['INFO'], 'message {}', (i, )) for i in range(100)]
+        written = results.count(True)
+        self.assertGreater(written, 0)
+        self.assertEqual(ring_logger.dropped, 100 - written)
+
+        ring_logger.flush()
+        lines = self.read_lines()
+        self.assertEqual(len(lines), written + 1)
+        self.assertIn(f'dropped {100 - written} records', lines[-1])
+
+        # 读出后可以继续写入
+        self.assertTrue(ring_logger.write(LEVEL_NOS['INFO'], 'message after drain'))
+        ring_logger.close()
+
+    def test_filter_and_rotation(self):
+        ring_logger = RingBufferLogger(buffer_size=4096, drain_interval_ms=60 * 1000, rotation_size=parse_rotation_size('100B'))
+        other_file_path = os.path.join(self.tmp_dir.name, 'other.log')
+        ring_logger.add_sink(self.file_path, 'actor')
+        ring_logger.add_sink(other_file_path)
+
+        ring_logger.write(LEVEL_NOS['INFO'], 'actor message')
+        ring_logger.write(LEVEL_NOS['INFO'], 'learner message')
+        ring_logger.flush()
+
+        # 只输出包括过滤内容的日志, 未超过100字节不滚动
+        lines = self.read_lines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith('actor message'))
+        rotated_files = [name for name in os.listdir(os.path.dirname(self.file_path)) if name != 'actor_log.log']
+        self.assertEqual(len(rotated_files), 0)
+
+        # 超过100字节后滚动, 旧文件带有时间后缀
+        self.assertEqual(len(self.read_lines(other_file_path)), 0)
+        self.assertEqual(len([name for name in os.listdir(self.tmp_dir.name) if name.startswith('other.log.')]), 1)
+
+        ring_logger.close()
+
+    def test_drain_error_report(self):
+        ring_logger = RingBufferLogger(buffer_size=4096, drain_interval_ms=10)
+        stderr = io.StringIO()
+
+        # drainer线程里drain失败时只在第一次输出到stderr
+        with contextlib.redirect_stderr(stderr), mock.patch.object(ring_logger, 'drain', side_effect=OSError('disk full')) as drain:
+            ring_logger.add_sink(self.file_path)
+            while drain.call_count < 3:
+                time.sleep(0.01)
+
+        self.assertEqual(stderr.getvalue().count('ring_buffer_logger drain error'), 1)
+        self.assertIn('disk full', stderr.getvalue())
+        ring_logger.close()
+
+    def test_parse_rotation_size(self):
+        self.assertEqual(parse_rotation_size('100MB'), 100 * 1024 * 1024)
+        self.assertEqual(parse_rotation_size('1.5 KB'), 1536)
+        self.assertEqual(parse_rotation_size('10 days'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+'''
+HDR风格的log-linear直方图, 用于统计时延的分位数, 替代只统计最大值和平均值的做法
+1. 小于sub_bucket_count的值每个值1个桶, 精确统计
+2. 大于等于sub_bucket_count的值, 按照2的幂次划分区间, 每个区间再线性划分为sub_bucket_count / 2个桶, 相对误差不超过2 / sub_bucket_count
+3. 记录操作只是计算桶下标和计数加1, 不分配内存, 桶数目由highest_trackable_value决定, 超过的值记录到最后1个桶里
+
+单个直方图不加锁, 由单个线程写入; 跨线程/跨进程时各自记录, 上报前采用merge合并
+上报时由打点线程调用drain取出本周期的数据, 交给MonitorProxy线程展开为分位数指标, 打点路径上没有锁
+'''
+
+# 默认上报的分位数
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+'''
+分位数对应的指标后缀, 形如p50, p999
+'''
+def percentile_suffix(percentile):
+    return 'p' + f'{percentile:g}'.replace('.', '')
+
+
+class LogLinearHistogram(object):
+    __slots__ = ('sub_bucket_bits', 'sub_bucket_count', 'sub_bucket_half_count', 'highest_trackable_value',
+                 'counts', 'total_count', 'total_sum', 'min_value', 'max_value')
+
+    def __init__(self, highest_trackable_value=3600 * 1000 * 1000, sub_bucket_bits=6):
+        # 默认按照微秒统计, 最大1小时, 相对误差不超过3.2%
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.sub_bucket_half_count = self.sub_bucket_count >> 1
+        self.highest_trackable_value = int(highest_trackable_value)
+
+        self.counts = [0] * (self.bucket_index(self.highest_trackable_value) + 1)
+        self.reset()
+
+    def reset(self):
+        counts = self.counts
+        for i in range(len(counts)):
+            counts[i] = 0
+
+        self.total_count = 0
+        self.total_sum = 0
+        self.min_value = 0
+        self.max_value = 0
+
+    '''
+    值对应的桶下标
+    '''
+    def bucket_index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+
+        shift = value.bit_length() - self.sub_bucket_bits
+        return shift * self.sub_bucket_half_count + (value >> shift)
+
+    '''
+    桶下标对应的值区间的上界, 即该桶里所有值的等价值
+    '''
+    def bucket_upper_value(self, index):
+        if index < self.sub_bucket_count:
+            return index
+
+        shift = index // self.sub_bucket_half_count - 1
+        sub_index = index - shift * self.sub_bucket_half_count
+        return ((sub_index + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        value = int(value)
+        if value < 0:
+            value = 0
+        elif value > self.highest_trackable_value:
+            value = self.highest_trackable_value
+
+        self.counts[self.bucket_index(value)] += count
+
+        if not self.total_count or value < self.min_value:
+            self.min_value = value
+        if value > self.max_value:
+            self.max_value = value
+
+        self.total_count += count
+        self.total_sum += value * count
+
+    '''
+    合并另一个配置相同的直方图
+    '''
+    def merge(self, other):
+        if other.sub_bucket_bits != self.sub_bucket_bits or other.highest_trackable_value != self.highest_trackable_value:
+            raise ValueError('merge histogram with different sub_bucket_bits or highest_trackable_value')
+
+        if not other.total_count:
+            return
+
+        counts = self.counts
+        for i, count in enumerate(other.counts):
+            if count:
+                counts[i] += count
+
+        if not self.total_count or other.min_value < self.min_value:
+            self.min_value = other.min_value
+        if other.max_value > self.max_value:
+            self.max_value = other.max_value
+
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+
+    @property
+    def count(self):
+        return self.total_count
+
+    def mean(self):
+        if not self.total_count:
+            return 0
+        return self.total_sum / self.total_count
+
+    def percentile(self, percentile):
+        return self.percentiles((percentile, ))[0]
+
+    '''
+    取出当前的统计数据, 返回新的直方图, 自身清零
+    '''
+    def drain(self):
+        snapshot = LogLinearHistogram(self.highest_trackable_value, self.sub_bucket_bits)
+        snapshot.merge(self)
+        self.reset()
+
+        return snapshot
+
+    '''
+    展开为上报的指标, 形如{name_p50: 100, name_p999: 2000, name_max: 3000, name_cnt: 1000}
+    '''
+    def monitor_data(self, name, percentiles=PERCENTILES):
+        monitor_data = {}
+        for percentile, value in zip(percentiles, self.percentiles(percentiles)):
+            monitor_data[f'{name}_{percentile_suffix(percentile)}'] = value
+
+        monitor_data[f'{name}_max'] = self.max_value
+        monitor_data[f'{name}_cnt'] = self.total_count
+
+        return monitor_data
+
+    '''
+    一次遍历计算多个分位数, percentiles需要按照从小到大排列
+    返回值为所在桶的上界, 不超过实际记录到的最大值
+    '''
+    def percentiles(self, percentiles):
+        results = [0] * len(percentiles)
+        if not self.total_count:
+            return results
+
+        targets = [max(1, -(-self.total_count * p // 100)) for p in percentiles]
+
+        index = 0
+        cumulative = 0
+        for bucket, count in enumerate(self.counts):
+            if not count:
+                continue
+
+            cumulative += count
+            while index < len(targets) and cumulative >= targets[index]:
+                results[index] = min(self.bucket_upper_value(bucket), self.max_value)
+                index += 1
+
+            if index == len(targets):
+                break
+
+        return results
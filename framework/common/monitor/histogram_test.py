@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import random
+import unittest
+
+from framework.common.monitor.histogram import LogLinearHistogram, percentile_suffix
+
+
+class LogLinearHistogramTest(unittest.TestCase):
+    def test_histogram_bucket(self):
+        histogram = LogLinearHistogram()
+
+        # 桶下标连续, 上界单调递增
+        last_upper = -1
+        for index in range(len(histogram.counts)):
+            upper = histogram.bucket_upper_value(index)
+            self.assertGreater(upper, last_upper)
+            last_upper = upper
+
+        for value in (0, 63, 64, 65, 1000, 123456, 3600 * 1000 * 1000):
+            index = histogram.bucket_index(value)
+            self.assertLessEqual(value, histogram.bucket_upper_value(index))
+            if index:
+                self.assertGreater(value, histogram.bucket_upper_value(index - 1))
+
+    def test_histogram_percentile(self):
+        histogram = LogLinearHistogram()
+        values = list(range(1, 10001))
+        random.shuffle(values)
+        for value in values:
+            histogram.record(value)
+
+        self.assertEqual(histogram.count, 10000)
+        self.assertEqual(histogram.max_value, 10000)
+        self.assertEqual(histogram.min_value, 1)
+
+        p50, p99, p100 = histogram.percentiles((50, 99, 100))
+        self.assertLessEqual(abs(p50 - 5000) / 5000, 0.04)
+        self.assertLessEqual(abs(p99 - 9900) / 9900, 0.04)
+        self.assertEqual(p100, 10000)
+
+        # 合并后分位数不变, 计数翻倍
+        other = LogLinearHistogram()
+        other.merge(histogram)
+        other.merge(histogram)
+        self.assertEqual(other.count, 20000)
+        self.assertEqual(other.percentile(50), p50)
+
+        histogram.reset()
+        self.assertEqual(histogram.count, 0)
+        self.assertEqual(histogram.percentile(99), 0)
+
+    def test_drain_and_monitor_data(self):
+        histogram = LogLinearHistogram()
+        for value in range(1000):
+            histogram.record(value)
+
+        snapshot = histogram.drain()
+        self.assertEqual(histogram.count, 0)
+        self.assertEqual(snapshot.count, 1000)
+
+        monitor_data = snapshot.monitor_data('actor_compress_time_us')
+        self.assertEqual(set(monitor_data.keys()), {'actor_compress_time_us_p50', 'actor_compress_time_us_p90', 'actor_compress_time_us_p99',
+                                                    'actor_compress_time_us_p999', 'actor_compress_time_us_max', 'actor_compress_time_us_cnt'})
+        self.assertEqual(monitor_data['actor_compress_time_us_max'], 999)
+        self.assertEqual(monitor_data['actor_compress_time_us_cnt'], 1000)
+        self.assertLessEqual(monitor_data['actor_compress_time_us_p90'], monitor_data['actor_compress_time_us_p99'])
+
+        self.assertEqual(percentile_suffix(99.9), 'p999')
+        self.assertEqual(percentile_suffix(50), 'p50')
+
+    def test_merge_invalid(self):
+        with self.assertRaises(ValueError):
+            LogLinearHistogram().merge(LogLinearHistogram(sub_bucket_bits=4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import time
+from framework.common.monitor.histogram import LogLinearHistogram, PERCENTILES
+
+
+'''
+单帧时延分阶段统计, 替代distributed_tracing的逐条日志
+1. 各个环节在关键位置用time.monotonic_ns()打点, 同一台机器上的多个进程之间可以直接比较
+2. 跨机器的环节(aisrv <--> actor)不传递时间戳, 只传递对端各个阶段的耗时(微秒), 随compose_id回传, 网络耗时 = 往返耗时 - 对端耗时
+3. 每个阶段对应1个LogLinearHistogram, 按照prometheus_stat_per_minutes周期上报分位数后清零
+
+阶段名字定义在KaiwuDRLDefine.TRACE_STAGE_*
+'''
+class LatencyTracer(object):
+
+    def __init__(self, prefix, percentiles=PERCENTILES):
+        self.prefix = prefix
+        self.percentiles = percentiles
+        self.histograms = {}
+
+    def record(self, stage, cost_us):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LogLinearHistogram()
+
+        histogram.record(cost_us)
+
+    '''
+    记录从start_ns到end_ns的耗时, start_ns为空时说明该帧没有打点, 忽略
+    '''
+    def record_ns(self, stage, start_ns, end_ns=None):
+        if not start_ns:
+            return
+
+        if end_ns is None:
+            end_ns = time.monotonic_ns()
+
+        self.record(stage, (end_ns - start_ns) // 1000)
+
+    '''
+    本周期的统计结果, 形如{trace_aisrv_feature_p99: 1200, trace_aisrv_feature_cnt: 1000}, 单位为微秒, 获取后清零
+    统计线程和打点线程可能不同, 这里整体替换histograms, 不在打点路径上加锁
+    '''
+    def monitor_data(self):
+        histograms, self.histograms = self.histograms, {}
+
+        monitor_data = {}
+        for stage, histogram in histograms.items():
+            monitor_data.update(histogram.monitor_data(f'{self.prefix}_{stage}', self.percentiles))
+
+        return monitor_data
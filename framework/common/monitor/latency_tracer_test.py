@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+
+from framework.common.monitor.latency_tracer import LatencyTracer
+
+
+class LatencyTracerTest(unittest.TestCase):
+    def test_tracer(self):
+        tracer = LatencyTracer('trace_aisrv', percentiles=(50, 99))
+        for cost_us in range(100):
+            tracer.record('feature', cost_us)
+        tracer.record_ns('network', 1000, 2001000)
+        tracer.record_ns('network', 0)
+
+        monitor_data = tracer.monitor_data()
+        self.assertEqual(monitor_data['trace_aisrv_feature_cnt'], 100)
+        self.assertEqual(monitor_data['trace_aisrv_feature_max'], 99)
+        self.assertEqual(monitor_data['trace_aisrv_network_p50'], 2000)
+        self.assertEqual(monitor_data['trace_aisrv_network_cnt'], 1)
+
+        # 获取后清零
+        self.assertEqual(tracer.monitor_data(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
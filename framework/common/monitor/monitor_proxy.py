@@ -11,6 +11,7 @@ import time
 import traceback
 from framework.common.config.config_control import CONFIG
 from framework.common.monitor.prometheus_utils import PrometheusUtils
+from framework.common.monitor.histogram import LogLinearHistogram
 
 '''
 此类用于aisrv, actor, learner进程与监控产品(当前是普罗米修斯, 后期可以按照需要调整)
@@ -50,6 +51,7 @@ class MonitorProxy(threading.Thread):
 
     '''
     monitor_data采用map形式, 即key/value格式, 监控指标/监控值
+    监控值为LogLinearHistogram时, 上报时展开为{监控指标}_p50/p90/p99/p999/max/cnt, 调用方需要传入drain后的直方图, 之后不再修改
     '''
 
     def put_data(self, monitor_data):
@@ -81,7 +83,11 @@ class MonitorProxy(threading.Thread):
             return
 
         for monitor_name, montor_value in monitor_data.items():
-            if isinstance(montor_value, list):
+            if isinstance(montor_value, LogLinearHistogram):
+                for name, value in montor_value.monitor_data(monitor_name).items():
+                    self.prometheus_utils.gauge_use(
+                        CONFIG.svr_name, name, name, value)
+            elif isinstance(montor_value, list):
                 for i in range(len(montor_value)):
                     self.prometheus_utils.gauge_use(
                         CONFIG.svr_name, monitor_name, monitor_name, montor_value[i])
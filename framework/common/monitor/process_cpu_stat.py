@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import psutil
+
+
+'''
+按照角色统计进程的CPU耗时, 同一个角色的多个进程累加
+'''
+class ProcessCpuStat(object):
+    def __init__(self):
+        self.processes = {}
+
+    def add(self, role, pid):
+        try:
+            self.processes.setdefault(role, []).append(psutil.Process(pid))
+        except psutil.NoSuchProcess:
+            pass
+
+    '''
+    返回{role: (user, system)}, 单位秒
+    '''
+    def times(self):
+        times = {}
+        for role, processes in self.processes.items():
+            user, system = 0, 0
+            for process in processes:
+                try:
+                    cpu_times = process.cpu_times()
+                except psutil.NoSuchProcess:
+                    continue
+                user += cpu_times.user
+                system += cpu_times.system
+            times[role] = (user, system)
+
+        return times
+
+    '''
+    按照两次times的结果计算每个角色的CPU使用率, 返回形如'role user%/system%'的字符串
+    '''
+    @staticmethod
+    def format_usage(last_times, current_times, interval):
+        usage = []
+        for role, (user, system) in current_times.items():
+            last_user, last_system = last_times.get(role, (0, 0))
+            usage.append(f'{role} {(user - last_user) / interval * 100:.0f}%/{(system - last_system) / interval * 100:.0f}%')
+
+        return ', '.join(usage)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import os
+import unittest
+from framework.common.monitor.process_cpu_stat import ProcessCpuStat
+
+
+class ProcessCpuStatTest(unittest.TestCase):
+    def test_times(self):
+        cpu_stat = ProcessCpuStat()
+        cpu_stat.add('main', os.getpid())
+        cpu_stat.add('main', os.getpid())
+
+        user, system = cpu_stat.times()['main']
+        self.assertGreater(user + system, 0)
+
+    def test_format_usage(self):
+        usage = ProcessCpuStat.format_usage({'trainer': (1, 1)}, {'trainer': (3, 1.5), 'generator': (0.5, 0)}, 2)
+        self.assertEqual(usage, 'trainer 100%/25%, generator 25%/0%')
+
+
+if __name__ == '__main__':
+    unittest.main()
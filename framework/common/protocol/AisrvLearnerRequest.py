@@ -58,7 +58,34 @@ class AisrvLearnerRequest(object):
             return self._tab.Get(flatbuffers.number_types.Int32Flags, o + self._tab.Pos)
         return 0
 
-def AisrvLearnerRequestStart(builder): builder.StartObject(2)
+    # AisrvLearnerRequest
+    def ModelVersion(self, j):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(8))
+        if o != 0:
+            a = self._tab.Vector(o)
+            return self._tab.Get(flatbuffers.number_types.Int64Flags, a + flatbuffers.number_types.UOffsetTFlags.py_type(j * 8))
+        return 0
+
+    # AisrvLearnerRequest
+    def ModelVersionAsNumpy(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(8))
+        if o != 0:
+            return self._tab.GetVectorAsNumpy(flatbuffers.number_types.Int64Flags, o)
+        return 0
+
+    # AisrvLearnerRequest
+    def ModelVersionLength(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(8))
+        if o != 0:
+            return self._tab.VectorLen(o)
+        return 0
+
+    # AisrvLearnerRequest
+    def ModelVersionIsNone(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(8))
+        return o == 0
+
+def AisrvLearnerRequestStart(builder): builder.StartObject(3)
 def Start(builder):
     return AisrvLearnerRequestStart(builder)
 def AisrvLearnerRequestAddData(builder, data): builder.PrependUOffsetTRelativeSlot(0, flatbuffers.number_types.UOffsetTFlags.py_type(data), 0)
@@ -70,6 +97,12 @@ def StartDataVector(builder, numElems):
 def AisrvLearnerRequestAddBatchSize(builder, batchSize): builder.PrependInt32Slot(1, batchSize, 0)
 def AddBatchSize(builder, batchSize):
     return AisrvLearnerRequestAddBatchSize(builder, batchSize)
+def AisrvLearnerRequestAddModelVersion(builder, modelVersion): builder.PrependUOffsetTRelativeSlot(2, flatbuffers.number_types.UOffsetTFlags.py_type(modelVersion), 0)
+def AddModelVersion(builder, modelVersion):
+    return AisrvLearnerRequestAddModelVersion(builder, modelVersion)
+def AisrvLearnerRequestStartModelVersionVector(builder, numElems): return builder.StartVector(8, numElems, 8)
+def StartModelVersionVector(builder, numElems):
+    return AisrvLearnerRequestStartModelVersionVector(builder, numElems)
 def AisrvLearnerRequestEnd(builder): return builder.EndObject()
 def End(builder):
     return AisrvLearnerRequestEnd(builder)
\ No newline at end of file
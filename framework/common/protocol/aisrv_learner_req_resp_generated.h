@@ -22,7 +22,8 @@ struct AisrvLearnerRequest FLATBUFFERS_FINAL_CLASS : private ::flatbuffers::Tabl
   typedef AisrvLearnerRequestBuilder Builder;
   enum FlatBuffersVTableOffset FLATBUFFERS_VTABLE_UNDERLYING_TYPE {
     VT_DATA = 4,
-    VT_BATCH_SIZE = 6
+    VT_BATCH_SIZE = 6,
+    VT_MODEL_VERSION = 8
   };
   const ::flatbuffers::Vector<float> *data() const {
     return GetPointer<const ::flatbuffers::Vector<float> *>(VT_DATA);
@@ -30,11 +31,16 @@ struct AisrvLearnerRequest FLATBUFFERS_FINAL_CLASS : private ::flatbuffers::Tabl
   int32_t batch_size() const {
     return GetField<int32_t>(VT_BATCH_SIZE, 0);
   }
+  const ::flatbuffers::Vector<int64_t> *model_version() const {
+    return GetPointer<const ::flatbuffers::Vector<int64_t> *>(VT_MODEL_VERSION);
+  }
   bool Verify(::flatbuffers::Verifier &verifier) const {
     return VerifyTableStart(verifier) &&
            VerifyOffset(verifier, VT_DATA) &&
            verifier.VerifyVector(data()) &&
            VerifyField<int32_t>(verifier, VT_BATCH_SIZE, 4) &&
+           VerifyOffset(verifier, VT_MODEL_VERSION) &&
+           verifier.VerifyVector(model_version()) &&
            verifier.EndTable();
   }
 };
@@ -49,6 +55,9 @@ struct AisrvLearnerRequestBuilder {
   void add_batch_size(int32_t batch_size) {
     fbb_.AddElement<int32_t>(AisrvLearnerRequest::VT_BATCH_SIZE, batch_size, 0);
   }
+  void add_model_version(::flatbuffers::Offset<::flatbuffers::Vector<int64_t>> model_version) {
+    fbb_.AddOffset(AisrvLearnerRequest::VT_MODEL_VERSION, model_version);
+  }
   explicit AisrvLearnerRequestBuilder(::flatbuffers::FlatBufferBuilder &_fbb)
         : fbb_(_fbb) {
     start_ = fbb_.StartTable();
@@ -63,8 +72,10 @@ struct AisrvLearnerRequestBuilder {
 inline ::flatbuffers::Offset<AisrvLearnerRequest> CreateAisrvLearnerRequest(
     ::flatbuffers::FlatBufferBuilder &_fbb,
     ::flatbuffers::Offset<::flatbuffers::Vector<float>> data = 0,
-    int32_t batch_size = 0) {
+    int32_t batch_size = 0,
+    ::flatbuffers::Offset<::flatbuffers::Vector<int64_t>> model_version = 0) {
   AisrvLearnerRequestBuilder builder_(_fbb);
+  builder_.add_model_version(model_version);
   builder_.add_batch_size(batch_size);
   builder_.add_data(data);
   return builder_.Finish();
@@ -73,12 +84,15 @@ inline ::flatbuffers::Offset<AisrvLearnerRequest> CreateAisrvLearnerRequest(
 inline ::flatbuffers::Offset<AisrvLearnerRequest> CreateAisrvLearnerRequestDirect(
     ::flatbuffers::FlatBufferBuilder &_fbb,
     const std::vector<float> *data = nullptr,
-    int32_t batch_size = 0) {
+    int32_t batch_size = 0,
+    const std::vector<int64_t> *model_version = nullptr) {
   auto data__ = data ? _fbb.CreateVector<float>(*data) : 0;
+  auto model_version__ = model_version ? _fbb.CreateVector<int64_t>(*model_version) : 0;
   return kaiwu_msg::CreateAisrvLearnerRequest(
       _fbb,
       data__,
-      batch_size);
+      batch_size,
+      model_version__);
 }
 
 inline const kaiwu_msg::AisrvLearnerRequest *GetAisrvLearnerRequest(const void *buf) {
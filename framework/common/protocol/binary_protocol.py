@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import struct
+import lz4.block
+import zstd
+import numpy as np
+
+
+'''
+aisrv --> actor预测请求的二进制格式, 替代pickle + lz4, 格式自描述, 不依赖lz4_uncompressed_size
+消息格式, 全部为小端序:
+1. 消息头, magic(4字节) + version(1字节) + flags(1字节) + 字段数目(2字节)
+2. 字段表, 每个字段为dtype编码(1字节) + 维度数目(1字节) + 压缩算法(1字节) + 保留(1字节) + 数据长度(4字节) + 各维度大小(每维4字节)
+3. 数据区, 每个字段的数据连续存放, 起始地址按照8字节对齐
+
+解码时未压缩的字段直接在消息上np.frombuffer, 不做拷贝; 压缩的字段按照字段表里的shape和dtype得到原始大小后解压缩
+'''
+
+MAGIC = b'KWBP'
+VERSION = 1
+ALIGNMENT = 8
+
+HEADER = struct.Struct('<4sBBH')
+FIELD = struct.Struct('<BBBBI')
+
+CODEC_NONE = 0
+CODEC_LZ4 = 1
+CODEC_ZSTD = 2
+
+# dtype编码, 只支持数值类型
+DTYPE_TO_CODE = {
+    np.dtype(np.bool_): 1,
+    np.dtype(np.int8): 2,
+    np.dtype(np.uint8): 3,
+    np.dtype(np.int16): 4,
+    np.dtype(np.uint16): 5,
+    np.dtype(np.int32): 6,
+    np.dtype(np.uint32): 7,
+    np.dtype(np.int64): 8,
+    np.dtype(np.uint64): 9,
+    np.dtype(np.float16): 10,
+    np.dtype(np.float32): 11,
+    np.dtype(np.float64): 12,
+}
+CODE_TO_DTYPE = {code: dtype for dtype, code in DTYPE_TO_CODE.items()}
+
+SHAPE_STRUCTS = [struct.Struct(f'<{ndim}I') for ndim in range(33)]
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) & ~(ALIGNMENT - 1)
+
+
+def _compress(data, codec):
+    if codec == CODEC_LZ4:
+        return lz4.block.compress(data, mode='fast', store_size=False)
+    elif codec == CODEC_ZSTD:
+        return zstd.compress(data, 1)
+
+    raise ValueError(f'unsupported codec {codec}')
+
+
+def _decompress(data, codec, raw_nbytes):
+    if codec == CODEC_LZ4:
+        return lz4.block.decompress(data, uncompressed_size=raw_nbytes)
+    elif codec == CODEC_ZSTD:
+        return zstd.decompress(data)
+
+    raise ValueError(f'unsupported codec {codec}')
+
+
+'''
+编码numpy数组列表
+codec: 压缩算法, CODEC_NONE为不压缩
+compress_min_bytes: 字段原始大小不小于该值时才压缩, 小字段压缩的收益不足以抵消耗时
+'''
+def encode_arrays(arrays, codec=CODEC_NONE, compress_min_bytes=0):
+    table = [HEADER.pack(MAGIC, VERSION, 0, len(arrays))]
+    payloads = []
+
+    for array in arrays:
+        array = np.asarray(array)
+        if not array.flags.c_contiguous:
+            array = array.copy(order='C')
+
+        dtype_code = DTYPE_TO_CODE.get(array.dtype)
+        if dtype_code is None:
+            raise ValueError(f'unsupported dtype {array.dtype}')
+
+        payload = array.data.cast('B') if array.size else b''
+        field_codec = CODEC_NONE
+        if codec != CODEC_NONE and array.nbytes >= compress_min_bytes and array.nbytes:
+            compressed = _compress(payload, codec)
+            # 压缩后没有变小则不压缩
+            if len(compressed) < array.nbytes:
+                payload = compressed
+                field_codec = codec
+
+        table.append(FIELD.pack(dtype_code, array.ndim, field_codec, 0, len(payload)))
+        table.append(SHAPE_STRUCTS[array.ndim].pack(*array.shape))
+        payloads.append(payload)
+
+    # 数据区按照8字节对齐
+    parts = table
+    offset = sum(len(part) for part in table)
+    for payload in payloads:
+        padding = _align(offset) - offset
+        if padding:
+            parts.append(bytes(padding))
+            offset += padding
+
+        parts.append(payload)
+        offset += len(payload)
+
+    return b''.join(parts)
+
+
+'''
+解码为numpy数组列表
+copy为False时, 未压缩的字段是消息上的只读视图, 和消息的生命周期一致
+如果消息所在的内存会被复用(比如SharedMemoryQueue), 需要设置copy为True
+'''
+def decode_arrays(data, copy=False):
+    magic, version, _, field_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f'invalid magic {magic}')
+    if version != VERSION:
+        raise ValueError(f'unsupported version {version}')
+
+    offset = HEADER.size
+    fields = []
+    for _ in range(field_count):
+        dtype_code, ndim, codec, _, nbytes = FIELD.unpack_from(data, offset)
+        offset += FIELD.size
+
+        shape = SHAPE_STRUCTS[ndim].unpack_from(data, offset)
+        offset += SHAPE_STRUCTS[ndim].size
+
+        fields.append((CODE_TO_DTYPE[dtype_code], shape, codec, nbytes))
+
+    arrays = []
+    for dtype, shape, codec, nbytes in fields:
+        offset = _align(offset)
+
+        count = 1
+        for dim in shape:
+            count *= dim
+
+        if codec == CODEC_NONE:
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape)
+            if copy:
+                array = array.copy()
+        else:
+            raw = _decompress(memoryview(data)[offset:offset + nbytes], codec, count * dtype.itemsize)
+            array = np.frombuffer(raw, dtype=dtype, count=count).reshape(shape)
+
+        arrays.append(array)
+        offset += nbytes
+
+    return arrays
+
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+'''
+aisrv --> actor预测请求编解码的性能对比, 数据为sgame_1v1的单个预测请求:
+1. pickle + lz4, 即aisrv_actor_protocl = pickle
+2. protobuf(AisrvActorRequest) + lz4, 即aisrv_actor_protocl = protobuf
+3. binary, 不压缩和按照字段lz4压缩, 即aisrv_actor_protocl = binary
+
+python3 framework/common/protocol/binary_protocol_benchmark.py --count 10000
+'''
+
+import time
+import argparse
+import lz4.block
+import numpy as np
+try:
+    import _pickle as pickle
+except ImportError:
+    import pickle
+
+from framework.common.protocol.aisrv_actor_req_resp_pb2 import AisrvActorRequest
+from framework.common.protocol.binary_protocol import encode_arrays, decode_arrays, CODEC_NONE, CODEC_LZ4
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--count', default=10000, type=int)
+parser.add_argument('--compress_min_bytes', default=4096, type=int)
+parser.add_argument('--lz4_uncompressed_size', default=3145728, type=int)
+
+args = parser.parse_args()
+
+
+def make_request():
+    # 和sgame_1v1的state_space一致, cur_buf_size为1
+    return [
+        np.random.rand(1, 725),
+        np.random.randint(0, 2, (1, 172)).astype(np.float64),
+        np.random.randint(0, 2, (1, 12, 6)).astype(np.float64),
+        np.random.rand(1, 512),
+        np.random.rand(1, 512),
+        np.array([100], dtype=np.int32),
+        np.array([[0, 1, 2, 3]], dtype=np.int32),
+    ]
+
+
+def pickle_encode(msg):
+    return lz4.block.compress(pickle.dumps(msg), mode='fast', store_size=False)
+
+
+def pickle_decode(data):
+    return pickle.loads(lz4.block.decompress(data, uncompressed_size=args.lz4_uncompressed_size), encoding='bytes')
+
+
+def protobuf_encode(msg):
+    # 和ActorProxy.serialize_buffer_data的protobuf流程一致
+    request = AisrvActorRequest()
+    request.client_id = int(msg[-2][0])
+    request.sample_size = 1
+    request.compose_id.extend(msg[-1].flatten().tolist())
+    request.feature.extend(np.concatenate([msg[0], msg[4], msg[3]], axis=1).reshape(-1).tolist())
+
+    return lz4.block.compress(request.SerializeToString(), mode='fast', store_size=False)
+
+
+def protobuf_decode(data):
+    request = AisrvActorRequest()
+    request.ParseFromString(lz4.block.decompress(data, uncompressed_size=args.lz4_uncompressed_size))
+
+    return np.array(request.feature, dtype=np.float32)
+
+
+def binary_encode(msg):
+    return encode_arrays(msg, CODEC_NONE)
+
+
+def binary_lz4_encode(msg):
+    return encode_arrays(msg, CODEC_LZ4, args.compress_min_bytes)
+
+
+def benchmark(name, encode, decode, msg):
+    start = time.time()
+    for _ in range(args.count):
+        data = encode(msg)
+    encode_cost = (time.time() - start) / args.count * 1e6
+
+    start = time.time()
+    for _ in range(args.count):
+        decode(data)
+    decode_cost = (time.time() - start) / args.count * 1e6
+
+    print(f'{name:<16} size {len(data):>8} bytes, encode {encode_cost:>8.2f} us, decode {decode_cost:>8.2f} us')
+
+
+def main():
+    msg = make_request()
+
+    benchmark('pickle + lz4', pickle_encode, pickle_decode, msg)
+    benchmark('protobuf + lz4', protobuf_encode, protobuf_decode, msg)
+    benchmark('binary', binary_encode, decode_arrays, msg)
+    benchmark('binary + lz4', binary_lz4_encode, decode_arrays, msg)
+
+
+if __name__ == '__main__':
+    main()
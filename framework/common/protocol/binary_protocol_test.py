@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+import numpy as np
+
+from framework.common.protocol.binary_protocol import encode_arrays, decode_arrays, CODEC_NONE, CODEC_LZ4
+
+
+class BinaryProtocolTest(unittest.TestCase):
+    def setUp(self):
+        self.arrays = [
+            np.random.rand(1, 725),
+            np.zeros((1, 12, 6), dtype=np.float32),
+            np.array([100], dtype=np.int32),
+            np.array([[0, 1, 2, 3]], dtype=np.int32),
+            np.arange(6, dtype=np.int64).reshape(2, 3)[:, 1],
+            np.array(True),
+        ]
+
+    def check(self, decoded):
+        self.assertEqual(len(decoded), len(self.arrays))
+        for array, output in zip(self.arrays, decoded):
+            self.assertEqual(output.dtype, array.dtype)
+            self.assertEqual(output.shape, array.shape)
+            self.assertTrue(np.array_equal(output, array))
+
+    def test_encode_decode(self):
+        data = encode_arrays(self.arrays)
+        decoded = decode_arrays(data)
+        self.check(decoded)
+
+        # 未压缩的字段是消息上的只读视图
+        self.assertFalse(decoded[0].flags.writeable)
+        self.assertTrue(decode_arrays(data, copy=True)[0].flags.writeable)
+
+    def test_compress(self):
+        raw = encode_arrays(self.arrays, CODEC_NONE)
+        compressed = encode_arrays(self.arrays, CODEC_LZ4, compress_min_bytes=64)
+        self.assertLess(len(compressed), len(raw))
+        self.check(decode_arrays(compressed))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            encode_arrays([np.array(['a'])])
+
+        with self.assertRaises(ValueError):
+            decode_arrays(b'XXXX' + bytes(16))
+
+
+if __name__ == '__main__':
+    unittest.main()
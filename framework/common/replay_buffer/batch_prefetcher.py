@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import time
+import queue
+import threading
+import numpy as np
+
+
+'''
+learner训练输入的预取, 训练主循环执行当前批次时, 后台线程提前采样并准备好后面的prefetch_count个批次
+1. 预先分配prefetch_count份host上的数组(双缓冲即prefetch_count=2), 第一次采样时按照样本的形状和类型分配, 形状变化时重新分配
+2. 采样得到的float16数组在拷贝时直接转换为float32, 训练主循环拿到的是可以直接使用的数组
+3. get返回的是预分配数组本身, 在下一次get之前有效, 下一次get时归还给后台线程复用
+4. clear增加代数, 已经准备好的和正在采样的旧批次在get时丢弃, 用于on-policy清空样本池后不再使用旧策略的样本
+
+统计项:
+1. input_wait_time, get里等待批次的耗时, 即训练主循环因为输入而空闲的时间(input-bound)
+2. compute_time, 两次get之间的耗时, 即训练主循环执行训练的时间(compute-bound)
+3. sample_time, 后台线程采样和拷贝的耗时
+'''
+class BatchPrefetcher(object):
+
+    def __init__(self, sample_fn, prefetch_count=2, logger=None) -> None:
+        # sample_fn返回1个批次的数组列表/元组, 返回None表示暂时没有样本
+        self.sample_fn = sample_fn
+        self.prefetch_count = max(1, int(prefetch_count))
+        self.logger = logger
+
+        self._slots = [None] * self.prefetch_count
+        self._free_queue = queue.Queue()
+        self._ready_queue = queue.Queue()
+        for index in range(self.prefetch_count):
+            self._free_queue.put(index)
+
+        # 训练主循环正在使用的slot, 下一次get时归还
+        self._using_index = None
+        self._generation = 0
+        self._running = False
+        self._thread = None
+
+        self._last_get_end_time = None
+        self.stat_reset()
+
+    def start(self):
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def stat_reset(self):
+        self.batch_count = 0
+        self.input_wait_time = 0
+        self.compute_time = 0
+        self.sample_time = 0
+
+    '''
+    float16按照float32存储, 其他类型保持不变
+    '''
+    @staticmethod
+    def staging_dtype(dtype):
+        return np.float32 if dtype == np.float16 else dtype
+
+    def stage(self, index, batch):
+        slot = self._slots[index]
+        if slot is None or len(slot) != len(batch) or any(
+                buffer.shape != np.shape(data) or buffer.dtype != self.staging_dtype(np.asarray(data).dtype)
+                for buffer, data in zip(slot, batch)):
+            slot = [np.empty(np.shape(data), dtype=self.staging_dtype(np.asarray(data).dtype)) for data in batch]
+            self._slots[index] = slot
+
+        for buffer, data in zip(slot, batch):
+            np.copyto(buffer, data, casting='unsafe')
+
+    '''
+    后台线程, 获取空闲的slot, 采样并拷贝后放入ready队列
+    '''
+    def run(self):
+        while self._running:
+            try:
+                index = self._free_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            staged = False
+            try:
+                generation = self._generation
+                start = time.monotonic()
+                batch = self.sample_fn()
+                if batch is not None:
+                    self.stage(index, batch)
+                    self.sample_time += time.monotonic() - start
+                    self._ready_queue.put((index, generation))
+                    staged = True
+
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f'train batch prefetcher sample error: {str(e)}')
+                time.sleep(1)
+
+            finally:
+                if not staged:
+                    self._free_queue.put(index)
+
+    '''
+    已经准备好的批次数目, 训练主循环用来判断是否可以训练, 去掉对样本池的查询
+    '''
+    def ready_count(self):
+        return self._ready_queue.qsize()
+
+    def release(self):
+        if self._using_index is not None:
+            self._free_queue.put(self._using_index)
+            self._using_index = None
+
+    '''
+    获取下一个批次, 返回数组列表, 超时返回None
+    '''
+    def get(self, timeout=None):
+        start = time.monotonic()
+        if self._last_get_end_time is not None:
+            self.compute_time += start - self._last_get_end_time
+
+        self.release()
+
+        deadline = None if timeout is None else start + timeout
+        result = None
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                index, generation = self._ready_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            # 丢弃clear之前的批次
+            if generation != self._generation:
+                self._free_queue.put(index)
+                continue
+
+            self._using_index = index
+            self.batch_count += 1
+            result = self._slots[index]
+            break
+
+        end = time.monotonic()
+        self.input_wait_time += end - start
+        self._last_get_end_time = end
+
+        return result
+
+    def clear(self):
+        self._generation += 1
+
+    '''
+    返回统计项并且复原, input_bound_ratio为等待输入的时间占比, 接近1表示输入是瓶颈, 接近0表示训练是瓶颈
+    '''
+    def get_stat(self):
+        total_time = self.input_wait_time + self.compute_time
+        stat = {
+            'batch_count': self.batch_count,
+            'input_wait_time_ms': self.input_wait_time * 1000,
+            'compute_time_ms': self.compute_time * 1000,
+            'sample_time_ms': self.sample_time * 1000,
+            'input_bound_ratio': self.input_wait_time / total_time if total_time > 0 else 0,
+        }
+        self.stat_reset()
+
+        return stat
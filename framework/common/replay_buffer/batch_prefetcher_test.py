@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import time
+import threading
+import unittest
+import numpy as np
+from framework.common.replay_buffer.batch_prefetcher import BatchPrefetcher
+
+
+class BatchPrefetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            value = self.count
+            self.count += 1
+
+        return (np.full((4, 3), value, dtype=np.float16), np.full((4, 1), value, dtype=np.int64))
+
+    def test_prefetch_and_decode(self):
+        prefetcher = BatchPrefetcher(self.sample, prefetch_count=2)
+        prefetcher.start()
+
+        first = prefetcher.get(timeout=5)
+        self.assertEqual(first[0].dtype, np.float32)
+        self.assertEqual(first[1].dtype, np.int64)
+        np.testing.assert_array_equal(first[0], np.zeros((4, 3)))
+
+        # 批次按照采样顺序返回, 只复用2份数组
+        values = [int(prefetcher.get(timeout=5)[1][0, 0]) for _ in range(5)]
+        self.assertEqual(values, [1, 2, 3, 4, 5])
+        self.assertEqual(len(set(id(slot[0]) for slot in prefetcher._slots)), 2)
+
+        stat = prefetcher.get_stat()
+        self.assertEqual(stat['batch_count'], 6)
+        self.assertTrue(0 <= stat['input_bound_ratio'] <= 1)
+        prefetcher.stop()
+
+    def test_clear(self):
+        event = threading.Event()
+
+        def sample():
+            event.wait()
+            return self.sample()
+
+        prefetcher = BatchPrefetcher(sample, prefetch_count=2)
+        prefetcher.start()
+
+        # 正在采样的旧批次被丢弃
+        time.sleep(0.05)
+        prefetcher.clear()
+        event.set()
+
+        batch = prefetcher.get(timeout=5)
+        self.assertEqual(int(batch[1][0, 0]), 1)
+        prefetcher.stop()
+
+    def test_timeout(self):
+        prefetcher = BatchPrefetcher(lambda: None, prefetch_count=2)
+        prefetcher.start()
+
+        self.assertEqual(prefetcher.ready_count(), 0)
+        self.assertIsNone(prefetcher.get(timeout=0.05))
+        prefetcher.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import threading
+import numpy as np
+from framework.common.utils.tf_utils import *
+from framework.common.config.config_control import CONFIG
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+from framework.common.replay_buffer.replay_buffer_base import ReplayBufferBase
+from framework.common.replay_buffer.sum_tree import SumTree
+
+
+'''
+learner进程内的样本池, 单机learner上替代reverb server, 去掉gRPC交互和reverb server常驻线程
+1. 按照data_spec预先分配每列的环形数组, 列的类型和形状由data_spec决定(比如float16/float32), 插入时直接拷贝到对应位置
+2. 采样方式和reverb的selectors对应:
+2.1 fifo, 按照插入顺序读取, 读取后移除, 适用于on-policy
+2.2 uniform, 在样本池里均匀随机采样, 采样后不移除
+2.3 prioritized, 按照优先级的priority_exponent次方比例采样(sum-tree), 采样后不移除
+    训练侧需要用sample(return_info=True)返回的key调用update_priorities, 否则优先级一直是插入时的值
+3. 样本池满了以后覆盖最旧的样本, 和reverb.selectors.Fifo的remover一致
+4. total_size, insert_stats都是内存里的计数, 训练主循环里查询的开销可以忽略
+
+data_spec格式为[(名字, numpy类型, 形状)], 插入时没有提供的列保持为0
+插入线程和tf.data的采样线程之间采用Condition互斥, 样本数目不足batch_size时采样阻塞, 和reverb的MinSize一致
+'''
+class NativeReplayBuffer(ReplayBufferBase):
+    def __init__(self, data_spec, capacity=4096, sampler=KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_UNIFORM, priority_exponent=0.5):
+        super().__init__(data_spec, int(capacity))
+
+        self.sampler = sampler
+
+        # 优先级里默认的0.5, 和ReverbReplayBuffer一致
+        self.priority_exponent = priority_exponent
+
+        self._cond = threading.Condition()
+        self._columns = None
+        self._sum_tree = None
+        self._rng = np.random.default_rng()
+
+        # 最旧样本的位置和样本数目, 新样本写在(self._tail + self._size) % capacity
+        self._tail = 0
+        self._size = 0
+        self._insert_count = 0
+
+    def init(self):
+        self._columns = {name: np.zeros((self._capacity, ) + tuple(shape), dtype=dtype) for name, dtype, shape in self._data_spec}
+        if self.sampler == KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_PRIORITIZED:
+            self._sum_tree = SumTree(self._capacity)
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self._data_spec]
+
+    '''
+    批量插入, batch格式为{名字: 形状为(batch_size, ...)的数组}, priorities为每条样本的优先级, 只在prioritized时使用, 默认1.0
+    单次超过capacity时只保留最后capacity条
+    '''
+    def add_batch(self, batch, priorities=None):
+        batch_size = len(next(iter(batch.values())))
+        if not batch_size:
+            return
+
+        start = max(0, batch_size - self._capacity)
+        count = batch_size - start
+
+        with self._cond:
+            indices = (self._tail + self._size + np.arange(count)) % self._capacity
+            for name, value in batch.items():
+                self._columns[name][indices] = value[start:]
+
+            if self._sum_tree is not None:
+                priorities = np.ones(count) if priorities is None else np.asarray(priorities, dtype=np.float64)[start:]
+                self._sum_tree.update(indices, np.power(priorities, self.priority_exponent))
+
+            # 覆盖最旧的样本
+            overflow = max(0, self._size + count - self._capacity)
+            self._tail = (self._tail + overflow) % self._capacity
+            self._size = min(self._capacity, self._size + count)
+            self._insert_count += batch_size
+
+            self._cond.notify_all()
+
+    '''
+    采样1个批次, 返回按照data_spec顺序的数组元组, 数组是拷贝, 不受后续插入影响
+    return_info为True时返回(数组元组, info), 和reverb的SampleInfo对应, info为{'key': 样本位置, 'probability': 采样概率}
+    key用于update_priorities, fifo的probability为1, uniform为1/样本数目
+    样本数目不足batch_size时阻塞, 超时或者prioritized的优先级全部为0时返回None
+    '''
+    def sample(self, batch_size, timeout=None, return_info=False):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size >= batch_size, timeout):
+                return None
+
+            if self.sampler == KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_FIFO:
+                indices = (self._tail + np.arange(batch_size)) % self._capacity
+                probabilities = np.ones(batch_size)
+                self._tail = (self._tail + batch_size) % self._capacity
+                self._size -= batch_size
+
+            elif self._sum_tree is not None:
+                indices = self._sum_tree.sample(batch_size, self._rng)
+                if indices is None:
+                    return None
+                probabilities = self._sum_tree.get(indices) / self._sum_tree.total
+
+            else:
+                indices = (self._tail + self._rng.integers(0, self._size, batch_size)) % self._capacity
+                probabilities = np.full(batch_size, 1 / self._size)
+
+            batch = tuple(self._columns[name][indices] for name in self.names)
+            if not return_info:
+                return batch
+
+            return batch, {'key': indices, 'probability': probabilities}
+
+    '''
+    修改样本的优先级, indices为样本在样本池里的位置, 只在prioritized时生效
+    '''
+    def update_priorities(self, indices, priorities):
+        if self._sum_tree is None:
+            return
+
+        with self._cond:
+            self._sum_tree.update(indices, np.power(np.asarray(priorities, dtype=np.float64), self.priority_exponent))
+
+    def clear(self, client=None, step=None):
+        with self._cond:
+            self._tail = 0
+            self._size = 0
+            if self._sum_tree is not None:
+                self._sum_tree.clear()
+
+        return None
+
+    def total_size(self, client=None):
+        return self._size
+
+    # 获取insert次数
+    def insert_stats(self, client=None):
+        return self._insert_count
+
+    '''
+    tf.data.Dataset.from_generator, 每次产出1个批次, 不需要再batch
+    '''
+    def as_dataset(self, batch_size=128, prefetch_size=tf.data.experimental.AUTOTUNE):
+        # 以配置为主
+        batch_size = int(CONFIG.train_batch_size)
+
+        def generator():
+            while True:
+                yield self.sample(batch_size)
+
+        dataset = tf.data.Dataset.from_generator(
+            generator,
+            output_types=tuple(tf.as_dtype(dtype) for _, dtype, _ in self._data_spec),
+            output_shapes=tuple(tf.TensorShape([batch_size] + list(shape)) for _, _, shape in self._data_spec))
+
+        if prefetch_size is not None:
+            dataset = dataset.prefetch(prefetch_size)
+
+        return dataset
+
+    def gather_all(self):
+        raise NotImplementedError('NativeReplayBuffer does not support `gather_all`.')
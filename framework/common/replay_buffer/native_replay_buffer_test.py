@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import threading
+import unittest
+import numpy as np
+from framework.common.replay_buffer.native_replay_buffer import NativeReplayBuffer
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+
+
+class NativeReplayBufferTest(unittest.TestCase):
+    def create(self, sampler, capacity=8):
+        replay_buffer = NativeReplayBuffer([('input_datas', np.float16, [3]), ('s', np.int64, [1])], capacity, sampler)
+        replay_buffer.init()
+        return replay_buffer
+
+    def batch(self, start, count):
+        return {'input_datas': np.arange(start, start + count, dtype=np.float32).repeat(3).reshape(count, 3)}
+
+    def test_fifo(self):
+        replay_buffer = self.create(KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_FIFO)
+        replay_buffer.add_batch(self.batch(0, 6))
+        replay_buffer.add_batch(self.batch(6, 4))
+
+        # 超过容量时覆盖最旧的样本
+        self.assertEqual(replay_buffer.total_size(), 8)
+        self.assertEqual(replay_buffer.insert_stats(), 10)
+
+        input_datas, steps = replay_buffer.sample(5)
+        self.assertEqual(input_datas.dtype, np.float16)
+        np.testing.assert_array_equal(input_datas[:, 0], [2, 3, 4, 5, 6])
+        np.testing.assert_array_equal(steps, np.zeros((5, 1)))
+
+        # 读取后移除, 不足batch_size时超时返回None
+        self.assertEqual(replay_buffer.total_size(), 3)
+        self.assertIsNone(replay_buffer.sample(5, timeout=0.01))
+        np.testing.assert_array_equal(replay_buffer.sample(3)[0][:, 0], [7, 8, 9])
+
+    def test_uniform(self):
+        replay_buffer = self.create(KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_UNIFORM)
+        replay_buffer.add_batch(self.batch(0, 20))
+
+        # 单次超过容量只保留最后capacity条
+        input_datas = np.concatenate([replay_buffer.sample(8)[0] for _ in range(8)])
+        self.assertEqual(set(input_datas[:, 0].tolist()), set(range(12, 20)))
+        self.assertEqual(replay_buffer.total_size(), 8)
+
+        replay_buffer.clear()
+        self.assertEqual(replay_buffer.total_size(), 0)
+
+    def test_prioritized(self):
+        replay_buffer = self.create(KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_PRIORITIZED)
+        replay_buffer.add_batch(self.batch(0, 4), priorities=[0, 0, 0, 1])
+
+        input_datas, _ = replay_buffer.sample(4)
+        np.testing.assert_array_equal(input_datas[:, 0], np.full(4, 3))
+
+        replay_buffer.update_priorities([3, 0], [0, 1])
+        np.testing.assert_array_equal(replay_buffer.sample(4)[0][:, 0], np.zeros(4))
+
+    def test_prioritized_sample_info(self):
+        replay_buffer = self.create(KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_PRIORITIZED)
+        replay_buffer.add_batch(self.batch(0, 4), priorities=[1, 1, 1, 1])
+
+        # 按照采样返回的key更新优先级, 之后只会采样到优先级不为0的样本
+        (input_datas, _), info = replay_buffer.sample(4, return_info=True)
+        np.testing.assert_array_equal(input_datas[:, 0], info['key'])
+        np.testing.assert_allclose(info['probability'], np.full(4, 0.25))
+
+        replay_buffer.update_priorities(info['key'], np.where(info['key'] == 2, 1, 0))
+        (input_datas, _), info = replay_buffer.sample(4, return_info=True)
+        np.testing.assert_array_equal(input_datas[:, 0], np.full(4, 2))
+        np.testing.assert_allclose(info['probability'], np.ones(4))
+
+        replay_buffer.update_priorities([2], [0])
+        self.assertIsNone(replay_buffer.sample(4, timeout=0))
+
+    def test_sample_wait_for_insert(self):
+        replay_buffer = self.create(KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_FIFO)
+
+        timer = threading.Timer(0.05, replay_buffer.add_batch, args=(self.batch(0, 4), ))
+        timer.start()
+        input_datas, _ = replay_buffer.sample(4, timeout=5)
+        timer.join()
+
+        np.testing.assert_array_equal(input_datas[:, 0], [0, 1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,20 +5,42 @@
 import time
 import threading
 import datetime
+import numpy as np
 from framework.common.utils.tf_utils import *
 from framework.common.config.config_control import CONFIG
 from framework.common.utils.tf_utils import TF_VERSION_MAJOR
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.replay_buffer.reverb_replay_buffer import ReverbReplayBuffer
+from framework.common.replay_buffer.native_replay_buffer import NativeReplayBuffer
+from framework.common.replay_buffer.batch_prefetcher import BatchPrefetcher
+from framework.common.replay_buffer.sample_staleness import SampleStalenessFilter
 
+'''
+样本池的封装, 支持下面的类型:
+1. reverb, 样本池在reverb server里, 通过reverb client访问
+2. mempool/tf_uniform, 样本池在learner进程内, 样本由LearnerServerZmq写入共享内存队列sample_queue, 本进程的线程读取后写入样本池
+
+开启use_learner_prefetch后, 由BatchPrefetcher在后台线程预取批次, pytorch训练时通过next_batch获取, tensorflow_simple训练时dataset_from_generator返回预取批次的tensor
+开启use_sample_staleness后, 样本池增加model_version列, 预取时由SampleStalenessFilter过滤过旧的样本, 需要开启use_learner_prefetch
+model_version列和重要性权重列是框架追加的列, 不放入业务的数据列, 按照KaiwuDRLDefine的名字单独提供给训练
+'''
 class ReplayBufferWrapper(object):
-    def __init__(self, tensor_names, tensor_dtypes, tensor_shapes, logger=None):
+    def __init__(self, tensor_names, tensor_dtypes, tensor_shapes, logger=None, sample_queue=None):
         self._tensor_names = tensor_names
         self._tensor_dtypes = tensor_dtypes
         self._tensor_shapes = tensor_shapes
         self._sorted_names = None
         self._sorted_dtypes = None
         self._sorted_shapes = None
+        self._reverb_client = None
+        self._sample_queue = sample_queue
+        self._prefetcher = None
+        self._staleness_filter = None
+        self._extra_tensors = {}
 
+        # 预取时由后台线程刷新的样本池统计, 训练主循环里不再查询reverb server
+        self._cached_insert_stats = 0
+        self._cached_current_size = 0
 
         # 针对replaybuffer 统计信息
         self.proc_sample_cnt = 0
@@ -32,13 +54,20 @@ class ReplayBufferWrapper(object):
             self._replay_buffer = ReverbReplayBuffer(
                 tuple([tf.TensorSpec(shape, dtype, name) for name, dtype, shape in zip(*self.sorted_tensor_spec())]))
             self._replay_buffer.init()
-        elif CONFIG.use_tf_uniform():
-            self._replay_buffer = NotImplemented
-        elif CONFIG.use_mempool():
-            self._replay_buffer = NotImplemented
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
+            sampler = CONFIG.native_replay_buffer_sampler if CONFIG.use_mempool() else KaiwuDRLDefine.NATIVE_REPLAY_BUFFER_SAMPLER_UNIFORM
+            self._replay_buffer = NativeReplayBuffer(
+                [(name, dtype.as_numpy_dtype, shape.as_list()) for name, dtype, shape in zip(*self.sorted_tensor_spec())],
+                int(CONFIG.replay_buffer_capacity), sampler)
+            self._replay_buffer.init()
         else:
             raise ValueError('ReplayBuffer currently only support reverb or tf_uniform or mempool!')
 
+        if int(CONFIG.use_sample_staleness):
+            self._staleness_filter = SampleStalenessFilter(
+                int(CONFIG.train_batch_size), int(CONFIG.sample_staleness_max_lag),
+                bool(int(CONFIG.sample_staleness_use_importance_weight)), float(CONFIG.sample_staleness_weight_decay))
+
     def train_hooks(self, local_step_tensor=None):
         return []
 
@@ -70,42 +99,119 @@ class ReplayBufferWrapper(object):
                 dtypes += [tf.int64]
                 shapes += [tf.TensorShape([1, ])]
 
+            # 生成样本时actor的model_version, 用于计算样本的陈旧程度
+            if int(CONFIG.use_sample_staleness):
+                names += [KaiwuDRLDefine.SAMPLE_MODEL_VERSION]
+                dtypes += [tf.int64]
+                shapes += [tf.TensorShape([1, ])]
+
             self._sorted_dtypes = dtypes
             self._sorted_names = names
             self._sorted_shapes = shapes
 
         return self._sorted_names, self._sorted_dtypes, self._sorted_shapes
 
+    '''
+    预取批次的列, 在样本池的列后面加上SampleStalenessFilter追加的重要性权重列
+    '''
+    def batch_tensor_spec(self):
+        names, dtypes, shapes = [list(spec) for spec in self.sorted_tensor_spec()]
+        if self._staleness_filter and self._staleness_filter.use_importance_weight:
+            names.append(KaiwuDRLDefine.SAMPLE_IMPORTANCE_WEIGHT)
+            dtypes.append(tf.float32)
+            shapes.append(tf.TensorShape([1, ]))
+
+        return names, dtypes, shapes
+
+    '''
+    框架追加的列, 不属于业务的tensor_names
+    '''
+    @property
+    def extra_names(self):
+        names = []
+        if self._staleness_filter:
+            names.append(KaiwuDRLDefine.SAMPLE_MODEL_VERSION)
+            if self._staleness_filter.use_importance_weight:
+                names.append(KaiwuDRLDefine.SAMPLE_IMPORTANCE_WEIGHT)
+
+        return names
+
+    '''
+    把预取的批次拆分为业务的数据列和框架追加的列, 返回(数据列的数组列表, {名字: 数组})
+    '''
+    def split_batch(self, batch):
+        names, _, _ = self.batch_tensor_spec()
+        extra_names = self.extra_names
+
+        data = [value for name, value in zip(names, batch) if name not in extra_names]
+        extras = {name: value for name, value in zip(names, batch) if name in extra_names}
+
+        return data, extras
+
     '''
     该方案采用dataset.from_generator来进行构造数据, 获取到具体数据, 再进行run_session
     '''
     def dataset_from_generator(self):
+        if self.use_prefetch:
+            return self.prefetch_tensors()
+
         dataset = self._replay_buffer.as_dataset()
         self._dataset_iter = tf.compat.v1.data.make_initializable_iterator(dataset)
 
         if CONFIG.use_reverb():
             next_tensors = self._dataset_iter.get_next()[1]
-        elif CONFIG.use_tf_uniform():
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
             next_tensors = self._dataset_iter.get_next()
         else:
             assert False
         
         return next_tensors
 
+    '''
+    开启预取时, 由预取好的批次通过dataset.from_generator构造dataset, 用于tensorflow_simple的训练
+    预取时float16已经转换为float32, 这里按照样本池的类型转换回去, 业务的网络结构不需要修改
+    '''
+    def prefetch_tensors(self):
+        names, dtypes, shapes = self.batch_tensor_spec()
+        staging_dtypes = [tf.as_dtype(BatchPrefetcher.staging_dtype(dtype.as_numpy_dtype)) for dtype in dtypes]
+        batch_shapes = [tf.TensorShape([None]).concatenate(shape) for shape in shapes]
+
+        dataset = tf.data.Dataset.from_generator(self.prefetch_generator, tuple(staging_dtypes), tuple(batch_shapes))
+        dataset = dataset.map(lambda *tensors: tuple(tf.cast(tensor, dtype) for tensor, dtype in zip(tensors, dtypes)))
+        self._dataset_iter = tf.compat.v1.data.make_initializable_iterator(dataset)
+
+        extra_names = self.extra_names
+        tensors = self._dataset_iter.get_next()
+        self._extra_tensors = {name: tensor for name, tensor in zip(names, tensors) if name in extra_names}
+
+        return tuple(tensor for name, tensor in zip(names, tensors) if name not in extra_names)
+
+    '''
+    prefetch_tensors里框架追加的列的tensor, {名字: tensor}, 比如KaiwuDRLDefine.SAMPLE_IMPORTANCE_WEIGHT
+    '''
+    def extra_tensors(self):
+        return self._extra_tensors
+
+    '''
+    from_generator生成的tensor可能直接引用numpy的内存, 预分配的数组在下一次next_batch时会复用, 这里拷贝后返回
+    '''
+    def prefetch_generator(self):
+        while True:
+            batch = self.next_batch()
+            if batch is not None:
+                yield tuple(np.array(data) for data in batch)
+
     '''
     该方案是采用tf.compat.v1.placeholder_with_default占位符 + 业务自定义网络结构生成的流水线设计, 推荐
     '''
 
     def input_tensors(self):
-        if CONFIG.use_tf_uniform():
-            pass
-
         dataset = self._replay_buffer.as_dataset()
 
         self._dataset_iter = tf.compat.v1.data.make_initializable_iterator(dataset)
         if CONFIG.use_reverb():
             next_tensors = self._dataset_iter.get_next()[1]
-        elif CONFIG.use_tf_uniform():
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
             next_tensors = self._dataset_iter.get_next()
         else:
             assert False
@@ -162,20 +268,124 @@ class ReplayBufferWrapper(object):
             #thread.daemon = True
             #thread.start()
 
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
+            if not self._sample_queue:
+                self.logger.error(f'train replaybuff {CONFIG.replay_buffer_type} has no sample_queue, need use_learner_server')
+                return
+
+            '''
+            LearnerServerZmq写入的是整个batch的float16数组, 每行样本对应input_datas列
+            get_array返回的是共享内存上的视图, add_batch里完成拷贝后才会归还slot
+            开启use_sample_staleness时, LearnerServerZmq把aisrv发送的model_version和样本写入同一个slot
+            '''
+            def start_native_replay_buffer_insert():
+                while True:
+                    try:
+                        if self._staleness_filter:
+                            arrays = self._sample_queue.get_arrays([np.float16, np.int64])
+                            batch = {'input_datas': arrays[0], KaiwuDRLDefine.SAMPLE_MODEL_VERSION: arrays[1]} if arrays is not None else None
+                        else:
+                            datas = self._sample_queue.get_array(np.float16)
+                            batch = {'input_datas': datas} if datas is not None else None
+                        if batch is not None:
+                            self._replay_buffer.add_batch(batch)
+                    except Exception as e:
+                        self.logger.error(f'train replaybuff insert error: {str(e)}')
+                        time.sleep(CONFIG.idle_sleep_second)
+
+            thread = threading.Thread(target=start_native_replay_buffer_insert)
+            thread.daemon = True
+            thread.start()
+
+    @property
+    def use_prefetch(self):
+        return self._prefetcher is not None
+
+    '''
+    启动批次预取, 样本池在learner进程内时直接从样本池采样, 否则通过tf_sess执行dataset的next_tensors采样
+    '''
+    def start_prefetch(self, tf_sess=None, next_tensors=None):
+        if self._prefetcher:
+            return
+
+        if CONFIG.use_tf_uniform() or CONFIG.use_mempool():
+            batch_size = int(CONFIG.train_batch_size)
+
+            def sample_fn():
+                return self._replay_buffer.sample(batch_size, timeout=1)
+
+        else:
+            if tf_sess is None or next_tensors is None:
+                self.logger.error(f'train replaybuff start_prefetch need tf_sess and next_tensors')
+                return
+
+            def sample_fn():
+                batch = tf_sess.run(next_tensors)
+                self._cached_insert_stats = self._replay_buffer.insert_stats(self._reverb_client)
+                self._cached_current_size = self._replay_buffer.total_size(self._reverb_client)
+                return batch
+
+        # 过滤过旧的样本, 保留的样本凑满batch_size后才输出
+        if self._staleness_filter:
+            version_index = self._sorted_names.index(KaiwuDRLDefine.SAMPLE_MODEL_VERSION)
+            sample_batch_fn = sample_fn
+
+            def sample_fn():
+                # 采样前记录代数, 采样期间发生reset时丢弃该批次
+                generation = self._staleness_filter.generation
+                batch = sample_batch_fn()
+                if batch is None:
+                    return None
+                return self._staleness_filter.process(batch, version_index, generation)
+
+        self._prefetcher = BatchPrefetcher(sample_fn, int(CONFIG.learner_prefetch_batch_count), self.logger)
+        self._prefetcher.start()
+        self.logger.info(f'train replaybuff start prefetch, prefetch_batch_count is {CONFIG.learner_prefetch_batch_count}')
+
+    '''
+    获取预取好的下一个批次, 数组在下一次调用前有效
+    '''
+    def next_batch(self, timeout=None):
+        return self._prefetcher.get(timeout)
+
+    def prefetch_ready(self):
+        return self.prefetch_ready_count() > 0
+
+    def prefetch_ready_count(self):
+        return self._prefetcher.ready_count()
+
+    def get_prefetch_stat(self):
+        return self._prefetcher.get_stat() if self._prefetcher else {}
+
+    '''
+    learner当前的model_version, 用于计算样本的陈旧程度
+    '''
+    def set_current_model_version(self, model_version):
+        if self._staleness_filter:
+            self._staleness_filter.set_current_model_version(model_version)
+
+    def get_staleness_stat(self):
+        return self._staleness_filter.get_stat() if self._staleness_filter else {}
+
     def reset(self, step, tf_sess):
         if CONFIG.use_reverb():
             self._replay_buffer.clear(self._reverb_client, step)
-        elif CONFIG.use_tf_uniform():
-            tf_sess.run(self._tf_replay_buffer_clear)
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
+            self._replay_buffer.clear(step=step)
         else:
             assert False
 
+        # 已经预取的和正在采样的批次来自清空前的样本, 需要丢弃, 在样本池清空后再增加代数
+        if self._prefetcher:
+            self._prefetcher.clear()
+        if self._staleness_filter:
+            self._staleness_filter.clear()
+
     def input_ready(self, tf_sess):
         if CONFIG.use_reverb():
             current_size = self._replay_buffer.total_size(self._reverb_client)
-        elif CONFIG.use_tf_uniform():
-            # 这里暂时没有实现
-            current_size = tf_sess.run(self._tf_replay_buffer_total_size)
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
+            current_size = self._replay_buffer.total_size()
         else:
             assert False
 
@@ -188,7 +398,7 @@ class ReplayBufferWrapper(object):
     def get_recv_speed(self):
         if CONFIG.use_reverb():
             return 0
-        elif CONFIG.use_tf_uniform():
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
             return 0
         else:
             assert False
@@ -198,10 +408,11 @@ class ReplayBufferWrapper(object):
     '''
     def get_current_size(self):
         if CONFIG.use_reverb():
+            if self._prefetcher:
+                return self._cached_current_size
             return self._replay_buffer.total_size(self._reverb_client)
-        elif CONFIG.use_tf_uniform():
-            # 这里暂时没有实现
-            return 0
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
+            return self._replay_buffer.total_size()
         else:
             assert False
         
@@ -210,9 +421,10 @@ class ReplayBufferWrapper(object):
     '''
     def get_insert_stats(self):
         if CONFIG.use_reverb():
+            if self._prefetcher:
+                return self._cached_insert_stats
             return self._replay_buffer.insert_stats(self._reverb_client)
-        elif CONFIG.use_tf_uniform():
-            # 这里暂时没有实现
-            return 0
+        elif CONFIG.use_tf_uniform() or CONFIG.use_mempool():
+            return self._replay_buffer.insert_stats()
         else:
             assert False
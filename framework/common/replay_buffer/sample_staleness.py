@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import threading
+import numpy as np
+from framework.common.monitor.histogram import LogLinearHistogram
+
+
+'''
+learner上按照样本的陈旧程度过滤样本, 样本的陈旧程度staleness = learner当前的model_version - 生成样本的model_version
+1. 样本从aisrv带上生成样本时actor的model_version, 作为样本池里的model_version列
+2. staleness超过max_lag的样本丢弃, 保留的样本累积到batch_size后输出, 保证训练的批次大小不变
+3. model_version小于0的样本表示未知版本(比如aisrv没有提供), 不过滤, 单独计数
+4. learner当前的model_version小于0时(比如off-policy), 只做统计不过滤
+5. use_importance_weight时在批次最后追加形如(batch_size, 1)的float32权重列, 权重为weight_decay ** staleness, 最新的样本权重为1, ReplayBufferWrapper按照KaiwuDRLDefine.SAMPLE_IMPORTANCE_WEIGHT提供给训练
+
+staleness按照直方图统计, 上报后清零
+process在预取线程里调用, clear和get_stat在训练主循环里调用, 保留样本和统计项的读写都在锁内
+clear增加代数, 采样时记录的代数和当前不一致的批次是clear之前采样的, 直接丢弃, 不会再进入保留样本
+'''
+class SampleStalenessFilter(object):
+
+    def __init__(self, batch_size, max_lag, use_importance_weight=False, weight_decay=0.5) -> None:
+        self.batch_size = int(batch_size)
+
+        # 小于0时不丢弃样本
+        self.max_lag = int(max_lag)
+        self.use_importance_weight = use_importance_weight
+        self.weight_decay = float(weight_decay)
+
+        self.current_model_version = -1
+
+        # 未凑满batch_size的保留样本, 每列1个数组列表
+        self._pending = None
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self.generation = 0
+
+        self.staleness_histogram = LogLinearHistogram(highest_trackable_value=1 << 20)
+        self.stat_reset()
+
+    def stat_reset(self):
+        self.keep_count = 0
+        self.drop_count = 0
+        self.unknown_count = 0
+
+    '''
+    丢弃未凑满batch_size的保留样本, 用于on-policy清空样本池
+    '''
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._pending = None
+            self._pending_count = 0
+
+    def set_current_model_version(self, model_version):
+        self.current_model_version = int(model_version)
+
+    '''
+    返回每条样本的staleness, 未知版本的为-1
+    '''
+    def staleness(self, model_versions):
+        model_versions = np.asarray(model_versions).reshape(-1).astype(np.int64)
+        if self.current_model_version < 0:
+            return np.full(len(model_versions), -1, dtype=np.int64)
+
+        # 样本的版本可能比learner记录的更新, 按照0计算
+        staleness = np.maximum(self.current_model_version - model_versions, 0)
+        staleness[model_versions < 0] = -1
+
+        return staleness
+
+    def record(self, staleness):
+        known = staleness[staleness >= 0]
+        self.unknown_count += len(staleness) - len(known)
+        for value, count in zip(*np.unique(known, return_counts=True)):
+            self.staleness_histogram.record(int(value), int(count))
+
+    '''
+    过滤1个批次, batch为按照样本池列顺序的数组列表, version_index为model_version列的下标
+    返回batch_size条样本的数组列表, 保留的样本不足batch_size时返回None, 剩下的样本留到下一次输出
+    generation为采样前读取的代数, 和当前代数不一致时返回None
+    '''
+    def process(self, batch, version_index, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return None
+
+            staleness = self.staleness(batch[version_index])
+            self.record(staleness)
+
+            keep = staleness <= self.max_lag if self.max_lag >= 0 else np.ones(len(staleness), dtype=bool)
+            keep |= staleness < 0
+
+            keep_count = int(np.count_nonzero(keep))
+            self.keep_count += keep_count
+            self.drop_count += len(keep) - keep_count
+
+            if keep_count:
+                columns = batch if keep_count == len(keep) else [np.asarray(data)[keep] for data in batch]
+                if self._pending is None:
+                    self._pending = [[] for _ in columns]
+                for pending, data in zip(self._pending, columns):
+                    pending.append(np.asarray(data))
+                self._pending_count += keep_count
+
+            if self._pending_count < self.batch_size:
+                return None
+
+            columns = [np.concatenate(pending) if len(pending) > 1 else pending[0] for pending in self._pending]
+            output = [data[:self.batch_size] for data in columns]
+
+            self._pending_count -= self.batch_size
+            self._pending = [[data[self.batch_size:]] for data in columns] if self._pending_count else None
+
+            if self.use_importance_weight:
+                output.append(self.importance_weight(output[version_index]))
+
+            return output
+
+    '''
+    按照当前的model_version计算权重, 未知版本的权重为1
+    '''
+    def importance_weight(self, model_versions):
+        staleness = self.staleness(model_versions)
+        weight = np.power(self.weight_decay, np.maximum(staleness, 0)).astype(np.float32)
+
+        return weight.reshape(-1, 1)
+
+    '''
+    返回统计项并且复原
+    '''
+    def get_stat(self):
+        with self._lock:
+            stat = {
+                'keep_count': self.keep_count,
+                'drop_count': self.drop_count,
+                'unknown_count': self.unknown_count,
+                'staleness_histogram': self.staleness_histogram.drain(),
+            }
+            self.stat_reset()
+
+        return stat
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+import numpy as np
+from framework.common.replay_buffer.sample_staleness import SampleStalenessFilter
+
+
+class SampleStalenessFilterTest(unittest.TestCase):
+    def batch(self, values, model_versions):
+        return [np.asarray(values, dtype=np.float32).reshape(-1, 1), np.asarray(model_versions, dtype=np.int64).reshape(-1, 1)]
+
+    def test_filter(self):
+        staleness_filter = SampleStalenessFilter(batch_size=4, max_lag=1)
+        staleness_filter.set_current_model_version(10)
+
+        # 版本8的样本超过max_lag被丢弃, 未知版本的保留, 不足batch_size时留到下一次
+        self.assertIsNone(staleness_filter.process(self.batch([0, 1, 2], [10, 8, -1]), 1))
+        output = staleness_filter.process(self.batch([3, 4, 5], [9, 11, 10]), 1)
+        np.testing.assert_array_equal(output[0][:, 0], [0, 2, 3, 4])
+        self.assertEqual(len(output), 2)
+
+        output = staleness_filter.process(self.batch([6, 7, 8], [10, 10, 10]), 1)
+        np.testing.assert_array_equal(output[0][:, 0], [5, 6, 7, 8])
+
+        stat = staleness_filter.get_stat()
+        self.assertEqual((stat['keep_count'], stat['drop_count'], stat['unknown_count']), (8, 1, 1))
+        self.assertEqual(stat['staleness_histogram'].count, 8)
+        self.assertEqual(stat['staleness_histogram'].max_value, 2)
+
+    def test_no_current_model_version(self):
+        staleness_filter = SampleStalenessFilter(batch_size=2, max_lag=0)
+
+        output = staleness_filter.process(self.batch([0, 1], [3, 100]), 1)
+        np.testing.assert_array_equal(output[0][:, 0], [0, 1])
+        self.assertEqual(staleness_filter.get_stat()['unknown_count'], 2)
+
+    def test_importance_weight(self):
+        staleness_filter = SampleStalenessFilter(batch_size=3, max_lag=-1, use_importance_weight=True, weight_decay=0.5)
+        staleness_filter.set_current_model_version(5)
+
+        output = staleness_filter.process(self.batch([0, 1, 2], [5, 3, -1]), 1)
+        self.assertEqual(output[2].dtype, np.float32)
+        np.testing.assert_array_equal(output[2][:, 0], [1, 0.25, 1])
+
+    def test_clear_generation(self):
+        staleness_filter = SampleStalenessFilter(batch_size=2, max_lag=-1)
+
+        # clear之前开始采样的批次, 在clear之后才过滤, 不能进入保留样本
+        generation = staleness_filter.generation
+        self.assertIsNone(staleness_filter.process(self.batch([0], [1]), 1))
+        staleness_filter.clear()
+        self.assertIsNone(staleness_filter.process(self.batch([1], [1]), 1, generation))
+
+        generation = staleness_filter.generation
+        self.assertIsNone(staleness_filter.process(self.batch([2], [1]), 1, generation))
+        output = staleness_filter.process(self.batch([3], [1]), 1, generation)
+        np.testing.assert_array_equal(output[0][:, 0], [2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
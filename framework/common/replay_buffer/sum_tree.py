@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import numpy as np
+
+
+'''
+优先级采样的sum-tree, 叶子节点为每个位置的优先级, 父节点为子节点之和
+1. 叶子数目按照2的幂次对齐, 树保存在1维数组里, 下标1为根节点, 下标i的子节点为2i和2i+1
+2. 修改优先级时从叶子向上更新到根, O(log n)
+3. 采样时在[0, total)上分段均匀生成随机数, 整批从根节点向下查找, 每层1次向量化比较, O(batch_size * log n)
+
+优先级为0的位置不会被采样, 空的位置和已经被移除的位置优先级都置为0
+'''
+class SumTree(object):
+
+    def __init__(self, capacity) -> None:
+        self.capacity = int(capacity)
+        self.leaf_count = 1 << max(0, (self.capacity - 1).bit_length())
+        self.depth = self.leaf_count.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaf_count, dtype=np.float64)
+
+    @property
+    def total(self):
+        return float(self.tree[1])
+
+    def get(self, indices):
+        return self.tree[self.leaf_count + np.asarray(indices)]
+
+    '''
+    批量设置优先级, indices里有重复下标时以最后1次为准
+    '''
+    def update(self, indices, priorities):
+        nodes = self.leaf_count + np.asarray(indices, dtype=np.int64)
+        self.tree[nodes] = priorities
+
+        # 逐层向上更新, 每层对去重后的父节点重新求和
+        for _ in range(self.depth):
+            nodes = np.unique(nodes >> 1)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def clear(self):
+        self.tree.fill(0)
+
+    '''
+    分层采样batch_size个位置, 返回叶子下标, total为0时返回None
+    '''
+    def sample(self, batch_size, rng):
+        total = self.total
+        if total <= 0:
+            return None
+
+        segment = total / batch_size
+        values = (np.arange(batch_size) + rng.random(batch_size)) * segment
+
+        nodes = np.ones(batch_size, dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values >= left_sum
+            values = np.where(go_right, values - left_sum, values)
+            nodes = np.where(go_right, left + 1, left)
+
+        indices = nodes - self.leaf_count
+
+        # 浮点误差可能落到优先级为0的叶子上, 替换为优先级最大的位置
+        empty = self.tree[nodes] <= 0
+        if empty.any():
+            indices[empty] = int(np.argmax(self.tree[self.leaf_count:self.leaf_count + self.capacity]))
+
+        return indices
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+import numpy as np
+from framework.common.replay_buffer.sum_tree import SumTree
+
+
+class SumTreeTest(unittest.TestCase):
+    def test_update(self):
+        tree = SumTree(5)
+        self.assertEqual(tree.leaf_count, 8)
+        self.assertEqual(tree.total, 0)
+
+        tree.update([0, 1, 4], [1.0, 2.0, 3.0])
+        self.assertEqual(tree.total, 6.0)
+
+        # 重复下标以最后1次为准
+        tree.update([1, 1], [5.0, 0.5])
+        self.assertEqual(tree.total, 4.5)
+        np.testing.assert_array_equal(tree.get([0, 1, 2, 4]), [1.0, 0.5, 0.0, 3.0])
+
+        tree.clear()
+        self.assertEqual(tree.total, 0)
+        self.assertIsNone(tree.sample(4, np.random.default_rng(0)))
+
+    def test_sample_proportional(self):
+        tree = SumTree(4)
+        tree.update([0, 1, 3], [1.0, 3.0, 6.0])
+
+        rng = np.random.default_rng(0)
+        counts = np.bincount(np.concatenate([tree.sample(100, rng) for _ in range(200)]), minlength=4)
+
+        # 优先级为0的位置不会被采样
+        self.assertEqual(counts[2], 0)
+        np.testing.assert_allclose(counts / counts.sum(), [0.1, 0.3, 0.0, 0.6], atol=0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
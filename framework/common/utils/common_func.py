@@ -24,6 +24,7 @@ import json
 import fcntl
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.config.config_control import CONFIG
+from framework.common.protocol.binary_protocol import encode_arrays, decode_arrays, CODEC_NONE, CODEC_LZ4, CODEC_ZSTD
 
 try:
     import _pickle as pickle
@@ -516,7 +517,8 @@ def compress_data(data, serialize=True):
     try:
         # 采用pickle序列化
         if serialize:
-            if CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PICKLE:
+            # binary协议只用于预测请求, 预测响应依旧采用pickle
+            if CONFIG.aisrv_actor_protocl in (KaiwuDRLDefine.PROTOCL_PICKLE, KaiwuDRLDefine.PROTOCL_BINARY):
                 data = pickle.dumps(data)
             elif CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PROTOBUF:
                 data = data.SerializeToString()
@@ -562,7 +564,7 @@ def decompress_data(data, serialize=True):
         
         if serialize:
             # 采用pickle反序列化
-            if CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PICKLE:
+            if CONFIG.aisrv_actor_protocl in (KaiwuDRLDefine.PROTOCL_PICKLE, KaiwuDRLDefine.PROTOCL_BINARY):
                 decompress_msg = pickle.loads(decompress_msg, encoding='bytes')
             # 采用protobuf序列化
             elif CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PROTOBUF:
@@ -574,6 +576,41 @@ def decompress_data(data, serialize=True):
 
     return decompress_msg
 
+'''
+aisrv --> actor预测请求的编码, 请求为numpy数组列表
+1. binary协议, 采用自描述的二进制格式, 按照字段压缩
+2. 其他协议, 同compress_data
+'''
+def compress_predict_request(arrays):
+    if CONFIG.aisrv_actor_protocl != KaiwuDRLDefine.PROTOCL_BINARY:
+        return compress_data(arrays)
+
+    codec = CODEC_NONE
+    if CONFIG.use_compress_decompress:
+        if CONFIG.compress_decompress_algorithms == KaiwuDRLDefine.COMPRESS_DECOMPRESS_ALGORITHMS_LZ4:
+            codec = CODEC_LZ4
+        elif CONFIG.compress_decompress_algorithms == KaiwuDRLDefine.COMPRESS_DECOMPRESS_ALGORITHMS_ZSTD:
+            codec = CODEC_ZSTD
+
+    return encode_arrays(arrays, codec, int(CONFIG.binary_protocol_compress_min_bytes))
+
+'''
+aisrv --> actor预测请求的解码, 和compress_predict_request对应
+copy为True时, binary协议下的未压缩字段会拷贝出来, 用于消息所在内存会被复用的场景
+'''
+def decompress_predict_request(data, copy=False):
+    if CONFIG.aisrv_actor_protocl != KaiwuDRLDefine.PROTOCL_BINARY:
+        return decompress_data(data)
+
+    if not data:
+        return data
+
+    try:
+        return decode_arrays(data, copy)
+    except Exception as e:
+        print(f'decompress_predict_request error {str(e)}')
+        return None
+
 '''
 CPU 绑核操作, 规避因为CPU调度引起的时延大问题
 '''
@@ -16,6 +16,8 @@ class KaiwuDRLDefine(object):
     # 下面是aisrv <--> actor之间的消息格式定义
     COMPOSE_ID_SIZE = 4
     CLIENT_ID_SIZE = 1
+    # actor没有完成预测时, 返回给aisrv的单个样本的结果里带上该key, 值为错误原因
+    PREDICT_ERROR = 'predict_error'
 
     # 进程名字, 其中main是为了便于在七彩石上管理, 不是实际存在的进程名
     SERVER_AISRV = 'aisrv'
@@ -73,6 +75,8 @@ class KaiwuDRLDefine(object):
     ACTOR_TENSORRT_GPU2CPU_SUCC_CNT = 'actor_tensorrt_gpu_send_to_cpu_succ_cnt'
     ACTOR_TENSORRT_GPU2CPU_ERR_CNT = 'actor_tensorrt_gpu_send_to_cpu_error_cnt'
     MONITOR_ACTOR_SERVER_QUEUE_FULL_CNT = 'actor_server_queue_full_cnt'
+    # 预测请求超过共享内存slot大小, 直接返回错误响应的数目
+    MONITOR_ACTOR_SERVER_REQUEST_TOO_LARGE_CNT = 'actor_server_request_too_large_cnt'
     MONITOR_ACTOR_MAX_COMPRESS_TIME = 'actor_max_compress_time'
     MONITOR_ACTOR_MAX_DECOMPRESS_TIME = 'actor_max_decompress_time'
     MONITOR_ACTOR_MAX_COMPRESS_SIZE = 'actor_max_compress_size'
@@ -80,6 +84,15 @@ class KaiwuDRLDefine(object):
     MONITOR_ACTOR_PREDICT_RESULT_QUEUE_SIZE = 'predict_result_queue_size'
     MONITOR_ACTOR_SERVER_REQUEST_QUEUE_SIZE = 'actor_server_request_queue_size'
     MONITOR_ACTOR_SERVER_RESULT_QUEUE_SIZE = 'actor_server_result_queue_size'
+    # actor上自适应批处理的目标batch_size, 收包截止时间和p99端到端时延
+    MONITOR_ACTOR_ADAPTIVE_BATCH_SIZE = 'actor_adaptive_batch_size'
+    MONITOR_ACTOR_ADAPTIVE_WAIT_MS = 'actor_adaptive_wait_ms'
+    MONITOR_ACTOR_PREDICT_P99_LATENCY_MS = 'actor_predict_p99_latency_ms'
+    # actor上按照直方图统计的耗时, 单位为微秒, 上报时展开为_p50/_p90/_p99/_p999/_max/_cnt
+    MONITOR_ACTOR_FROM_ZMQ_QUEUE_TIME_US = 'actor_from_zmq_queue_time_us'
+    MONITOR_ACTOR_BATCH_PREDICT_TIME_US = 'actor_batch_predict_time_us'
+    MONITOR_ACTOR_DECOMPRESS_TIME_US = 'actor_decompress_time_us'
+    MONITOR_ACTOR_COMPRESS_TIME_US = 'actor_compress_time_us'
     # actor/actor上aisrv的TCP数目
     ACTOR_TCP_AISRV = 'actor_tcp_aisrv'
     # 在使用TesnorFlow/TensorRT时, 可能会出现refit时大时延, 故获取最大值
@@ -90,6 +103,8 @@ class KaiwuDRLDefine(object):
     ON_POLICY_PULL_FROM_MODELPOOL_SUCCESS_CNT = 'on_policy_pull_from_modelpool_success_cnt'
     ON_POLICY_ACTOR_CHANGE_MODEL_VERSION_ERROR_COUNT = 'actor_change_model_version_error_count'
     ON_POLICY_ACTOR_CHANGE_MODEL_VERSION_SUCCESS_COUNT = 'actor_change_model_version_success_count'
+    ON_POLICY_RECV_WEIGHT_BROADCAST_ERROR_CNT = 'on_policy_recv_weight_broadcast_error_cnt'
+    ON_POLICY_RECV_WEIGHT_BROADCAST_SUCCESS_CNT = 'on_policy_recv_weight_broadcast_success_cnt'
 
     # learner
     MONITOR_REVERB_READY_SIZE = 'reverb_ready_size'
@@ -101,6 +116,20 @@ class KaiwuDRLDefine(object):
     PUSH_TO_MODEL_POOL_SUCC_CNT = 'push_to_model_pool_succ_cnt'
     PUSH_TO_MODEL_POOL_ERR_CNT = 'push_to_model_pool_err_cnt'
     MONITOR_LEARNER_ZMQ_REVERB_QUEUE_LEN = 'learner_zmq_reverb_queue_len'
+    # learner上按照直方图统计的样本大小(字节)和写入reverb server的耗时(微秒)
+    MONITOR_LEARNER_SAMPLE_SIZE_BYTES = 'learner_sample_size_bytes'
+    MONITOR_LEARNER_REVERB_WRITE_TIME_US = 'learner_reverb_write_time_us'
+    # learner预取时, 统计周期内训练主循环等待输入的耗时, 训练的耗时, 以及等待输入的占比
+    MONITOR_LEARNER_INPUT_WAIT_TIME_MS = 'learner_input_wait_time_ms'
+    MONITOR_LEARNER_COMPUTE_TIME_MS = 'learner_compute_time_ms'
+    MONITOR_LEARNER_INPUT_BOUND_RATIO = 'learner_input_bound_ratio'
+    # learner上样本的陈旧程度(直方图), 因为过旧丢弃的样本数目, 没有model_version的样本数目
+    MONITOR_LEARNER_SAMPLE_STALENESS = 'learner_sample_staleness'
+    MONITOR_LEARNER_STALE_SAMPLE_DROP_CNT = 'learner_stale_sample_drop_cnt'
+    MONITOR_LEARNER_UNKNOWN_VERSION_SAMPLE_CNT = 'learner_unknown_version_sample_cnt'
+    # learner进程内样本池时, 写入共享内存样本队列成功和因为队列满而丢弃的样本数目
+    MONITOR_LEARNER_SAMPLE_QUEUE_SUCC_CNT = 'learner_sample_queue_succ_cnt'
+    MONITOR_LEARNER_SAMPLE_QUEUE_DROP_CNT = 'learner_sample_queue_drop_cnt'
     # actor/actor上aisrv的TCP数目
     LEARNER_TCP_AISRV = 'learner_tcp_aisrv'
     # 下面是on-policy的learner统计告警指标
@@ -110,6 +139,8 @@ class KaiwuDRLDefine(object):
     ON_POLICY_LEARNER_RECV_AISRV_SUCCESS_CNT = 'on_policy_learner_recv_aisrv_success_cnt'
     ON_POLICY_LEARNER_RECV_ACTOR_ERROR_CNT = 'on_policy_learner_recv_actor_error_cnt'
     ON_POLICY_LEARNER_RECV_ACTOR_SUCCESS_CNT = 'on_policy_learner_recv_actor_success_cnt'
+    ON_POLICY_WEIGHT_BROADCAST_ERROR_CNT = 'on_policy_weight_broadcast_error_cnt'
+    ON_POLICY_WEIGHT_BROADCAST_SUCCESS_CNT = 'on_policy_weight_broadcast_success_cnt'
 
     # aisrv
     MONITOR_SENDTO_REVERB_SUCC_CNT = 'send_to_reverb_succ_cnt'
@@ -126,9 +157,14 @@ class KaiwuDRLDefine(object):
     MONITOR_AISRV_MAX_COMPRESS_TIME = 'aisrv_max_compress_time'
     MONITOR_AISRV_MAX_DECOMPRESS_TIME = 'aisrv_max_decompress_time'
     MONITOR_AISRV_MAX_COMPRESS_SIZE = 'aisrv_max_compress_size'
+    MONITOR_AISRV_ACTOR_PROXY_MAX_COALESCE_SIZE = 'aisrv_actor_proxy_max_coalesce_size'
     MONITOR_AISRV_ACTOR_MEAN_TIME_COST = 'aisrv_actor_mean_time_cost'
     MONITOR_AISRV_ACTOR_MAX_TIME_COST = 'aisrv_actor_max_time_cost'
     MONITOR_AISRV_ACTOR_TIMEOUT_GT = 'aisrv_actor_timeout_gt_'
+    # aisrv上按照直方图统计的耗时, 单位为微秒
+    MONITOR_AISRV_COMPRESS_TIME_US = 'aisrv_compress_time_us'
+    MONITOR_AISRV_DECOMPRESS_TIME_US = 'aisrv_decompress_time_us'
+    MONITOR_AISRV_ACTOR_TIME_COST_US = 'aisrv_actor_time_cost_us'
     # actor/actor上aisrv的TCP数目
     AISRV_TCP_BATTLESRV = 'aisrv_tcp_battlesrv'
     MONITOR_AISRV_SEND_TO_BATTLESRV_SUC_CNT = 'send_to_battlesrv_suc_cnt'
@@ -144,6 +180,37 @@ class KaiwuDRLDefine(object):
     MONITOR_AISRV_ON_POLICY_AISRV_CHANGE_MODEL_VERSION_ERROR_COUNT = 'aisrv_change_model_version_error_count'
     MONITOR_AISRV_ON_POLICY_AISRV_CHANGE_MODEL_VERSION_SUCCESS_COUNT = 'aisrv_change_model_version_success_count'
 
+    # 单帧时延分阶段统计, 上报的指标名字形如{prefix}_{stage}_p99, 单位为微秒
+    MONITOR_TRACE_AISRV_PREFIX = 'trace_aisrv'
+    MONITOR_TRACE_ACTOR_PROXY_PREFIX = 'trace_actor_proxy'
+    MONITOR_TRACE_ACTOR_PREFIX = 'trace_actor'
+    # aisrv上gamecore请求到达到发送预测请求, 即排队和特征处理耗时
+    TRACE_STAGE_FEATURE = 'feature'
+    # aisrv上发送预测请求到拿到预测响应
+    TRACE_STAGE_PREDICT = 'predict'
+    # actor_proxy收到预测响应到kaiwu_rl_helper拿到预测响应
+    TRACE_STAGE_AISRV_RECV = 'aisrv_recv'
+    # aisrv上gamecore请求到达到响应交给gamecore发送
+    TRACE_STAGE_TOTAL = 'total'
+    # actor_proxy上预测请求在msg_queue里的排队耗时
+    TRACE_STAGE_PROXY_QUEUE = 'proxy_queue'
+    # aisrv <--> actor往返耗时减去actor上的耗时, 包括序列化, 压缩和网络耗时
+    TRACE_STAGE_NETWORK = 'network'
+    # actor上预测请求从收包到开始预测的排队耗时
+    TRACE_STAGE_ACTOR_QUEUE = 'actor_queue'
+    # actor上模型预测耗时
+    TRACE_STAGE_ACTOR_MODEL = 'actor_model'
+    # actor上预测结束到组装好响应
+    TRACE_STAGE_ACTOR_POST = 'actor_post'
+    # actor上预测结束到响应放入发送队列, 包括压缩耗时
+    TRACE_STAGE_ACTOR_SEND = 'actor_send'
+    # actor随compose_id回传的各阶段耗时数目, 依次为actor_queue, actor_model, actor_post
+    TRACE_CONTEXT_SIZE = 3
+
+    # 日志模式, loguru为loguru的enqueue模式, ring_buffer为进程内环形缓冲区加后台线程写文件的模式
+    LOG_MODE_LOGURU = 'loguru'
+    LOG_MODE_RING_BUFFER = 'ring_buffer'
+
     # COS桶下的key名字
     COS_BUCKET_KEY = 'kaiwu_drl_models/'
 
@@ -162,6 +229,24 @@ class KaiwuDRLDefine(object):
     COMMUNICATION_WAY_ZMQ = 'zmq'
     COMMUNICATION_WAY_ZMQ_OPS = 'zmq-ops'
 
+    # actor_server和predictor之间的预测请求队列类型
+    PREDICT_QUEUE_TYPE_QUEUE = 'queue'
+    PREDICT_QUEUE_TYPE_SHARED_MEMORY = 'shared_memory'
+
+    # learner上LearnerServerZmq和LearnerServerReverb之间的样本队列类型
+    LEARNER_REVERB_QUEUE_TYPE_QUEUE = 'queue'
+    LEARNER_REVERB_QUEUE_TYPE_SHARED_MEMORY = 'shared_memory'
+
+    # learner进程内的样本池(replay_buffer_type为mempool/tf_uniform)的采样方式
+    NATIVE_REPLAY_BUFFER_SAMPLER_FIFO = 'fifo'
+    NATIVE_REPLAY_BUFFER_SAMPLER_UNIFORM = 'uniform'
+    NATIVE_REPLAY_BUFFER_SAMPLER_PRIORITIZED = 'prioritized'
+
+    # 样本里生成样本时actor的model_version字段, 也是样本池里的列名
+    SAMPLE_MODEL_VERSION = 'model_version'
+    # 按照样本陈旧程度衰减的每条样本的权重, 预取时计算, 训练时按照该名字提供
+    SAMPLE_IMPORTANCE_WEIGHT = 'importance_weight'
+
     # actor_server采用的方式
     RUN_AS_COROUTINE = 'coroutine'
     RUN_AS_DIRECT = 'direct'
@@ -202,6 +287,7 @@ class KaiwuDRLDefine(object):
     # aisrv和actor之间采用的通信协议
     PROTOCL_PICKLE = 'pickle'
     PROTOCL_PROTOBUF = 'protobuf'
+    PROTOCL_BINARY = 'binary'
 
     # 文件结束标志的文件名
     FILE_FINISH_NAME = 'FINSH'
@@ -211,8 +297,9 @@ class KaiwuDRLDefine(object):
     RUN_MODEL_TRAIN = 'train'
     RUN_MODEL_EVAL = 'eval'
 
-    # aisrv的运行框架, 包括socketserver, kaiwudrl, arena, 其中socketserver, arena是python的, kaiwudrl是C++的
+    # aisrv的运行框架, 包括socketserver, asyncio, kaiwudrl, arena, 其中socketserver, asyncio, arena是python的, kaiwudrl是C++的
     AISRV_FRAMEWORK_SOCKETSERVER = 'socketserver'
+    AISRV_FRAMEWORK_ASYNCIO = 'asyncio'
     AISRV_FRAMEWORK_KAIWUDRL = 'kaiwudrl'
     AISRV_FRAMEWORK_ARENA = 'arena'
 
@@ -241,6 +328,8 @@ class KaiwuDRLDefine(object):
     # 下面是on-policy里面的消息类型和值
     ON_POLICY_MESSAGE_TYPE = 'message_type'
     ON_POLICY_MESSAGE_VALUE = 'message_value'
+    # model_version同步请求里携带, 表示learner已经通过zmq PUB广播了模型参数, actor不需要从modelpool拉取
+    ON_POLICY_MESSAGE_WEIGHT_BROADCAST = 'weight_broadcast'
     ON_POLICY_MESSAGE_MODEL_VERSION_CHANGE_REQUEST = 'model_version_change_request'
     ON_POLICY_MESSAGE_MODEL_VERSION_CHANGE_RESPONSE = 'model_version_change_response'
     ON_POLICY_MESSAGE_ASK_LEARNER_TO_EXECUTE_ON_POLICY_PROCESS_REQUEST = 'ask_learner_to_execute_on_policy_process_request'
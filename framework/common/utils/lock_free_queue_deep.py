@@ -50,10 +50,12 @@ class SafeQueue:
             self.size.value += 1
             self.cvar.notify()
 
-    def get(self):
+    def get(self, block=True, timeout=None):
         """
         Fetch the next item in the queue. Blocks until an item is ready.
-        :return: The next unsigned integer in the queue.
+        :param block: If False, return -1 immediately when the queue is empty.
+        :param timeout: If block is True, wait at most timeout seconds and return -1 on expiry.
+        :return: The next unsigned integer in the queue, or -1 if none is available.
         """
         with self.cvar:
             while True:
@@ -63,7 +65,10 @@ class SafeQueue:
                     self.size.value -= 1
                     assert rval >= 0
                     return rval
-                self.cvar.wait()
+                if not block:
+                    return -1
+                if not self.cvar.wait(timeout) and timeout is not None:
+                    return -1
 
     def get_circ_size(self):
         return self.size.value
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import multiprocessing
+import numpy as np
+from framework.common.utils.lock_free_queue_deep import SharedCircBuf
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+from framework.common.config.config_control import CONFIG
+
+
+'''
+基于共享内存环形缓冲区的字节队列, 用于替代进程间传递bytes的multiprocessing.Queue
+1. 预先分配queue_size个固定大小的slot, 每个slot包括数据长度和数据内容
+2. 写方直接将数据写入空闲slot, 读方直接在slot上读取, 去掉了multiprocessing.Queue的pickle/unpickle和pipe拷贝
+3. get返回的是slot上的memoryview, 只在本进程下一次get或者release之前有效, 读方需要在此之前完成解压缩/反序列化
+
+接口和multiprocessing.Queue保持一致, 便于按照配置替换
+'''
+class SharedMemoryQueue(object):
+    LENGTH_KEY = 'length'
+    PAYLOAD_KEY = 'payload'
+
+    def __init__(self, queue_size, slot_size) -> None:
+        self.slot_size = int(slot_size)
+
+        template = {
+            SharedMemoryQueue.LENGTH_KEY: np.zeros(1, dtype=np.int64),
+            SharedMemoryQueue.PAYLOAD_KEY: np.zeros(self.slot_size, dtype=np.uint8)
+        }
+        self.circ_buf = SharedCircBuf(queue_size, template, [SharedMemoryQueue.LENGTH_KEY, SharedMemoryQueue.PAYLOAD_KEY])
+
+        # 本进程当前持有的slot, 在下一次get或者release时归还, 每个进程各自一份
+        self.held_idx = -1
+
+    '''
+    写入数据, 数据超过slot_size时抛出异常
+    block为False时, 队列满则返回False
+    '''
+    def put(self, data, block=True, timeout=None):
+        if not data:
+            return False
+
+        data_len = len(data)
+        if data_len > self.slot_size:
+            raise ValueError(f'data size {data_len} is larger than slot size {self.slot_size}')
+
+        idx = self.circ_buf.write_queue.get(block, timeout)
+        if idx < 0:
+            return False
+
+        length, payload = self.circ_buf.arys[idx]
+        length[0] = data_len
+        payload[:data_len] = np.frombuffer(data, dtype=np.uint8)
+
+        self.circ_buf.read_queue.put(idx)
+        return True
+
+    def put_nowait(self, data):
+        return self.put(data, block=False)
+
+    '''
+    写入numpy数组, 按照dtype直接转换写入slot, 数据类型转换和拷贝只发生一次
+    slot内格式为: 维度数目(int64) + 各维度大小(每维int64) + 数据
+    block为False时, 队列满则返回False
+    '''
+    def put_array(self, array, dtype=None, block=True, timeout=None):
+        array = np.asarray(array)
+        dtype = np.dtype(dtype or array.dtype)
+
+        header_len = (array.ndim + 1) * 8
+        data_len = header_len + array.size * dtype.itemsize
+        if data_len > self.slot_size:
+            raise ValueError(f'data size {data_len} is larger than slot size {self.slot_size}')
+
+        idx = self.circ_buf.write_queue.get(block, timeout)
+        if idx < 0:
+            return False
+
+        length, payload = self.circ_buf.arys[idx]
+        length[0] = data_len
+        header = payload[:header_len].view(np.int64)
+        header[0] = array.ndim
+        header[1:] = array.shape
+        np.copyto(payload[header_len:data_len].view(dtype).reshape(array.shape), array, casting='unsafe')
+
+        self.circ_buf.read_queue.put(idx)
+        return True
+
+    '''
+    写入多个numpy数组, 按照dtypes逐个转换写入同一个slot, 用于需要一起读取的样本数据和model_version等
+    slot内格式为: 数组数目(int64) + 每个数组的put_array格式, 每个数组的数据按照8字节对齐
+    block为False时, 队列满则返回False
+    '''
+    def put_arrays(self, arrays, dtypes, block=True, timeout=None):
+        arrays = [np.asarray(array) for array in arrays]
+        dtypes = [np.dtype(dtype) for dtype in dtypes]
+
+        layout, data_len = [], 8
+        for array, dtype in zip(arrays, dtypes):
+            header_len = (array.ndim + 1) * 8
+            array_len = array.size * dtype.itemsize
+            layout.append((data_len, header_len, array_len))
+            data_len += header_len + (array_len + 7) // 8 * 8
+        if data_len > self.slot_size:
+            raise ValueError(f'data size {data_len} is larger than slot size {self.slot_size}')
+
+        idx = self.circ_buf.write_queue.get(block, timeout)
+        if idx < 0:
+            return False
+
+        length, payload = self.circ_buf.arys[idx]
+        length[0] = data_len
+        payload[:8].view(np.int64)[0] = len(arrays)
+        for array, dtype, (start, header_len, array_len) in zip(arrays, dtypes, layout):
+            header = payload[start:start + header_len].view(np.int64)
+            header[0] = array.ndim
+            header[1:] = array.shape
+            data_start = start + header_len
+            np.copyto(payload[data_start:data_start + array_len].view(dtype).reshape(array.shape), array, casting='unsafe')
+
+        self.circ_buf.read_queue.put(idx)
+        return True
+
+    '''
+    读取数据, 返回slot上的memoryview, 不做拷贝
+    block为False或者超时时, 队列空则返回None
+    '''
+    def get(self, block=True, timeout=None):
+        self.release()
+
+        idx = self.circ_buf.read_queue.get(block, timeout)
+        if idx < 0:
+            return None
+
+        self.held_idx = idx
+        length, payload = self.circ_buf.arys[idx]
+        # 只读视图, 部分解压缩库只接受只读的bytes-like对象
+        return memoryview(payload[:int(length[0])]).toreadonly()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    '''
+    读取put_array写入的numpy数组, 返回slot上的视图, 不做拷贝, 有效期和get一致
+    block为False或者超时时, 队列空则返回None
+    '''
+    def get_array(self, dtype, block=True, timeout=None):
+        self.release()
+
+        idx = self.circ_buf.read_queue.get(block, timeout)
+        if idx < 0:
+            return None
+
+        self.held_idx = idx
+        length, payload = self.circ_buf.arys[idx]
+        ndim = int(payload[:8].view(np.int64)[0])
+        header_len = (ndim + 1) * 8
+        shape = tuple(payload[8:header_len].view(np.int64).tolist())
+
+        return payload[header_len:int(length[0])].view(dtype).reshape(shape)
+
+    '''
+    读取put_arrays写入的numpy数组列表, 返回slot上的视图, 不做拷贝, 有效期和get一致
+    block为False或者超时时, 队列空则返回None
+    '''
+    def get_arrays(self, dtypes, block=True, timeout=None):
+        self.release()
+
+        idx = self.circ_buf.read_queue.get(block, timeout)
+        if idx < 0:
+            return None
+
+        self.held_idx = idx
+        _, payload = self.circ_buf.arys[idx]
+        count = int(payload[:8].view(np.int64)[0])
+
+        arrays, start = [], 8
+        for dtype in dtypes[:count]:
+            dtype = np.dtype(dtype)
+            ndim = int(payload[start:start + 8].view(np.int64)[0])
+            header_len = (ndim + 1) * 8
+            shape = tuple(payload[start + 8:start + header_len].view(np.int64).tolist())
+            array_len = int(np.prod(shape)) * dtype.itemsize
+            data_start = start + header_len
+            arrays.append(payload[data_start:data_start + array_len].view(dtype).reshape(shape))
+            start = data_start + (array_len + 7) // 8 * 8
+
+        return arrays
+
+    '''
+    归还本进程当前持有的slot
+    '''
+    def release(self):
+        if self.held_idx < 0:
+            return
+
+        self.circ_buf.write_queue.put(self.held_idx)
+        self.held_idx = -1
+
+    def qsize(self):
+        return self.circ_buf.get_size()
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def full(self):
+        return self.circ_buf.write_queue.get_circ_size() == 0
+
+
+'''
+估算单个预测请求的最大字节数, 用于设置共享内存环形缓冲区的slot大小
+1. 单个样本的大小为app各个policy的state_space里数组字节数之和的最大值, 加上client_id和compose_id
+2. ActorProxy合并请求时最多合并proxy_batch_size个样本
+3. 压缩在最坏情况下会比原始数据略大, pickle/binary协议还有头部, 按照1/8加上固定的4KB余量估算
+'''
+def estimate_predict_request_size():
+    from framework.common.config.app_conf import AppConf
+
+    sample_size = 0
+    for policy in AppConf[CONFIG.app].policies.values():
+        state_space = policy.state.state_space()
+        sample_size = max(sample_size, sum(int(np.prod(spec.shape)) * np.dtype(spec.dtype).itemsize for spec in state_space.values()))
+    sample_size += (KaiwuDRLDefine.CLIENT_ID_SIZE + KaiwuDRLDefine.COMPOSE_ID_SIZE) * 8
+
+    request_size = sample_size * int(CONFIG.proxy_batch_size)
+    return request_size + request_size // 8 + 4096
+
+
+'''
+按照配置创建actor_server --> predictor的预测请求队列
+1. queue, 采用multiprocessing.Queue
+2. shared_memory, 采用SharedMemoryQueue, actor_server_predict_queue_slot_size小于等于0时按照estimate_predict_request_size设置slot大小
+'''
+def create_predict_request_queue(queue_size):
+    if CONFIG.actor_server_predict_queue_type == KaiwuDRLDefine.PREDICT_QUEUE_TYPE_SHARED_MEMORY:
+        slot_size = int(CONFIG.actor_server_predict_queue_slot_size)
+        if slot_size <= 0:
+            slot_size = estimate_predict_request_size()
+        return SharedMemoryQueue(queue_size, slot_size)
+
+    return multiprocessing.Queue(queue_size)
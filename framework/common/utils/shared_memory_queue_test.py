@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+import numpy as np
+from unittest import mock
+from framework.common.config.config_control import CONFIG
+from framework.interface.array_spec import ArraySpec
+from framework.common.utils.shared_memory_queue import SharedMemoryQueue, estimate_predict_request_size
+
+
+class SharedMemoryQueueTest(unittest.TestCase):
+    def test_put_get(self):
+        queue = SharedMemoryQueue(2, 16)
+        self.assertTrue(queue.empty())
+
+        self.assertTrue(queue.put(b'hello'))
+        self.assertTrue(queue.put(b'world'))
+        self.assertTrue(queue.full())
+        self.assertFalse(queue.put_nowait(b'full'))
+        self.assertEqual(queue.qsize(), 2)
+
+        self.assertEqual(bytes(queue.get()), b'hello')
+        # 上一次get的slot在下一次get时才归还
+        self.assertTrue(queue.full())
+        self.assertEqual(bytes(queue.get()), b'world')
+        self.assertFalse(queue.full())
+
+        self.assertIsNone(queue.get_nowait())
+        self.assertTrue(queue.put_nowait(b'again'))
+
+    def test_put_get_array(self):
+        queue = SharedMemoryQueue(1, 1024)
+        array = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+        self.assertTrue(queue.put_array(array, np.float16))
+        self.assertFalse(queue.put_array(array, np.float16, block=False))
+
+        output = queue.get_array(np.float16)
+        self.assertEqual(output.dtype, np.float16)
+        self.assertEqual(output.shape, (3, 4))
+        self.assertTrue(np.array_equal(output, array))
+
+        with self.assertRaises(ValueError):
+            queue.put_array(np.zeros(1024, dtype=np.float32))
+
+    def test_put_get_arrays(self):
+        queue = SharedMemoryQueue(1, 1024)
+        datas = np.arange(15, dtype=np.float32).reshape(3, 5)
+        model_versions = np.array([[3], [-1], [7]])
+
+        self.assertTrue(queue.put_arrays([datas, model_versions], [np.float16, np.int64]))
+        self.assertFalse(queue.put_arrays([datas, model_versions], [np.float16, np.int64], block=False))
+
+        output_datas, output_versions = queue.get_arrays([np.float16, np.int64])
+        self.assertEqual(output_datas.dtype, np.float16)
+        self.assertTrue(np.array_equal(output_datas, datas))
+        self.assertEqual(output_versions.dtype, np.int64)
+        self.assertEqual(output_versions.tolist(), [[3], [-1], [7]])
+
+        with self.assertRaises(ValueError):
+            queue.put_arrays([np.zeros(1024, dtype=np.float32)], [np.float16])
+
+    def test_oversize(self):
+        queue = SharedMemoryQueue(1, 4)
+        with self.assertRaises(ValueError):
+            queue.put(b'too long')
+
+    def test_estimate_predict_request_size(self):
+        state_spaces = [
+            {'observation': ArraySpec((725, ), np.float32), 'legal_action': ArraySpec((12, 6), np.float32)},
+            {'observation': ArraySpec((10, ), np.float64)},
+        ]
+        policies = {f'policy_{i}': mock.MagicMock(**{'state.state_space.return_value': state_space}) for i, state_space in enumerate(state_spaces)}
+        CONFIG.app = 'test_app'
+        CONFIG.proxy_batch_size = 32
+
+        # 按照最大的policy估算, 加上client_id和compose_id, 乘以proxy_batch_size后加上余量
+        with mock.patch('framework.common.config.app_conf.AppConf', {'test_app': mock.MagicMock(policies=policies)}):
+            request_size = ((725 + 72) * 4 + 5 * 8) * 32
+            self.assertEqual(estimate_predict_request_size(), request_size + request_size // 8 + 4096)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,14 @@ from multiprocessing import Array
 from multiprocessing import Lock
 from multiprocessing import Queue
 from multiprocessing import Pipe
+from multiprocessing import RawArray
+from multiprocessing import Semaphore
+from multiprocessing import Value
 import sys
+try:
+    import _pickle as pickle
+except ImportError:
+    import pickle
 
 
 class _Queue():
@@ -33,46 +40,156 @@ class _Queue():
             #return self.queue._poll(timeout)
 
 
+class _Mailbox():
+    '''
+    共享内存上单个slot的信箱, 接口和_Queue一致
+    1. 每个slot是record_num条固定大小记录组成的FIFO, 每条记录包括序号, 数据长度和数据内容, 同一个group的所有slot共用一块共享内存
+    2. 每个slot只有ActorProxy一个写方和对局一个读方, 写计数和读计数分别只由写方和读方修改, 写满时send抛出RuntimeError
+    3. 写方写完记录后对信号量release, 读方在信号量上等待, 不占用文件句柄
+    4. 记录的序号采用seqlock方式, 写入过程中为奇数, 读方先拷贝数据, 拷贝前后序号不一致则重读, 不会反序列化写了一半的数据
+    '''
+    __slots__=("seqs", "lengths", "counters", "payload", "index", "record_num", "record_size", "sem", "ready")
+
+    def __init__(self, seqs, lengths, counters, payload, index, record_num, record_size):
+        self.seqs = seqs
+        self.lengths = lengths
+        self.counters = counters
+        self.payload = payload
+        self.index = index
+        self.record_num = record_num
+        self.record_size = record_size
+        self.sem = Semaphore(0)
+
+        # 本进程是否已经拿到了信号量, 即poll返回True但是还没有recv
+        self.ready = False
+
+    '''
+    返回第count条数据所在的记录下标
+    '''
+    def _record(self, count):
+        return self.index * self.record_num + count % self.record_num
+
+    def recv(self):
+        if not self.ready:
+            self.sem.acquire()
+        self.ready = False
+
+        read_cnt = self.counters[2 * self.index + 1]
+        record = self._record(read_cnt)
+        offset = record * self.record_size
+        while True:
+            seq = self.seqs[record]
+            if seq & 1:
+                continue
+
+            data = bytes(self.payload[offset:offset + self.lengths[record]])
+            if self.seqs[record] == seq:
+                break
+
+        self.counters[2 * self.index + 1] = read_cnt + 1
+
+        return pickle.loads(data)
+
+    def send(self, obj):
+        data = pickle.dumps(obj, protocol=-1)
+        data_len = len(data)
+        if data_len > self.record_size:
+            raise ValueError(f'data size {data_len} is larger than mailbox record size {self.record_size}')
+
+        write_cnt = self.counters[2 * self.index]
+        if write_cnt - self.counters[2 * self.index + 1] >= self.record_num:
+            raise RuntimeError(f'mailbox of slot {self.index} is full, record num {self.record_num}')
+
+        record = self._record(write_cnt)
+        offset = record * self.record_size
+        self.seqs[record] += 1
+        self.payload[offset:offset + data_len] = data
+        self.lengths[record] = data_len
+        self.seqs[record] += 1
+        self.counters[2 * self.index] = write_cnt + 1
+
+        self.sem.release()
+
+    def poll(self, timeout=0):
+        if not self.ready:
+            if timeout == 0:
+                self.ready = self.sem.acquire(False)
+            else:
+                self.ready = self.sem.acquire(True, timeout)
+
+        return self.ready
+
+
+'''
+按照slot_num创建group下所有slot的信箱, 每个slot有record_num条记录
+'''
+def _create_mailboxes(slot_num, record_num, record_size):
+    seqs = RawArray('q', slot_num * record_num)
+    lengths = RawArray('q', slot_num * record_num)
+    counters = RawArray('q', slot_num * 2)
+    payload = memoryview(RawArray('b', slot_num * record_num * record_size)).cast('B')
+
+    return [_Mailbox(seqs, lengths, counters, payload, i, record_num, record_size) for i in range(slot_num)]
+
+
 '''
-因为会使用到multiprocessing.SemLock, 故需要修改ulimit -n 10000, 其配置值是CONFIG.max_tcp_count, 其配置的值是多少, 则需要ulimit -n修改成该值
+slot管理和预测响应的分发, 每个group(即ActorProxy)下每个slot一个通道
+1. use_mailbox为False时, 每个slot一个multiprocessing.Pipe, 需要修改ulimit -n 10000, 其配置值是CONFIG.max_tcp_count, 其配置的值是多少, 则需要ulimit -n修改成该值
+2. use_mailbox为True时, 每个slot一个共享内存信箱, 不占用文件句柄, 最多缓存record_num条未读取的响应, 每条记录大小为record_size
+空闲的slot采用空闲栈管理, get_slot和put_slot都是O(1)
 '''
 class Slots:
-    __slots__=("lock", "slot_num", "slots", "pipes", "max_buf")
+    __slots__=("lock", "slot_num", "slots", "pipes", "max_buf", "free_slots", "free_count", "use_mailbox", "record_size", "record_num")
     
-    def __init__(self, slot_num, max_buf=0):
+    def __init__(self, slot_num, max_buf=0, use_mailbox=False, record_size=65536, record_num=4):
         self.lock = Lock()
         self.slot_num = slot_num
         self.slots = Array('i', self.slot_num, lock=False)
         self.pipes = {}
         self.max_buf = max_buf
+        self.use_mailbox = use_mailbox
+        self.record_size = record_size
+        self.record_num = record_num
+
+        # 空闲栈, 栈顶为slot_id最小的空闲slot
+        self.free_slots = Array('i', range(self.slot_num - 1, -1, -1), lock=False)
+        self.free_count = Value('i', self.slot_num, lock=False)
 
     def register_group(self, group_name):
-        self.pipes[group_name] = [_Queue(self.max_buf) for _ in range(self.slot_num)]
+        if self.use_mailbox:
+            self.pipes[group_name] = _create_mailboxes(self.slot_num, self.record_num, self.record_size)
+        else:
+            self.pipes[group_name] = [_Queue(self.max_buf) for _ in range(self.slot_num)]
 
     def get_slot(self):
         with self.lock:
-            for i in range(len(self.slots)):
-                if self.slots[i] == 0:
-                    # skip expired data
-                    for group_name in self.pipes:
-                        input_pipe = self.get_input_pipe(group_name, i)
-                        while input_pipe.poll():
-                            input_pipe.recv()
-                    self.slots[i] = 1
-                    return i
-            raise RuntimeError("can't find empty slots")
+            if self.free_count.value <= 0:
+                raise RuntimeError("can't find empty slots")
+
+            self.free_count.value -= 1
+            i = self.free_slots[self.free_count.value]
+
+            # skip expired data
+            for group_name in self.pipes:
+                input_pipe = self.get_input_pipe(group_name, i)
+                while input_pipe.poll():
+                    input_pipe.recv()
+            self.slots[i] = 1
+            return i
 
     def used_slot(self):
-        cnt = 0
         with self.lock:
-            for i in range(len(self.slots)):
-                if self.slots[i] == 1:
-                    cnt += 1
-            return cnt
+            return self.slot_num - self.free_count.value
 
     def put_slot(self, i):
         with self.lock:
+            # 重复归还时忽略
+            if self.slots[i] == 0:
+                return
+
             self.slots[i] = 0
+            self.free_slots[self.free_count.value] = i
+            self.free_count.value += 1
 
     def get_input_pipe(self, group_name, i):
         return self.pipes[group_name][i]
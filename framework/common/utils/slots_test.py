@@ -30,6 +30,84 @@ class SlotsV2Test(unittest.TestCase):
         slots.put_slot(slot_id)
         self.assertEqual(slots.used_slot(), 0)
 
+    def test_free_list(self):
+        slots = Slots(4)
+        ids = [slots.get_slot() for _ in range(4)]
+        self.assertEqual(ids, [0, 1, 2, 3])
+        self.assertRaises(RuntimeError, slots.get_slot)
+
+        # 归还后优先复用, 重复归还忽略
+        slots.put_slot(2)
+        slots.put_slot(2)
+        self.assertEqual(slots.used_slot(), 3)
+        self.assertEqual(slots.get_slot(), 2)
+
+    def test_mailbox(self):
+        slots = Slots(8, use_mailbox=True, record_size=1024)
+        slots.register_group("g_a")
+
+        slot_id = slots.get_slot()
+        output_pipe = slots.get_output_pipe("g_a", slot_id)
+        input_pipe = slots.get_input_pipe("g_a", slot_id)
+        self.assertFalse(input_pipe.poll())
+
+        output_pipe.send({0: {'format_action': [1, 2, 3]}})
+        self.assertTrue(input_pipe.poll(0.1))
+        self.assertEqual(input_pipe.recv(), {0: {'format_action': [1, 2, 3]}})
+
+        # 其他slot的信箱不受影响
+        self.assertFalse(slots.get_input_pipe("g_a", slot_id + 1).poll())
+
+        self.assertRaises(ValueError, output_pipe.send, b'x' * 2048)
+
+        # 重新分配slot时丢弃过期数据
+        output_pipe.send("expired")
+        slots.put_slot(slot_id)
+        self.assertEqual(slots.get_slot(), slot_id)
+        self.assertFalse(input_pipe.poll())
+
+    def test_mailbox_fifo(self):
+        slots = Slots(2, use_mailbox=True, record_size=1024, record_num=3)
+        slots.register_group("g_a")
+
+        slot_id = slots.get_slot()
+        output_pipe = slots.get_output_pipe("g_a", slot_id)
+        input_pipe = slots.get_input_pipe("g_a", slot_id)
+
+        # 同一个slot读取前收到多个响应, 按照顺序全部保留
+        for agent_id in range(3):
+            output_pipe.send({agent_id: {'format_action': [agent_id]}})
+        self.assertRaises(RuntimeError, output_pipe.send, {3: {}})
+
+        for agent_id in range(3):
+            self.assertTrue(input_pipe.poll())
+            self.assertEqual(input_pipe.recv(), {agent_id: {'format_action': [agent_id]}})
+        self.assertFalse(input_pipe.poll())
+
+        # 读取后可以继续写入, 记录循环复用
+        for i in range(5):
+            output_pipe.send(i)
+            self.assertEqual(input_pipe.recv(), i)
+
+    def test_mailbox_torn_read(self):
+        slots = Slots(1, use_mailbox=True, record_size=1024, record_num=1)
+        slots.register_group("g_a")
+        mailbox = slots.get_input_pipe("g_a", 0)
+        mailbox.send("complete")
+
+        # 模拟写入过程中被读取, 第1次拷贝后序号变化, 需要重读
+        seqs = mailbox.seqs
+        reads = []
+
+        class Seqs(object):
+            def __getitem__(self, i):
+                reads.append(i)
+                return seqs[i] + (2 if len(reads) == 2 else 0)
+
+        mailbox.seqs = Seqs()
+        self.assertEqual(mailbox.recv(), "complete")
+        self.assertEqual(len(reads), 4)
+
 
 if __name__ == '__main__':
     unittest.main()
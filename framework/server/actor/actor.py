@@ -24,6 +24,7 @@ from framework.common.config.app_conf import AppConf
 from framework.common.config.algo_conf import AlgoConf
 from framework.common.utils.common_func import get_local_rank, get_gpu_machine_type
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+from framework.common.utils.shared_memory_queue import create_predict_request_queue
 
 def proc_flags(configure_file):
     CONFIG.set_configure_file(configure_file)
@@ -57,7 +58,7 @@ sgame_1v1:
 3. actor_server_async = False
 4. python_cpp_daemon = False
 5. cpp_daemon_send_recv_zmq_data = False
-6. aisrv_actor_protocl = pickle
+6. aisrv_actor_protocl = pickle or binary
 7. use_which_deep_learning_framework = tensorflow_simple
 
 sgame_5v5:
@@ -80,7 +81,7 @@ def app_check_param():
             CONFIG.python_cpp_daemon = False
         if CONFIG.cpp_daemon_send_recv_zmq_data:
             CONFIG.cpp_daemon_send_recv_zmq_data = False
-        if CONFIG.aisrv_actor_protocl != KaiwuDRLDefine.PROTOCL_PICKLE:
+        if CONFIG.aisrv_actor_protocl not in (KaiwuDRLDefine.PROTOCL_PICKLE, KaiwuDRLDefine.PROTOCL_BINARY):
             CONFIG.aisrv_actor_protocl = KaiwuDRLDefine.PROTOCL_PICKLE
         if CONFIG.use_which_deep_learning_framework != KaiwuDRLDefine.MODEL_TENSORFLOW_SIMPLE:
             CONFIG.use_which_deep_learning_framework = KaiwuDRLDefine.MODEL_TENSORFLOW_SIMPLE
@@ -165,7 +166,7 @@ def predictor_loop(actor_send_server, actor_recv_server, monitor_proxy):
             predict_conn, actor_server_conn = multiprocessing.Pipe(duplex=False)
             '''
 
-            predict_request_queue = multiprocessing.Queue(CONFIG.queue_size)
+            predict_request_queue = create_predict_request_queue(CONFIG.queue_size)
 
             predictor_queues.append(predict_request_queue)
 
@@ -199,6 +200,30 @@ def predictor_loop(actor_send_server, actor_recv_server, monitor_proxy):
         actor_send_server.start()
 
 
+'''
+创建ActorServer, 返回(actor_send_server, actor_recv_server)
+如果采用的是异步方式: actor_server从zmq_server的收发进程是2个独立的
+如果采用的是同步方式: actor_server从zmq_server的收发进程是1个
+'''
+def create_actor_server(monitor_proxy):
+    if CONFIG.actor_server_async:
+        from framework.server.actor.actor_server_async import ActorServerASync
+        actor_server_async = ActorServerASync()
+        actor_send_server = actor_server_async.get_actor_send_server()
+        actor_recv_server = actor_server_async.get_actor_recv_server()
+        if CONFIG.use_prometheus:
+            actor_send_server.set_monitor_proxy(monitor_proxy)
+            actor_recv_server.set_monitor_proxy(monitor_proxy)
+
+    else:
+        from framework.server.actor.actor_server_sync import ActorServerSync
+        actor_send_server = ActorServerSync()
+        actor_recv_server = actor_send_server
+        if CONFIG.use_prometheus:
+            actor_send_server.set_monitor_proxy(monitor_proxy)
+
+    return actor_send_server, actor_recv_server
+
 '''
 流程如下:
 1. 判定当前GPU机器类型
@@ -254,26 +279,7 @@ def main():
         monitor_proxy.start()
     
     # 步骤6, 启动ActorServer, libzmqops.so和interface.so的protoc版本不兼容, 需要在这里import
-    
-    '''
-    如果采用的是异步方式: actor_server从zmq_server的收发进程是2个独立的
-    如果采用的是同步方式: actor_server从zmq_server的收发进程是1个
-    '''
-    if CONFIG.actor_server_async:
-        from framework.server.actor.actor_server_async import ActorServerASync
-        actor_server_async = ActorServerASync()
-        actor_send_server = actor_server_async.get_actor_send_server()
-        actor_recv_server = actor_server_async.get_actor_recv_server()
-        if CONFIG.use_prometheus:
-            actor_send_server.set_monitor_proxy(monitor_proxy)
-            actor_recv_server.set_monitor_proxy(monitor_proxy)
-
-    else:
-        from framework.server.actor.actor_server_sync import ActorServerSync
-        actor_send_server = ActorServerSync()
-        actor_recv_server = actor_send_server
-        if CONFIG.use_prometheus:
-            actor_send_server.set_monitor_proxy(monitor_proxy)
+    actor_send_server, actor_recv_server = create_actor_server(monitor_proxy)
 
     # 步骤7, 开始预测
     predictor_loop(actor_send_server, actor_recv_server, monitor_proxy)
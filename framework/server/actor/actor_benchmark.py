@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+'''
+actor端到端的预测吞吐压测, 不需要启动gamecore和aisrv:
+1. 按照actor.py的流程启动ActorServer和OnPolicyPredictor(CPU), 或者用--actor_address压测已经启动的actor
+2. generator进程模拟多个ActorProxy, 每个模拟的ActorProxy有独立的client_id和zmq连接, 和ActorProxy一样串行收发:
+   发送1个消息(包括requests_per_message个请求)后等待响应, 收到响应后按照request_rate发送下一个
+3. 请求的内容按照业务State的state_space(sgame_1v1为SgameState)随机生成, 序列化和压缩与ActorProxy.serialize_buffer_data一致
+
+协议按照配置项aisrv_actor_protocl和aisrv_actor_communication_way, 用--protocol和--communication_way指定:
+1. pickle/binary, zmq/zmq_ops, 本地启动的python actor只支持这两种协议
+2. protobuf, 只支持单个请求的消息, python actor的sgame_1v1会强制修正为pickle, 需要用--actor_address压测C++ actor
+
+每隔report_interval秒打印一次, 结束时打印warmup之后的汇总:
+1. 吞吐, 请求数/s和消息数/s, 超时数
+2. 往返时延, 从发送消息到收到响应的耗时分位数
+3. 批处理大小分布, 本地启动actor时统计predictor每次预测的样本数
+4. CPU耗时占比, 按照actor_server, predictor, generator进程统计user/system
+
+python3 framework/server/actor/actor_benchmark.py --duration 120 --client_num 64 --protocol pickle --communication_way zmq
+python3 framework/server/actor/actor_benchmark.py --duration 120 --client_num 64 --protocol binary --requests_per_message 4 --set predict_batch_size=64
+'''
+
+import os
+import time
+import queue
+import argparse
+import multiprocessing
+import psutil
+import numpy as np
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config_file', default='conf/framework/actor.toml', type=str)
+parser.add_argument('--duration', default=120, type=int, help='total seconds, include warmup')
+parser.add_argument('--warmup', default=20, type=int, help='seconds not counted in the summary')
+parser.add_argument('--report_interval', default=10, type=int)
+parser.add_argument('--protocol', default='pickle', choices=['pickle', 'binary', 'protobuf'])
+parser.add_argument('--communication_way', default='zmq', choices=['zmq', 'zmq_ops'])
+parser.add_argument('--client_num', default=32, type=int, help='simulated ActorProxy count, i.e. concurrency')
+parser.add_argument('--generator_process_num', default=2, type=int)
+parser.add_argument('--request_rate', default=0, type=float, help='messages/s per client, 0 means send after each response')
+parser.add_argument('--requests_per_message', default=1, type=int, help='coalesced requests per message, like actor_proxy_coalesce_window_ms')
+parser.add_argument('--timeout', default=5, type=float, help='seconds to wait for a response before reconnect')
+parser.add_argument('--actor_address', default='', type=str, help='ip of a running actor, empty means start one locally')
+parser.add_argument('--set', default=[], action='append', help='config override key=value, can be repeated')
+
+args = parser.parse_args()
+
+from framework.common.config.config_control import CONFIG
+from framework.common.config.app_conf import AppConf
+from framework.common.config.algo_conf import AlgoConf
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+from framework.common.utils.common_func import get_uuid, compress_predict_request, decompress_data
+from framework.common.ipc.zmq_util import ZmqClient, ZmqOpsClient
+from framework.common.monitor.histogram import LogLinearHistogram
+from framework.common.monitor.process_cpu_stat import ProcessCpuStat
+from framework.common.protocol.aisrv_actor_req_resp_pb2 import AisrvActorRequest, AisrvActorResponse
+import framework.server.actor.actor as actor
+
+
+'''
+压测固定的配置, 在解析配置文件时按照环境变量覆盖, 关闭prometheus, alloc, rainbow等外部依赖
+'''
+BENCHMARK_CONFIG = {
+    'actor_device_type': 'cpu',
+    'run_mode': KaiwuDRLDefine.RUN_MODEL_TRAIN,
+    'use_prometheus': 'False',
+    'use_alloc': 'False',
+    'use_rainbow': 'False',
+}
+
+# 批处理大小分布的最大值, 超过的按照最大值统计
+MAX_BATCH_SIZE = 4096
+
+
+def parse_config():
+    overrides = dict(BENCHMARK_CONFIG)
+    overrides['aisrv_actor_protocl'] = args.protocol
+    overrides['aisrv_actor_communication_way'] = args.communication_way
+    for item in args.set:
+        key, value = item.split('=', 1)
+        overrides[key.strip()] = value.strip()
+
+    os.environ.update(overrides)
+    actor.proc_flags(args.config_file)
+
+
+'''
+模拟的单个ActorProxy, 同一时间最多只有1个消息在等待响应
+'''
+class SimulatedActorProxy(object):
+    def __init__(self, slot_id, actor_address, state_space) -> None:
+        self.slot_id = slot_id
+        self.actor_address = actor_address
+        self.client_id = get_uuid()
+        self.use_zmq_ops = (CONFIG.aisrv_actor_communication_way == KaiwuDRLDefine.COMMUNICATION_WAY_ZMQ_OPS)
+        self.use_protobuf = (CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PROTOBUF)
+
+        # 和ActorProxy.buffer_data一致, 合法动作的mask全部为1
+        count = args.requests_per_message
+        rng = np.random.default_rng(self.client_id)
+        self.state_keys = list(state_space.keys())
+        self.buffer_data = {}
+        for key, spec in state_space.items():
+            if 'legal' in key or 'mask' in key:
+                self.buffer_data[key] = np.ones((count, ) + spec.shape, spec.dtype)
+            else:
+                self.buffer_data[key] = (rng.standard_normal((count, ) + spec.shape) * 0.1).astype(spec.dtype)
+
+        self.client_id_buf = np.full(count, self.client_id, np.int32)
+        self.compose_id_buf = np.zeros((count, KaiwuDRLDefine.COMPOSE_ID_SIZE), np.int32)
+        self.compose_id_buf[:, 0] = slot_id
+        self.compose_id_buf[:, 1] = np.arange(count)
+        self.compose_id_buf[:, 3] = -1
+
+        self.message_id = 0
+        self.send_time = None
+        self.next_send_time = 0
+
+        self.zmq_client = ZmqClient(str(self.client_id), self.actor_address, CONFIG.zmq_server_port)
+        if self.use_zmq_ops:
+            from framework.common.pybind11.zmq_ops.zmq_ops import dump_arrays
+            self.dump_arrays = dump_arrays
+            self.zmq_ops_client = ZmqOpsClient(str(self.client_id), self.actor_address, CONFIG.zmq_server_op_port)
+        self.connect()
+
+    def connect(self):
+        self.zmq_client.connect()
+        if self.use_zmq_ops:
+            self.zmq_ops_client.connect()
+
+    def close(self):
+        self.zmq_client.close()
+        if self.use_zmq_ops:
+            self.zmq_ops_client.close()
+
+    @property
+    def waiting(self):
+        return self.send_time is not None
+
+    '''
+    和ActorProxy.serialize_buffer_data一致
+    '''
+    def serialize(self):
+        if self.use_protobuf:
+            request = AisrvActorRequest()
+            request.client_id = self.client_id
+            request.sample_size = 1
+            request.compose_id.extend(self.compose_id_buf[:1].flatten().tolist())
+            input_array = np.concatenate([self.buffer_data['observation'][0], self.buffer_data['lstm_cell'][0],
+                                          self.buffer_data['lstm_hidden'][0]], axis=-1).reshape(-1)
+            request.feature.extend(input_array.tolist())
+            msg = request
+        else:
+            msg = [self.buffer_data[key] for key in self.state_keys] + [self.client_id_buf, self.compose_id_buf]
+
+        msg = compress_predict_request(msg)
+        if self.use_zmq_ops:
+            return self.dump_arrays(msg)
+
+        return msg
+
+    def send(self):
+        self.message_id += 1
+        self.compose_id_buf[:, 2] = self.message_id
+        msg = self.serialize()
+
+        self.send_time = time.monotonic()
+        if self.use_zmq_ops:
+            self.zmq_ops_client.send(msg)
+
+            # 和ActorProxy一致, 发送心跳让actor知道回包的client_id
+            self.zmq_client.send(b'heartbeat', binary=True)
+        else:
+            self.zmq_client.send(msg, binary=True)
+
+    '''
+    收到响应时返回(往返耗时, 响应里的请求数), 没有响应时返回None
+    '''
+    def recv(self):
+        if not self.zmq_client.readable():
+            return None
+
+        data = decompress_data(self.zmq_client.recv(binary=True))
+        now = time.monotonic()
+        if self.use_protobuf:
+            response = AisrvActorResponse()
+            response.ParseFromString(data)
+            count = 1
+        else:
+            count = len(data)
+
+        round_trip_time = now - self.send_time
+        self.send_time = None
+        self.next_send_time = now + 1 / args.request_rate if args.request_rate > 0 else now
+
+        return round_trip_time, count
+
+    '''
+    超时后重新建立连接, REQ类型的socket在没有收到响应时不能再发送
+    先关闭旧的socket, 复用context, 避免持续超时时泄漏socket和文件句柄
+    '''
+    def reset(self):
+        self.send_time = None
+        self.close()
+        self.connect()
+
+
+'''
+generator进程, 每隔report_interval秒将统计项放入stat_queue
+'''
+def generator_proc(idx, client_num, actor_address, stat_queue, exit_flag):
+    policy_name = next(iter(AppConf[CONFIG.app].policies))
+    state_space = AppConf[CONFIG.app].policies[policy_name].state.state_space()
+    clients = [SimulatedActorProxy(idx * client_num + i, actor_address, state_space) for i in range(client_num)]
+
+    # 往返时延(微秒)
+    round_trip_time_histogram = LogLinearHistogram()
+    request_count, message_count, timeout_count = 0, 0, 0
+    next_report_time = time.monotonic() + args.report_interval
+
+    while not exit_flag.value:
+        now = time.monotonic()
+        progressed = False
+        for client in clients:
+            if not client.waiting:
+                if now >= client.next_send_time:
+                    client.send()
+                    progressed = True
+                continue
+
+            result = client.recv()
+            if result:
+                round_trip_time, count = result
+                round_trip_time_histogram.record(round_trip_time * 1000000)
+                request_count += count
+                message_count += 1
+                progressed = True
+
+            elif now - client.send_time > args.timeout:
+                timeout_count += 1
+                client.reset()
+
+        if now >= next_report_time:
+            stat_queue.put((request_count, message_count, timeout_count, round_trip_time_histogram.drain()))
+            request_count, message_count, timeout_count = 0, 0, 0
+            next_report_time += args.report_interval
+
+        # 所有模拟的ActorProxy都在等待时短暂让出CPU
+        if not progressed:
+            time.sleep(0.0001)
+
+    for client in clients:
+        client.close()
+
+
+'''
+统计predictor每次预测的样本数, 在启动predictor进程前替换predict_batch, predictor进程fork后继承
+'''
+def hook_predict_batch_size(batch_size_counts):
+    predictor_class = AlgoConf[CONFIG.algo].predictor
+    predict_batch = predictor_class.predict_batch
+
+    def counted_predict_batch(self, datas, flatten=True):
+        sizes, res_msgs = predict_batch(self, datas, flatten)
+        with batch_size_counts.get_lock():
+            batch_size_counts[min(len(res_msgs), MAX_BATCH_SIZE)] += 1
+
+        return sizes, res_msgs
+
+    predictor_class.predict_batch = counted_predict_batch
+
+
+'''
+启动本地的actor, 返回ActorServer进程的pid和predictor等其他进程的pid
+'''
+def start_actor(batch_size_counts):
+    hook_predict_batch_size(batch_size_counts)
+
+    current_process = psutil.Process()
+    before = set(child.pid for child in current_process.children())
+
+    actor_send_server, actor_recv_server = actor.create_actor_server(None)
+    actor.predictor_loop(actor_send_server, actor_recv_server, None)
+
+    actor_server_pids = set([actor_send_server.pid, actor_recv_server.pid])
+    other_pids = set(child.pid for child in current_process.children()) - before - actor_server_pids
+
+    return actor_server_pids, other_pids
+
+
+class Report(object):
+    def __init__(self, stat_queue, batch_size_counts, cpu_stat):
+        self.stat_queue = stat_queue
+        self.batch_size_counts = batch_size_counts
+        self.cpu_stat = cpu_stat
+
+        self.last = self.snapshot()
+        self.begin = None
+        self.total = self.empty_stat()
+
+    def empty_stat(self):
+        return {'request': 0, 'message': 0, 'timeout': 0, 'round_trip_time': LogLinearHistogram()}
+
+    def snapshot(self):
+        return {
+            'time': time.monotonic(),
+            'batch_size_counts': np.array(self.batch_size_counts[:], dtype=np.int64),
+            'cpu': self.cpu_stat.times(),
+        }
+
+    def collect(self):
+        stat = self.empty_stat()
+        while True:
+            try:
+                request_count, message_count, timeout_count, round_trip_time_histogram = self.stat_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            stat['request'] += request_count
+            stat['message'] += message_count
+            stat['timeout'] += timeout_count
+            stat['round_trip_time'].merge(round_trip_time_histogram)
+
+        return stat
+
+    @staticmethod
+    def format_batch_size(batch_size_counts):
+        total = int(batch_size_counts.sum())
+        if not total:
+            return 'batch size: no predict'
+
+        sizes = np.arange(len(batch_size_counts))
+        cumulative = np.cumsum(batch_size_counts)
+        p50, p99 = [int(np.searchsorted(cumulative, total * p / 100)) for p in (50, 99)]
+        top = np.argsort(batch_size_counts)[::-1][:5]
+        distribution = ', '.join(f'{int(size)}:{batch_size_counts[size] / total * 100:.0f}%' for size in top if batch_size_counts[size])
+
+        return (f'batch size: predicts {total}, mean {(sizes * batch_size_counts).sum() / total:.1f}, p50 {p50}, p99 {p99}, '
+                f'max {int(sizes[batch_size_counts > 0][-1])}, top {distribution}')
+
+    def format(self, last, current, stat):
+        interval = max(current['time'] - last['time'], 1e-6)
+        round_trip_time = stat['round_trip_time']
+
+        return [
+            f"requests/s {stat['request'] / interval:.1f}, messages/s {stat['message'] / interval:.1f}, timeout {stat['timeout']}",
+            f"round trip ms: mean {round_trip_time.mean() / 1000:.2f}, p50 {round_trip_time.percentile(50) / 1000:.2f}, "
+            f"p99 {round_trip_time.percentile(99) / 1000:.2f}, max {round_trip_time.max_value / 1000:.2f}",
+            self.format_batch_size(current['batch_size_counts'] - last['batch_size_counts']),
+            'cpu user/system: ' + ProcessCpuStat.format_usage(last['cpu'], current['cpu'], interval),
+        ]
+
+    '''
+    周期性打印, 第一次在warmup之后调用时开始汇总
+    '''
+    def report(self, in_warmup):
+        current = self.snapshot()
+        stat = self.collect()
+        if not in_warmup:
+            if self.begin is None:
+                self.begin = self.last
+            self.total['request'] += stat['request']
+            self.total['message'] += stat['message']
+            self.total['timeout'] += stat['timeout']
+            self.total['round_trip_time'].merge(stat['round_trip_time'])
+
+        lines = self.format(self.last, current, stat)
+        print(f"{'[warmup] ' if in_warmup else ''}" + '\n    '.join(lines), flush=True)
+
+        self.last = current
+
+    def summary(self):
+        if self.begin is None:
+            print('no summary, duration is not longer than warmup')
+            return
+
+        print('======== summary ========')
+        print('\n'.join(self.format(self.begin, self.last, self.total)), flush=True)
+
+
+def main():
+    parse_config()
+
+    if not args.actor_address:
+        if args.protocol == KaiwuDRLDefine.PROTOCL_PROTOBUF:
+            print('protobuf is only served by the C++ actor, please set --actor_address')
+            return
+
+        if not actor.check_param():
+            print('conf param error, please check')
+            return
+
+    if args.protocol == KaiwuDRLDefine.PROTOCL_PROTOBUF and args.requests_per_message != 1:
+        print('protobuf not support requests_per_message > 1')
+        return
+
+    cpu_stat = ProcessCpuStat()
+    batch_size_counts = multiprocessing.Array('q', MAX_BATCH_SIZE + 1)
+    actor_address = args.actor_address
+    if not actor_address:
+        actor_address = CONFIG.ip_address
+        actor_server_pids, other_pids = start_actor(batch_size_counts)
+        for pid in actor_server_pids:
+            cpu_stat.add('actor_server', pid)
+        for pid in other_pids:
+            cpu_stat.add('predictor', pid)
+
+    stat_queue = multiprocessing.Queue()
+    exit_flag = multiprocessing.Value('b', False)
+    client_nums = [args.client_num // args.generator_process_num + (1 if i < args.client_num % args.generator_process_num else 0)
+                   for i in range(args.generator_process_num)]
+    generators = []
+    for i, client_num in enumerate(client_nums):
+        generator = multiprocessing.Process(target=generator_proc, args=(i, client_num, actor_address, stat_queue, exit_flag), name=f'generator_{i}')
+        generator.daemon = True
+        generator.start()
+        generators.append(generator)
+        cpu_stat.add('generator', generator.pid)
+
+    report = Report(stat_queue, batch_size_counts, cpu_stat)
+
+    print(f'actor benchmark start, actor_address {actor_address}, protocol {CONFIG.aisrv_actor_protocl}, '
+          f'communication_way {CONFIG.aisrv_actor_communication_way}, predict_batch_size {CONFIG.predict_batch_size}, '
+          f'client_num {args.client_num}, requests_per_message {args.requests_per_message}, request_rate {args.request_rate}', flush=True)
+
+    start = time.monotonic()
+    try:
+        while time.monotonic() - start < args.duration:
+            time.sleep(args.report_interval)
+            report.report(in_warmup=time.monotonic() - start < args.warmup)
+
+    except KeyboardInterrupt:
+        pass
+
+    report.summary()
+
+    exit_flag.value = True
+    for generator in generators:
+        generator.join(timeout=5)
+
+    # actor的各个进程没有退出标志, 直接结束进程
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
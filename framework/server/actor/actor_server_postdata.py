@@ -147,8 +147,9 @@ class ActorServerPostData(multiprocessing.Process):
                 send_data = pred['pred']
                 client_id = client_ids[0]
                 compose_id = compose_ids[0]
-                res = [(tuple(compose_id), send_data)]
-                dict_obj[client_id] = res
+                # 同一个ActorProxy合并的多个slot共用client_id, 需要追加而不是覆盖
+                list_obj = dict_obj.setdefault(client_id, [])
+                list_obj.append((tuple(compose_id), send_data))
             else:
                 send_data = {
                     'format_action': pred['pred'][0],
@@ -22,7 +22,7 @@ import time
 from framework.common.config.config_control import CONFIG
 from framework.common.utils.slots import Slots
 from framework.common.pybind11.zmq_ops import *
-from framework.common.utils.common_func import TimeIt, Context, set_schedule_event, compress_data, decompress_data
+from framework.common.utils.common_func import TimeIt, Context, set_schedule_event, compress_data, decompress_data, decompress_predict_request
 from framework.common.logging.kaiwu_logger import KaiwuLogger, g_not_server_label
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.monitor.monitor_proxy import MonitorProxy
@@ -95,9 +95,9 @@ class ActorServerPreData(multiprocessing.Process):
     def actor_server_predata(self):
         data = self.zmq_receive_server.get_from_to_predict_queue()
         if data:
-            # 增加压缩和解压缩耗时
+            # 增加压缩和解压缩耗时, 解码后的数据会异步放入队列, binary协议下需要从消息里拷贝出来
             with TimeIt() as ti:
-                decompressed_data = decompress_data(data)
+                decompressed_data = decompress_predict_request(data, copy=True)
             if self.max_decompress_time < ti.interval:
                 self.max_decompress_time = ti.interval
 
@@ -29,11 +29,13 @@ import datetime
 import traceback
 import schedule
 import lz4.block
+import numpy as np
 from framework.common.ipc.zmq_util import ZmqServer, ZmqPoller
 from framework.common.config.config_control import CONFIG
 from framework.common.utils.slots import Slots
+from framework.common.utils.shared_memory_queue import create_predict_request_queue
 from framework.common.pybind11.zmq_ops import *
-from framework.common.utils.common_func import TimeIt, Context, set_schedule_event, compress_data, decompress_data
+from framework.common.utils.common_func import TimeIt, Context, set_schedule_event, compress_data, decompress_data, decompress_predict_request
 from framework.common.logging.kaiwu_logger import KaiwuLogger, g_not_server_label
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.monitor.monitor_proxy import MonitorProxy
@@ -86,7 +88,8 @@ class ActorServerSync(multiprocessing.Process):
             if CONFIG.actor_server_predict_server_different_queue:
                 self.predict_request_queues = None
             else:
-                self.predict_request_queue = multiprocessing.Queue(CONFIG.queue_size)
+                # 按照配置采用multiprocessing.Queue或者共享内存环形缓冲区
+                self.predict_request_queue = create_predict_request_queue(CONFIG.queue_size)
 
         # 统计指标
         self.send_to_aisrv_succ_cnt = 0
@@ -106,6 +109,9 @@ class ActorServerSync(multiprocessing.Process):
         # actor_server从zmq获取数据放入本地队列报错次数
         self.actor_server_queue_full_cnt = 0
 
+        # 预测请求超过共享内存slot大小, 直接返回错误响应的次数
+        self.actor_server_request_too_large_cnt = 0
+
         # 如果是队列设置在predict里, 则actor_server需要记录下当前的predict_queue的
         if CONFIG.actor_server_predict_server_different_queue:
             self.predict_request_queue = None
@@ -178,6 +184,7 @@ class ActorServerSync(multiprocessing.Process):
         self.recv_from_aisrv_succ_cnt = 0
         self.recv_from_aisrv_error_cnt = 0
         self.actor_server_queue_full_cnt = 0
+        self.actor_server_request_too_large_cnt = 0
         
         self.actor_send_to_aisrv_batch_cost_time_ms = 0
         self.max_compress_time = 0
@@ -207,6 +214,7 @@ class ActorServerSync(multiprocessing.Process):
                 # KaiwuDRLDefine.MONITOR_ACTOR_MAX_DECOMPRESS_TIME : self.max_decompress_time,
                 # KaiwuDRLDefine.MONITOR_ACTOR_MAX_COMPRESS_SIZE : self.max_compress_size,
                 KaiwuDRLDefine.MONITOR_ACTOR_SERVER_QUEUE_FULL_CNT : self.actor_server_queue_full_cnt,
+                KaiwuDRLDefine.MONITOR_ACTOR_SERVER_REQUEST_TOO_LARGE_CNT : self.actor_server_request_too_large_cnt,
                 KaiwuDRLDefine.MONITOR_ACTOR_SERVER_REQUEST_QUEUE_SIZE : actor_server_request_queue_size,
                 KaiwuDRLDefine.MONITOR_ACTOR_SERVER_RESULT_QUEUE_SIZE : actor_server_result_queue_size,
             }
@@ -240,7 +248,7 @@ class ActorServerSync(multiprocessing.Process):
     def send_response_to_aisrv(self, size, pred):
 
         if CONFIG.distributed_tracing:
-            self.logger.info(f'actor_server distributed_tracing send_response_to_aisrv start', g_not_server_label)
+            self.logger.info('actor_server distributed_tracing send_response_to_aisrv start', g_not_server_label)
     
         client_ids = pred.pop(KaiwuDRLDefine.CLIENT_ID_TENSOR)
         compose_ids = pred.pop(KaiwuDRLDefine.COMPOSE_ID_TENSOR)
@@ -265,10 +273,10 @@ class ActorServerSync(multiprocessing.Process):
                 self.send_to_aisrv_succ_cnt += 1
 
                 if CONFIG.distributed_tracing:
-                    self.logger.info(f'actor_server distributed_tracing zmq server send a new msg to {compose_id} success', g_not_server_label)
+                    self.logger.info('actor_server distributed_tracing zmq server send a new msg to {} success', compose_id, g_not_server_label)
 
         if CONFIG.distributed_tracing:
-            self.logger.info(f'actor_server distributed_tracing send_response_to_aisrv end', g_not_server_label)
+            self.logger.info('actor_server distributed_tracing send_response_to_aisrv end', g_not_server_label)
 
     def send_response_to_aisrv_simple_fast(self, size, preds):
         if CONFIG.distributed_tracing:
@@ -284,8 +292,9 @@ class ActorServerSync(multiprocessing.Process):
                 send_data = pred['pred']
                 client_id = client_ids[0]
                 compose_id = compose_ids[0]
-                res = [(tuple(compose_id), send_data)]
-                dict_obj[client_id] = res
+                # 同一个ActorProxy合并的多个slot共用client_id, 需要追加而不是覆盖
+                list_obj = dict_obj.setdefault(client_id, [])
+                list_obj.append((tuple(compose_id), send_data))
             else:
                 send_data = {
                     'format_action': pred['pred'][0],
@@ -318,7 +327,7 @@ class ActorServerSync(multiprocessing.Process):
             self.send_to_aisrv_succ_cnt += 1
 
             if CONFIG.distributed_tracing:
-                self.logger.info(f'actor_server distributed_tracing zmq server send a new msg to {compose_id} success', g_not_server_label)
+                self.logger.info('actor_server distributed_tracing zmq server send a new msg to {} success', compose_id, g_not_server_label)
 
         if CONFIG.distributed_tracing:
             self.logger.info('actor_server distributed_tracing send_response_to_aisrv_simple_fast end')
@@ -332,7 +341,7 @@ class ActorServerSync(multiprocessing.Process):
         #assert len(size) == len(preds), "actor batch prediction"
 
         if CONFIG.distributed_tracing:
-            self.logger.info(f'actor_server distributed_tracing send_response_to_aisrv_simple start', g_not_server_label)
+            self.logger.info('actor_server distributed_tracing send_response_to_aisrv_simple start', g_not_server_label)
 
         batch_size = len(size)
         for j in range(batch_size):
@@ -403,10 +412,10 @@ class ActorServerSync(multiprocessing.Process):
                     self.send_to_aisrv_succ_cnt += 1
 
                     if CONFIG.distributed_tracing:
-                        self.logger.info(f'actor_server distributed_tracing zmq server send a new msg to {compose_id} success', g_not_server_label)
+                        self.logger.info('actor_server distributed_tracing zmq server send a new msg to {} success', compose_id, g_not_server_label)
 
         if CONFIG.distributed_tracing:
-            self.logger.info(f'actor_server distributed_tracing send_response_to_aisrv_simple end', g_not_server_label)
+            self.logger.info('actor_server distributed_tracing send_response_to_aisrv_simple end', g_not_server_label)
 
     '''
     处理aisrv --> actor方向预测请求, 线程模式
@@ -437,6 +446,30 @@ class ActorServerSync(multiprocessing.Process):
         else:
             self.predict_request_queue.put(data)
 
+    '''
+    预测请求不能被处理时, 按照请求里的compose_id给aisrv返回错误响应, 每个样本的结果只带有KaiwuDRLDefine.PREDICT_ERROR
+    protobuf协议下的回包需要按照pb组包, 这里只处理pickle和binary协议
+    '''
+    def send_error_response_to_aisrv(self, client_id, message, error):
+        if CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PROTOBUF:
+            return
+
+        try:
+            request = decompress_predict_request(message)
+            compose_ids = np.asarray(request[-1]).reshape(-1, KaiwuDRLDefine.COMPOSE_ID_SIZE)
+            send_data = [(tuple(compose_id.tolist()), {KaiwuDRLDefine.PREDICT_ERROR: error}) for compose_id in compose_ids]
+            compressed_data = compress_data(send_data)
+
+            if CONFIG.server_use_processes == KaiwuDRLDefine.RUN_AS_THREAD:
+                with self.lock:
+                    self.zmq_server.send(str(client_id), compressed_data, binary=True)
+            else:
+                self.zmq_server.send(str(client_id), compressed_data, binary=True)
+
+        except Exception as e:
+            self.send_to_aisrv_error_cnt += 1
+            self.logger.error(f'actor_server send error response to aisrv error: {str(e)}, traceback.print_exc() is {traceback.format_exc()}', g_not_server_label)
+
     '''
     处理aisrv --> actor方向预测请求, 直接调用
     '''
@@ -463,11 +496,16 @@ class ActorServerSync(multiprocessing.Process):
                 self.recv_from_aisrv_succ_cnt += 1
 
                 if CONFIG.distributed_tracing:
-                    self.logger.info(f'actor_server distributed_tracing actor_receive_msg_direct a new message', g_not_server_label)
+                    self.logger.info('actor_server distributed_tracing actor_receive_msg_direct a new message', g_not_server_label)
 
                 try:
                     # 直接放入原始的数据, 在on_policy_predictor进程里解压缩和压缩, 减少CPU损耗
                     self.put_data_to_queue(message)
+                except ValueError as e:
+                    # 请求超过共享内存slot大小, 不会被预测, 直接返回错误响应, 避免aisrv一直等到超时
+                    self.logger.error(f'actor_server zmq server to predict queue error, message is {str(e)}', g_not_server_label)
+                    self.actor_server_request_too_large_cnt += 1
+                    self.send_error_response_to_aisrv(self.client_id, message, str(e))
                 except Exception as e:
                     # 当actor_server --> predict的队列满时报错
                     self.logger.error(f'actor_server zmq server to predict queue error, message is {str(e)}', g_not_server_label)
@@ -502,7 +540,7 @@ class ActorServerSync(multiprocessing.Process):
                 self.recv_from_aisrv_succ_cnt += 1
 
                 if CONFIG.distributed_tracing:
-                    self.logger.info(f'actor_server distributed_tracing actor_receive_msg_direct a new message', g_not_server_label)
+                    self.logger.info('actor_server distributed_tracing actor_receive_msg_direct a new message', g_not_server_label)
 
                 try:
                     # 直接放入原始的数据, 在on_policy_predictor进程里解压缩和压缩, 减少CPU损耗
@@ -546,7 +584,7 @@ class ActorServerSync(multiprocessing.Process):
         self.send_to_aisrv_succ_cnt += 1
 
         if CONFIG.distributed_tracing:
-            self.logger.info(f'actor_server distributed_tracing zmq server send a new msg success', g_not_server_label)
+            self.logger.info('actor_server distributed_tracing zmq server send a new msg success', g_not_server_label)
 
     '''
     actor给aisrv发送预测结果函数, 分为流水线和非流水线的场景
@@ -573,7 +611,7 @@ class ActorServerSync(multiprocessing.Process):
         self.send_to_aisrv_succ_cnt += 1
 
         if CONFIG.distributed_tracing:
-            self.logger.info(f'actor_server distributed_tracing zmq server send a new msg success', g_not_server_label)
+            self.logger.info('actor_server distributed_tracing zmq server send a new msg success', g_not_server_label)
 
     '''
     处理actor --> aisrv方向预测请求, 线程模式
@@ -21,7 +21,7 @@ import schedule
 from framework.common.config.config_control import CONFIG
 from framework.common.utils.slots import Slots
 from framework.common.pybind11.zmq_ops import *
-from framework.common.utils.common_func import TimeIt, Context, set_schedule_event,decompress_data
+from framework.common.utils.common_func import TimeIt, Context, set_schedule_event, decompress_predict_request
 from framework.common.logging.kaiwu_logger import KaiwuLogger, g_not_server_label
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.monitor.monitor_proxy import MonitorProxy
@@ -206,7 +206,7 @@ class ActorServerSyncReceiver(multiprocessing.Process):
                 else:
                     # 增加解压缩
                     with TimeIt() as ti:
-                        output_data = decompress_data(message)
+                        output_data = decompress_predict_request(message)
                     if self.max_decompress_time < ti.interval:
                         self.max_decompress_time = ti.interval
                     self.to_predict_queue.put(output_data)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import time
+import numpy as np
+
+
+class AdaptiveBatcher(object):
+    '''
+    actor上的自适应批处理, 替代固定的predict_batch_size和actor_receive_cost_time_ms:
+    1. 统计最近的请求到达间隔(EWMA)
+    2. 统计不同batch_size下的预测耗时, 采用带衰减的最小二乘拟合 latency(b) = a + c * b
+    3. 在满足p99端到端时延目标的前提下, 选择吞吐量 b / (等待耗时 + 预测耗时) 最大的batch_size, 以及对应的收包截止时间
+    4. 根据最近窗口内实际的p99端到端时延做反馈, 超过目标则收紧时延预算, 远低于目标则逐步放开
+
+    batch_size只考虑在max_wait_ms内能够收齐的, 即不超过max_wait_ms / 到达间隔 + 1, 收包截止时间为收齐该batch_size的预计耗时
+    低负载时请求到达间隔大于max_wait_ms, 则不等待, 小batch直接预测; 高负载时批量越大吞吐越高, 直到触达时延目标
+    '''
+
+    def __init__(self, max_batch_size, max_wait_ms, latency_slo_ms, min_batch_size=1,
+                 window_size=1024, replan_interval=32, ewma_alpha=0.1) -> None:
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.min_batch_size = min(max(int(min_batch_size), 1), self.max_batch_size)
+        self.max_wait_ms = float(max_wait_ms)
+        self.latency_slo_ms = float(latency_slo_ms)
+        self.replan_interval = max(int(replan_interval), 1)
+        self.ewma_alpha = float(ewma_alpha)
+
+        # 请求到达间隔的EWMA, 单位ms
+        self.arrival_interval_ms = None
+        self.last_arrival_time = None
+
+        # 预测耗时线性模型的衰减累计量
+        self.sum_w = 0.0
+        self.sum_b = 0.0
+        self.sum_l = 0.0
+        self.sum_bb = 0.0
+        self.sum_bl = 0.0
+
+        # 最近窗口内的端到端时延, 用于计算p99
+        self.latencies = np.zeros(max(int(window_size), 1), dtype=np.float64)
+        self.latency_count = 0
+
+        # 时延预算的反馈系数, 范围[0.1, 1]
+        self.slo_scale = 1.0
+        self.p99_latency_ms = 0.0
+
+        self.batch_count = 0
+        self.target_batch_size = self.max_batch_size
+        self.wait_ms = self.max_wait_ms
+
+    '''
+    记录请求到达, count为本次到达的样本数, 合并发送的请求包括多个样本, 到达间隔按照样本计算
+    '''
+    def on_arrival(self, now=None, count=1):
+        now = time.monotonic() if now is None else now
+        if self.last_arrival_time is not None:
+            interval_ms = (now - self.last_arrival_time) * 1000 / max(count, 1)
+            if self.arrival_interval_ms is None:
+                self.arrival_interval_ms = interval_ms
+            else:
+                self.arrival_interval_ms += self.ewma_alpha * (interval_ms - self.arrival_interval_ms)
+
+        self.last_arrival_time = now
+
+    '''
+    记录单次批处理的结果
+    batch_size: 本次批处理大小
+    predict_cost_ms: 本次预测耗时, 包括回包
+    e2e_latency_ms: 本批次第一个请求从到达到预测完成的耗时
+    '''
+    def on_batch_done(self, batch_size, predict_cost_ms, e2e_latency_ms):
+        decay = 1.0 - self.ewma_alpha
+        self.sum_w = self.sum_w * decay + 1.0
+        self.sum_b = self.sum_b * decay + batch_size
+        self.sum_l = self.sum_l * decay + predict_cost_ms
+        self.sum_bb = self.sum_bb * decay + batch_size * batch_size
+        self.sum_bl = self.sum_bl * decay + batch_size * predict_cost_ms
+
+        self.latencies[self.latency_count % len(self.latencies)] = e2e_latency_ms
+        self.latency_count += 1
+
+        self.batch_count += 1
+        if self.batch_count % self.replan_interval == 0:
+            self.feedback()
+            self.replan()
+
+    '''
+    按照线性模型估计batch_size的预测耗时, 没有统计数据时返回0
+    '''
+    def predict_cost_ms(self, batch_size):
+        if self.sum_w <= 0:
+            return 0.0
+
+        mean_b = self.sum_b / self.sum_w
+        mean_l = self.sum_l / self.sum_w
+        var_b = self.sum_bb / self.sum_w - mean_b * mean_b
+
+        # 只观察到单一batch_size时, 按照耗时和batch_size成正比估计
+        if var_b <= 1e-6:
+            return mean_l * batch_size / max(mean_b, 1.0)
+
+        slope = max((self.sum_bl / self.sum_w - mean_b * mean_l) / var_b, 0.0)
+        intercept = max(mean_l - slope * mean_b, 0.0)
+        return intercept + slope * batch_size
+
+    '''
+    根据最近窗口内的p99端到端时延调整时延预算
+    '''
+    def feedback(self):
+        count = min(self.latency_count, len(self.latencies))
+        if not count:
+            return
+
+        self.p99_latency_ms = float(np.percentile(self.latencies[:count], 99))
+        if self.p99_latency_ms > self.latency_slo_ms:
+            self.slo_scale = max(self.slo_scale * 0.9, 0.1)
+        elif self.p99_latency_ms < self.latency_slo_ms * 0.8:
+            self.slo_scale = min(self.slo_scale * 1.05, 1.0)
+
+    '''
+    重新计算目标batch_size和收包截止时间
+    1. 到达间隔为interval时, 收齐batch_size个样本需要等待(batch_size - 1) * interval, 超过max_wait_ms的batch_size收不齐, 不参与选择
+    2. 收包截止时间为收齐选中batch_size的预计耗时, 不超过时延预算里除去预测耗时剩下的部分
+    3. 还没有到达间隔的统计数据时, 按照时延预算里除去预测耗时剩下的部分等待
+    '''
+    def replan(self):
+        budget_ms = self.latency_slo_ms * self.slo_scale
+        interval_ms = self.arrival_interval_ms or 0.0
+
+        best_batch_size = self.min_batch_size
+        best_throughput = -1.0
+        for batch_size in range(self.min_batch_size, self.max_batch_size + 1):
+            cost_ms = self.predict_cost_ms(batch_size)
+            wait_ms = (batch_size - 1) * interval_ms
+
+            # 等待耗时和预测耗时随batch_size单调不减, 收不齐或者超过预算后更大的batch_size也不满足
+            if batch_size > self.min_batch_size and (wait_ms > self.max_wait_ms or wait_ms + cost_ms > budget_ms):
+                break
+
+            throughput = batch_size / max(wait_ms + cost_ms, 1e-3)
+            if throughput > best_throughput:
+                best_throughput = throughput
+                best_batch_size = batch_size
+
+        self.target_batch_size = best_batch_size
+
+        wait_ms = max(budget_ms - self.predict_cost_ms(best_batch_size), 0.0)
+        if self.arrival_interval_ms is not None:
+            wait_ms = min(wait_ms, (best_batch_size - 1) * interval_ms)
+        self.wait_ms = min(self.max_wait_ms, wait_ms)
+
+    '''
+    返回本次收包的目标batch_size和截止时间(ms)
+    '''
+    def plan(self):
+        return self.target_batch_size, self.wait_ms
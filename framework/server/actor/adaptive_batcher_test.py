@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+
+from framework.server.actor.adaptive_batcher import AdaptiveBatcher
+
+
+class AdaptiveBatcherTest(unittest.TestCase):
+    def feed(self, batcher, arrival_interval_ms, fixed_cost_ms, per_sample_cost_ms, batch_sizes):
+        now = 0.0
+        for _ in range(batcher.replan_interval):
+            for batch_size in batch_sizes:
+                for _ in range(batch_size):
+                    now += arrival_interval_ms / 1000
+                    batcher.on_arrival(now)
+
+                cost_ms = fixed_cost_ms + per_sample_cost_ms * batch_size
+                batcher.on_batch_done(batch_size, cost_ms, cost_ms + (batch_size - 1) * arrival_interval_ms)
+
+    def test_high_load_prefers_large_batch(self):
+        batcher = AdaptiveBatcher(32, 5, 20, replan_interval=4)
+        # 固定开销大, 到达密集, 批量越大吞吐越高
+        self.feed(batcher, 0.01, 4, 0.05, [1, 8, 16, 32])
+
+        target_batch_size, wait_ms = batcher.plan()
+        self.assertEqual(target_batch_size, 32)
+        self.assertLessEqual(wait_ms, 5)
+
+    def test_low_load_does_not_wait(self):
+        batcher = AdaptiveBatcher(32, 5, 20, replan_interval=4)
+        # 到达间隔远大于固定开销, 等待凑批不划算
+        self.feed(batcher, 10, 0.5, 0.05, [1, 2, 4])
+
+        target_batch_size, wait_ms = batcher.plan()
+        self.assertEqual(target_batch_size, 1)
+        self.assertEqual(wait_ms, 0)
+
+    def test_wait_matches_arrivals(self):
+        batcher = AdaptiveBatcher(32, 5, 20, replan_interval=4)
+        # 到达间隔1ms, 5ms内最多收齐6个样本; 到达间隔0.1ms时收齐32个样本只需要等待3.1ms
+        self.feed(batcher, 1, 4, 0.05, [1, 2, 4])
+
+        target_batch_size, wait_ms = batcher.plan()
+        self.assertEqual(target_batch_size, 6)
+        self.assertAlmostEqual(wait_ms, 5, places=3)
+
+        batcher = AdaptiveBatcher(32, 5, 20, replan_interval=4)
+        self.feed(batcher, 0.1, 4, 0.05, [1, 8, 16, 32])
+        target_batch_size, wait_ms = batcher.plan()
+        self.assertEqual(target_batch_size, 32)
+        self.assertAlmostEqual(wait_ms, 3.1, places=3)
+
+    def test_arrival_count(self):
+        batcher = AdaptiveBatcher(32, 5, 20)
+        batcher.on_arrival(0.0)
+        batcher.on_arrival(0.008, count=4)
+        self.assertAlmostEqual(batcher.arrival_interval_ms, 2.0)
+
+    def test_slo_limits_batch_size(self):
+        batcher = AdaptiveBatcher(64, 50, 10, replan_interval=4)
+        # 单样本耗时0.5ms, 时延目标10ms限制了批量大小
+        self.feed(batcher, 0.01, 1, 0.5, [4, 8, 16])
+
+        target_batch_size, wait_ms = batcher.plan()
+        self.assertLess(target_batch_size, 64)
+        self.assertLessEqual(batcher.predict_cost_ms(target_batch_size), 10)
+        self.assertLessEqual(wait_ms, 10)
+
+    def test_feedback_shrinks_budget(self):
+        batcher = AdaptiveBatcher(32, 5, 10, replan_interval=1)
+        batcher.on_batch_done(8, 2, 50)
+        self.assertGreater(batcher.p99_latency_ms, 10)
+        self.assertLess(batcher.slo_scale, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+from operator import itemgetter
+import numpy as np
+
+
+class BatchAssembler(object):
+    '''
+    actor上预测的批处理组装类, 规避按样本, 按key的python循环:
+    1. 按照state_space里的key, 预先分配连续的numpy数组, 每个key一个, 形如(capacity, feature_dim), 跨批次复用
+    2. 每次预测时将各个请求里相同key的数据一次性拷贝到对应数组的前batch_size行
+    3. 预测结果按照样本切片, 拆分回每个请求
+
+    注意:
+    1. 每个请求的数据格式为[state_key_0, ..., state_key_n, client_id, compose_id], 和aisrv上ActorProxy序列化的顺序一致
+       aisrv上ActorProxy会合并多个对局的请求一起发送, 故每个请求包括的样本数目为client_id的长度, 批处理大小为所有请求的样本数目之和
+    2. 返回给业务的state_dict是预分配数组的视图, 只在下一次assemble之前有效, 业务侧如需保存请自行拷贝
+    3. client_id和compose_id每次新分配, 因为会随着预测结果异步发送出去, 不能复用
+    '''
+
+    def __init__(self, state_space, max_batch_size) -> None:
+        self.state_keys = list(state_space.keys())
+        self.state_shapes = [tuple(state_space[key].shape) for key in self.state_keys]
+        self.feature_dims = [int(np.prod(shape)) for shape in self.state_shapes]
+        self.dtypes = [np.dtype(state_space[key].dtype) for key in self.state_keys]
+
+        # 每个key对应的数据在请求里的下标
+        self.getters = [itemgetter(i) for i in range(len(self.state_keys))]
+        self.client_id_getter = itemgetter(-2)
+        self.compose_id_getter = itemgetter(-1)
+
+        self.capacity = 0
+        self.buffers = []
+        self.reserve(max_batch_size)
+
+    '''
+    按需扩容, 按照2倍扩容, 规避频繁的重新分配
+    '''
+    def reserve(self, batch_size):
+        if batch_size <= self.capacity:
+            return
+
+        self.capacity = max(int(batch_size), self.capacity * 2)
+        self.buffers = [np.empty((self.capacity, dim), dtype=dtype)
+                        for dim, dtype in zip(self.feature_dims, self.dtypes)]
+
+    '''
+    所有请求的样本数目之和
+    '''
+    def batch_size(self, datas):
+        return sum(map(len, map(self.client_id_getter, datas)))
+
+    '''
+    组装state_dict, 每个key对应的value形如(batch_size, feature_dim)
+    flatten为False时, value形如(batch_size,) + state_space[key].shape, 依旧是同一块内存的视图
+    '''
+    def assemble(self, datas, flatten=True):
+        batch_size = self.batch_size(datas)
+        self.reserve(batch_size)
+
+        state_dict = {}
+        for i, key in enumerate(self.state_keys):
+            out = self.buffers[i][:batch_size]
+
+            # 单次拷贝到连续内存里, 每个请求的数据reshape为(sample_size, feature_dim)后整体concatenate
+            dim = self.feature_dims[i]
+            values = [value.reshape(-1, dim) for value in map(self.getters[i], datas)]
+            np.concatenate(values, axis=0, out=out)
+
+            state_dict[key] = out if flatten else out.reshape((batch_size,) + self.state_shapes[i])
+
+        return state_dict
+
+    '''
+    组装client_id和compose_id, 返回形如(batch_size, 1)和(batch_size, 1, COMPOSE_ID_SIZE)的数组
+    model_version不为None时, 批量设置compose_id里的model_version字段
+    '''
+    def assemble_ids(self, datas, model_version=None):
+        client_ids = np.concatenate(list(map(self.client_id_getter, datas))).reshape(-1, 1)
+        compose_ids = np.concatenate(list(map(self.compose_id_getter, datas)))
+        compose_ids = compose_ids.reshape(len(client_ids), 1, -1)
+
+        # compose_id格式形如[[slot_id, agent_id, message_id, model_version]]
+        if model_version is not None:
+            compose_ids[..., 3] = model_version
+
+        return client_ids, compose_ids
+
+    '''
+    预测结果按照样本拆分, pred为业务返回的多个输出, 每个输出的第一维是batch_size
+    返回的结果里第i项是第i个样本的各个输出
+    '''
+    @staticmethod
+    def split(pred):
+        return list(zip(*pred))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+import numpy as np
+
+from framework.interface.array_spec import ArraySpec
+from framework.server.actor.batch_assembler import BatchAssembler
+
+
+class BatchAssemblerTest(unittest.TestCase):
+    def setUp(self):
+        self.state_space = {
+            'observation': ArraySpec((5,), np.float32),
+            'sub_action_mask': ArraySpec((2, 3), np.float32),
+        }
+
+    def make_request(self, i):
+        return [np.full((1, 5), i, np.float32),
+                np.full((1, 2, 3), i, np.float32),
+                np.array([100], np.int32),
+                np.array([[0, i, i, 0]], np.int32)]
+
+    def test_assemble(self):
+        assembler = BatchAssembler(self.state_space, 2)
+        datas = [self.make_request(i) for i in range(3)]
+
+        state_dict = assembler.assemble(datas)
+        self.assertEqual(state_dict['observation'].shape, (3, 5))
+        self.assertEqual(state_dict['sub_action_mask'].shape, (3, 6))
+        self.assertTrue(np.all(state_dict['sub_action_mask'][2] == 2))
+
+        # 扩容后依旧复用同一块内存
+        buffer = assembler.buffers[0]
+        state_dict = assembler.assemble(datas[:2], flatten=False)
+        self.assertIs(assembler.buffers[0], buffer)
+        self.assertEqual(state_dict['sub_action_mask'].shape, (2, 2, 3))
+
+    def test_assemble_multi_sample_request(self):
+        assembler = BatchAssembler(self.state_space, 2)
+        # aisrv合并发送的请求, 包括2个样本
+        merged = [np.full((2, 5), 9, np.float32),
+                  np.full((2, 2, 3), 9, np.float32),
+                  np.array([100, 100], np.int32),
+                  np.array([[0, 7, 7, 0], [1, 8, 8, 0]], np.int32)]
+        datas = [self.make_request(0), merged]
+
+        self.assertEqual(assembler.batch_size(datas), 3)
+        state_dict = assembler.assemble(datas)
+        self.assertEqual(state_dict['observation'].shape, (3, 5))
+        self.assertTrue(np.all(state_dict['observation'][1:] == 9))
+
+        client_ids, compose_ids = assembler.assemble_ids(datas)
+        self.assertEqual(client_ids.shape, (3, 1))
+        self.assertEqual(compose_ids.shape, (3, 1, 4))
+        self.assertEqual(tuple(compose_ids[2][0]), (1, 8, 8, 0))
+
+    def test_assemble_ids_and_split(self):
+        assembler = BatchAssembler(self.state_space, 4)
+        datas = [self.make_request(i) for i in range(3)]
+
+        client_ids, compose_ids = assembler.assemble_ids(datas, model_version=7)
+        self.assertEqual(compose_ids.shape, (3, 1, 4))
+        self.assertTrue(np.all(compose_ids[:, 0, 3] == 7))
+        self.assertEqual(tuple(compose_ids[1][0]), (0, 1, 1, 7))
+        self.assertEqual(client_ids[2][0], 100)
+
+        pred = (np.arange(3), ['a', 'b', 'c'])
+        samples = assembler.split(pred)
+        self.assertEqual(len(samples), 3)
+        self.assertEqual(samples[1], (1, 'b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,7 +17,9 @@ import os
 import schedule
 import datetime
 from framework.server.actor.predictor import Predictor
-from framework.common.utils.common_func import TimeIt, set_schedule_event, make_single_dir, actor_learner_aisrv_count, get_host_ip, stop_process_by_pid, decompress_data, compress_data
+from framework.server.actor.batch_assembler import BatchAssembler
+from framework.server.actor.adaptive_batcher import AdaptiveBatcher
+from framework.common.utils.common_func import TimeIt, set_schedule_event, make_single_dir, actor_learner_aisrv_count, get_host_ip, stop_process_by_pid, decompress_data, compress_data, decompress_predict_request
 from framework.common.config.algo_conf import AlgoConf
 from framework.common.config.config_control import CONFIG
 from framework.common.algorithms.model_wrapper_builder import ModelWrapperBuilder
@@ -29,7 +31,10 @@ from framework.common.checkpoint.model_file_sync_wrapper import ModelFileSyncWra
 from framework.common.checkpoint.model_file_sync import ModelFileSync
 from framework.common.alloc.alloc_proxy import AllocProxy
 from framework.common.monitor.monitor_proxy import MonitorProxy
+from framework.common.monitor.latency_tracer import LatencyTracer
+from framework.common.monitor.histogram import LogLinearHistogram
 from framework.common.ipc.zmq_util import ZmqServer
+from framework.common.ipc.weight_broadcast import WeightBroadcastSubscriber
 from framework.common.logging.kaiwu_logger import KaiwuLogger, g_not_server_label
 
 class OnPolicyPredictor(Predictor, multiprocessing.Process):
@@ -43,23 +48,28 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
         self.index = -1
 
         '''
-        actor采用批处理从zmq_server获取, 故记录了此时队列长度, 从队列里获取的耗时, 
+        actor采用批处理从zmq_server获取, 故记录了此时队列长度, 
         为了减少损耗, 只是记录统计周期最后一次的值
         1. actor从zmq-server获取的队列长度, 最大为配置值, 需要查看平时是多少
-        2. 从zmq-server的队列里获取数据时批处理耗时
-        3. actor批处理预测耗时
-        4. actor将预测结果发送给aisrv的批处理耗时
-        5. actor加载最新的Model文件耗时
+        2. actor加载最新的Model文件耗时
         '''
         self.actor_from_zmq_queue_size = 0
-        self.actor_from_zmq_queue_cost_time_ms = 0
-        self.actor_batch_predict_cost_time_ms = 0
         self.actor_load_last_model_cost_ms = 0
         self.actor_load_last_model_succ_cnt = 0
 
-        self.max_decompress_time = 0
         self.max_compress_size = 0
-        self.max_compress_time = 0
+
+        '''
+        耗时类的指标按照直方图统计, 单位为微秒, 上报分位数, 替代只上报统计周期里的最大值
+        1. 从zmq-server的队列里获取数据时批处理耗时
+        2. actor批处理预测耗时
+        3. 预测请求解压缩耗时
+        4. 预测响应压缩耗时
+        '''
+        self.from_zmq_queue_time_histogram = LogLinearHistogram()
+        self.batch_predict_time_histogram = LogLinearHistogram()
+        self.decompress_time_histogram = LogLinearHistogram()
+        self.compress_time_histogram = LogLinearHistogram()
 
         '''
         从actor_server获取的需要预测的数据, 每次处理完成需要清空
@@ -221,6 +231,9 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
         self.rainbow_activate_single_process(KaiwuDRLDefine.SERVER_MAIN)
         self.rainbow_activate_single_process(CONFIG.svr_name)
 
+        # 配置可能有修改, 重新生成配置快照
+        self.reload_config()
+
     def rainbow_activate_single_process(self, process_name):
         result_code, data, result_msg = self.rainbow_utils.read_from_rainbow(
             process_name)
@@ -298,13 +311,14 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
                 stop_process_by_pid(self.process_pid_list)
 
     def predict_stat_reset(self):
-        self.actor_batch_predict_cost_time_ms = 0
-        self.actor_from_zmq_queue_cost_time_ms = 0
         self.actor_from_zmq_queue_size = 0
         self.actor_load_last_model_cost_ms = 0
-        self.max_decompress_time = 0
         self.max_compress_size = 0
-        self.max_compress_time = 0
+
+        self.from_zmq_queue_time_histogram.reset()
+        self.batch_predict_time_histogram.reset()
+        self.decompress_time_histogram.reset()
+        self.compress_time_histogram.reset()
 
     '''
     这里增加predict的统计项
@@ -325,15 +339,15 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
             monitor_data = {
                 KaiwuDRLDefine.MONITOR_ACTOR_PREDICT_SUCC_CNT: self.model_wrapper.predict_stat,
                 KaiwuDRLDefine.MONITOR_ACTOR_FROM_ZMQ_QUEUE_SIZE: self.actor_from_zmq_queue_size,
-                KaiwuDRLDefine.MONITOR_ACTOR_FROM_ZMQ_QUEUE_COST_TIME_MS: self.actor_from_zmq_queue_cost_time_ms,
-                KaiwuDRLDefine.MONITOR_ACTOR_BATCH_PREDICT_COST_TIME_MS: self.actor_batch_predict_cost_time_ms,
+                KaiwuDRLDefine.MONITOR_ACTOR_FROM_ZMQ_QUEUE_TIME_US: self.from_zmq_queue_time_histogram.drain(),
+                KaiwuDRLDefine.MONITOR_ACTOR_BATCH_PREDICT_TIME_US: self.batch_predict_time_histogram.drain(),
                 KaiwuDRLDefine.ACTOR_TCP_AISRV: actor_learner_aisrv_count(self.host, CONFIG.svr_name),
                 KaiwuDRLDefine.ACTOR_LOAD_LAST_MODEL_COST_MS: self.actor_load_last_model_cost_ms,
                 KaiwuDRLDefine.ACTORLOAD_LAST_MODEL_SUCC_CNT: self.actor_load_last_model_succ_cnt,
-                KaiwuDRLDefine.MONITOR_ACTOR_MAX_DECOMPRESS_TIME : self.max_decompress_time,
+                KaiwuDRLDefine.MONITOR_ACTOR_DECOMPRESS_TIME_US : self.decompress_time_histogram.drain(),
                 KaiwuDRLDefine.MONITOR_ACTOR_PREDICT_REQUEST_QUEUE_SIZE : predict_request_queue_size,
                 KaiwuDRLDefine.MONITOR_ACTOR_PREDICT_RESULT_QUEUE_SIZE : predict_result_queue_size,
-                KaiwuDRLDefine.MONITOR_ACTOR_MAX_COMPRESS_TIME : self.max_compress_time,
+                KaiwuDRLDefine.MONITOR_ACTOR_COMPRESS_TIME_US : self.compress_time_histogram.drain(),
                 KaiwuDRLDefine.MONITOR_ACTOR_MAX_COMPRESS_SIZE : self.max_compress_size,
 
             }
@@ -343,7 +357,18 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
                 monitor_data[KaiwuDRLDefine.ON_POLICY_PULL_FROM_MODELPOOL_SUCCESS_CNT] = self.on_policy_pull_from_modelpool_success_cnt
                 monitor_data[KaiwuDRLDefine.ON_POLICY_ACTOR_CHANGE_MODEL_VERSION_ERROR_COUNT] = self.actor_change_model_version_error_count
                 monitor_data[KaiwuDRLDefine.ON_POLICY_ACTOR_CHANGE_MODEL_VERSION_SUCCESS_COUNT] = self.actor_change_model_version_success_count
-                
+                monitor_data[KaiwuDRLDefine.ON_POLICY_RECV_WEIGHT_BROADCAST_ERROR_CNT] = self.on_policy_recv_weight_broadcast_error_cnt
+                monitor_data[KaiwuDRLDefine.ON_POLICY_RECV_WEIGHT_BROADCAST_SUCCESS_CNT] = self.on_policy_recv_weight_broadcast_success_cnt
+
+            if self.adaptive_batcher:
+                target_batch_size, wait_ms = self.adaptive_batcher.plan()
+                monitor_data[KaiwuDRLDefine.MONITOR_ACTOR_ADAPTIVE_BATCH_SIZE] = target_batch_size
+                monitor_data[KaiwuDRLDefine.MONITOR_ACTOR_ADAPTIVE_WAIT_MS] = wait_ms
+                monitor_data[KaiwuDRLDefine.MONITOR_ACTOR_PREDICT_P99_LATENCY_MS] = self.adaptive_batcher.p99_latency_ms
+
+            if self.latency_tracer:
+                monitor_data.update(self.latency_tracer.monitor_data())
+
             self.monitor_proxy.put_data(monitor_data)
 
         # 指标复原, 计算的是周期性的上报指标
@@ -396,10 +421,39 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
         if CONFIG.run_mode == KaiwuDRLDefine.RUN_MODEL_EVAL:
             self.process_pid_list = []
 
+        # 配置快照和预测, 回包函数的选择, 热点循环里不再访问CONFIG
+        self.reload_config()
+
         # model_wrapper
         with TimeIt() as ti:
             self.create_mode_wraper()
 
+        # 批处理组装, 预分配的数组大小为predict_batch_size, 收包时按照样本数目不超过predict_batch_size, 单个请求超过时按需扩容
+        self.batch_assembler = BatchAssembler(self.policy_conf.state.state_space(), int(CONFIG.predict_batch_size))
+
+        # 收包时加入后超过批处理大小的请求, 留到下一批次, 形如(请求, 收包时间, 收包时间ns)
+        self.pending_predict_data = None
+
+        # 共享内存队列上的slot在下一次get时会被复用, binary协议解码时需要拷贝出来
+        self.decode_copy = CONFIG.actor_server_predict_queue_type == KaiwuDRLDefine.PREDICT_QUEUE_TYPE_SHARED_MEMORY
+
+        # 自适应批处理, 只在pipeline_process_sync为False时生效, predict_batch_size和actor_receive_cost_time_ms作为上限
+        self.adaptive_batcher = None
+        self.batch_first_arrival_time = 0
+        if int(CONFIG.use_adaptive_batching) and not CONFIG.pipeline_process_sync:
+            self.adaptive_batcher = AdaptiveBatcher(int(CONFIG.predict_batch_size), int(CONFIG.actor_receive_cost_time_ms),
+                                                    float(CONFIG.actor_predict_latency_slo_ms))
+
+        '''
+        单帧时延分阶段统计, 按照样本记录收包时间, 按照批次记录预测的开始和结束时间
+        回包时将actor上各阶段的耗时追加到compose_id后面, 由aisrv计算网络耗时
+        '''
+        self.latency_tracer = None
+        self.trace_arrival_ns = []
+        self.trace_model_ns = (0, 0)
+        if int(CONFIG.use_latency_tracing):
+            self.latency_tracer = LatencyTracer(KaiwuDRLDefine.MONITOR_TRACE_ACTOR_PREFIX)
+
         if CONFIG.run_mode == KaiwuDRLDefine.RUN_MODEL_EVAL:
             if CONFIG.actor_server_async:
                 self.process_pid_list.append(self.send_server.pid)
@@ -442,11 +496,19 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
             self.zmq_server.bind()
             self.logger.info(f'predict zmq server on-policy bind at {CONFIG.ip_address} : {int(CONFIG.zmq_server_port) + 100} for learner')
 
+            # learner --> actor之间内存里同步模型参数, 见weight_broadcast.py
+            self.weight_subscriber = None
+            if int(CONFIG.use_weight_broadcast):
+                self.weight_subscriber = WeightBroadcastSubscriber(CONFIG.ip_address, int(CONFIG.zmq_server_port) + 200)
+                self.logger.info(f'predict weight broadcast subscriber bind at {CONFIG.ip_address} : {int(CONFIG.zmq_server_port) + 200} for learner')
+
             # 下面是统计告警指标
             self.on_policy_pull_from_modelpool_error_cnt = 0
             self.on_policy_pull_from_modelpool_success_cnt = 0
             self.actor_change_model_version_error_count = 0
             self.actor_change_model_version_success_count = 0
+            self.on_policy_recv_weight_broadcast_error_cnt = 0
+            self.on_policy_recv_weight_broadcast_success_cnt = 0
 
         else:
             pass
@@ -485,41 +547,7 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
     '''
 
     def predict_tensorrt(self, datas):
-        batch_size = len(datas)
-
-        # 数据整理
-        state_dict = {}
-        state_space = self.policy_conf.state.state_space()
-        for i, key in enumerate(state_space.keys()):
-            state_dict[key] = [datas[j][i].flatten()
-                               for j in range(batch_size)]
-
-        res_msgs = []
-        for i in range(batch_size):
-            # 如果是on-policy则返回actor预测用到的model版本号, data[i][-1]格式形如[[ 0  0 28 1]]
-            if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
-                datas[i][-1][0][3] = self.current_sync_model_version_from_learner
-
-            res_msgs.append({
-                KaiwuDRLDefine.CLIENT_ID_TENSOR: datas[i][-2],
-                KaiwuDRLDefine.COMPOSE_ID_TENSOR: datas[i][-1]
-            })
-
-        sizes = []
-        try:
-            pred = self.model_wrapper.predict(state_dict, batch_size)
-            if pred:
-                for i in range(batch_size):
-                    res_msgs[i]['pred'] = [p[i] for p in pred]
-                    sizes.append(len(pred))
-
-        except Exception as e:
-            self.logger.error(
-                f"predict failed to run {self.name} predictor, as {e}, traceback.print_exc() is {traceback.format_exc()}")
-
-        # self.logger.debug(f'after predict, size is {sizes}')
-
-        return sizes, res_msgs
+        return self.predict_batch(datas)
 
     '''
     actor上的预测predict主函数, 使用框架的predict
@@ -536,7 +564,12 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
                 KaiwuDRLDefine.CLIENT_ID_TENSOR: self.dequeue_tensors[-2],
                 KaiwuDRLDefine.COMPOSE_ID_TENSOR: self.dequeue_tensors[-1]}
             
-            pred = self.model_wrapper.predict(extra_tensors, batch_size)
+            if self.latency_tracer:
+                model_start_ns = time.monotonic_ns()
+                pred = self.model_wrapper.predict(extra_tensors, batch_size)
+                self.trace_model_ns = (model_start_ns, time.monotonic_ns())
+            else:
+                pred = self.model_wrapper.predict(extra_tensors, batch_size)
             size = next(iter(pred.values())).shape[0]
 
             pred['s'] = np.array([self.global_step] * size)
@@ -550,87 +583,53 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
         return size, pred
 
     def pytorch_predict(self, datas):
-
-        # 组装batch
-        # arr 对应state_space中的key
-        arr_size = len(datas[0])
-        batch_size = len(datas)
-        data = []
-        for i in range(arr_size):
-            data.append([datas[j][i] for j in range(batch_size)])
-
-        # 数据整理
-        state_dict = {}
-        state_space = self.policy_conf.state.state_space()
-        for i, key in enumerate(state_space.keys()):
-            # state_dict[key] = [data[i][j].flatten() for j in range(batch_size)]
-            state_dict[key] = [data[i][j] for j in range(batch_size)]
-
-        res_msgs = []
-        for i in range(batch_size):
-            # 如果是on-policy则返回actor预测用到的model版本号, data[i][-1]格式形如[[ 0  0 28 1]]
-            if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
-                datas[i][-1][0][3] = self.current_sync_model_version_from_learner
-
-            res_msgs.append({
-                KaiwuDRLDefine.CLIENT_ID_TENSOR: datas[i][-2],
-                KaiwuDRLDefine.COMPOSE_ID_TENSOR: datas[i][-1]
-            })
-
-        sizes = []
-        try:
-            # (format_action, network_sample_info, lstm_info) = pred
-            pred = self.model_wrapper.predict(state_dict, batch_size)
-            if pred:
-                for i in range(batch_size):
-                    res_msgs[i]['pred'] = [p[i] for p in pred]
-                    sizes.append(len(pred))
-
-        except Exception as e:
-            self.logger.error(
-                f"predict failed to run {self.name} predictor, as {e}, traceback.print_exc() is {traceback.format_exc()}")
-
-        # self.logger.debug(f'after predict, size is {sizes}')
-
-        return sizes, res_msgs
+        return self.predict_batch(datas, flatten=False)
 
     '''
     actor上的预测predict主函数, 使用业务的predict
     '''
 
     def predict_simple(self, datas):
+        return self.predict_batch(datas)
 
-        # 组装batch
-        # arr 对应state_space中的key
-        batch_size = len(datas)
+    '''
+    批处理预测的公共流程:
+    1. 采用batch_assembler将各个请求的数据拷贝到预分配的连续数组里, 规避按样本, 按key的python循环
+    2. 调用业务的predict
+    3. 预测结果按照样本切片, 拆分回各个请求
+    flatten为True时每个key的数据形如(batch_size, feature_dim), 否则形如(batch_size,) + shape
+    '''
+    def predict_batch(self, datas, flatten=True):
 
-        # 数据整理
-        state_dict = {}
-        state_space = self.policy_conf.state.state_space()
-        for i, key in enumerate(state_space.keys()):
-            state_dict[key] = [datas[j][i].flatten()
-                               for j in range(batch_size)]
+        # 数据整理, 单个请求可能包括多个样本, 故batch_size为样本数目之和
+        state_dict = self.batch_assembler.assemble(datas, flatten=flatten)
 
-        res_msgs = []
-        for i in range(batch_size):
-            # 如果是on-policy则返回actor预测用到的model版本号, data[i][-1]格式形如[[ 0  0 28 1]]
-            if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
-                datas[i][-1][0][3] = self.current_sync_model_version_from_learner
-            
-            res_msgs.append({
-                KaiwuDRLDefine.CLIENT_ID_TENSOR: datas[i][-2],
-                KaiwuDRLDefine.COMPOSE_ID_TENSOR: datas[i][-1]
-            })
+        # 如果是on-policy则返回actor预测用到的model版本号, compose_id格式形如[[ 0  0 28 1]]
+        model_version = None
+        if self.config_snapshot.is_on_policy:
+            model_version = self.current_sync_model_version_from_learner
+
+        client_ids, compose_ids = self.batch_assembler.assemble_ids(datas, model_version)
+        batch_size = len(client_ids)
+
+        res_msgs = [{
+                KaiwuDRLDefine.CLIENT_ID_TENSOR: client_id,
+                KaiwuDRLDefine.COMPOSE_ID_TENSOR: compose_id
+            } for client_id, compose_id in zip(client_ids, compose_ids)]
 
         sizes = []
         try:
-            # self.logger.debug(f'predict actor from aisrv is {state_dict}')
-            pred = self.model_wrapper.predict(state_dict, batch_size)
-            # self.logger.debug(f'predict actor send to aisrv is {pred}')
+            # (format_action, network_sample_info, lstm_info) = pred
+            if self.latency_tracer:
+                model_start_ns = time.monotonic_ns()
+                pred = self.model_wrapper.predict(state_dict, batch_size)
+                self.trace_model_ns = (model_start_ns, time.monotonic_ns())
+            else:
+                pred = self.model_wrapper.predict(state_dict, batch_size)
             if pred:
-                for i in range(batch_size):
-                    res_msgs[i]['pred'] = [p[i] for p in pred]
-                    sizes.append(len(pred))
+                for res_msg, sample_pred in zip(res_msgs, self.batch_assembler.split(pred)):
+                    res_msg['pred'] = sample_pred
+                sizes = [len(pred)] * batch_size
 
         except Exception as e:
             self.logger.error(
@@ -681,6 +680,23 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
     def get_predict_result_data(self):
         return self.predict_result_queue.get()
 
+    '''
+    解压缩后的请求放入本批次, 返回请求里的样本数目
+    arrival_time和arrival_ns为收包时间, 分别用于自适应批处理和单帧时延统计, 没有时为None
+    '''
+    def add_predict_data(self, datas, data, arrival_time, arrival_ns):
+        sample_size = len(data[-2])
+        if self.adaptive_batcher and not datas and arrival_time is not None:
+            self.batch_first_arrival_time = arrival_time
+
+        datas.append(data)
+
+        # 按照样本记录收包时间
+        if self.latency_tracer and arrival_ns is not None:
+            self.trace_arrival_ns.extend([arrival_ns] * sample_size)
+
+        return sample_size
+
     '''
     从actor_server进程提供的队列收集预测数据, 以函数形式
     1. 如果是pipeline_process_sync为False则从actor_server队列里获取
@@ -689,23 +705,40 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
     1. 如果是False:
         1.1 单次批处理predict_batch_size
         1.2 设置的超时时间
+        1.3 开启自适应批处理时, 批处理大小和超时时间由AdaptiveBatcher按照时延目标动态给出
+        1.4 单个请求可能包括多个样本, 批处理大小按照样本数目计算
     2. 如果是True:
         2.1 尽最大努力获取数据
-        2.2 超过predict_batch_size跳出, 平滑操作
+        2.2 达到predict_batch_size个样本跳出, 平滑操作
+    3. 单个请求不拆分, 加入后超过批处理大小的请求留到下一批次, 故除了单个请求超过批处理大小外, 批处理大小不超过predict_batch_size
     '''
     def get_predict_data_from_actor_server(self):
         datas = []
+        if self.latency_tracer:
+            self.trace_arrival_ns.clear()
+
+        # 上一次收包时留下的请求放在本批次的最前面
+        sample_count = 0
+        if self.pending_predict_data:
+            pending_predict_data, self.pending_predict_data = self.pending_predict_data, None
+            sample_count = self.add_predict_data(datas, *pending_predict_data)
 
+        config_snapshot = self.config_snapshot
         with TimeIt() as it:
-            if not CONFIG.pipeline_process_sync:
+            if not config_snapshot.pipeline_process_sync:
 
                 # 按照时间间隔和批处理大小收包
+                if self.adaptive_batcher:
+                    target_batch_size, wait_ms = self.adaptive_batcher.plan()
+                else:
+                    target_batch_size, wait_ms = config_snapshot.predict_batch_size, config_snapshot.actor_receive_cost_time_ms
+
                 start_time = time.time()
-                while len(datas) < int(CONFIG.predict_batch_size):
+                while sample_count < target_batch_size:
 
                     # 区分从哪里获取数据
                     data = None
-                    if not CONFIG.actor_server_predict_server_different_queue:
+                    if not config_snapshot.actor_server_predict_server_different_queue:
                         data = self.recv_server.get_from_to_predict_queue()
                     else:
                         try:
@@ -714,27 +747,40 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
                             pass
                     
                     if data:
+                        arrival_time = time.monotonic()
+
                         # 增加压缩和解压缩耗时
                         with TimeIt() as ti:
-                            decompressed_data = decompress_data(data)
-                        if self.max_decompress_time < ti.interval:
-                            self.max_decompress_time = ti.interval
+                            decompressed_data = decompress_predict_request(data, self.decode_copy)
+                        self.decompress_time_histogram.record(ti.interval * 1000000)
+
+                        # 单个请求可能包括多个样本, 样本数目为client_id的长度
+                        sample_size = len(decompressed_data[-2])
+                        if self.adaptive_batcher:
+                            self.adaptive_batcher.on_arrival(arrival_time, sample_size)
+
+                        # 合并发送的请求加入后超过批处理大小时, 留到下一批次
+                        arrival_ns = time.monotonic_ns() if self.latency_tracer else None
+                        if datas and sample_count + sample_size > target_batch_size:
+                            self.pending_predict_data = (decompressed_data, arrival_time, arrival_ns)
+                            break
 
-                        datas.append(decompressed_data)
+                        sample_count += self.add_predict_data(datas, decompressed_data, arrival_time, arrival_ns)
 
                     # 收包超时时强制退出, 平滑处理
-                    if (time.time() - start_time) * 1000 > int(CONFIG.actor_receive_cost_time_ms):
+                    if (time.time() - start_time) * 1000 > wait_ms:
                         break
 
             else:
 
-                # 最大限度收包
-                while not self.predict_request_queue.empty():
-                    datas.append(self.predict_request_queue.get())
-
-                    # 最大predict_batch_size的跳出去, 平滑处理
-                    if len(datas) > int(CONFIG.predict_batch_size):
+                # 最大限度收包, 最多predict_batch_size个样本, 平滑处理
+                while sample_count < config_snapshot.predict_batch_size and not self.predict_request_queue.empty():
+                    data = self.predict_request_queue.get()
+                    if datas and sample_count + len(data[-2]) > config_snapshot.predict_batch_size:
+                        self.pending_predict_data = (data, None, None)
                         break
+
+                    sample_count += self.add_predict_data(datas, data, None, None)
         
         # 如果本次没有数据, 提前返回, 不需要进行处理
         datas_length = len(datas)
@@ -742,102 +788,100 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
             self.process_run_idle_count += 1
             return datas
         
-        if CONFIG.distributed_tracing:
-            self.logger.info(f"predict distributed_tracing get_predict_data_from_actor_server end")
+        if config_snapshot.distributed_tracing:
+            self.logger.info("predict distributed_tracing get_predict_data_from_actor_server end")
         
         # 获取采集周期里的最大值
         if self.actor_from_zmq_queue_size < datas_length:
             self.actor_from_zmq_queue_size = datas_length
 
-        if self.actor_from_zmq_queue_cost_time_ms < it.interval * 1000:
-            self.actor_from_zmq_queue_cost_time_ms = it.interval * 1000
+        self.from_zmq_queue_time_histogram.record(it.interval * 1000000)
         
         return datas
 
     '''
-    预测函数
+    根据配置快照选择预测函数和回包函数, 在进程启动时和配置重新加载时调用, 规避每次预测时的配置分支判断
+    1. 预测函数由use_which_deep_learning_framework决定, 不支持的值为None, 预测时报错
+    2. 回包函数由pipeline_process_sync和aisrv_actor_communication_way决定
     '''
-    def predict(self, datas):
-
-        if not datas or not len(datas):
-            return
-        
-        # 返回的数据格式
-        size = 0
-        pred = None
-
-        if CONFIG.distributed_tracing:
-            self.logger.info(f"predict distributed_tracing predict start")
-
-        if KaiwuDRLDefine.MODEL_TENSORFLOW_SIMPLE == CONFIG.use_which_deep_learning_framework:
-            with TimeIt() as ti:
-                size, pred = self.predict_simple(datas)
-
-            # tensorflow的运行机制, TensorFlow 首先会构建计算图（Computation Graph)，这是一个表示计算操作和数据流的图结构。构建计算图需要一些额外的时间，因此第一次执行 session.run() 时会比较耗时。
-            # 作为统计, 因为该值是动态变化的, 故第一次可能比较高, 不影响后续统计
-            if self.actor_batch_predict_cost_time_ms < ti.interval * 1000:
-                self.actor_batch_predict_cost_time_ms = ti.interval * 1000
-
-        elif KaiwuDRLDefine.MODEL_TENSORFLOW_COMPLEX == CONFIG.use_which_deep_learning_framework:
-            with TimeIt() as ti:
-                size, pred = self.predict_tensorflow()
+    def reload_config(self):
+        self.config_snapshot = CONFIG.snapshot()
+
+        predict_funcs = {
+            KaiwuDRLDefine.MODEL_TENSORFLOW_SIMPLE: self.predict_simple,
+            KaiwuDRLDefine.MODEL_TENSORFLOW_COMPLEX: self.predict_tensorflow_complex,
+            KaiwuDRLDefine.MODEL_PYTORCH: self.predict_simple,
+            KaiwuDRLDefine.MODEL_TCNN: self.predict_tcnn,
+            KaiwuDRLDefine.MODEL_TENSORRT: self.predict_tensorrt,
+        }
+        self.predict_func = predict_funcs.get(self.config_snapshot.use_which_deep_learning_framework)
+
+        if self.config_snapshot.pipeline_process_sync:
+            self.send_response_func = self.put_predict_result
+        elif self.config_snapshot.use_zmq_ops:
+            self.send_response_func = self.send_response_to_aisrv
+        else:
+            self.send_response_func = self.send_response_to_aisrv_simple_fast
 
-            # tensorflow的运行机制, TensorFlow 首先会构建计算图（Computation Graph)，这是一个表示计算操作和数据流的图结构。构建计算图需要一些额外的时间，因此第一次执行 session.run() 时会比较耗时。
-            # 作为统计, 因为该值是动态变化的, 故第一次可能比较高, 不影响后续统计
-            if self.actor_batch_predict_cost_time_ms < ti.interval * 1000:
-                self.actor_batch_predict_cost_time_ms = ti.interval * 1000
+    def predict_tensorflow_complex(self, datas):
+        return self.predict_tensorflow()
 
-        elif KaiwuDRLDefine.MODEL_PYTORCH == CONFIG.use_which_deep_learning_framework:
-            with TimeIt() as ti:
-                size, pred = self.predict_simple(datas)
+    def predict_tcnn(self, datas):
+        return 0, None
 
-            if self.actor_batch_predict_cost_time_ms < ti.interval * 1000:
-                self.actor_batch_predict_cost_time_ms = ti.interval * 1000
+    '''
+    pipeline_process_sync模式下预测结果放入本地队列, 由actor_server取走
+    '''
+    def put_predict_result(self, size, pred):
+        self.predict_result_queue.put([size, pred])
 
-        elif KaiwuDRLDefine.MODEL_TCNN == CONFIG.use_which_deep_learning_framework:
-            pass
+    '''
+    预测函数
+    '''
+    def predict(self, datas):
 
-        elif KaiwuDRLDefine.MODEL_TENSORRT == CONFIG.use_which_deep_learning_framework:
-            with TimeIt() as ti:
-                size, pred = self.predict_tensorrt(datas)
+        if not datas or not len(datas):
+            return
 
-            if self.actor_batch_predict_cost_time_ms < ti.interval * 1000:
-                self.actor_batch_predict_cost_time_ms = ti.interval * 1000
+        distributed_tracing = self.config_snapshot.distributed_tracing
+        if distributed_tracing:
+            self.logger.info("predict distributed_tracing predict start")
 
-        else:
-            self.logger.error(f'predict error use_which_deep_learning_framework {CONFIG.use_which_deep_learning_framework}, only suport {KaiwuDRLDefine.MODEL_TCNN}, {KaiwuDRLDefine.MODEL_PYTORCH}, \
+        if not self.predict_func:
+            self.logger.error(f'predict error use_which_deep_learning_framework {self.config_snapshot.use_which_deep_learning_framework}, only suport {KaiwuDRLDefine.MODEL_TCNN}, {KaiwuDRLDefine.MODEL_PYTORCH}, \
                 {KaiwuDRLDefine.MODEL_TENSORFLOW_COMPLEX}, {KaiwuDRLDefine.MODEL_TENSORFLOW_SIMPLE}')
 
             return
 
-        if CONFIG.distributed_tracing:
-            self.logger.info(f"predict distributed_tracing predict end")
+        # tensorflow的运行机制, TensorFlow 首先会构建计算图（Computation Graph)，这是一个表示计算操作和数据流的图结构。构建计算图需要一些额外的时间，因此第一次执行 session.run() 时会比较耗时。
+        # 作为统计, 因为该值是动态变化的, 故第一次可能比较高, 只影响最高的分位数
+        with TimeIt() as ti:
+            size, pred = self.predict_func(datas)
+
+        self.batch_predict_time_histogram.record(ti.interval * 1000000)
+
+        if distributed_tracing:
+            self.logger.info("predict distributed_tracing predict end")
 
         # 处理actor --> aisrv的回包
-        if CONFIG.distributed_tracing:
-            self.logger.info(f"predict distributed_tracing predict put actor_server predict result start")
+        if distributed_tracing:
+            self.logger.info("predict distributed_tracing predict put actor_server predict result start")
 
         '''
         处理actor->aisrv的响应回包
         '''
-        if not CONFIG.pipeline_process_sync:
-            if CONFIG.aisrv_actor_communication_way == KaiwuDRLDefine.COMMUNICATION_WAY_ZMQ_OPS:
-                 self.send_response_to_aisrv(size, pred)
-            else:
-                self.send_response_to_aisrv_simple_fast(size, pred)
-        else:
-            self.predict_result_queue.put([size, pred])
+        self.send_response_func(size, pred)
 
-        if CONFIG.distributed_tracing:
-            self.logger.info(f"predict distributed_tracing predict put actor_server predict result end")
+        if distributed_tracing:
+            self.logger.info("predict distributed_tracing predict put actor_server predict result end")
 
     '''
     zmq_ops模式下发送响应包
     '''
     def send_response_to_aisrv(self, size, pred):
 
-        if CONFIG.distributed_tracing:
-            self.logger.info(f'actor_server distributed_tracing send_response_to_aisrv start', g_not_server_label)
+        if self.config_snapshot.distributed_tracing:
+            self.logger.info('actor_server distributed_tracing send_response_to_aisrv start', g_not_server_label)
     
         client_ids = pred.pop(KaiwuDRLDefine.CLIENT_ID_TENSOR)
         compose_ids = pred.pop(KaiwuDRLDefine.COMPOSE_ID_TENSOR)
@@ -846,8 +890,8 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
             dict_obj = {}
             for i in range(size):
                 send_data = {k: v[i] for k, v in pred.items()}
-                client_id = client_ids[i] if not CONFIG.use_rnn else client_ids[i][0]
-                compose_id = compose_ids[i] if not CONFIG.use_rnn else compose_ids[i][0]
+                client_id = client_ids[i] if not self.config_snapshot.use_rnn else client_ids[i][0]
+                compose_id = compose_ids[i] if not self.config_snapshot.use_rnn else compose_ids[i][0]
                 list_obj = dict_obj.setdefault(client_id, [])
                 list_obj.append((tuple(compose_id), send_data))
                 # self.logger.debug(f'actor_server zmq server will send a new msg {compose_id} to {client_id}', g_not_server_label)
@@ -861,31 +905,46 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
                 self.zmq_server.send(str(client_id), send_data, binary=True)
                 self.send_to_aisrv_succ_cnt += 1
 
-                if CONFIG.distributed_tracing:
-                    self.logger.info(f'actor_server distributed_tracing zmq server send a new msg to {compose_id} success', g_not_server_label)
+                if self.config_snapshot.distributed_tracing:
+                    self.logger.info('actor_server distributed_tracing zmq server send a new msg to {} success', compose_id, g_not_server_label)
 
-        if CONFIG.distributed_tracing:
-            self.logger.info(f'actor_server distributed_tracing send_response_to_aisrv end', g_not_server_label)
+        if self.config_snapshot.distributed_tracing:
+            self.logger.info('actor_server distributed_tracing send_response_to_aisrv end', g_not_server_label)
         
     '''
     actor给aisrv的回包组包处理, 免得阻塞actor_server进程
     '''
     def send_response_to_aisrv_simple_fast(self, size, preds):
-        if CONFIG.distributed_tracing:
+        if self.config_snapshot.distributed_tracing:
             self.logger.info('actor_server distributed_tracing send_response_to_aisrv_simple_fast start', g_not_server_label)
 
         dict_obj = {}
 
+        trace_context = ()
+        if self.latency_tracer:
+            model_start_ns, model_end_ns = self.trace_model_ns
+            model_us = (model_end_ns - model_start_ns) // 1000
+            post_us = (time.monotonic_ns() - model_end_ns) // 1000
+            self.latency_tracer.record(KaiwuDRLDefine.TRACE_STAGE_ACTOR_MODEL, model_us)
+            self.latency_tracer.record(KaiwuDRLDefine.TRACE_STAGE_ACTOR_POST, post_us)
+
         for j, pred in enumerate(preds):
             client_ids = pred[KaiwuDRLDefine.CLIENT_ID_TENSOR]
             compose_ids = pred[KaiwuDRLDefine.COMPOSE_ID_TENSOR]
 
-            if CONFIG.app == KaiwuDRLDefine.APP_SGAME_5V5:
+            # 追加在compose_id后面的actor_queue, actor_model, actor_post耗时, pipeline_process_sync模式下没有收包时间
+            if self.latency_tracer:
+                queue_us = (model_start_ns - self.trace_arrival_ns[j]) // 1000 if j < len(self.trace_arrival_ns) else 0
+                self.latency_tracer.record(KaiwuDRLDefine.TRACE_STAGE_ACTOR_QUEUE, queue_us)
+                trace_context = (queue_us, model_us, post_us)
+
+            if self.config_snapshot.is_sgame_5v5:
                 send_data = pred['pred']
                 client_id = client_ids[0]
                 compose_id = compose_ids[0]
-                res = [(tuple(compose_id), send_data)]
-                dict_obj[client_id] = res
+                # 开启actor_proxy_coalesce_window_ms时, 同一个ActorProxy合并的多个slot共用client_id, 需要追加而不是覆盖
+                list_obj = dict_obj.setdefault(client_id, [])
+                list_obj.append((tuple(compose_id) + trace_context, send_data))
             else:
                 send_data = {
                     'format_action': pred['pred'][0],
@@ -894,10 +953,10 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
                 }
 
                 for i in range(size[j] - 2):
-                    client_id = client_ids[i] if not CONFIG.use_rnn else client_ids[i][0]
-                    compose_id = compose_ids[i] if not CONFIG.use_rnn else compose_ids[i][0]
+                    client_id = client_ids[i] if not self.config_snapshot.use_rnn else client_ids[i][0]
+                    compose_id = compose_ids[i] if not self.config_snapshot.use_rnn else compose_ids[i][0]
                     list_obj = dict_obj.setdefault(client_id, [])
-                    list_obj.append((tuple(compose_id), send_data))
+                    list_obj.append((tuple(compose_id) + trace_context, send_data))
 
         for client_id, send_data in dict_obj.items():
 
@@ -905,8 +964,7 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
             with TimeIt() as ti:
                 compressed_data = compress_data(send_data)
 
-            if self.max_compress_time < ti.interval:
-                self.max_compress_time = ti.interval
+            self.compress_time_histogram.record(ti.interval * 1000000)
 
             compress_msg_len = len(compressed_data)
             if self.max_compress_size < compress_msg_len:
@@ -915,14 +973,17 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
             # 这里直接放置的是client_id, compressed_data对
             self.send_server.put_predict_result_data([client_id, compressed_data])
 
-            if CONFIG.server_use_processes == KaiwuDRLDefine.RUN_AS_THREAD:
+            if self.latency_tracer:
+                self.latency_tracer.record_ns(KaiwuDRLDefine.TRACE_STAGE_ACTOR_SEND, model_end_ns)
+
+            if self.config_snapshot.run_as_thread:
                 with self.send_server.predict_result_condition:
                     self.send_server.predict_result_condition.notify()
 
-            if CONFIG.distributed_tracing:
-                self.logger.info(f'actor_server distributed_tracing zmq server send a new msg to {client_id} success', g_not_server_label)
+            if self.config_snapshot.distributed_tracing:
+                self.logger.info('actor_server distributed_tracing zmq server send a new msg to {} success', client_id, g_not_server_label)
 
-        if CONFIG.distributed_tracing:
+        if self.config_snapshot.distributed_tracing:
             self.logger.info('actor_server distributed_tracing send_response_to_aisrv_simple_fast end')
 
     '''
@@ -949,7 +1010,13 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
         if datas:
 
             # 步骤4, 预测
-            self.predict(datas)
+            with TimeIt() as ti:
+                self.predict(datas)
+
+            # 自适应批处理, 统计本批次的预测耗时和端到端时延
+            if self.adaptive_batcher:
+                self.adaptive_batcher.on_batch_done(self.batch_assembler.batch_size(datas), ti.interval * 1000,
+                                                    (time.monotonic() - self.batch_first_arrival_time) * 1000)
 
         # Model文件同步操作, learner --> actor, 采用单独的进程处理
     
@@ -957,7 +1024,7 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
     actor上执行on-policy流程
     '''
     def actor_on_policy_process(self):
-        if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
+        if self.config_snapshot.is_on_policy:
             self.actor_on_policy_process_detail()
 
     '''
@@ -982,6 +1049,37 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
         
         return all_pull_model_success
 
+    '''
+    actor接收learner通过zmq PUB广播的模型参数, 直接设置到session里, 不经过modelpool和磁盘
+    未开启广播, 超时没有收齐或者model_wrapper不支持set_weights时返回False, learner会回退到modelpool流程
+    '''
+    def actor_get_weights_from_broadcast(self, model_version):
+        if not self.weight_subscriber:
+            return False
+
+        try:
+            with TimeIt() as ti:
+                result = self.weight_subscriber.recv_weights(model_version, float(CONFIG.weight_broadcast_timeout_seconds))
+                if not result:
+                    self.logger.error(f'predict recv weights model_version: {model_version} timeout')
+                    return False
+
+                _, weights = result
+                if not self.model_wrapper.set_weights(weights):
+                    self.logger.error(f'predict model_wrapper not support set_weights')
+                    return False
+
+        except Exception as e:
+            self.logger.error(f'predict recv weights error, as {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
+            return False
+
+        if self.actor_load_last_model_cost_ms < ti.interval * 1000:
+            self.actor_load_last_model_cost_ms = ti.interval * 1000
+        self.actor_load_last_model_succ_cnt += 1
+
+        self.logger.info(f'predict recv weights model_version: {model_version} success, cost {ti.interval * 1000:.1f} ms')
+        return True
+
     '''
     actor上的on-policy的处理流程:
     1. 同步model_version请求
@@ -1001,7 +1099,26 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
             # 获取来自learner的 model文件同步请求
             client_id, message = self.zmq_server.recv(block=False, binary=False)
             if message:
-                if message[KaiwuDRLDefine.ON_POLICY_MESSAGE_TYPE] == KaiwuDRLDefine.ON_POLICY_MESSAGE_MODEL_VERSION_CHANGE_REQUEST:
+                if message[KaiwuDRLDefine.ON_POLICY_MESSAGE_TYPE] == KaiwuDRLDefine.ON_POLICY_MESSAGE_MODEL_VERSION_CHANGE_REQUEST and message.get(KaiwuDRLDefine.ON_POLICY_MESSAGE_WEIGHT_BROADCAST):
+
+                    # learner已经广播了模型参数, 失败时learner会再发送不带广播标志的请求, 走modelpool流程
+                    actor_execute_on_policy_success = self.actor_get_weights_from_broadcast(message[KaiwuDRLDefine.ON_POLICY_MESSAGE_VALUE])
+                    if actor_execute_on_policy_success:
+                        self.current_sync_model_version_from_learner = message[KaiwuDRLDefine.ON_POLICY_MESSAGE_VALUE]
+                        self.on_policy_recv_weight_broadcast_success_cnt += 1
+                        self.actor_change_model_version_success_count += 1
+                    else:
+                        self.on_policy_recv_weight_broadcast_error_cnt += 1
+                        self.actor_change_model_version_error_count += 1
+
+                    send_data = {
+                                    KaiwuDRLDefine.ON_POLICY_MESSAGE_TYPE: KaiwuDRLDefine.ON_POLICY_MESSAGE_MODEL_VERSION_CHANGE_RESPONSE,
+                                    KaiwuDRLDefine.ON_POLICY_MESSAGE_VALUE: actor_execute_on_policy_success
+                                }
+                    self.zmq_server.send(str(client_id), send_data, binary=False)
+                    self.logger.info(f"predict learner ask actor to {message[KaiwuDRLDefine.ON_POLICY_MESSAGE_TYPE]} by weight broadcast success")
+
+                elif message[KaiwuDRLDefine.ON_POLICY_MESSAGE_TYPE] == KaiwuDRLDefine.ON_POLICY_MESSAGE_MODEL_VERSION_CHANGE_REQUEST:
 
                     '''
                     actor重新从modelpool获取文件, 因为是learner才push到modelpool, 这里加上重试机制
@@ -1080,10 +1197,10 @@ class OnPolicyPredictor(Predictor, multiprocessing.Process):
                 self.run_once()
 
                 # 因为在pipeline_process_sync模式下一直从本地收包容易导致CPU100%, 而在非pipeline_process_sync模式下有收包超时时间反而不容易发生
-                if CONFIG.pipeline_process_sync:
+                if self.config_snapshot.pipeline_process_sync:
                     # 短暂sleep, 规避容器里进程CPU使用率100%问题, 由于存在actor的按照时间间隔去预测, 故这里不休眠, 后期修改为事件机制
-                    if self.process_run_idle_count % CONFIG.idle_sleep_count == 0:
-                        time.sleep(CONFIG.idle_sleep_second)
+                    if self.process_run_idle_count % self.config_snapshot.idle_sleep_count == 0:
+                        time.sleep(self.config_snapshot.idle_sleep_second)
 
                         # process_run_count置0, 规避溢出
                         self.process_run_idle_count = 0
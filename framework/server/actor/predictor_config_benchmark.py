@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+'''
+OnPolicyPredictor单次循环里配置访问开销的微基准测试, 只统计配置分支的耗时:
+1. before, 和修改前一致, 每次循环访问CONFIG, 做int()转换和KaiwuDRLDefine字符串比较, 按照if/elif选择预测和回包函数
+2. after, 进程启动时生成配置快照, 预先选择好预测和回包函数
+
+注意这里不是OnPolicyPredictor真实的循环: before和after都是按照配置分支手写的副本, 预测和回包采用空函数,
+不包括收包, 组batch, 模型预测和压缩, 结果只反映配置访问和分支选择的开销, 不代表predictor整体的吞吐
+
+python3 framework/server/actor/predictor_config_benchmark.py --count 1000000 --batch_size 32
+'''
+
+import time
+import argparse
+from framework.common.config.config_control import CONFIG
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--count', default=1000000, type=int)
+parser.add_argument('--batch_size', default=32, type=int)
+parser.add_argument('--config_file', default='conf/framework/actor.toml', type=str)
+
+args = parser.parse_args()
+
+
+def predict_simple(datas):
+    return [len(datas)] * len(datas), datas
+
+
+def send_response(size, pred):
+    pass
+
+
+'''
+修改前的单次循环: 收包条件, 预测函数选择, on-policy判断, 回包函数选择, 按照样本的use_rnn和app判断
+'''
+def loop_before(datas):
+    if not CONFIG.pipeline_process_sync:
+        target_batch_size, wait_ms = int(CONFIG.predict_batch_size), int(CONFIG.actor_receive_cost_time_ms)
+        if not CONFIG.actor_server_predict_server_different_queue:
+            pass
+
+    if CONFIG.distributed_tracing:
+        pass
+
+    if KaiwuDRLDefine.MODEL_TENSORFLOW_SIMPLE == CONFIG.use_which_deep_learning_framework:
+        size, pred = predict_simple(datas)
+    elif KaiwuDRLDefine.MODEL_TENSORFLOW_COMPLEX == CONFIG.use_which_deep_learning_framework:
+        size, pred = predict_simple(datas)
+    elif KaiwuDRLDefine.MODEL_PYTORCH == CONFIG.use_which_deep_learning_framework:
+        size, pred = predict_simple(datas)
+    elif KaiwuDRLDefine.MODEL_TCNN == CONFIG.use_which_deep_learning_framework:
+        size, pred = predict_simple(datas)
+    elif KaiwuDRLDefine.MODEL_TENSORRT == CONFIG.use_which_deep_learning_framework:
+        size, pred = predict_simple(datas)
+    else:
+        return
+
+    if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
+        pass
+
+    if not CONFIG.pipeline_process_sync:
+        if CONFIG.aisrv_actor_communication_way == KaiwuDRLDefine.COMMUNICATION_WAY_ZMQ_OPS:
+            send_response(size, pred)
+        else:
+            send_response(size, pred)
+
+    for data in datas:
+        if CONFIG.app == KaiwuDRLDefine.APP_SGAME_5V5:
+            pass
+        client_id = data if not CONFIG.use_rnn else data[0]
+        if CONFIG.server_use_processes == KaiwuDRLDefine.RUN_AS_THREAD:
+            pass
+
+    if CONFIG.distributed_tracing:
+        pass
+
+
+'''
+修改后的单次循环, 和OnPolicyPredictor里的写法一致
+'''
+def loop_after(datas, config_snapshot, predict_func, send_response_func):
+    if not config_snapshot.pipeline_process_sync:
+        target_batch_size, wait_ms = config_snapshot.predict_batch_size, config_snapshot.actor_receive_cost_time_ms
+        if not config_snapshot.actor_server_predict_server_different_queue:
+            pass
+
+    distributed_tracing = config_snapshot.distributed_tracing
+    if distributed_tracing:
+        pass
+
+    # 和OnPolicyPredictor.predict一致, 不支持的框架直接返回
+    if not predict_func:
+        return
+
+    size, pred = predict_func(datas)
+
+    if config_snapshot.is_on_policy:
+        pass
+
+    send_response_func(size, pred)
+
+    for data in datas:
+        if config_snapshot.is_sgame_5v5:
+            pass
+        client_id = data if not config_snapshot.use_rnn else data[0]
+        if config_snapshot.run_as_thread:
+            pass
+
+    if distributed_tracing:
+        pass
+
+
+def benchmark(name, func):
+    start = time.time()
+    for _ in range(args.count):
+        func()
+    cost = (time.time() - start) / args.count * 1e6
+
+    print(f'{name:<8} {cost:>8.3f} us per loop')
+    return cost
+
+
+def main():
+    CONFIG.set_configure_file(args.config_file)
+    CONFIG.parse_actor_configure()
+
+    datas = list(range(args.batch_size))
+
+    config_snapshot = CONFIG.snapshot()
+    predict_funcs = {
+        KaiwuDRLDefine.MODEL_TENSORFLOW_SIMPLE: predict_simple,
+        KaiwuDRLDefine.MODEL_TENSORFLOW_COMPLEX: predict_simple,
+        KaiwuDRLDefine.MODEL_PYTORCH: predict_simple,
+        KaiwuDRLDefine.MODEL_TCNN: predict_simple,
+        KaiwuDRLDefine.MODEL_TENSORRT: predict_simple,
+    }
+    # 和OnPolicyPredictor.reload_config一致, 不支持的框架为None
+    predict_func = predict_funcs.get(config_snapshot.use_which_deep_learning_framework)
+
+    before = benchmark('before', lambda: loop_before(datas))
+    after = benchmark('after', lambda: loop_after(datas, config_snapshot, predict_func, send_response))
+
+    print(f'speedup {before / after:.2f}x, batch_size {args.batch_size}')
+
+
+if __name__ == '__main__':
+    main()
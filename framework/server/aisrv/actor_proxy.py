@@ -4,6 +4,7 @@
 
 import multiprocessing
 import os
+import queue
 import time
 import traceback
 import numpy as np
@@ -24,8 +25,10 @@ from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 if CONFIG.aisrv_actor_communication_way == KaiwuDRLDefine.COMMUNICATION_WAY_ZMQ_OPS:
     from framework.common.pybind11.zmq_ops.zmq_ops import dump_arrays
 from framework.common.logging.kaiwu_logger import KaiwuLogger, g_not_server_label
-from framework.common.utils.common_func import get_uuid, compress_data, decompress_data, get_mean_and_max
+from framework.common.utils.common_func import get_uuid, compress_data, decompress_data, compress_predict_request
 from framework.common.monitor.monitor_proxy import MonitorProxy
+from framework.common.monitor.latency_tracer import LatencyTracer
+from framework.common.monitor.histogram import LogLinearHistogram
 from framework.common.protocol.aisrv_actor_req_resp_pb2 import AisrvActorRequest
 from framework.common.protocol.aisrv_actor_req_resp_pb2 import AisrvActorResponse
 
@@ -86,17 +89,26 @@ class ActorProxy(multiprocessing.Process):
         self.recv_from_actor_succ_cnt = 0
         self.recv_from_actor_error_cnt = 0
 
-        # 采用压缩算法时, 压缩耗时, 解压缩耗时, 压缩大小
-        self.max_compress_time = 0
-        self.max_decompress_time = 0
+        # 采用压缩算法时, 压缩耗时和解压缩耗时按照直方图统计, 单位为微秒, 压缩大小取最大值
+        self.compress_time_histogram = LogLinearHistogram()
+        self.decompress_time_histogram = LogLinearHistogram()
         self.max_compress_size = 0
+
+        # 单个消息里合并的最大请求数目
+        self.max_coalesce_size = 0
+
+        # 单帧时延分阶段统计, 打开时预测请求后面追加放入msg_queue的时间
+        self.use_latency_tracing = int(CONFIG.use_latency_tracing)
     
     # 需要区分是哪个agent发送的请求
     def put_predict_data(self, slot_id, agent_id, message_id, model_version, predict_data) -> None:
         if not predict_data or self.msg_queue.full():
             return False
         
-        self.msg_queue.put(((slot_id, agent_id, message_id, model_version), predict_data))
+        if self.use_latency_tracing:
+            self.msg_queue.put(((slot_id, agent_id, message_id, model_version), predict_data, time.monotonic_ns()))
+        else:
+            self.msg_queue.put(((slot_id, agent_id, message_id, model_version), predict_data))
         return True
     
     # 同一个对局的两个agent数据同时发送过来，需要actor同时处理
@@ -142,46 +154,81 @@ class ActorProxy(multiprocessing.Process):
             # 业务数据反序列化
             pred_data = self.deserialize_buff_data(pred_data)
             
-            if self.max_decompress_time < ti.interval:
-                self.max_decompress_time = ti.interval
+            self.decompress_time_histogram.record(ti.interval * 1000000)
 
             self.recv_from_actor_succ_cnt += 1
             
             # 处理响应回包
             result_map = {}
             for compose_id, pred_result in pred_data:
-                slot_id, agent_id, message_id, model_version = compose_id
+                slot_id, agent_id, message_id, model_version = compose_id[:KaiwuDRLDefine.COMPOSE_ID_SIZE]
 
-                # 增加model_version值
-                pred_result['model_version'] = model_version
-                result_map.setdefault(slot_id, {})[agent_id] = pred_result
+                # 增加model_version值, 5v5等场景的预测结果不是dict, model_version按照agent_id单独存放
+                slot_result = result_map.setdefault(slot_id, {})
+                if isinstance(pred_result, dict):
+                    pred_result['model_version'] = model_version
+                else:
+                    slot_result.setdefault(KaiwuDRLDefine.SAMPLE_MODEL_VERSION, {})[agent_id] = model_version
+                slot_result[agent_id] = pred_result
+
+                if self.latency_tracer and isinstance(pred_result, dict):
+                    self.trace_predict_result(compose_id, pred_result)
 
                 if CONFIG.distributed_tracing:
                     self.logger.info(f'actor_proxy distributed_tracing compose_id {compose_id} from zmq server {self.get_zmq_server_ip()} success', g_not_server_label)
 
                 '''
                 处理响应回包里超时情况, 处理步骤如下:
-                1. 按照message_id计算出耗时, 放入time_cost_map
+                1. 按照message_id计算出耗时, 放入time_cost_histogram
                 2. 删除timeout_map对应的message_id项
 
                 主要去掉第一帧耗时大的
                 ''' 
-                index = (slot_id, agent_id, message_id)
-                if index in self.timeout_map:
-                    now = int(round(time.time() * 1000))
-                    cost_time = now - self.timeout_map.get(index)
-                    self.time_cost_map[index] = cost_time
-
-                    del self.timeout_map[index]
+                send_ns = self.timeout_map.pop((slot_id, agent_id, message_id), None)
+                if send_ns:
+                    self.time_cost_histogram.record((time.monotonic_ns() - send_ns) // 1000)
 
             for slot_id, client_results in result_map.items():
-                output_pipe = self.slots.get_output_pipe(self.slot_group_name, slot_id)
-                output_pipe.send(client_results)
+                # 单个slot的信箱写满或者响应过大时, 不影响其他slot的响应
+                try:
+                    output_pipe = self.slots.get_output_pipe(self.slot_group_name, slot_id)
+                    output_pipe.send(client_results)
+                except Exception as e:
+                    self.logger.error(f'actor_proxy slot_id {slot_id} output_pipe send error: {str(e)}', g_not_server_label)
                 # self.logger.debug(f'actor_proxy slot_id {slot_id} output_pipe send success', g_not_server_label)
 
         except Exception as e:
             self.process_run_idle_count += 1
 
+    '''
+    单帧时延分阶段统计:
+    1. 往返耗时为发送预测请求到收到预测响应, 减去actor随compose_id回传的各阶段耗时即为网络耗时
+    2. 收到响应的时间放入预测结果里, 由kaiwu_rl_helper统计actor_proxy到kaiwu_rl_helper的耗时
+    '''
+    def trace_predict_result(self, compose_id, pred_result):
+        now = time.monotonic_ns()
+        pred_result['trace_ns'] = now
+
+        send_ns = self.trace_send_map.pop(tuple(int(x) for x in compose_id[:3]), None)
+        trace_context = compose_id[KaiwuDRLDefine.COMPOSE_ID_SIZE:]
+        if not send_ns or len(trace_context) != KaiwuDRLDefine.TRACE_CONTEXT_SIZE:
+            return
+
+        queue_us, model_us, post_us = trace_context
+        self.latency_tracer.record(KaiwuDRLDefine.TRACE_STAGE_ACTOR_QUEUE, queue_us)
+        self.latency_tracer.record(KaiwuDRLDefine.TRACE_STAGE_ACTOR_MODEL, model_us)
+        self.latency_tracer.record(KaiwuDRLDefine.TRACE_STAGE_ACTOR_POST, post_us)
+        self.latency_tracer.record(KaiwuDRLDefine.TRACE_STAGE_NETWORK, (now - send_ns) // 1000 - queue_us - model_us - post_us)
+
+    '''
+    发送预测请求后记录本次发送的各个请求的msg_queue排队耗时和发送时间
+    '''
+    def trace_send_buffer_data(self):
+        now = time.monotonic_ns()
+        for i in range(self.cur_buf_size):
+            self.latency_tracer.record_ns(KaiwuDRLDefine.TRACE_STAGE_PROXY_QUEUE, self.trace_enqueue_ns[i], now)
+            self.trace_send_map[tuple(self.compose_id_buf[i][:3].tolist())] = now
+
     '''
     包括的操作:
     1. aisrv --> actor发送预测请求
@@ -223,14 +270,14 @@ class ActorProxy(multiprocessing.Process):
     针对不同的数据类型, 进行反序列化
     消息的数据格式:
     (compose_id, pred_result)
-    1. pickle, 直接返回
+    1. pickle/binary, 直接返回, binary协议下预测响应依旧采用pickle
     2. protobuf, 从KaiwuServerResponse获取数据后组装返回
     '''
     def deserialize_buff_data(self, data):
         if not data:
             return data
 
-        if CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PICKLE:
+        if CONFIG.aisrv_actor_protocl in (KaiwuDRLDefine.PROTOCL_PICKLE, KaiwuDRLDefine.PROTOCL_BINARY):
             return data
         
         elif CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PROTOBUF:
@@ -266,19 +313,19 @@ class ActorProxy(multiprocessing.Process):
     '''
     def serialize_buffer_data(self):
         # 序列化 pre_req(业务State定义的类里的key的顺序) + client_id + compose_id(agent_id, slot_id)
-        
-        assert self.cur_buf_size==1
+        # 合并发送时cur_buf_size为本次合并的请求数目, 每个字段的第一维为cur_buf_size
         # self.logger.info(f'actor_proxy cur_buf_size is:{self.cur_buf_size}', g_not_server_label)
 
-        # 采用pickle序列化
-        if CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PICKLE:
+        # 采用pickle序列化或者binary格式, 两者的消息内容一致
+        if CONFIG.aisrv_actor_protocl in (KaiwuDRLDefine.PROTOCL_PICKLE, KaiwuDRLDefine.PROTOCL_BINARY):
             pred_req = [self.buffer_data[key][:self.cur_buf_size] for key in self.state_keys]
 
             msg = pred_req + [self.client_id_buf[:self.cur_buf_size], self.compose_id_buf[:self.cur_buf_size]]
 
-        # 采用protobuf序列化
+        # 采用protobuf序列化, 不支持合并发送
         elif CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PROTOBUF:
-            
+            assert self.cur_buf_size == 1
+
             kaiwu_server_request = AisrvActorRequest()
             kaiwu_server_request.client_id = self.client_id_buf[:self.cur_buf_size][0]
             kaiwu_server_request.sample_size = 1
@@ -294,13 +341,12 @@ class ActorProxy(multiprocessing.Process):
 
             msg = kaiwu_server_request
 
-        # 增加lz4的压缩
+        # 增加lz4的压缩, binary格式下按照字段压缩
         with TimeIt() as ti:
-            compress_msg = compress_data(msg)
+            compress_msg = compress_predict_request(msg)
 
         # 压缩耗时和压缩包大小
-        if self.max_compress_time < ti.interval:
-            self.max_compress_time = ti.interval
+        self.compress_time_histogram.record(ti.interval * 1000000)
         
         compress_msg_len = len(compress_msg)
         if self.max_compress_size < compress_msg_len:
@@ -372,6 +418,18 @@ class ActorProxy(multiprocessing.Process):
         
         self.cur_buf_size = 0
 
+        '''
+        合并发送, 在coalesce_window_ms时间窗口内合并多个对局的预测请求, 最多proxy_batch_size个, 作为一个消息发送给actor
+        actor按照client_id分组回包, 回包里包括本消息的所有compose_id, 再按照slot_id分发
+        protobuf协议下actor为C++常驻进程, 不支持合并
+        '''
+        self.coalesce_window_ms = 0
+        if CONFIG.aisrv_actor_protocl in (KaiwuDRLDefine.PROTOCL_PICKLE, KaiwuDRLDefine.PROTOCL_BINARY):
+            self.coalesce_window_ms = float(CONFIG.actor_proxy_coalesce_window_ms)
+
+        # 合并时从队列里取到的多agent请求不能合并, 留到下一次单独发送
+        self.pending_predict_data = None
+
         # 启动记录发送成功失败的数目的定时器
         self.send_and_recv_zmq_stat()
 
@@ -384,13 +442,22 @@ class ActorProxy(multiprocessing.Process):
             self.monitor_proxy.start()
 
         '''
-        用于做超时控制的, key为aisrv --> actor的message_id, value为发送时间
+        用于做超时控制的, key为aisrv --> actor的message_id, value为发送时间(time.monotonic_ns)
         1. 发送时, 将message_id和发送时间放在map里
-        2. 当响应包回来, 则当前时间 - 发送时间, 即耗时
+        2. 当响应包回来, 则当前时间 - 发送时间, 即耗时, 记录到time_cost_histogram
         3. 如果在一定时间里没有响应包回来, 则开始删除map里的key, 并且记录ERROR日志
         '''
         self.timeout_map = {}
-        self.time_cost_map = {}
+        self.time_cost_histogram = LogLinearHistogram()
+
+        '''
+        单帧时延分阶段统计, trace_enqueue_ns和buffer_data一一对应, trace_send_map的key和timeout_map一致, value为发送时间
+        '''
+        self.latency_tracer = None
+        if self.use_latency_tracing:
+            self.latency_tracer = LatencyTracer(KaiwuDRLDefine.MONITOR_TRACE_ACTOR_PROXY_PREFIX)
+            self.trace_enqueue_ns = [0] * (CONFIG.proxy_batch_size * 2)
+            self.trace_send_map = {}
     
     def prometheus_stat_reset(self):
         self.send_to_actor_succ_cnt = 0
@@ -399,8 +466,11 @@ class ActorProxy(multiprocessing.Process):
         self.recv_from_actor_error_cnt = 0
 
         self.max_compress_size = 0
-        self.max_compress_time = 0
-        self.max_decompress_time = 0
+        self.max_coalesce_size = 0
+
+        self.compress_time_histogram.reset()
+        self.decompress_time_histogram.reset()
+        self.time_cost_histogram.reset()
 
     '''
     普罗米修斯相关数据上报, 不能阻塞核心流程, 故采用间隔prometheus_stat_per_minutes进行上报处理
@@ -425,9 +495,10 @@ class ActorProxy(multiprocessing.Process):
                 KaiwuDRLDefine.MONITOR_AISRV_RECVFROM_ACTOR_SUCC_CNT : self.recv_from_actor_succ_cnt,
                 KaiwuDRLDefine.MONITOR_AISRV_RECVFROM_ACTOR_ERROR_CNT : self.recv_from_actor_error_cnt,
                 KaiwuDRLDefine.MONITOR_AISRV_ACTOR_PROXY_QUEUE_LEN : msg_queue_size,
-                KaiwuDRLDefine.MONITOR_AISRV_MAX_COMPRESS_TIME : self.max_compress_time,
-                KaiwuDRLDefine.MONITOR_AISRV_MAX_DECOMPRESS_TIME : self.max_decompress_time,
-                KaiwuDRLDefine.MONITOR_AISRV_MAX_COMPRESS_SIZE : self.max_compress_size
+                KaiwuDRLDefine.MONITOR_AISRV_COMPRESS_TIME_US : self.compress_time_histogram.drain(),
+                KaiwuDRLDefine.MONITOR_AISRV_DECOMPRESS_TIME_US : self.decompress_time_histogram.drain(),
+                KaiwuDRLDefine.MONITOR_AISRV_MAX_COMPRESS_SIZE : self.max_compress_size,
+                KaiwuDRLDefine.MONITOR_AISRV_ACTOR_PROXY_MAX_COALESCE_SIZE : self.max_coalesce_size,
 
             }
 
@@ -438,22 +509,18 @@ class ActorProxy(multiprocessing.Process):
                           recv_error_cnt is {self.recv_from_actor_error_cnt}', g_not_server_label)
         '''
         
-        # 针对aisrv发出去的请求, 有响应包的场景, 只是计算最大值和平均值时延
+        # 针对aisrv发出去的请求, 有响应包的场景, 按照直方图上报时延分位数
         if int(CONFIG.use_prometheus):
-            mean_value, max_value = get_mean_and_max(self.time_cost_map.values())
-
-            monitor_data[KaiwuDRLDefine.MONITOR_AISRV_ACTOR_MEAN_TIME_COST] = mean_value
-            monitor_data[KaiwuDRLDefine.MONITOR_AISRV_ACTOR_MAX_TIME_COST] = max_value
-        
-        self.time_cost_map.clear()
+            monitor_data[KaiwuDRLDefine.MONITOR_AISRV_ACTOR_TIME_COST_US] = self.time_cost_histogram.drain()
 
         # 针对aisrv发出去的请求, 没有响应包的场景
         timeout_cnt = 0
+        now = time.monotonic_ns()
         for key in list(self.timeout_map.keys()):
             value = self.timeout_map.get(key)
 
             # 计算下来是s为单位
-            time_dela = (int(round(time.time() * 1000)) - value) / 1000
+            time_dela = (now - value) / 1000000000
 
             if  time_dela > CONFIG.aisrv_actor_timeout_second_threshold:
                 timeout_cnt += 1
@@ -464,6 +531,15 @@ class ActorProxy(multiprocessing.Process):
 
         if int(CONFIG.use_prometheus):
             monitor_data[f'{KaiwuDRLDefine.MONITOR_AISRV_ACTOR_TIMEOUT_GT}{CONFIG.aisrv_actor_timeout_second_threshold}'] = timeout_cnt
+
+        # 单帧时延分阶段统计, 没有响应包的请求随timeout_map一起清理
+        if self.latency_tracer:
+            if int(CONFIG.use_prometheus):
+                monitor_data.update(self.latency_tracer.monitor_data())
+
+            deadline = time.monotonic_ns() - CONFIG.aisrv_actor_timeout_second_threshold * 1000000000
+            for key in [key for key, send_ns in self.trace_send_map.items() if send_ns < deadline]:
+                del self.trace_send_map[key]
         
         if monitor_data:
             self.monitor_proxy.put_data(monitor_data)
@@ -481,6 +557,8 @@ class ActorProxy(multiprocessing.Process):
         msg = self.get_data_from_predict_data_queue()
         if msg:
             self.send_data_to_actor_detail(msg)
+            if self.latency_tracer:
+                self.trace_send_buffer_data()
             self.cur_buf_size = 0
 
     '''
@@ -492,37 +570,83 @@ class ActorProxy(multiprocessing.Process):
         msg = self.get_data_from_predict_data_queue()
         if msg:
             self.send_data_to_actor_detail(msg)
+            if self.latency_tracer:
+                self.trace_send_buffer_data()
             self.cur_buf_size = 0
 
+    '''
+    单帧单agent的预测请求放入buffer_data
+    '''
+    def put_to_buffer_data(self, tmp_data):
+        compose_id, data = tmp_data[0], tmp_data[1]
+
+        self.compose_id_buf[self.cur_buf_size] = np.asarray(compose_id).astype(np.int32)
+        if self.latency_tracer:
+            self.trace_enqueue_ns[self.cur_buf_size] = tmp_data[2] if len(tmp_data) > 2 else 0
+
+        for key in self.state_keys:
+            self.buffer_data[key][self.cur_buf_size] = data[key]
+
+        self.cur_buf_size += 1
+
+        '''
+        注意:
+        1. 获取当前时间放入timeout_map, 第一帧耗时比较大, 不做统计
+        2. slot_id, agent_id, message_id作为存放时延的key, 不能加入model_version, 该值可能被actor返回的值修改掉
+        '''
+        # 获取当前时间放入timeout_map, 第一帧耗时比较大, 不做统计
+        (slot_id, agent_id, message_id, model_version) = compose_id
+        if message_id != 1:
+            self.timeout_map[(slot_id, agent_id, message_id)] = time.monotonic_ns()
+
+        if CONFIG.distributed_tracing:
+            self.logger.info(f'actor_proxy distributed_tracing compose_id {compose_id} will send to actor {self.get_zmq_server_ip()}', g_not_server_label)
+
+    '''
+    在coalesce_window_ms时间窗口内继续收集其他对局的预测请求, 直到窗口结束或者达到proxy_batch_size
+    取到多agent的请求时结束合并, 该请求放入pending_predict_data, 下一次单独发送
+    '''
+    def coalesce_predict_data(self):
+        deadline = time.monotonic() + self.coalesce_window_ms / 1000
+        while self.cur_buf_size < CONFIG.proxy_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            try:
+                tmp_data = self.msg_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if not tmp_data:
+                continue
+
+            # 只合并单帧单agent的请求
+            if not isinstance(tmp_data, tuple):
+                self.pending_predict_data = tmp_data
+                break
+
+            self.put_to_buffer_data(tmp_data)
+
+        if self.max_coalesce_size < self.cur_buf_size:
+            self.max_coalesce_size = self.cur_buf_size
+
     def get_data_from_predict_data_queue(self):
-        tmp_data = self.msg_queue.get()
+        if self.pending_predict_data is not None:
+            tmp_data = self.pending_predict_data
+            self.pending_predict_data = None
+        else:
+            tmp_data = self.msg_queue.get()
         if not tmp_data:
             return None
 
         # 单帧单agent处理逻辑
         if isinstance(tmp_data, tuple):
-            
-            compose_id, data = tmp_data
-
-            self.compose_id_buf[self.cur_buf_size] = np.asarray(compose_id).astype(np.int32)
+            self.put_to_buffer_data(tmp_data)
 
-            for key in self.state_keys:
-                self.buffer_data[key][self.cur_buf_size] = data[key]
-            
-            self.cur_buf_size += 1
-
-            '''
-            注意:
-            1. 获取当前时间放入timeout_map, 第一帧耗时比较大, 不做统计
-            2. slot_id, agent_id, message_id作为存放时延的key, 不能加入model_version, 该值可能被actor返回的值修改掉
-            '''
-            # 获取当前时间放入timeout_map, 第一帧耗时比较大, 不做统计
-            (slot_id, agent_id, message_id, model_version) = compose_id
-            if message_id != 1:
-                self.timeout_map[(slot_id, agent_id, message_id)] = int(round(time.time() * 1000))
-            
-            if CONFIG.distributed_tracing:
-                self.logger.info(f'actor_proxy distributed_tracing compose_id {compose_id} will send to actor {self.get_zmq_server_ip()}', g_not_server_label)
+            # 合并多个对局的预测请求, 一个消息发送
+            if self.coalesce_window_ms > 0:
+                self.coalesce_predict_data()
 
             msg = self.serialize_buffer_data()
         
@@ -532,7 +656,7 @@ class ActorProxy(multiprocessing.Process):
             
             (slot_id, agent_id, message_id, model_version) = compose_id_0
             if message_id != 1:
-                self.timeout_map[(slot_id, agent_id, message_id)] = int(round(time.time() * 1000))
+                self.timeout_map[(slot_id, agent_id, message_id)] = time.monotonic_ns()
                 
             kaiwu_server_request = AisrvActorRequest()
             kaiwu_server_request.client_id = self.client_id_buf[0]
@@ -47,7 +47,7 @@ def register_signal():
 '''
 下面是目前业务的正确配置项, 如果配置错误, 则强制进行修正
 sgame_1v1:
-1. aisrv_actor_protocl = pickle
+1. aisrv_actor_protocl = pickle or binary
 
 sgame_5v5:
 1. aisrv_actor_protocl = protobuf
@@ -57,7 +57,7 @@ gym:
 '''
 def app_check_param():
     if CONFIG.app == KaiwuDRLDefine.APP_SGAME_1V1:
-        if CONFIG.aisrv_actor_protocl != KaiwuDRLDefine.PROTOCL_PICKLE:
+        if CONFIG.aisrv_actor_protocl not in (KaiwuDRLDefine.PROTOCL_PICKLE, KaiwuDRLDefine.PROTOCL_BINARY):
             CONFIG.aisrv_actor_protocl = KaiwuDRLDefine.PROTOCL_PICKLE
 
     elif CONFIG.app == KaiwuDRLDefine.APP_SGAME_5V5:
@@ -135,6 +135,13 @@ def main():
         server = AiSrv((CONFIG.aisrv_ip_address, CONFIG.aisrv_server_port), AiSrvHandle)
         server.serve_forever()
     
+    elif KaiwuDRLDefine.AISRV_FRAMEWORK_ASYNCIO == CONFIG.aisrv_framework:
+        # python版本, 每个进程1个事件循环复用多个gamecore连接
+        from framework.server.aisrv.aisrv_asyncio_server import AiSrvAsyncio
+
+        server = AiSrvAsyncio((CONFIG.aisrv_ip_address, CONFIG.aisrv_server_port))
+        server.serve_forever()
+
     elif KaiwuDRLDefine.AISRV_FRAMEWORK_KAIWUDRL == CONFIG.aisrv_framework:
         # C++版本
         from framework.server.aisrv.aisrv_server import AiServer
@@ -148,7 +155,7 @@ def main():
         server.run()
 
     else:
-        print(f"not support {CONFIG.aisrv_framework}, only support {KaiwuDRLDefine.AISRV_FRAMEWORK_TRPC} or {KaiwuDRLDefine.AISRV_FRAMEWORK_SOCKETSERVER} or {KaiwuDRLDefine.AISRV_FRAMEWORK_KAIWUDRL}")
+        print(f"not support {CONFIG.aisrv_framework}, only support {KaiwuDRLDefine.AISRV_FRAMEWORK_TRPC} or {KaiwuDRLDefine.AISRV_FRAMEWORK_SOCKETSERVER} or {KaiwuDRLDefine.AISRV_FRAMEWORK_ASYNCIO} or {KaiwuDRLDefine.AISRV_FRAMEWORK_KAIWUDRL}")
 
 
 if __name__ == '__main__':
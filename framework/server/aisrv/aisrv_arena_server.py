@@ -383,7 +383,10 @@ class AiServer(multiprocessing.Process):
         # 设置Context
         self.simu_ctx = Context()
         # aisrv handler进程使用
-        self.simu_ctx.slots = Slots(int(CONFIG.max_tcp_count), int(CONFIG.max_queue_len))
+        # use_slots_mailbox为True时, 预测响应采用共享内存信箱分发, 否则每个slot一个pipe
+        self.simu_ctx.slots = Slots(int(CONFIG.max_tcp_count), int(CONFIG.max_queue_len),
+                                    int(CONFIG.use_slots_mailbox), int(CONFIG.slots_mailbox_record_size),
+                                    int(CONFIG.slots_mailbox_record_num))
 
         # 配置相关的传递
         try:
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+# @file aisrv_asyncio_server.py
+# @brief
+# @author kaiwu
+# @date 2022-04-25
+
+
+import os
+import socket
+import asyncio
+import threading
+import multiprocessing
+import traceback
+import datetime
+import collections
+from framework.common.config.config_control import CONFIG
+from framework.common.logging.kaiwu_logger import KaiwuLogger
+from framework.common.utils.common_func import Context, compress_data, decompress_data
+from framework.common.ipc.connection import Connection
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+from framework.server.aisrv.msg_buff import AsyncMsgBuff
+from framework.server.aisrv.aisrv_socketserver import AiSrv, AiSrvHandle
+
+
+'''
+asyncio版本的aisrv前端, 替代ForkingTCPServer每个gamecore连接fork 1个进程的方式
+1. 主进程和AiSrv一致, 完成配置, policies_builder, alloc, 普罗米修斯, on-policy等初始化
+2. 主进程fork aisrv_asyncio_process_num个事件循环进程, 在同一个监听socket上accept
+3. 每个连接对应1个AsyncAiSrvHandle, 网络收发在事件循环里完成, 帧格式和Connection一致, 编解码和AiSrvHandle一致
+4. 对局依旧由KaiWuRLHelper线程处理, 单个进程同时处理的对局数受aisrv_asyncio_max_episodes限制
+'''
+class AiSrvAsyncio(AiSrv):
+
+    def __init__(self, server_address):
+        super().__init__(server_address, AsyncAiSrvHandle)
+
+        self.process_num = int(CONFIG.aisrv_asyncio_process_num) or os.cpu_count()
+
+        self.max_episodes = int(CONFIG.aisrv_asyncio_max_episodes)
+        if not self.max_episodes:
+            self.max_episodes = max(int(CONFIG.max_tcp_count) // self.process_num, 1)
+
+    def serve_forever(self):
+        self.event_loop_processes = []
+        for idx in range(self.process_num):
+            process = multiprocessing.Process(target=self.event_loop_process, args=(idx, ))
+            process.daemon = True
+            process.start()
+            self.event_loop_processes.append(process)
+
+        self.logger.info(f'AiSrv asyncio start {self.process_num} event loop processes, max_episodes per process is {self.max_episodes}')
+
+        if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
+            # aisrv上执行on-policy流程
+            self.aisrv_on_policy_process()
+
+        else:
+            for process in self.event_loop_processes:
+                process.join()
+
+    '''
+    事件循环进程入口
+    '''
+    def event_loop_process(self, idx):
+        self.logger = KaiwuLogger()
+        pid = os.getpid()
+        self.logger.setLoggerFormat(f"/{CONFIG.svr_name}/aisrv_asyncio_{idx}_pid{pid}_log_{datetime.datetime.now().strftime('%Y-%m-%d-%H')}.log", 'AiSrv')
+        self.logger.info(f'AiSrv asyncio event loop {idx} start at pid {pid}')
+
+        asyncio.run(self.serve_async())
+
+    async def serve_async(self):
+        self.loop = asyncio.get_running_loop()
+        self.episode_semaphore = asyncio.Semaphore(self.max_episodes)
+
+        server = await asyncio.start_server(self.handle_connection, sock=self.socket)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        client_address = writer.get_extra_info('peername')
+
+        sock = writer.get_extra_info('socket')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, CONFIG.sock_buff_size)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, CONFIG.sock_buff_size)
+
+        # 超过单个进程的对局数上限时, 连接在这里等待
+        async with self.episode_semaphore:
+            handler = AsyncAiSrvHandle(self, client_address, self.loop, self.logger)
+            try:
+                # 创建KaiWuRLHelper时会构建policy, 放到线程池里执行, 不阻塞其他连接
+                await self.loop.run_in_executor(None, handler.setup)
+            except Exception as e:
+                self.logger.error(f'AiSrv asyncio setup handler failed {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
+                writer.close()
+                return
+
+            try:
+                await handler.handle_async(reader, writer)
+            except Exception as e:
+                self.logger.error(f'AiSrv asyncio failed to handle message {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
+            finally:
+                writer.close()
+
+                # 等待KaiWuRLHelper线程退出是阻塞操作, 放到线程池里执行
+                await self.loop.run_in_executor(None, handler.finish)
+
+
+'''
+单个gamecore连接的处理, 复用AiSrvHandle的on-policy和ep_end_req逻辑
+由于多个连接共享1个进程, 每个连接的Context需要单独拷贝, 日志和普罗米修斯上报采用进程级别的
+'''
+class AsyncAiSrvHandle(AiSrvHandle):
+
+    def __init__(self, server, client_address, loop, logger):
+        # 不调用BaseRequestHandler.__init__, 其会同步执行setup, handle, finish
+        self.server = server
+        self.client_address = client_address
+        self.loop = loop
+        self.logger = logger
+
+    def setup(self) -> None:
+        self.simu_ctx = Context(**self.server.simu_ctx.__dict__)
+        self.simu_ctx.exit_flag = multiprocessing.Value('b', False)
+
+        # 设置客户端连接地址
+        self.simu_ctx.client_address = str(self.client_address)
+        self.slots = self.simu_ctx.slots
+        self.slot_id = self.slots.get_slot()
+        self.simu_ctx.slot_id = self.slot_id
+
+        # 设置aisrv上对客户端的消息buff, 回包时唤醒事件循环
+        self.msg_buff = AsyncMsgBuff(self.simu_ctx, self.loop)
+        self.simu_ctx.msg_buff = self.msg_buff
+
+        self.data_queue = collections.deque(maxlen=CONFIG.max_queue_len)
+        self.simu_ctx.data_queue = self.data_queue
+
+        self.kaiwu_rl_helper = self.simu_ctx.kaiwu_rl_helper(self.simu_ctx)
+        self.kaiwu_rl_helper.daemon = True
+        self.kaiwu_rl_helper.start()
+
+        self.logger.info(f'aisrvhandle asyncio established connection from {self.client_address}, slot id is {str(self.slot_id)}')
+
+        # 采用单独的线程来执行aisrv_handler_on_policy_process逻辑
+        if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
+            if CONFIG.on_policy_by_way == KaiwuDRLDefine.ALGORITHM_ON_POLICY_WAY_EPISODE or CONFIG.on_policy_by_way == KaiwuDRLDefine.ALGORITHM_ON_POLICY_WAY_STEP:
+                self.server.set_active_handlers_alive_count_value(1)
+
+                server_thread = threading.Thread(target=self.aisrv_handler_on_policy_process)
+                server_thread.daemon = True
+                server_thread.start()
+
+    '''
+    按照Connection的帧格式读取1个消息, 对端关闭连接时返回None
+    '''
+    async def recv_msg(self, reader):
+        try:
+            header = await reader.readexactly(Connection.HEADER_TOTAL_LEN)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+        magic_number = int.from_bytes(header[:Connection.MAGIC_LEN], byteorder='big')
+        if magic_number != Connection.MAGIC_NUM:
+            raise RuntimeError("magic number %x is error, right is %x, peer ip: %s" % (magic_number, Connection.MAGIC_NUM, str(self.client_address)))
+
+        msg_len = int.from_bytes(header[Connection.MAGIC_LEN:], byteorder='big')
+        if msg_len <= 0 or msg_len > Connection.MAX_MSG_SIZE:
+            raise RuntimeError("invalid msg len: %d" % msg_len)
+
+        try:
+            return await reader.readexactly(msg_len)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+    async def send_msg(self, writer, send_msg):
+        header = Connection.MAGIC_NUM.to_bytes(Connection.MAGIC_LEN, byteorder='big') + len(send_msg).to_bytes(Connection.DATA_LEN, byteorder='big')
+        writer.writelines((header, send_msg))
+        await writer.drain()
+
+    async def handle_async(self, reader, writer):
+        try:
+            while not self.simu_ctx.exit_flag.value:
+                recv_msg = await self.recv_msg(reader)
+                if recv_msg is None:
+                    self.logger.error(f'aisrvhandle asyncio peer {self.client_address} close connection')
+                    self.quit()
+                    return
+
+                # 增加LZ4压缩/解压缩
+                recv_msg = decompress_data(recv_msg, serialize=False)
+
+                # 放入到aisrv本地缓冲区MsgBuff里, 等待需要给gamecore的回包
+                send_msg = await self.msg_buff.async_update(recv_msg)
+                if send_msg:
+                    send_msg = compress_data(send_msg, serialize=False)
+                    await self.send_msg(writer, send_msg)
+
+        except Exception as e:
+            self.quit()
+            raise e
+
+    '''
+    对端退出或者异常时, 回一个结束包来结束KaiWuRLHelper, 释放资源
+    '''
+    def quit(self):
+        if self.simu_ctx.exit_flag.value:
+            return
+
+        self.simu_ctx.exit_flag.value = True
+        self.ep_end_req()
+        self.kaiwu_rl_helper.stop()
+
+    def finish(self) -> None:
+        self.kaiwu_rl_helper.join()
+
+        # 回收slot_id
+        self.slots.put_slot(self.slot_id)
+
+        if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
+            if CONFIG.on_policy_by_way == KaiwuDRLDefine.ALGORITHM_ON_POLICY_WAY_EPISODE or CONFIG.on_policy_by_way == KaiwuDRLDefine.ALGORITHM_ON_POLICY_WAY_STEP:
+                self.server.set_active_handlers_alive_count_value(-1)
+
+        self.logger.info(f'aisrvhandle asyncio lost connection from {self.client_address}, slot id is {str(self.slot_id)}')
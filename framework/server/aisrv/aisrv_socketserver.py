@@ -35,6 +35,7 @@ from framework.server.aisrv.msg_buff import MsgBuff
 from framework.common.utils.slots import Slots
 from framework.common.alloc.alloc_utils import AllocUtils
 from framework.common.alloc.alloc_proxy import AllocProxy
+from framework.common.config.shared_config import SharedConfigSegment, SharedConfigObserver
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.utils.rainbow_utils import RainbowUtils
 import lz4.block
@@ -104,8 +105,15 @@ class AiSrv(ss.ForkingTCPServer):
         # 设置Context
         self.simu_ctx = Context()
 
+        # 配置热更新的共享内存段, 需要在fork AllocProxy和handler进程之前创建
+        if int(CONFIG.use_shared_config):
+            CONFIG.attach_shared_config(SharedConfigSegment(int(CONFIG.shared_config_size)))
+
         # aisrv handler进程使用
-        self.simu_ctx.slots = Slots(int(CONFIG.max_tcp_count), int(CONFIG.max_queue_len))
+        # use_slots_mailbox为True时, 预测响应采用共享内存信箱分发, 否则每个slot一个pipe
+        self.simu_ctx.slots = Slots(int(CONFIG.max_tcp_count), int(CONFIG.max_queue_len),
+                                    int(CONFIG.use_slots_mailbox), int(CONFIG.slots_mailbox_record_size),
+                                    int(CONFIG.slots_mailbox_record_num))
 
         # aisrv进程启动时, 从七彩石获取配置
         if int(CONFIG.use_rainbow):
@@ -671,7 +679,7 @@ class AiSrv(ss.ForkingTCPServer):
 
 class AiSrvHandle(ss.BaseRequestHandler):
     __slots__ = ("logger", "conn", "simu_ctx", "slots", "slot_id", "msg_buff", "data_queue", "kaiwu_rl_helper", "min_slot_id",
-                 "monitor_proxy")
+                 "monitor_proxy", "send_thread")
 
     def setup(self) -> None:
         self.logger = KaiwuLogger()
@@ -692,8 +700,14 @@ class AiSrvHandle(ss.BaseRequestHandler):
         self.simu_ctx.slot_id = self.slot_id
 
         # 设置aisrv上对客户端的消息buff, 匹配速度
-        self.msg_buff = MsgBuff(self.simu_ctx)
+        # msg_buff_pipeline为True时, 收包和回包分别在handler线程和send_thread线程里, 同时处理多个请求
+        self.msg_buff = MsgBuff(self.simu_ctx, int(CONFIG.msg_buff_pipeline), int(CONFIG.msg_buff_max_inflight))
         self.simu_ctx.msg_buff = self.msg_buff
+
+        if self.msg_buff.pipeline:
+            self.send_thread = threading.Thread(target=self.send_loop)
+            self.send_thread.daemon = True
+            self.send_thread.start()
         
         # 负责统计kaiwu_rl_helper中产生的对局数据，线程和主进程间只用数据dequeue即可，减少cpu消耗
         self.data_queue = collections.deque(maxlen=CONFIG.max_queue_len)
@@ -740,9 +754,16 @@ class AiSrvHandle(ss.BaseRequestHandler):
         if not CONFIG.actor_learner_expansion:
             return
         
-        current_actor_addrs, current_learner_addrs = self.kaiwu_rl_helper.get_current_actor_learner_address()
+        # 共享内存段的版本号没有变化时直接返回, 不需要读取和解析配置文件
+        if self.shared_config_observer:
+            if not CONFIG.reload_from_shared_config(self.shared_config_observer):
+                return
+
+            read_from_file_content = {'actor_addrs': CONFIG.actor_addrs, 'learner_addrs': CONFIG.learner_addrs}
+        else:
+            read_from_file_content = CONFIG.read_from_file(CONFIG.svr_name, ['actor_addrs', 'learner_addrs'])
 
-        read_from_file_content = CONFIG.read_from_file(CONFIG.svr_name, ['actor_addrs', 'learner_addrs'])
+        current_actor_addrs, current_learner_addrs = self.kaiwu_rl_helper.get_current_actor_learner_address()
         
         # 本次读取的文件内容错误, 则跳过本次处理下次再进行处理
         try:
@@ -834,6 +855,10 @@ class AiSrvHandle(ss.BaseRequestHandler):
                 for key, value in app_monitor_data.items():
                     monitor_data[key] = float(value)
 
+                # 单帧时延分阶段统计
+                if self.kaiwu_rl_helper.latency_tracer:
+                    monitor_data.update(self.kaiwu_rl_helper.latency_tracer.monitor_data())
+
                 self.monitor_proxy.put_data(monitor_data)
                     
 
@@ -853,7 +878,11 @@ class AiSrvHandle(ss.BaseRequestHandler):
         '''
         设置了aisrv自动更新actor和learner后, 就设置按时执行
         '''
+        self.shared_config_observer = None
         if CONFIG.actor_learner_expansion:
+            if CONFIG.shared_config:
+                self.shared_config_observer = SharedConfigObserver(CONFIG.shared_config)
+
             set_schedule_event(int(CONFIG.alloc_process_per_seconds), self.aisrv_with_new_actor_learner_change)
         
         '''
@@ -1014,11 +1043,19 @@ class AiSrvHandle(ss.BaseRequestHandler):
         # 步骤2, 网络收发包
         try:
             with TimeIt() as ti:
-                # recv msg, 从网络上获取一个请求响应包的数据
+                # recv msg, 从网络上获取一个请求响应包的数据, 返回的是接收缓冲区上的memoryview
                 recv_msg = self.conn.recv_msg()
-                recv_msg = recv_msg.tobytes()
-                # 增加LZ4压缩/解压缩
+                # 增加LZ4压缩/解压缩, 直接在接收缓冲区上解压缩
                 recv_msg = decompress_data(recv_msg, serialize=False)
+                # 没有解压缩时依旧是接收缓冲区上的视图, 下一次recv_msg会覆盖, 需要拷贝
+                if isinstance(recv_msg, memoryview):
+                    recv_msg = recv_msg.tobytes()
+
+            # pipeline模式下放入请求后立即返回继续收包, 回包由send_thread按照请求顺序发送
+            if self.msg_buff.pipeline:
+                seq_no = Request.Request.GetRootAsRequest(recv_msg, 0).SeqNo()
+                self.msg_buff.put_request(recv_msg, seq_no)
+                return
 
             with TimeIt() as ti:
                 # 放入到aisrv本地缓冲区MsgBuff里
@@ -1044,6 +1081,22 @@ class AiSrvHandle(ss.BaseRequestHandler):
 
             return
 
+    '''
+    pipeline模式下的回包线程, 按照请求顺序将kaiwu_rl_helper的回包发送给gamecore
+    '''
+    def send_loop(self):
+        while not self.simu_ctx.exit_flag.value:
+            try:
+                send_msg = self.msg_buff.get_response(timeout=CONFIG.queue_wait_timeout)
+                if send_msg:
+                    # 增加LZ4压缩/解压缩
+                    send_msg = compress_data(send_msg, serialize=False)
+
+                    self.conn.send_msg(send_msg)
+
+            except Exception as e:
+                self.logger.error(f'aisrvhandle send_loop error {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
+
     def handle(self) -> None:
 
         # before_run
@@ -46,6 +46,10 @@ class AsyncPolicy(Policy):
         while retry_num < int(CONFIG.socket_retry_times) and not self._exit_flag:
             result_map = self._actor_proxy_list[actor_index].get_predict_data(slot_id)
             if result_map:
+                # actor没有完成预测时返回带有错误原因的响应, 直接报错, 不再等待超时
+                for pred_result in result_map.values():
+                    if isinstance(pred_result, dict) and KaiwuDRLDefine.PREDICT_ERROR in pred_result:
+                        raise RuntimeError(f'agent {agent_id}  slot_id {slot_id} actor {self._actor_proxy_list[actor_index].get_zmq_server_ip()} predict error: {pred_result[KaiwuDRLDefine.PREDICT_ERROR]}')
                 return result_map
             retry_num += 1
         if retry_num >= int(CONFIG.socket_retry_times) or self._exit_flag:
@@ -93,10 +97,10 @@ class AsyncPolicy(Policy):
         self._learner_proxy_list[learn_index].put_data(agent_id, train_data, train_data_prioritezeds)
     
     # sample_server-->learener_proxy-->learner
-    def gen_frame_sample(self, slot_id, sample_info_list, must_need_sample_info):
+    def gen_frame_sample(self, slot_id, sample_info_list, must_need_sample_info, model_version=-1):
 
         sample_index = slot_id % len(self._sample_sever_list)
-        self._sample_sever_list[sample_index].gen_frame_sample(slot_id, sample_info_list, must_need_sample_info)
+        self._sample_sever_list[sample_index].gen_frame_sample(slot_id, sample_info_list, must_need_sample_info, model_version)
         
     def sample_server_gameover(self, slot_id):
 
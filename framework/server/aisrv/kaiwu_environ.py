@@ -45,6 +45,9 @@ class KaiwuEnviron(Environ):
         # MsgBuff
         self.msg_buff = simu_ctx.msg_buff
 
+        # 单帧时延分阶段统计, 由kaiwu_rl_helper创建
+        self.latency_tracer = getattr(simu_ctx, 'latency_tracer', None)
+
         # 有些场景需要保存上一次的预测结果
         self.last_action = [[0, 0, 10000]]
 
@@ -120,7 +123,8 @@ class KaiwuEnviron(Environ):
         while not self.exit_flag.value:
             try:
                 msg_type, req = self.recv_req()
-                if self.msg_buff.input_q.qsize() != 0:
+                # pipeline模式下input_q里允许有多个请求
+                if self.msg_buff.input_q.qsize() != 0 and not self.msg_buff.pipeline:
                     self.logger.error("kaiwu_environ Not Zero")
                 # assert self.msg_buff.input_q.qsize()==0
                 if msg_type == ReqMsg.ReqMsg.ep_start_req:
@@ -467,8 +471,15 @@ class KaiwuEnviron(Environ):
         self.builder.Finish(rsp)
         msg = self.builder.Output()
 
+        # pipeline模式下回包发出后删除请求的到达时间, 故在发送前获取
+        recv_ns = self.msg_buff.get_recv_ns(self.seqno) if self.latency_tracer else 0
+
         self.send_rsp_to_client(bytes(msg))
 
+        # gamecore请求到达到预测结果交给gamecore发送的总耗时
+        if self.latency_tracer and msg_type == RspMsg.RspMsg.update_rsp:
+            self.latency_tracer.record_ns(KaiwuDRLDefine.TRACE_STAGE_TOTAL, recv_ns)
+
         self.builder = flatbuffers.Builder(0)
 
     def handle_heartbeat(self, req):
@@ -478,4 +489,4 @@ class KaiwuEnviron(Environ):
 
     # 放入aisrv --> gamecore的队列
     def send_rsp_to_client(self, fb_rsp):
-        self.msg_buff.send_msg(fb_rsp)
+        self.msg_buff.send_msg(fb_rsp, self.seqno)
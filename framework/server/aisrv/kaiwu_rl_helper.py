@@ -23,6 +23,7 @@ from framework.common.config.algo_conf import AlgoConf
 from framework.interface.exception import SkipEpisodeException, ClientQuitException, TimeoutEpisodeException
 from framework.common.logging.kaiwu_logger import KaiwuLogger
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
+from framework.common.monitor.latency_tracer import LatencyTracer
 
 SAMPLE_CUT_POINT = [14, 39, 81, 123, 126, 187, 188, 189, 190, 191, 192, 193]
 
@@ -79,6 +80,12 @@ class KaiWuRLHelper(threading.Thread):
         # 将日志句柄作为参数传递
         self.simu_ctx.logger = self.logger
 
+        # 单帧时延分阶段统计, 在kaiwu_rl_helper线程里打点, 由aisrvhandle周期性上报
+        self.latency_tracer = None
+        if int(CONFIG.use_latency_tracing):
+            self.latency_tracer = LatencyTracer(KaiwuDRLDefine.MONITOR_TRACE_AISRV_PREFIX)
+        self.simu_ctx.latency_tracer = self.latency_tracer
+
         # 启动Env, 即消息流转函数
         self.env = KaiwuEnviron(
             self.simu_ctx, self.exit_flag, self.client_address)
@@ -98,6 +105,9 @@ class KaiWuRLHelper(threading.Thread):
         # learner通知aisrv此时最新的model文件版本号
         self.from_learner_model_version = -1
 
+        # 样本带上生成样本时的model_version, 由learner按照陈旧程度过滤
+        self.use_sample_staleness = int(CONFIG.use_sample_staleness)
+
         # 暂停/继续线程执行
         self.should_pause = False
 
@@ -213,6 +223,10 @@ class KaiWuRLHelper(threading.Thread):
     """
 
     def predict(self, agent_ids):
+        if self.latency_tracer:
+            predict_start_ns = time.monotonic_ns()
+            self.latency_tracer.record_ns(KaiwuDRLDefine.TRACE_STAGE_FEATURE, self.env.msg_buff.get_recv_ns(self.env.seqno), predict_start_ns)
+
         # 两个agent是同一个policy情况下的预测处理，只适用5v5，将两个样本拼在一起进行预测，保证两个样本能够同时被处理，减小预测耗时
         if len(agent_ids) == 2 and list(self.agent_ctxs[0].policy.keys())[0] == list(self.agent_ctxs[1].policy.keys())[0] and CONFIG.aisrv_actor_protocl == KaiwuDRLDefine.PROTOCL_PROTOBUF:
             policy_id = list(self.agent_ctxs[0].policy.keys())[0]
@@ -250,6 +264,13 @@ class KaiWuRLHelper(threading.Thread):
                 else:
                     agent_ctx.pred_output[policy_id] = pred_output
 
+                    # actor_proxy收到预测响应的时间放在trace_ns里
+                    if self.latency_tracer and isinstance(pred_output.get(agent_id), dict):
+                        self.latency_tracer.record_ns(KaiwuDRLDefine.TRACE_STAGE_AISRV_RECV, pred_output[agent_id].get('trace_ns'))
+
+        if self.latency_tracer:
+            self.latency_tracer.record_ns(KaiwuDRLDefine.TRACE_STAGE_PREDICT, predict_start_ns)
+
     # gym单局游戏的处理逻辑
     def episode_main_loop(self, states):
         while not self.exit_flag.value:
@@ -367,11 +388,23 @@ class KaiWuRLHelper(threading.Thread):
         expr_processor.gen_expr(
             extra_info['must_need_sample_info'], extra_info['network_sample_info'], self.from_actor_model_version, self.from_learner_model_version)
 
-    def gen_expr_server(self, agent_id, policy_id, sample_info_list, must_need_sample_info):
+    def gen_expr_server(self, agent_id, policy_id, sample_info_list, must_need_sample_info, model_version=-1):
         # sample_server只有一个，两个agent的样本会同时存储
         policy = self.agent_ctxs[agent_id].policy[policy_id]
         policy.gen_frame_sample(
-            self.slot_id, sample_info_list, must_need_sample_info)
+            self.slot_id, sample_info_list, must_need_sample_info, model_version)
+
+    '''
+    预测结果对应的actor的model_version, 由actor_proxy按照compose_id里的model_version赋值
+    dict形式的预测结果放在'model_version'字段里, 其他形式的预测结果按照agent_id放在KaiwuDRLDefine.SAMPLE_MODEL_VERSION里
+    '''
+    @staticmethod
+    def pred_model_version(pred_output, agent_id):
+        pred_result = pred_output[agent_id]
+        if isinstance(pred_result, dict):
+            return pred_result.get('model_version', -1)
+
+        return pred_output.get(KaiwuDRLDefine.SAMPLE_MODEL_VERSION, {}).get(agent_id, -1)
 
     def sample_server_gameover(self, agent_id, policy_id):
         policy = self.agent_ctxs[agent_id].policy[policy_id]
@@ -754,6 +787,7 @@ class KaiWuRLHelper(threading.Thread):
                     format_action_list = []
                     network_sample_info_list = []
                     lstm_cell_list, lstm_hidden_list = [], []
+                    model_versions = []
                     for agent_id in valid_agents:
                         agent_ctx = self.agent_ctxs[agent_id]
                         for policy_id in agent_ctx.policy:
@@ -766,6 +800,11 @@ class KaiWuRLHelper(threading.Thread):
                                 network_sample_info[0])
                             lstm_cell_list.append(lstm_info[0][0])
                             lstm_hidden_list.append(lstm_info[0][1])
+                            model_versions.append(self.pred_model_version(agent_ctx.pred_output[policy_id], agent_id))
+
+                    # 本帧样本的model_version取各agent预测结果里最旧的
+                    if self.use_sample_staleness and model_versions:
+                        self.from_actor_model_version = int(min(model_versions))
 
                     self.env.on_handle_action(format_action_list)
 
@@ -884,10 +923,12 @@ class KaiWuRLHelper(threading.Thread):
                     meta_msg_list = []
                     lstm_cell_list = []
                     lstm_hidden_list = []
+                    model_versions = []
                     for agent_id in valid_agents:
                         agent_ctx = self.agent_ctxs[agent_id]
                         for policy_id in agent_ctx.policy:
                             network_sample_info = agent_ctx.pred_output[policy_id][agent_id]
+                            model_versions.append(self.pred_model_version(agent_ctx.pred_output[policy_id], agent_id))
                             #lstm_info = agent_ctx.pred_output[policy_id][agent_id]['lstm_info'][0]
                             logits, value, meta_msg, lstm_cell, lstm_hidden = network_sample_info
                             logits_list.append(logits)
@@ -898,6 +939,10 @@ class KaiWuRLHelper(threading.Thread):
                             sample_info_list[agent_id].append(
                                 value.reshape([5, -1]))
 
+                    # 本帧样本的model_version取各agent预测结果里最旧的
+                    if self.use_sample_staleness and model_versions:
+                        self.from_actor_model_version = int(min(model_versions))
+
                     lstm_hidden_list = np.concatenate(
                         lstm_hidden_list).reshape([10, -1])
                     lstm_cell_list = np.concatenate(
@@ -948,7 +993,8 @@ class KaiWuRLHelper(threading.Thread):
                         # 采用sample_server的方式来存储样本
                         # 默认第一个agent对应的是new_policy，所以其simtux中的policy是有sample_server_list的
                         self.gen_expr_server(
-                            valid_agents[0], self.agent_ctxs[valid_agents[0]].main_id, sample_info_list, must_need_sample_info)
+                            valid_agents[0], self.agent_ctxs[valid_agents[0]].main_id, sample_info_list, must_need_sample_info,
+                            self.from_actor_model_version)
 
                     self.env.run_handler.update_lstm(
                         lstm_cell_list, lstm_hidden_list)
@@ -86,6 +86,7 @@ class LearnerProxy(multiprocessing.Process):
 
         # 必须放在这里赋值, 否则reverb client会卡住
         self.revervb_util = RevervbUtil(f'{self.learner_addr}:{self.learner_port}', self.logger)
+        self.use_reverb_batch_writer = int(CONFIG.use_reverb_batch_writer)
 
         self.reverb_table_names = ['{}_{}'.format(CONFIG.reverb_table_name, i) for i in range(int(CONFIG.reverb_table_size))]
         self.logger.info(f'learner_proxy send reverb server tables is {self.reverb_table_names}', g_not_server_label)
@@ -137,6 +138,10 @@ class LearnerProxy(multiprocessing.Process):
         # use reverb client send sample data to reverb server
         self.send_msg_use_reverb_client()
 
+        # 批量写入时, 没有新样本也需要按照时间flush
+        if self.use_reverb_batch_writer:
+            self.revervb_util.flush_batch_writer(force=False)
+
         # 重新设置self.train_data为None
         self.train_data = None
         self.train_data_prioritezeds.clear()
@@ -171,6 +176,11 @@ class LearnerProxy(multiprocessing.Process):
             except Exception as e:
                 self.logger.error(f'learner_proxy run error: {str(e)}, traceback.print_exc() is {traceback.format_exc()}', g_not_server_label)
 
+        # 进程退出前发送批量writer里还没有flush的样本, 否则会丢失最多reverb_batch_flush_interval_ms的样本
+        if self.use_reverb_batch_writer:
+            self.revervb_util.flush_batch_writer(force=True)
+            self.revervb_util.close_batch_writer()
+
     # 发送样本时, 可以对样本进行预处理操作
     def before_send_train_data(self):
         if not self.train_data:
@@ -196,7 +206,10 @@ class LearnerProxy(multiprocessing.Process):
 
         # 发给reverb server
         self.before_send_train_data_simple()
-        self.revervb_util.write_to_reverb_server_simple(self.reverb_table_names, self.train_data, self.train_data_prioritezeds)
+        if self.use_reverb_batch_writer:
+            self.revervb_util.write_to_reverb_server_batch(self.reverb_table_names, self.train_data, self.train_data_prioritezeds)
+        else:
+            self.revervb_util.write_to_reverb_server_simple(self.reverb_table_names, self.train_data, self.train_data_prioritezeds)
         
         # 更新最大样本大小
         input_datas_list = self.train_data
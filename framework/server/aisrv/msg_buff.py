@@ -2,14 +2,25 @@
 # -*- coding: utf-8 -*-
 
 
+import time
 import queue
+import asyncio
+import threading
+import collections
 
 from framework.common.config.config_control import CONFIG
 
+'''
+gamecore和kaiwu_rl_helper之间的消息缓冲
+1. 默认模式, update放入请求后阻塞等待回包, 每个连接同一时刻只有1个请求在处理
+2. pipeline模式, put_request放入请求后立即返回, 网络线程继续收包; get_response按照请求顺序返回回包, 回包和请求按照seq_no匹配
+   同时在处理的请求数目不超过max_inflight
+'''
 class MsgBuff:
-    __slots__ = ("exit_flag", "client_address", "input_q", "output_q")
+    __slots__ = ("exit_flag", "client_address", "input_q", "output_q", "pipeline", "pending_seq_nos", "ready_rsps",
+                 "inflight", "lock", "recv_ns", "recv_ns_map")
     
-    def __init__(self, context):
+    def __init__(self, context, pipeline=False, max_inflight=1):
         self.exit_flag = False
 
         self.client_address = context.client_address
@@ -17,8 +28,22 @@ class MsgBuff:
         # input_q是收队列(gamecore --> aisrv)，output_q是发队列(aisrv --> gamecore)
         self.input_q, self.output_q = queue.Queue(CONFIG.queue_size), queue.Queue(CONFIG.queue_size)
 
+        # pipeline模式下, 按照到达顺序记录请求的seq_no, 以及先到达的回包
+        self.pipeline = pipeline
+        self.pending_seq_nos = collections.deque()
+        self.ready_rsps = {}
+        self.inflight = threading.BoundedSemaphore(max(int(max_inflight), 1))
+        self.lock = threading.Lock()
+
+        # 最近1个gamecore请求放入input_q的时间, 用于单帧时延分阶段统计
+        # pipeline模式下同时有多个请求在处理, 按照seq_no记录, 回包发出时删除
+        self.recv_ns = 0
+        self.recv_ns_map = {}
+
     # 放入从gamecore --> aisrv的消息, 如果有需要aisrv --> gamecore的消息则返回
     def update(self, recv_msg):
+        self.recv_ns = time.monotonic_ns()
+
         retry_num = 0
         while retry_num < CONFIG.socket_retry_times and not self.exit_flag:
             try:
@@ -54,6 +79,75 @@ class MsgBuff:
 
         return send_msg
 
+    '''
+    pipeline模式, 放入从gamecore --> aisrv的消息, 不等待回包
+    同时在处理的请求达到max_inflight时阻塞, 直到有回包发出
+    '''
+    def put_request(self, recv_msg, seq_no):
+        while not self.inflight.acquire(timeout=CONFIG.queue_wait_timeout):
+            if self.exit_flag:
+                raise RuntimeError("gamecore %s exit..." %
+                                   (self.client_address))
+
+        with self.lock:
+            self.pending_seq_nos.append(seq_no)
+            self.recv_ns_map[seq_no] = time.monotonic_ns()
+
+        try:
+            self.input_q.put(recv_msg, timeout=CONFIG.queue_wait_timeout)
+        except queue.Full:
+            raise RuntimeError("gamecore %s failed to put msg into input queue" %
+                               (self.client_address))
+
+    '''
+    pipeline模式, 按照请求的到达顺序返回aisrv --> gamecore的回包
+    超时或者kaiwu_rl_helper通知结束时返回None
+    '''
+    def get_response(self, timeout=None):
+        while True:
+            with self.lock:
+                if self.pending_seq_nos:
+                    seq_no = self.pending_seq_nos[0]
+                    rsps = self.ready_rsps.get(seq_no)
+                    if rsps:
+                        self.pending_seq_nos.popleft()
+                        send_msg = rsps.popleft()
+                        if not rsps:
+                            del self.ready_rsps[seq_no]
+                        if seq_no not in self.pending_seq_nos:
+                            self.recv_ns_map.pop(seq_no, None)
+
+                        self.inflight.release()
+                        return send_msg
+
+            try:
+                rsp = self.output_q.get(timeout=timeout)
+            except queue.Empty:
+                return None
+
+            # kaiwu_rl_helper直接放入output_q的结束通知
+            if rsp is None:
+                return None
+
+            seq_no, send_msg = rsp
+            with self.lock:
+                if seq_no not in self.pending_seq_nos:
+                    # 不对应任何请求的回包, 比如aisrv主动构造的结束包, 直接返回
+                    return send_msg
+
+                self.ready_rsps.setdefault(seq_no, collections.deque()).append(send_msg)
+
+    '''
+    seq_no对应的gamecore请求放入input_q的时间, 在回包发出前调用, 没有记录时返回0
+    非pipeline模式下同一时刻只有1个请求, 返回最近1个请求的时间
+    '''
+    def get_recv_ns(self, seq_no=None):
+        if not self.pipeline:
+            return self.recv_ns
+
+        with self.lock:
+            return self.recv_ns_map.get(seq_no, 0)
+
     # gamecore --> aisrv的消息放入了input_q
     def recv_msg(self):
         """
@@ -75,11 +169,15 @@ class MsgBuff:
         return json_str
 
     # aisrv --> gamecore的消息放入了output_q
-    def send_msg(self, json_str):
+    def send_msg(self, json_str, seq_no=None):
         """
         发送一个消息给客户端(gamecore)
         :param json_str: 编码后的消息体, 默认是json字符串
+        :param seq_no: 对应请求的seq_no, pipeline模式下用于匹配请求和回包
         """
+        if self.pipeline and json_str is not None:
+            json_str = (seq_no, json_str)
+
         retry_num = 0
         while retry_num < CONFIG.socket_retry_times and not self.exit_flag and json_str is not None:
             try:
@@ -100,4 +198,55 @@ class MsgBuff:
         self.send_msg(json_str)
 
     def qsize(self):
-        return self.output_q.qsize()
\ No newline at end of file
+        return self.output_q.qsize()
+
+
+'''
+aisrv --> gamecore的消息队列, kaiwu_rl_helper线程put后唤醒事件循环, 事件循环里await获取消息
+'''
+class AsyncOutputQueue(queue.Queue):
+    def __init__(self, loop, maxsize=0):
+        super().__init__(maxsize)
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def _put(self, item):
+        super()._put(item)
+        self.loop.call_soon_threadsafe(self.ready.set)
+
+    async def async_get(self):
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+
+            # clear后再次检查, 规避put发生在get_nowait和clear之间时丢失唤醒
+            self.ready.clear()
+            if self.empty():
+                await self.ready.wait()
+
+
+'''
+asyncio前端使用的MsgBuff, kaiwu_rl_helper线程侧的接口不变, 网络侧update改为协程, 等待回包时不占用线程
+'''
+class AsyncMsgBuff(MsgBuff):
+    def __init__(self, context, loop):
+        super().__init__(context)
+
+        self.output_q = AsyncOutputQueue(loop, CONFIG.queue_size)
+
+    # 放入从gamecore --> aisrv的消息, 等待aisrv --> gamecore的消息
+    async def async_update(self, recv_msg):
+        if self.exit_flag:
+            raise RuntimeError("gamecore %s exit..." %
+                               (self.client_address))
+
+        self.recv_ns = time.monotonic_ns()
+        try:
+            self.input_q.put_nowait(recv_msg)
+        except queue.Full:
+            raise RuntimeError("gamecore %s failed to put msg into input queue" %
+                               (self.client_address))
+
+        return await self.output_q.async_get()
@@ -2,11 +2,12 @@
 # -*- coding: utf-8 -*-
 
 
+import asyncio
 import threading
 import unittest
 
 from framework.common.utils.common_func import Context
-from framework.server.aisrv.msg_buff import MsgBuff
+from framework.server.aisrv.msg_buff import MsgBuff, AsyncMsgBuff
 from framework.common.config.config_control import CONFIG
 
 def consumer(msg_buff):
@@ -34,5 +35,73 @@ class MsgEngineTest(unittest.TestCase):
 
         t.join()
 
+    def test_pipeline(self):
+
+        # 解析配置
+        CONFIG.set_configure_file("/data/projects/kaiwu-fwk/conf/framework/aisrv.toml")
+        CONFIG.parse_aisrv_configure()
+
+        context = Context()
+        context.slot_id = 1
+        context.client_address = "127.0.0.1:8080"
+
+        msg_engine = MsgBuff(context, pipeline=True, max_inflight=4)
+        msg_engine.put_request("frame 1", 1)
+        msg_engine.put_request("frame 2", 2)
+        self.assertEqual(msg_engine.recv_msg(), "frame 1")
+        self.assertEqual(msg_engine.recv_msg(), "frame 2")
+
+        # 回包乱序到达时, 依旧按照请求顺序返回
+        msg_engine.send_msg("rsp 2", 2)
+        msg_engine.send_msg("rsp 1", 1)
+        self.assertEqual(msg_engine.get_response(timeout=1), "rsp 1")
+        self.assertEqual(msg_engine.get_response(timeout=1), "rsp 2")
+        self.assertIsNone(msg_engine.get_response(timeout=0.01))
+
+    def test_pipeline_recv_ns(self):
+
+        # 解析配置
+        CONFIG.set_configure_file("/data/projects/kaiwu-fwk/conf/framework/aisrv.toml")
+        CONFIG.parse_aisrv_configure()
+
+        context = Context()
+        context.slot_id = 1
+        context.client_address = "127.0.0.1:8080"
+
+        # 后到达的请求不覆盖先到达请求的时间, 回包发出后删除
+        msg_engine = MsgBuff(context, pipeline=True, max_inflight=4)
+        msg_engine.put_request("frame 1", 1)
+        recv_ns_1 = msg_engine.get_recv_ns(1)
+        msg_engine.put_request("frame 2", 2)
+        self.assertGreater(recv_ns_1, 0)
+        self.assertEqual(msg_engine.get_recv_ns(1), recv_ns_1)
+        self.assertGreaterEqual(msg_engine.get_recv_ns(2), recv_ns_1)
+
+        msg_engine.send_msg("rsp 1", 1)
+        self.assertEqual(msg_engine.get_response(timeout=1), "rsp 1")
+        self.assertEqual(msg_engine.get_recv_ns(1), 0)
+        self.assertGreater(msg_engine.get_recv_ns(2), 0)
+
+    def test_async(self):
+
+        # 解析配置
+        CONFIG.set_configure_file("/data/projects/kaiwu-fwk/conf/framework/aisrv.toml")
+        CONFIG.parse_aisrv_configure()
+
+        context = Context()
+        context.slot_id = 1
+        context.client_address = "127.0.0.1:8080"
+
+        async def update():
+            msg_engine = AsyncMsgBuff(context, asyncio.get_running_loop())
+            t = threading.Thread(target=consumer, args=(msg_engine,))
+            t.start()
+
+            msg = await msg_engine.async_update("Hello Kaiwu!")
+            t.join()
+            return msg
+
+        self.assertEqual(asyncio.run(update()), "Hello Kaiwu!")
+
 if __name__ == '__main__':
     unittest.main()
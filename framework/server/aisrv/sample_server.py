@@ -6,12 +6,10 @@ import multiprocessing
 import time
 import traceback
 import datetime
-import lz4.block
 import schedule
 import datetime
 import numpy as np
 import collections
-import pickle
 from framework.common.config.config_control import CONFIG
 from framework.common.logging.kaiwu_logger import KaiwuLogger, g_not_server_label
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
@@ -19,16 +17,40 @@ from framework.common.utils.common_func import set_schedule_event
 from framework.common.monitor.monitor_proxy import MonitorProxy
 
 if CONFIG.app == KaiwuDRLDefine.APP_SGAME_5V5:
-    from app.sgame_5v5.sample_processor.sgame_expr import SgameExpr as RLDataInfo
     from app.sgame_5v5.algo.config import Config, ModelConfig
 from framework.interface.sample_processor import SampleProcessor
 
 
+'''
+反向折扣累加, 用于计算GAE: out[t] = deltas[t] + coef * out[t + 1]
+时间维度上是递推关系, 每一步在(agent, hero, head)维度上整体计算
+'''
+def reverse_discounted_cumsum(deltas, coef):
+    out = np.empty_like(deltas)
+    running = np.zeros_like(deltas[0])
+    for t in range(len(deltas) - 1, -1, -1):
+        running = running * coef + deltas[t]
+        out[t] = running
+
+    return out
+
+
 """样本处理相关类"""
 class SgameSampleProcessor(SampleProcessor):
-    __slots__ = ("_data_shapes", "_LSTM_FRAME", "network_sample_info","gamma","lamda","agent_policy","tmp_data",
-                 "last_data", "log_rewsum", "steps","logger", "game_id", "m_task_id", "m_task_uuid", "num_agents",
-                 "rl_data_map", "m_replay_buffer")
+    '''
+    样本按照列式存储, 每个字段一个预分配的numpy数组, 形如(frame, agent) + 单帧单agent的shape
+    1. 每一帧的数据直接写入对应行, 当前帧的reward和value回填到上一帧的reward和next_value
+    2. GAE在整个窗口上按照反向折扣累加计算
+    3. 按照LSTM_FRAME切分样本时, 通过reshape和transpose一次性组装
+    最后一帧的reward和next_value还未知, 不参与本次样本生成, 作为下一次的第一帧
+    '''
+    __slots__ = ("_data_shapes", "_LSTM_FRAME", "network_sample_info","gamma","lamda","agent_policy",
+                 "log_rewsum", "steps","logger", "game_id", "m_task_id", "m_task_uuid", "num_agents",
+                 "columns", "frame_cnt", "capacity", "m_replay_buffer")
+
+    # 参与GAE计算的字段采用float64, 其他字段最终以float16发送, 存储时直接采用float16
+    FLOAT64_FIELDS = ("reward", "value", "next_value")
+    FLOAT16_FIELDS = ("feature", "legal_action", "lstm_info", "prob", "action", "sub_action", "is_train", "meta_is_train")
     
     def __init__(self):
 
@@ -45,12 +67,14 @@ class SgameSampleProcessor(SampleProcessor):
         self.lamda= np.array([0.95,0.95,0.95,0.95,0.99856,0.95])
         self.agent_policy= []
         
-        self.tmp_data = None
-        self.last_data = None
-        
         self.log_rewsum = 0.0
         
         self.steps = 0
+
+        # 列式存储, 第一帧到来时按照数据的shape分配
+        self.columns = None
+        self.frame_cnt = 0
+        self.capacity = 0
     
     '''
     框架提供了日志接口, 业务直接使用即可
@@ -65,7 +89,8 @@ class SgameSampleProcessor(SampleProcessor):
         self.game_id = game_id
         self.m_task_id, self.m_task_uuid = 0, "default_task_uuid"
         self.num_agents = player_num
-        self.rl_data_map = [collections.OrderedDict() for _ in range(self.num_agents)]
+        self.columns = None
+        self.frame_cnt = 0
         self.m_replay_buffer = [[] for _ in range(self.num_agents)]
 
         self.log_rewsum = 0.0
@@ -80,35 +105,22 @@ class SgameSampleProcessor(SampleProcessor):
         Args:
             must_need_sample_info: 5v5中使用较少
             network_sample_info: Actor预测会返回action和网络参数, network_sample_info为样本需要的信息
+            sample_model_version: 产生该帧预测结果的actor的model_version, 未知时为-1
         Returns:
 
         """
         self.network_sample_info = network_sample_info
-        state_dict = must_need_sample_info
-        frame_no = state_dict['frame_no']
-        done = state_dict['done']
+        frame_no = must_need_sample_info['frame_no']
+        model_version = -1 if sample_model_version is None else sample_model_version
 
         for i in range(self.num_agents):
             feature_vec, lstm_hidden, lstm_cell, reward, value, legal_action, sub_action_mask, action, prob, is_trains = network_sample_info[i]
 
-            # 将feature压缩存储释放内存
-            feature_vec = pickle.dumps(feature_vec)
-            feature_vec = lz4.block.compress(feature_vec, mode='fast', store_size=False)
-            
-            meta_is_trains = np.zeros(5)
-            keys = ("frame_no", "vec_feature", "legal_action", "action", "reward", "value", "prob", "sub_action",
-                    "lstm_cell", "lstm_hidden", "done", "is_train", "meta_is_train")
-            #目前网络中没有增加大局观reward，在这个地方加入全0向量
-            reward_mgg = np.array([[0], [0], [0], [0], [0]])
-            reward = np.hstack((reward, reward_mgg))
-
-            values = (frame_no, feature_vec, legal_action, action, reward, value, prob, sub_action_mask,
-                      lstm_cell, lstm_hidden, done, is_trains, meta_is_trains)
-            sample = dict(zip(keys, values))
-
             # TODO:只有最新的Model，才能产生Sample
-            self.save_sample(**sample, agent_id=i, game_id=self.game_id, uuid=None)
-        
+            self.save_sample(frame_no, feature_vec, legal_action, action, reward, value, prob, sub_action_mask,
+                             lstm_cell, lstm_hidden, agent_id=i, is_train=is_trains, model_version=model_version)
+
+        self.frame_cnt += 1
         self.steps += 1
         self.logger.debug(f"game_id {self.game_id}, sample gen_expr success")
 
@@ -121,304 +133,243 @@ class SgameSampleProcessor(SampleProcessor):
         total_frame_cnt = len(self.network_sample_info)
         
         #异常情况需要删除最后保存的样本来保证样本的正确性
-        if del_last:
-            for i in range(self.num_agents):
-                if len(list(self.rl_data_map[i].keys())) > 0:
-                    last_key = list(self.rl_data_map[i].keys())[-1]
-                    self.rl_data_map[i].pop(last_key)
-
-        #else:
-        #    for i in range(self.num_agents):
-        #        feature_vec, lstm_hidden, lstm_cell, reward, value, legal_action, sub_action_mask, action, prob, is_trains = self.network_sample_info[i]
-        #        # 目前网络中没有增加大局观reward，在这个地方加入全0向量，5个hero均为0
-        #        reward_mgg = np.array([[0], [0], [0], [0], [0]])
-        #        reward = np.hstack((reward, reward_mgg))
-        #        self.save_last_sample(agent_id=i, reward=reward)
-        
-        #保存最后一个样本，作为reset后的rl_data_map的第一个
-        if len(list(self.rl_data_map[0].keys())) > 0:
-            self.last_data = [list(self.rl_data_map[i].items())[-1] for i in range(self.num_agents)]
-        else:
-            self.last_data = None
-        #保存尾部16个样本，方便最后样本数量不足16个时生成lstm的完整样本
-        if len(list(self.rl_data_map[0].keys())) > self._LSTM_FRAME:
-            self.tmp_data = [list(self.rl_data_map[i].items())[-self._LSTM_FRAME:-1] for i in range(self.num_agents)]
-        else:
-            self.tmp_data = None
+        if del_last and self.frame_cnt > 0:
+            self.frame_cnt -= 1
 
-        #最后一个样本已经保存，则不参与样本生成，不确定不对正常结束对局的最后一帧进行训练是否会有影响，后面可以加个flag进行判断
-        for i in range(self.num_agents):
-            if len(list(self.rl_data_map[i].keys())) > 0:
-                last_key = list(self.rl_data_map[i].keys())[-1]
-                self.rl_data_map[i].pop(last_key)
-        
-        #样本生成
+        #样本生成, 最后一个样本不参与样本生成, reset后作为第一个样本
         train_data = self.send_samples()
         return_rew = self.log_rewsum
         #清理旧样本
         self.reset()
         
-        # 对train_data进行压平处理
+        # 对train_data进行压平处理, 样本已经是float16
         train_data_all = []
         for agent_data in train_data:
-            # agent_data:list[(frame_no,vec)]
+            # agent_data:list[(frame_no, vec, model_version)]
             for sample in agent_data:
-                train_data_all.append({
-                    # 发送样本时, 强制转换成float16
-                    'input_datas': np.array(sample[1], dtype=np.float16)
-                })
+                train_data_all.append(self._train_sample(sample))
         train_frame_cnt = len(train_data)
         drop_frame_cnt = total_frame_cnt - train_frame_cnt
         self.logger.info(f'game_id {self.game_id}, sample train_frame_cnt {train_frame_cnt},  drop_frame_cnt {drop_frame_cnt}, reward {return_rew}')
         return train_data_all, train_frame_cnt, return_rew
 
+    '''
+    保留最后一帧作为下一次的第一帧
+    '''
     def reset(self):
-        self.rl_data_map = [collections.OrderedDict() for _ in range(self.num_agents)]
-        assert self.last_data, "last_data error!"
-        for i in range(self.num_agents):
-            self.rl_data_map[i][self.last_data[i][0]] = self.last_data[i][1]
+        if self.frame_cnt > 0:
+            for column in self.columns.values():
+                column[0] = column[self.frame_cnt - 1]
+            self.frame_cnt = 1
+
         self.m_replay_buffer = [[] for _ in range(self.num_agents)]
         
         self.log_rewsum = 0.0
         self.logger.info(f"game_id {self.game_id}, sample already reset")
 
+    '''
+    按照第一帧的数据分配列式存储, 容量不足时按照2倍扩容
+    '''
+    def reserve(self, frame_data):
+        if self.columns is None:
+            self.capacity = max(self._LSTM_FRAME * 2, 64)
+            self.columns = {}
+            for name, value in frame_data.items():
+                value = np.asarray(value)
+                if name in self.FLOAT64_FIELDS:
+                    dtype = np.float64
+                elif name in self.FLOAT16_FIELDS:
+                    dtype = np.float16
+                else:
+                    dtype = value.dtype
+                self.columns[name] = np.zeros((self.capacity, self.num_agents) + value.shape, dtype=dtype)
+
+        elif self.frame_cnt >= self.capacity:
+            self.capacity *= 2
+            for name, column in self.columns.items():
+                new_column = np.zeros((self.capacity,) + column.shape[1:], dtype=column.dtype)
+                new_column[:self.frame_cnt] = column[:self.frame_cnt]
+                self.columns[name] = new_column
+
     def save_sample(self, frame_no,
                     vec_feature, legal_action, action, reward, value, prob, sub_action,
                     lstm_cell, lstm_hidden,
-                    done, agent_id, is_train=True, meta_is_train=False,
-                    game_id=None, uuid=None):
+                    agent_id, is_train=True, meta_is_train=0, model_version=-1):
         """
         samples must saved by frame_no order
         """
+        #目前网络中没有增加大局观reward，在这个地方加入全0向量
         reward = self._clip_reward(reward)
+        reward = np.concatenate([reward, np.zeros(reward.shape[:-1] + (1,))], axis=-1)
+
         #只需要上报id=0的reward sum
         if agent_id==0:
             self.log_rewsum += np.sum(reward)
-        rl_data_info = RLDataInfo()
 
-        #value = value.flatten()[0]
-        #lstm_cell = lstm_cell.flatten()
-        #lstm_hidden = lstm_hidden.flatten()
+        frame_data = {
+            "frame_no": frame_no,
+            "feature": vec_feature,
+            "legal_action": legal_action,
+            "reward": np.zeros_like(reward),
+            "value": value,
+            "next_value": np.zeros_like(reward),
+            "lstm_info": np.concatenate([lstm_cell, lstm_hidden], axis=-1),
+            # np: (5， 14+25+42+42+3+61)
+            "prob": prob,
+            # np: (5,6)
+            "action": action,
+            # np: (5,6)
+            "sub_action": sub_action,
+            # np: (5)
+            "is_train": is_train,
+            # np: (5)
+            "meta_is_train": np.broadcast_to(meta_is_train, np.shape(is_train)),
+            # 产生该帧的actor的model_version, 不参与训练数据
+            "model_version": np.int64(model_version),
+        }
+        self.reserve(frame_data)
+
+        n = self.frame_cnt
 
         # update last frame's next_value
-        if len(self.rl_data_map[agent_id]) > 0:
-            last_key = list(self.rl_data_map[agent_id].keys())[-1]
-            last_rl_data_info = self.rl_data_map[agent_id][last_key]
-            last_rl_data_info.next_value = value
-            last_rl_data_info.reward = reward
+        if n > 0:
+            self.columns["next_value"][n - 1, agent_id] = value
+            self.columns["reward"][n - 1, agent_id] = reward
 
         # save current sample
-
-        rl_data_info.frame_no = frame_no
-        rl_data_info.feature = vec_feature
-        rl_data_info.legal_action = legal_action
-        rl_data_info.reward = np.zeros([5, 6])
-        rl_data_info.value = value
-        rl_data_info.done = done
-        rl_data_info.lstm_info = np.concatenate([lstm_cell, lstm_hidden], axis=-1)
-
-        # np: (5， 14+25+42+42+3+61)
-        rl_data_info.prob = prob
-        # np: (5,6)
-        # rl_data_info.action = 0 if action < 0 else action
-        rl_data_info.action = action
-        # np: (5,6)
-        rl_data_info.sub_action = sub_action
-        # np: (5)
-        rl_data_info.is_train = is_train
-        # np: (5)
-        rl_data_info.meta_is_train = meta_is_train
-
-        self.rl_data_map[agent_id][frame_no] = rl_data_info
+        for name, data in frame_data.items():
+            self.columns[name][n, agent_id] = data
         
     def save_last_sample(self, reward, agent_id):
         self.logger.info(f"game_id {self.game_id}, sample save last sample")
-        if len(self.rl_data_map[agent_id]) > 0:
+        if self.frame_cnt > 0:
             # TODO: is_action_executed, last_gamecore_act
-            last_key = list(self.rl_data_map[agent_id].keys())[-1]
-            last_rl_data_info = self.rl_data_map[agent_id][last_key]
-            last_rl_data_info.next_value = np.zeros([5, 6])
-            last_rl_data_info.reward = reward
+            self.columns["next_value"][self.frame_cnt - 1, agent_id] = 0
+            self.columns["reward"][self.frame_cnt - 1, agent_id] = reward
 
     def send_samples(self):
-        self._calc_reward()
-        self._format_data()
+        # 最后一帧不参与样本生成
+        frame_cnt = max(self.frame_cnt - 1, 0)
+
+        reward_sum, advantage = self._calc_reward(frame_cnt)
+        self._format_data(frame_cnt, reward_sum, advantage)
 
         return self._send_game_data()
 
-    def _calc_reward(self):
+    def stream_exprs(self):
+        """
+        流式生成样本, 只处理已经完整的LSTM_FRAME片段
+        片段最后一帧的next_value已知时即可生成, GAE在片段内截断并用next_value做bootstrap
+        Returns: train_data_all, train_frame_cnt
+        """
+        # 最后一帧的reward和next_value未知
+        ready_frame_cnt = (max(self.frame_cnt - 1, 0) // self._LSTM_FRAME) * self._LSTM_FRAME
+        if not ready_frame_cnt:
+            return [], 0
+
+        reward_sum, advantage = self._calc_reward(ready_frame_cnt, truncate=True)
+        self._format_data(ready_frame_cnt, reward_sum, advantage)
+        train_data = self._send_game_data()
+
+        # 未处理的帧移到开头, 每局只保留不超过LSTM_FRAME + 1帧
+        remain_frame_cnt = self.frame_cnt - ready_frame_cnt
+        for column in self.columns.values():
+            column[:remain_frame_cnt] = column[ready_frame_cnt:self.frame_cnt]
+        self.frame_cnt = remain_frame_cnt
+        self.m_replay_buffer = [[] for _ in range(self.num_agents)]
+
+        train_data_all = []
+        for agent_data in train_data:
+            for sample in agent_data:
+                train_data_all.append(self._train_sample(sample))
+
+        self.logger.debug(f'game_id {self.game_id}, sample stream {len(train_data_all)} samples')
+        return train_data_all, ready_frame_cnt
+
+    '''
+    单条发送给learner的样本, 开启use_sample_staleness时需要带上model_version字段和learner的样本池对齐
+    sample为(frame_no, data, model_version), model_version为片段内最旧的actor模型版本
+    '''
+    @staticmethod
+    def _train_sample(sample):
+        train_sample = {'input_datas': sample[1]}
+        if int(CONFIG.use_sample_staleness):
+            train_sample[KaiwuDRLDefine.SAMPLE_MODEL_VERSION] = np.array([sample[2]], dtype=np.int64)
+
+        return train_sample
+
+    def _calc_reward(self, frame_cnt, truncate=False):
         """
         Calculate cumulated reward and advantage with GAE.
         reward_sum: used for value loss
         advantage: used for policy loss
         V(s) here is a approximation of target network
+        truncate为True时在每个LSTM_FRAME片段内计算GAE, frame_cnt需要是LSTM_FRAME的整数倍
+        返回形如(frame, agent, hero, head)的reward_sum和advantage
         """
-        for i in range(self.num_agents):
-            reversed_keys = list(self.rl_data_map[i].keys())
-            reversed_keys.reverse()
-            gae = np.zeros([5, 6])
-            for j in reversed_keys:
-                rl_info = self.rl_data_map[i][j]
-                delta = -rl_info.value + rl_info.reward + self.gamma * rl_info.next_value
-                gae = gae * self.gamma * self.lamda + delta
-                
-                rl_info.advantage = gae
-                rl_info.reward_sum = gae + rl_info.value
-
-    def _reshape_lstm_batch_sample(self, sample_batch, sample_lstm):
-        sample = np.zeros([np.prod(sample_batch.shape) + np.prod(sample_lstm.shape)])
-        sample_one_size = sample_batch.shape[1]
-        idx, s_idx = 0, 0
-
-        sample[-sample_lstm.shape[0]:] = sample_lstm
-        for split_shape in self._data_shapes[:-2]:
-            one_shape = split_shape[0] // self._LSTM_FRAME
-            sample[s_idx: s_idx + split_shape[0]] = sample_batch[:, idx: idx + one_shape].reshape([-1])
-            idx += one_shape
-            s_idx += split_shape[0]
-        return sample
-
-    def common_sample_process(self, cnt, rl_info, sample_batch, sample_one_size):
-        # serilize one frames
-        idx, dlen = 0, 0
-        # vec_data
-        vec_feature = rl_info.feature
-        vec_feature = lz4.block.decompress(vec_feature, uncompressed_size=CONFIG.lz4_uncompressed_size)
-        vec_feature = pickle.loads(vec_feature, encoding='bytes')
-        dlen = vec_feature.shape[1]
-        sample_batch[:, cnt, idx:idx + dlen] = vec_feature
-        idx += dlen
-
-        # legal_action
-        dlen = rl_info.legal_action.shape[1]
-        sample_batch[:, cnt, idx:idx + dlen] = rl_info.legal_action
-        idx += dlen
-
-        # reward_sum & advantage
-        dlen = rl_info.reward.shape[1]
-        sample_batch[:, cnt, idx:idx + dlen] = rl_info.reward_sum
-        idx += dlen
-        #advantage最后一维是大局观，不参与policy训练才可以
-        #多头相加得到advantage
-        sample_batch[:, cnt, idx] = np.sum(rl_info.advantage[:, :-1], axis=-1)
-        idx += 1
-
-        # labels
-        dlen = rl_info.action.shape[1]
-        sample_batch[:, cnt, idx:idx + dlen] = rl_info.action
-        idx += dlen
-
-        # probs (neg log pi->prob)
-        dlen = rl_info.prob.shape[1]
-        sample_batch[:, cnt, idx:idx + dlen] = rl_info.prob
-        idx += dlen
-
-        # is_train
-        sample_batch[:, cnt, idx] = rl_info.is_train
-        idx += 1
-
-        sample_batch[:, cnt, idx] = rl_info.meta_is_train
-        idx += 1
-
-        # sub_action
-        dlen = rl_info.sub_action.shape[1]
-        sample_batch[:, cnt, idx:idx + dlen] = rl_info.sub_action
-        idx += dlen
+        if not frame_cnt:
+            return None, None
+
+        value = self.columns["value"][:frame_cnt]
+        deltas = self.columns["reward"][:frame_cnt] + self.gamma * self.columns["next_value"][:frame_cnt] - value
+        if truncate:
+            # (chunk, LSTM_FRAME, ...) --> (LSTM_FRAME, chunk, ...), 在时间维度上计算
+            chunks = deltas.reshape((-1, self._LSTM_FRAME) + deltas.shape[1:]).swapaxes(0, 1)
+            advantage = reverse_discounted_cumsum(chunks, self.gamma * self.lamda).swapaxes(0, 1).reshape(deltas.shape)
+        else:
+            advantage = reverse_discounted_cumsum(deltas, self.gamma * self.lamda)
 
-        assert idx == sample_one_size, "Sample check failed, {}/{}".format(idx, sample_one_size)
-        return sample_batch
+        return advantage + value, advantage
 
-    def _format_data(self):
+    def _format_data(self, frame_cnt, reward_sum, advantage):
         # feature   legal_action    reward  advantage action_list  prob_list   frame_is_train meta_is_train  weight_list
         #self._data_shapes = [12667, 187, 6, 1, 6, 187, 1, 1, 6]
 
-        sample_one_size = np.sum(self._data_shapes[:-2])
-        sample_lstm_size = np.sum(self._data_shapes[-2:])
-        sample_batch = np.zeros([5, self._LSTM_FRAME, sample_one_size])
-        sample_lstm = np.zeros([5, sample_lstm_size])
-        first_frame_no = -1
-
-        #本次发送样本数量小于lstm_step时,利用tmp_data进行样本拼凑保留尾部样本
-        if len(list(self.rl_data_map[0].keys())) < self._LSTM_FRAME and self.tmp_data:
-            data_len = len(list(self.rl_data_map[0].keys()))
-            tmp_len = self._LSTM_FRAME - data_len
-            for i in range(self.num_agents):
-                cnt = 0
-                for j in range(-tmp_len, 0):
-                    rl_info = self.tmp_data[i][j][1]
-
-                    if cnt == 0:
-                        # lstm cell & hidden
-                        first_frame_no = rl_info.frame_no
-                        sample_lstm = rl_info.lstm_info
-                        
-                    sample_batch = self.common_sample_process(cnt, rl_info, sample_batch, sample_one_size)
-
-                    cnt += 1
-                    
-                for j in self.rl_data_map[i]:
-                    rl_info = self.rl_data_map[i][j]
-                    sample_batch = self.common_sample_process(cnt, rl_info, sample_batch, sample_one_size)
-                    cnt += 1
-                    
-                if cnt == self._LSTM_FRAME:
-                    cnt = 0
-                    sample = sample_batch.reshape((5, -1))
-                    sample = np.concatenate([sample, sample_lstm], axis=-1)
-                    sample = sample.reshape((-1))
-                    self.m_replay_buffer[i].append((first_frame_no, sample))
-                    # self.logger.debug(f'sample first_frame_no {first_frame_no} add sample success')
-                else:
-                    self.logger.debug(f'game_id {self.game_id}, sample nums is wrong!')
-                    raise NotImplementedError
+        # 按照LSTM_FRAME切分, 尾部不足LSTM_FRAME的样本丢弃
+        chunk_cnt = frame_cnt // self._LSTM_FRAME
+        if not chunk_cnt:
             return
 
-        #正常处理样本逻辑
+        frame_cnt = chunk_cnt * self._LSTM_FRAME
+        columns = self.columns
+        parts = [
+            columns["feature"][:frame_cnt],
+            columns["legal_action"][:frame_cnt],
+            reward_sum[:frame_cnt],
+            #advantage最后一维是大局观，不参与policy训练才可以
+            #多头相加得到advantage
+            np.sum(advantage[:frame_cnt, ..., :-1], axis=-1, keepdims=True),
+            columns["action"][:frame_cnt],
+            columns["prob"][:frame_cnt],
+            columns["is_train"][:frame_cnt, ..., None],
+            columns["meta_is_train"][:frame_cnt, ..., None],
+            columns["sub_action"][:frame_cnt],
+        ]
+
+        # 每帧每个hero一行, 形如(frame, agent, hero, sample_one_size)
+        sample_one_size = np.sum(self._data_shapes[:-2])
+        hero_num = columns["feature"].shape[2]
+        rows = np.empty((frame_cnt, self.num_agents, hero_num, sample_one_size), dtype=np.float16)
+        idx = 0
+        for part in parts:
+            dlen = part.shape[-1]
+            rows[..., idx:idx + dlen] = part
+            idx += dlen
+        assert idx == sample_one_size, "Sample check failed, {}/{}".format(idx, sample_one_size)
+
+        # 每个样本为(hero, LSTM_FRAME * sample_one_size)再拼接上第一帧的lstm_info, 形如(agent, chunk, hero, -1)
+        rows = rows.reshape(chunk_cnt, self._LSTM_FRAME, self.num_agents, hero_num, sample_one_size)
+        rows = rows.transpose(2, 0, 3, 1, 4).reshape(self.num_agents, chunk_cnt, hero_num, -1)
+        lstm_info = columns["lstm_info"][:frame_cnt:self._LSTM_FRAME].transpose(1, 0, 2, 3)
+        samples = np.concatenate([rows, lstm_info], axis=-1).reshape(self.num_agents, chunk_cnt, -1)
+
+        # 每个样本的model_version取片段内最旧的版本, 形如(chunk, agent)
+        first_frame_nos = columns["frame_no"][:frame_cnt:self._LSTM_FRAME]
+        model_versions = columns["model_version"][:frame_cnt].reshape(chunk_cnt, self._LSTM_FRAME, self.num_agents).min(axis=1)
         for i in range(self.num_agents):
-            cnt = 0
-            for j in self.rl_data_map[i]:
-                rl_info = self.rl_data_map[i][j]
-
-                if cnt == 0:
-                    # lstm cell & hidden
-                    first_frame_no = rl_info.frame_no
-                    sample_lstm = rl_info.lstm_info
-
-                sample_batch = self.common_sample_process(cnt, rl_info, sample_batch, sample_one_size)
-
-                cnt += 1
-                if cnt == self._LSTM_FRAME:
-                    cnt = 0
-                    sample = sample_batch.reshape((5, -1))
-                    sample = np.concatenate([sample, sample_lstm], axis=-1)
-                    sample = sample.reshape((-1))
-                    self.m_replay_buffer[i].append((first_frame_no, sample))
-                    self.logger.debug(f'game_id {self.game_id}, sample first_frame_no {first_frame_no} add sample success')
-            ''' 
-            #尾部样本不丢弃
-            if cnt > 0:
-                a_ins = len(list(self.rl_data_map[i].keys()))-self._LSTM_FRAME
-                e_ins = len(list(self.rl_data_map[i].keys()))
-                cnt = 0
-                if a_ins >= 0:
-                    for k in range(a_ins, e_ins):
-                        rl_info = self.rl_data_map[i][list(self.rl_data_map[i].keys())[k]]
-
-                        if cnt == 0:
-                            # lstm cell & hidden
-                            first_frame_no = rl_info.frame_no
-                            sample_lstm = rl_info.lstm_info
-
-                            sample_batch = self.common_sample_process(cnt, rl_info, sample_batch, sample_one_size)
-
-                        cnt += 1
-                        if cnt == self._LSTM_FRAME:
-                            cnt = 0
-                            sample = sample_batch.reshape((5, -1))
-                            sample = np.concatenate([sample, sample_lstm], axis=-1)
-                            sample = sample.reshape((-1))
-                            self.m_replay_buffer[i].append((first_frame_no, sample))
-            '''
+            self.m_replay_buffer[i].extend(zip(first_frame_nos[:, i].tolist(), samples[i], model_versions[:, i].tolist()))
+
+        self.logger.debug(f'game_id {self.game_id}, sample add {chunk_cnt} samples success')
 
     def _clip_reward(self, reward, max=100, min=-100):
         reward = np.clip(reward, min, max)
@@ -461,18 +412,18 @@ class SampleServer(multiprocessing.Process):
         
         self.log_rewsum = multiprocessing.Value('f', 0.0)
     
-    def gen_frame_sample(self, slot_id, sample_info_list, must_need_sample_info):
+    def gen_frame_sample(self, slot_id, sample_info_list, must_need_sample_info, model_version=-1):
         while self.msg_queue.full():
             time.sleep(0.01)
         
-        self.msg_queue.put((slot_id, sample_info_list, must_need_sample_info))
+        self.msg_queue.put((slot_id, sample_info_list, must_need_sample_info, model_version))
     
     def sample_server_gameover(self, slot_id):
         
         while self.msg_queue.full():
             time.sleep(0.01)
         
-        self.msg_queue.put((slot_id, None, None))
+        self.msg_queue.put((slot_id, None, None, -1))
 
         return self.log_rewsum.value
     
@@ -520,6 +471,9 @@ class SampleServer(multiprocessing.Process):
         self.recv_from_kaiwu_rl_helper_suc_cnt = 0
         self.recv_from_kaiwu_rl_helper_err_cnt = 0
 
+        # 流式发送样本, 不再按照send_sample_size批量发送
+        self.use_streaming_sample = int(CONFIG.use_streaming_sample)
+
     def send_to_learner_proxy(self, train_data, slot_id):
 
         # 发送给learner_proxy
@@ -544,8 +498,8 @@ class SampleServer(multiprocessing.Process):
                     self.game_manager[slot_id].on_init(2, slot_id)
                 self.game_manager[slot_id].agent_policy.append(policy_id)
                 
-            elif len(data)==3:
-                slot_id, sample_info_list, must_need_sample_info = data
+            elif len(data)==4:
+                slot_id, sample_info_list, must_need_sample_info, model_version = data
                 # 处理gameover的情况
                 if sample_info_list==None and must_need_sample_info==None:
                     train_data, train_frame_cnt, _ = self.game_manager[slot_id].proc_exprs()
@@ -554,16 +508,23 @@ class SampleServer(multiprocessing.Process):
                     del self.game_manager[slot_id]
                 else:
                     # 保存样本
-                    self.game_manager[slot_id].gen_expr(must_need_sample_info, sample_info_list)
+                    self.game_manager[slot_id].gen_expr(must_need_sample_info, sample_info_list, model_version)
+
+                    # 流式发送, 完整的LSTM_FRAME片段立即发送给learner
+                    if self.use_streaming_sample:
+                        train_data, train_frame_cnt = self.game_manager[slot_id].stream_exprs()
+                        if train_frame_cnt > 0:
+                            self.send_to_learner_proxy(train_data, slot_id)
             else:
                 raise NotImplementedError
         
-            # 轮询进行leanrer样本发送
-            for i in self.game_manager:
-                if self.game_manager[i].steps>0 and self.game_manager[i].steps%int(CONFIG.send_sample_size) == 0:
-                    train_data, train_frame_cnt, _ = self.game_manager[i].proc_exprs()
-                    if train_frame_cnt > 0:
-                        self.send_to_learner_proxy(train_data, i)
+            # 轮询进行leanrer样本发送, 流式发送时已经在保存样本后发送
+            if not self.use_streaming_sample:
+                for i in self.game_manager:
+                    if self.game_manager[i].steps>0 and self.game_manager[i].steps%int(CONFIG.send_sample_size) == 0:
+                        train_data, train_frame_cnt, _ = self.game_manager[i].proc_exprs()
+                        if train_frame_cnt > 0:
+                            self.send_to_learner_proxy(train_data, i)
 
             if 0 in self.game_manager:
                 self.log_rewsum.value = self.game_manager[0].log_rewsum
@@ -2,8 +2,12 @@
 # -*- coding: utf-8 -*-
 
 
+import collections
 import unittest
+from unittest import mock
+import numpy as np
 from framework.common.config.config_control import CONFIG
+import framework.server.aisrv.sample_server as sample_server
 
 class MsgEngineTest(unittest.TestCase):
     def test_all(self):
@@ -13,5 +17,283 @@ class MsgEngineTest(unittest.TestCase):
         CONFIG.parse_aisrv_configure()
 
 
+# 小规模的sgame_5v5样本格式, 每帧feature, legal_action, reward_sum, advantage, action, prob, is_train, meta_is_train, sub_action
+HERO_NUM = 5
+FEATURE_DIM = 8
+LEGAL_ACTION_DIM = 5
+PROB_DIM = 7
+LSTM_UNIT_SIZE = 3
+LSTM_TIME_STEPS = 4
+
+
+class FakeModelConfig(object):
+    LSTM_TIME_STEPS = LSTM_TIME_STEPS
+    data_shapes_for_sample = [[FEATURE_DIM], [LEGAL_ACTION_DIM], [6], [1], [6], [PROB_DIM], [1], [1], [6],
+                              [LSTM_UNIT_SIZE], [LSTM_UNIT_SIZE]]
+
+
+class ReferenceSampleProcessor(object):
+    '''
+    向量化之前按帧处理的实现, 每个agent一个OrderedDict保存每帧的数据, 逐帧计算GAE和拼接样本
+    '''
+    def __init__(self, num_agents):
+        self.num_agents = num_agents
+        self.gamma = np.array([0.997, 0.997, 0.997, 0.997, 0.99978, 0.997])
+        self.lamda = np.array([0.95, 0.95, 0.95, 0.95, 0.99856, 0.95])
+        self.data_shapes = FakeModelConfig.data_shapes_for_sample
+        self.rl_data_map = [collections.OrderedDict() for _ in range(num_agents)]
+        self.log_rewsum = 0.0
+
+    def gen_expr(self, frame_no, network_sample_info):
+        for i in range(self.num_agents):
+            feature_vec, lstm_hidden, lstm_cell, reward, value, legal_action, sub_action_mask, action, prob, is_trains = network_sample_info[i]
+            reward = np.hstack((np.clip(reward, -100, 100), np.zeros((HERO_NUM, 1))))
+            if i == 0:
+                self.log_rewsum += np.sum(reward)
+
+            if self.rl_data_map[i]:
+                last_rl_info = next(reversed(self.rl_data_map[i].values()))
+                last_rl_info['next_value'] = value
+                last_rl_info['reward'] = reward
+
+            self.rl_data_map[i][frame_no] = {
+                'frame_no': frame_no, 'feature': feature_vec, 'legal_action': legal_action, 'reward': np.zeros([HERO_NUM, 6]),
+                'value': value, 'lstm_info': np.concatenate([lstm_cell, lstm_hidden], axis=-1), 'prob': prob, 'action': action,
+                'sub_action': sub_action_mask, 'is_train': is_trains, 'meta_is_train': np.zeros(HERO_NUM),
+            }
+
+    def save_last_sample(self, reward, agent_id):
+        if self.rl_data_map[agent_id]:
+            last_rl_info = next(reversed(self.rl_data_map[agent_id].values()))
+            last_rl_info['next_value'] = np.zeros([HERO_NUM, 6])
+            last_rl_info['reward'] = reward
+
+    def proc_exprs(self, del_last=False):
+        if del_last:
+            for i in range(self.num_agents):
+                if self.rl_data_map[i]:
+                    self.rl_data_map[i].popitem()
+
+        # 最后一帧不参与样本生成, 作为下一次的第一帧
+        last_data = [self.rl_data_map[i].popitem() for i in range(self.num_agents)]
+        self.calc_reward()
+        samples = self.format_data()
+
+        self.rl_data_map = [collections.OrderedDict([last_data[i]]) for i in range(self.num_agents)]
+        return_rew = self.log_rewsum
+        self.log_rewsum = 0.0
+
+        return samples, return_rew
+
+    def stream_exprs(self):
+        # 流式发送, 完整的LSTM_TIME_STEPS片段在片段内计算GAE, 剩下的帧留到下一次
+        ready_frame_cnt = (len(self.rl_data_map[0]) - 1) // LSTM_TIME_STEPS * LSTM_TIME_STEPS
+        if ready_frame_cnt <= 0:
+            return []
+
+        remain = [collections.OrderedDict(list(m.items())[ready_frame_cnt:]) for m in self.rl_data_map]
+        self.rl_data_map = [collections.OrderedDict(list(m.items())[:ready_frame_cnt]) for m in self.rl_data_map]
+        self.calc_reward(chunk_size=LSTM_TIME_STEPS)
+        samples = self.format_data()
+        self.rl_data_map = remain
+
+        return samples
+
+    def calc_reward(self, chunk_size=None):
+        for i in range(self.num_agents):
+            rl_infos = list(self.rl_data_map[i].values())
+            chunk_size = chunk_size or len(rl_infos)
+            for start in range(0, len(rl_infos), chunk_size):
+                gae = np.zeros([HERO_NUM, 6])
+                for rl_info in reversed(rl_infos[start:start + chunk_size]):
+                    delta = -rl_info['value'] + rl_info['reward'] + self.gamma * rl_info['next_value']
+                    gae = gae * self.gamma * self.lamda + delta
+                    rl_info['advantage'] = gae
+                    rl_info['reward_sum'] = gae + rl_info['value']
+
+    def format_data(self):
+        samples = []
+        sample_one_size = np.sum(self.data_shapes[:-2])
+        sample_batch = np.zeros([HERO_NUM, LSTM_TIME_STEPS, sample_one_size])
+        for i in range(self.num_agents):
+            cnt = 0
+            for rl_info in self.rl_data_map[i].values():
+                if cnt == 0:
+                    sample_lstm = rl_info['lstm_info']
+
+                parts = [rl_info['feature'], rl_info['legal_action'], rl_info['reward_sum'],
+                         np.sum(rl_info['advantage'][:, :-1], axis=-1, keepdims=True), rl_info['action'], rl_info['prob'],
+                         np.reshape(rl_info['is_train'], (-1, 1)), np.reshape(rl_info['meta_is_train'], (-1, 1)), rl_info['sub_action']]
+                sample_batch[:, cnt] = np.concatenate(parts, axis=-1)
+
+                cnt += 1
+                if cnt == LSTM_TIME_STEPS:
+                    cnt = 0
+                    sample = np.concatenate([sample_batch.reshape((HERO_NUM, -1)), sample_lstm], axis=-1)
+                    samples.append(np.array(sample.reshape(-1), dtype=np.float16))
+
+        return samples
+
+
+class SgameSampleProcessorTest(unittest.TestCase):
+    def setUp(self):
+        CONFIG.self_play = False
+        CONFIG.use_sample_staleness = 0
+
+        patcher = mock.patch.object(sample_server, 'ModelConfig', FakeModelConfig, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.num_agents = 2
+        self.processor = sample_server.SgameSampleProcessor()
+        self.processor.set_logger(mock.MagicMock())
+        self.processor.on_init(self.num_agents, 'game_0')
+        self.reference = ReferenceSampleProcessor(self.num_agents)
+
+        self.rng = np.random.default_rng(0)
+        self.frame_no = 0
+
+    def network_sample_info(self):
+        rng = self.rng
+        return [(
+            rng.standard_normal((HERO_NUM, FEATURE_DIM)).astype(np.float32),
+            rng.standard_normal((HERO_NUM, LSTM_UNIT_SIZE)).astype(np.float32),
+            rng.standard_normal((HERO_NUM, LSTM_UNIT_SIZE)).astype(np.float32),
+            rng.standard_normal((HERO_NUM, 5)) * 50,
+            rng.standard_normal((HERO_NUM, 6)).astype(np.float32),
+            (rng.random((HERO_NUM, LEGAL_ACTION_DIM)) > 0.5).astype(np.float32),
+            (rng.random((HERO_NUM, 6)) > 0.5).astype(np.float32),
+            rng.integers(0, 5, (HERO_NUM, 6)).astype(np.float32),
+            rng.random((HERO_NUM, PROB_DIM)).astype(np.float32),
+            (rng.random(HERO_NUM) > 0.2).astype(np.float32),
+        ) for _ in range(self.num_agents)]
+
+    def gen_frames(self, frame_cnt):
+        for _ in range(frame_cnt):
+            network_sample_info = self.network_sample_info()
+            self.processor.gen_expr({'frame_no': self.frame_no}, network_sample_info)
+            self.reference.gen_expr(self.frame_no, network_sample_info)
+            self.frame_no += 1
+
+    def assert_samples_equal(self, train_data, ref_samples):
+        self.assertEqual(len(train_data), len(ref_samples))
+        for sample, ref_sample in zip(train_data, ref_samples):
+            self.assertEqual(sample['input_datas'].dtype, np.float16)
+            np.testing.assert_allclose(sample['input_datas'].astype(np.float32), ref_sample.astype(np.float32),
+                                       rtol=2e-3, atol=2e-3)
+
+    def assert_proc_exprs_equal(self, del_last=False):
+        train_data, _, return_rew = self.processor.proc_exprs(del_last=del_last)
+        ref_samples, ref_return_rew = self.reference.proc_exprs(del_last=del_last)
+
+        self.assertAlmostEqual(return_rew, ref_return_rew, places=6)
+        self.assert_samples_equal(train_data, ref_samples)
+
+        return train_data
+
+    def test_calc_reward(self):
+        self.gen_frames(11)
+
+        frame_cnt = self.processor.frame_cnt - 1
+        reward_sum, advantage = self.processor._calc_reward(frame_cnt)
+        self.assertEqual(advantage.shape, (frame_cnt, self.num_agents, HERO_NUM, 6))
+
+        self.reference.rl_data_map = [collections.OrderedDict(list(m.items())[:-1]) for m in self.reference.rl_data_map]
+        self.reference.calc_reward()
+        for i in range(self.num_agents):
+            rl_infos = list(self.reference.rl_data_map[i].values())
+            np.testing.assert_allclose(advantage[:, i], np.stack([rl_info['advantage'] for rl_info in rl_infos]), rtol=1e-9)
+            np.testing.assert_allclose(reward_sum[:, i], np.stack([rl_info['reward_sum'] for rl_info in rl_infos]), rtol=1e-9)
+
+    def test_proc_exprs(self):
+        # 10帧里9帧参与样本生成, 每个agent 2条样本, 尾部1帧丢弃
+        self.gen_frames(10)
+        train_data = self.assert_proc_exprs_equal()
+        self.assertEqual(len(train_data), 2 * self.num_agents)
+        self.assertEqual(train_data[0]['input_datas'].shape,
+                         (HERO_NUM * (LSTM_TIME_STEPS * np.sum(FakeModelConfig.data_shapes_for_sample[:-2]) + 2 * LSTM_UNIT_SIZE), ))
+
+    def test_reset(self):
+        # reset后上一次的最后一帧作为第一帧, 多次proc_exprs都和按帧处理一致
+        for frame_cnt in (9, 6, 13):
+            self.gen_frames(frame_cnt)
+            self.assert_proc_exprs_equal()
+            self.assertEqual(self.processor.frame_cnt, 1)
+
+        # 数据超过预分配的容量时扩容
+        self.gen_frames(200)
+        self.assert_proc_exprs_equal()
+
+    def test_del_last(self):
+        self.gen_frames(10)
+        self.assert_proc_exprs_equal(del_last=True)
+
+        self.gen_frames(8)
+        self.assert_proc_exprs_equal(del_last=True)
+
+    def test_save_last_sample(self):
+        self.gen_frames(9)
+        reward = self.rng.standard_normal((HERO_NUM, 6))
+        for i in range(self.num_agents):
+            self.processor.save_last_sample(reward, i)
+            self.reference.save_last_sample(reward, i)
+
+        self.assert_proc_exprs_equal()
+
+    def test_calc_reward_truncate(self):
+        self.gen_frames(3 * LSTM_TIME_STEPS + 2)
+
+        # 每个片段内单独计算GAE, 片段最后一帧用next_value做bootstrap
+        frame_cnt = 3 * LSTM_TIME_STEPS
+        reward_sum, advantage = self.processor._calc_reward(frame_cnt, truncate=True)
+        self.assertEqual(advantage.shape, (frame_cnt, self.num_agents, HERO_NUM, 6))
+
+        self.reference.rl_data_map = [collections.OrderedDict(list(m.items())[:frame_cnt]) for m in self.reference.rl_data_map]
+        self.reference.calc_reward(chunk_size=LSTM_TIME_STEPS)
+        for i in range(self.num_agents):
+            rl_infos = list(self.reference.rl_data_map[i].values())
+            np.testing.assert_allclose(advantage[:, i], np.stack([rl_info['advantage'] for rl_info in rl_infos]), rtol=1e-9)
+            np.testing.assert_allclose(reward_sum[:, i], np.stack([rl_info['reward_sum'] for rl_info in rl_infos]), rtol=1e-9)
+
+        # 片段最后一帧的advantage只有单步的delta
+        columns = self.processor.columns
+        t = LSTM_TIME_STEPS - 1
+        np.testing.assert_allclose(advantage[t], columns['reward'][t] + self.processor.gamma * columns['next_value'][t] - columns['value'][t])
+
+    def test_stream_exprs(self):
+        # 最后一帧的next_value未知, 2 * LSTM_TIME_STEPS + 1帧可以生成2个片段
+        self.gen_frames(2 * LSTM_TIME_STEPS)
+        train_data, train_frame_cnt = self.processor.stream_exprs()
+        self.assertEqual(train_frame_cnt, LSTM_TIME_STEPS)
+        self.assert_samples_equal(train_data, self.reference.stream_exprs())
+        self.assertEqual(self.processor.frame_cnt, LSTM_TIME_STEPS)
+
+        self.gen_frames(1)
+        train_data, train_frame_cnt = self.processor.stream_exprs()
+        self.assertEqual(train_frame_cnt, LSTM_TIME_STEPS)
+        self.assertEqual(len(train_data), self.num_agents)
+        self.assert_samples_equal(train_data, self.reference.stream_exprs())
+        self.assertEqual(self.processor.frame_cnt, 1)
+
+        # 不足1个片段时不发送
+        self.assertEqual(self.processor.stream_exprs(), ([], 0))
+
+    def test_stream_across_windows(self):
+        # 和SampleServer一致, 每帧保存后尝试流式发送, 未处理的帧跨窗口保留
+        stream_samples, ref_samples = [], []
+        for _ in range(5 * LSTM_TIME_STEPS + 3):
+            self.gen_frames(1)
+            train_data, _ = self.processor.stream_exprs()
+            stream_samples.extend(train_data)
+            ref_samples.extend(self.reference.stream_exprs())
+            self.assertLessEqual(self.processor.frame_cnt, LSTM_TIME_STEPS)
+
+        self.assertEqual(len(stream_samples), 5 * self.num_agents)
+        self.assert_samples_equal(stream_samples, ref_samples)
+
+        # 对局结束时剩下的帧按照proc_exprs处理, 不足1个片段丢弃
+        self.assert_proc_exprs_equal()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -76,30 +76,68 @@ def check_param():
     if CONFIG.train_batch_size > CONFIG.replay_buffer_capacity:
         print(f'train_batch_size {CONFIG.train_batch_size} > replay_buffer_capacity {CONFIG.replay_buffer_capacity}')
         return False
+
+    # learner进程内的样本池只能通过learner_server接收样本
+    if (CONFIG.use_mempool() or CONFIG.use_tf_uniform()) and not CONFIG.use_learner_server:
+        print(f'replay_buffer_type {CONFIG.replay_buffer_type} need use_learner_server')
+        return False
+
+    # 后台预取接入了pytorch和tensorflow_simple(tensorrt相同)的训练流程, tensorflow_simple的预取批次通过dataset.from_generator提供, 只支持learner进程内的样本池
+    if int(CONFIG.use_learner_prefetch):
+        if CONFIG.use_which_deep_learning_framework in (KaiwuDRLDefine.MODEL_TENSORFLOW_SIMPLE, KaiwuDRLDefine.MODEL_TENSORRT):
+            if not (CONFIG.use_mempool() or CONFIG.use_tf_uniform()):
+                print(f'use_learner_prefetch with {CONFIG.use_which_deep_learning_framework} need replay_buffer_type mempool or tf_uniform, not {CONFIG.replay_buffer_type}')
+                return False
+        elif CONFIG.use_which_deep_learning_framework != KaiwuDRLDefine.MODEL_PYTORCH:
+            print(f'use_learner_prefetch not support {CONFIG.use_which_deep_learning_framework}')
+            return False
+
+    # 按照样本的陈旧程度过滤是在预取时进行的
+    if int(CONFIG.use_sample_staleness) and not int(CONFIG.use_learner_prefetch):
+        print(f'use_sample_staleness need use_learner_prefetch')
+        return False
     
     return True
 
-def train_loop():
-    # 根据配置文件conf/learner_conf.json找到本次使用的train类
-    train = AlgoConf[CONFIG.algo].trainer()
+'''
+启动learner_server, 包括learner_server_reverb和learner_server_zmq, 返回(learner_server_zmq, learner_server_reverbs), 不使用learner_server时返回(None, [])
+'''
+def start_learner_server(train):
+    learner_server_zmq = None
+    learner_server_reverbs = []
 
     # 临时方案TODO, 启动learner_server, 包括learner_server_reverb和learner_server_zmq
     if CONFIG.use_learner_server:
         from framework.server.learner.learner_server import LearnerServerReverb, LearnerServerZmq
 
         # LearnerServerReverb进程集合
-        learner_server_reverbs = []
-        for i in range(int(CONFIG.revervb_utils_count)):
-            learner_server_reverb = LearnerServerReverb(i)
-            learner_server_reverb.start()
-            learner_server_reverbs.append(learner_server_reverb)
+        sample_queue = None
+        if CONFIG.use_reverb():
+            for i in range(int(CONFIG.revervb_utils_count)):
+                learner_server_reverb = LearnerServerReverb(i)
+                learner_server_reverb.start()
+                learner_server_reverbs.append(learner_server_reverb)
+
+        # learner进程内的样本池, LearnerServerZmq直接写入共享内存队列, 不需要LearnerServerReverb
+        else:
+            from framework.common.utils.shared_memory_queue import SharedMemoryQueue
+            sample_queue = SharedMemoryQueue(int(CONFIG.learner_reverb_queue_size), int(CONFIG.learner_reverb_queue_slot_size))
+            train.set_sample_queue(sample_queue)
         
         # 人为的增加sleep时间
         time.sleep(CONFIG.start_python_daemon_sleep_after_cpp_daemon_sec)
 
-        learner_server_zmq = LearnerServerZmq(learner_server_reverbs)
+        learner_server_zmq = LearnerServerZmq(learner_server_reverbs, sample_queue)
         learner_server_zmq.start()
 
+    return learner_server_zmq, learner_server_reverbs
+
+def train_loop():
+    # 根据配置文件conf/learner_conf.json找到本次使用的train类
+    train = AlgoConf[CONFIG.algo].trainer()
+
+    start_learner_server(train)
+
     train.loop()
 
 '''
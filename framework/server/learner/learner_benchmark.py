@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+'''
+learner端到端的吞吐压测, 不需要启动gamecore, aisrv和actor:
+1. 按照learner.py的流程启动learner_server和trainer(CPU), trainer在本进程内运行
+2. generator进程按照sgame_1v1的样本格式(见synthetic_sample.py)生成合成样本, 和aisrv一样采用flatbuffer + lz4压缩, 通过zmq发送给LearnerServerZmq
+3. 样本经过LearnerServerZmq --> LearnerServerReverb --> 样本池 --> 训练, 或者mempool/tf_uniform时LearnerServerZmq --> 共享内存队列 --> learner进程内的样本池 --> 训练
+
+每隔report_interval秒打印一次, 结束时打印warmup之后的汇总:
+1. 吞吐, generator发送的样本数/s, 样本池插入的样本数/s, 训练消耗的样本数/s和训练次数/s
+2. 单次训练耗时, 即model_wrapper.train的耗时分位数
+3. 输入队列的长度, LearnerServerZmq --> LearnerServerReverb的队列, 共享内存样本队列, 样本池的大小, 预取准备好的批次数
+4. CPU耗时占比, 按照trainer, learner_server_zmq, learner_server_reverb, generator进程统计user/system
+
+训练次数和样本数不包括推送modelpool和同步model_version的耗时, 压测时这部分替换为直接返回成功, 见disable_model_sync
+
+配置项采用learner.toml, 压测固定的配置见BENCHMARK_CONFIG, 可以用--set key=value覆盖, 比如对比共享内存队列:
+python3 framework/server/learner/learner_benchmark.py --duration 300 --warmup 60 --set learner_reverb_queue_type=shared_memory
+python3 framework/server/learner/learner_benchmark.py --duration 300 --generator_process_num 4 --send_batch_size 64 --set replay_buffer_type=mempool
+'''
+
+import os
+import time
+import argparse
+import multiprocessing
+import lz4.block
+import zmq
+import flatbuffers
+from framework.common.protocol import AisrvLearnerRequest
+from framework.common.config.config_control import CONFIG
+from framework.common.config.algo_conf import AlgoConf
+from framework.common.monitor.histogram import LogLinearHistogram
+from framework.common.monitor.process_cpu_stat import ProcessCpuStat
+from framework.server.learner.synthetic_sample import SyntheticSampleGenerator
+import framework.server.learner.learner as learner
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config_file', default='conf/framework/learner.toml', type=str)
+parser.add_argument('--duration', default=300, type=int, help='total seconds, include warmup')
+parser.add_argument('--warmup', default=60, type=int, help='seconds not counted in the summary')
+parser.add_argument('--report_interval', default=10, type=int)
+parser.add_argument('--generator_process_num', default=2, type=int)
+parser.add_argument('--send_batch_size', default=64, type=int, help='samples per zmq message')
+parser.add_argument('--send_rate', default=0, type=int, help='samples/s per generator, 0 means as fast as possible')
+parser.add_argument('--pregenerated_message_count', default=16, type=int, help='distinct messages per generator, sent in turn')
+parser.add_argument('--obs_density', default=0.3, type=float, help='ratio of non-zero features, affects the lz4 ratio')
+parser.add_argument('--set', default=[], action='append', help='config override key=value, can be repeated')
+
+args = parser.parse_args()
+
+
+'''
+压测固定的配置, 在解析配置文件时按照环境变量覆盖
+1. 启动learner_server, 按照CPU运行
+2. on-policy按照time_interval的方式由learner自己推动训练, 不依赖aisrv
+3. 关闭prometheus, alloc, rainbow等外部依赖
+4. 每次保存model后的on-policy流程只保留清空样本池, 推送modelpool和同步actor, aisrv的model_version见disable_model_sync
+'''
+BENCHMARK_CONFIG = {
+    'use_learner_server': 'True',
+    'learner_device_type': 'CPU',
+    'algorithm_on_policy_or_off_policy': 'on-policy',
+    'on_policy_by_way': 'time_interval',
+    'use_prometheus': 'False',
+    'use_alloc': 'False',
+    'use_rainbow': 'False',
+    'preload_model': 'False',
+}
+
+
+def parse_config():
+    overrides = dict(BENCHMARK_CONFIG)
+    for item in args.set:
+        key, value = item.split('=', 1)
+        overrides[key.strip()] = value.strip()
+
+    os.environ.update(overrides)
+    learner.proc_flags(args.config_file)
+
+
+'''
+压测时没有modelpool, actor和aisrv, 推送modelpool失败时每轮重试会sleep(idle_sleep_second * 1000), 每次保存model会阻塞训练数秒
+故替换为直接返回成功, 保存model后的on-policy流程只保留清空样本池, 和真实训练时样本池的大小变化一致
+'''
+def disable_model_sync(trainer):
+    trainer.learner_push_model_to_modelpool = lambda: True
+    trainer.learner_broadcast_weights_to_actor = lambda send_data: False
+    trainer.learner_send_and_recv_actor_model_version_request_and_response = lambda send_data: True
+    trainer.learner_send_and_recv_aisrv_model_version_request_and_response = lambda send_data: True
+
+
+'''
+aisrv --> learner的请求格式, 见framework/common/protocol/AisrvLearnerRequest.py
+'''
+def encode_request(samples):
+    builder = flatbuffers.Builder(samples.nbytes + 1024)
+    data = builder.CreateNumpyVector(samples.reshape(-1))
+    AisrvLearnerRequest.AisrvLearnerRequestStart(builder)
+    AisrvLearnerRequest.AisrvLearnerRequestAddData(builder, data)
+    AisrvLearnerRequest.AisrvLearnerRequestAddBatchSize(builder, len(samples))
+    builder.Finish(AisrvLearnerRequest.AisrvLearnerRequestEnd(builder))
+
+    return lz4.block.compress(bytes(builder.Output()), store_size=False)
+
+
+'''
+generator进程, 预先生成pregenerated_message_count个消息后循环发送, 发送耗时不包含样本的生成和压缩
+'''
+def generator_proc(idx, zmq_address, sent_count, exit_flag):
+    # conf/config.py里的ModelConfig需要在解析配置文件后导入
+    from conf.config import ModelConfig
+
+    generator = SyntheticSampleGenerator(ModelConfig.DATA_SPLIT_SHAPE, ModelConfig.LSTM_TIME_STEPS, ModelConfig.LABEL_SIZE_LIST,
+                                         ModelConfig.SERI_VEC_SPLIT_SHAPE[0][0], args.obs_density, seed=idx)
+    messages = [encode_request(generator.sample_batch(args.send_batch_size)) for _ in range(args.pregenerated_message_count)]
+
+    # 和aisrv上C++版本的zmq一致, 采用DEALER
+    context = zmq.Context()
+    socket = context.socket(zmq.DEALER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.IDENTITY, bytes(f'learner_benchmark_generator_{idx}', 'utf-8'))
+    socket.connect(f'tcp://{zmq_address}')
+
+    interval = args.send_batch_size / args.send_rate if args.send_rate > 0 else 0
+    next_send_time = time.monotonic()
+    count = 0
+    while not exit_flag.value:
+        if interval:
+            now = time.monotonic()
+            if now < next_send_time:
+                time.sleep(next_send_time - now)
+            next_send_time += interval
+
+        # 对端处理不过来时阻塞在发送上, 超时后检查退出标志
+        if not socket.poll(1000, flags=zmq.POLLOUT):
+            continue
+
+        socket.send(messages[count % len(messages)], copy=False)
+        count += 1
+        with sent_count.get_lock():
+            sent_count.value += args.send_batch_size
+
+    socket.close()
+    context.term()
+
+
+class Report(object):
+    def __init__(self, trainer, learner_server_reverbs, sent_count, cpu_stat):
+        self.trainer = trainer
+        self.learner_server_reverbs = learner_server_reverbs
+        self.sent_count = sent_count
+        self.cpu_stat = cpu_stat
+
+        self.train_batch_size = int(CONFIG.train_batch_size)
+
+        # 单次训练耗时(微秒)
+        self.step_time_histogram = LogLinearHistogram()
+        self.total_step_time_histogram = LogLinearHistogram()
+        self.step_count = 0
+
+        self.last = self.snapshot()
+        self.begin = None
+
+    '''
+    统计model_wrapper.train的耗时和次数
+    '''
+    def wrap_train(self, model_wrapper):
+        train = model_wrapper.train
+
+        def timed_train(*train_args, **train_kwargs):
+            start = time.monotonic()
+            result = train(*train_args, **train_kwargs)
+            self.step_time_histogram.record((time.monotonic() - start) * 1000000)
+            self.step_count += 1
+
+            return result
+
+        model_wrapper.train = timed_train
+
+    def snapshot(self):
+        return {
+            'time': time.monotonic(),
+            'sent': self.sent_count.value,
+            'insert': self.trainer.replay_buffer_wrapper.get_insert_stats(),
+            'step': self.step_count,
+            'cpu': self.cpu_stat.times(),
+        }
+
+    def queue_size(self):
+        sizes = []
+        for learner_server_reverb in self.learner_server_reverbs:
+            try:
+                sizes.append(learner_server_reverb.msg_queue.qsize())
+            except Exception:
+                sizes.append(-1)
+
+        queue_size = {
+            'reverb_queue': sizes,
+            'replay_buffer': self.trainer.replay_buffer_wrapper.get_current_size(),
+        }
+        if self.trainer.sample_queue:
+            queue_size['sample_queue'] = self.trainer.sample_queue.qsize()
+        if self.trainer.replay_buffer_wrapper.use_prefetch:
+            queue_size['prefetch_ready'] = self.trainer.replay_buffer_wrapper.prefetch_ready_count()
+
+        return queue_size
+
+    def format(self, last, current, step_time_histogram):
+        interval = max(current['time'] - last['time'], 1e-6)
+        step = current['step'] - last['step']
+
+        lines = [
+            f"samples/s: sent {(current['sent'] - last['sent']) / interval:.1f}, "
+            f"insert {(current['insert'] - last['insert']) / interval:.1f}, "
+            f"train {step * self.train_batch_size / interval:.1f}, steps/s {step / interval:.2f}",
+            f"step time ms: mean {step_time_histogram.mean() / 1000:.1f}, "
+            f"p50 {step_time_histogram.percentile(50) / 1000:.1f}, p99 {step_time_histogram.percentile(99) / 1000:.1f}, "
+            f"max {step_time_histogram.max_value / 1000:.1f}",
+        ]
+
+        lines.append('cpu user/system: ' + ProcessCpuStat.format_usage(last['cpu'], current['cpu'], interval))
+
+        return lines
+
+    '''
+    周期性打印, 第一次在warmup之后调用时开始汇总
+    '''
+    def report(self, in_warmup):
+        current = self.snapshot()
+        step_time_histogram = self.step_time_histogram.drain()
+        if not in_warmup:
+            if self.begin is None:
+                self.begin = self.last
+            self.total_step_time_histogram.merge(step_time_histogram)
+
+        lines = self.format(self.last, current, step_time_histogram)
+        lines.append(f'queue size: {self.queue_size()}')
+        print(f"{'[warmup] ' if in_warmup else ''}" + '\n    '.join(lines), flush=True)
+
+        self.last = current
+
+    def summary(self):
+        if self.begin is None:
+            print('no summary, duration is not longer than warmup')
+            return
+
+        print('======== summary ========')
+        print('\n'.join(self.format(self.begin, self.last, self.total_step_time_histogram)), flush=True)
+
+
+def main():
+    parse_config()
+    if not learner.check_param():
+        print('conf param error, please check')
+        return
+
+    cpu_stat = ProcessCpuStat()
+    cpu_stat.add('trainer', os.getpid())
+
+    trainer = AlgoConf[CONFIG.algo].trainer()
+    learner_server_zmq, learner_server_reverbs = learner.start_learner_server(trainer)
+    cpu_stat.add('learner_server_zmq', learner_server_zmq.pid)
+    for learner_server_reverb in learner_server_reverbs:
+        cpu_stat.add('learner_server_reverb', learner_server_reverb.pid)
+
+    # trainer初始化后才开始发送样本, 和aisrv依赖learner先启动一致
+    trainer.before_run()
+    disable_model_sync(trainer)
+
+    sent_count = multiprocessing.Value('q', 0)
+    exit_flag = multiprocessing.Value('b', False)
+    zmq_address = f'{CONFIG.ip_address}:{int(CONFIG.reverb_svr_port) - 1}'
+    generators = []
+    for i in range(args.generator_process_num):
+        generator = multiprocessing.Process(target=generator_proc, args=(i, zmq_address, sent_count, exit_flag), name=f'generator_{i}')
+        generator.daemon = True
+        generator.start()
+        generators.append(generator)
+        cpu_stat.add('generator', generator.pid)
+
+    report = Report(trainer, learner_server_reverbs, sent_count, cpu_stat)
+    report.wrap_train(trainer.model_wrapper)
+
+    print(f'learner benchmark start, algo {CONFIG.algo}, replay_buffer_type {CONFIG.replay_buffer_type}, '
+          f'learner_reverb_queue_type {CONFIG.learner_reverb_queue_type}, train_batch_size {CONFIG.train_batch_size}, '
+          f'generator_process_num {args.generator_process_num}, send_batch_size {args.send_batch_size}', flush=True)
+
+    start = time.monotonic()
+    next_report_time = start + args.report_interval
+    process_run_count = 0
+    try:
+        while time.monotonic() - start < args.duration and not trainer.model_wrapper.should_stop():
+            trainer.run_once()
+
+            # 和OnPolicyTrainer.loop一致的短暂sleep
+            process_run_count += 1
+            if process_run_count % CONFIG.idle_sleep_count == 0:
+                time.sleep(CONFIG.idle_sleep_second)
+                process_run_count = 0
+
+            now = time.monotonic()
+            if now >= next_report_time:
+                report.report(in_warmup=now - start < args.warmup)
+                next_report_time += args.report_interval
+
+    except KeyboardInterrupt:
+        pass
+
+    report.summary()
+
+    exit_flag.value = True
+    for generator in generators:
+        generator.join(timeout=5)
+
+    learner_server_zmq.terminate()
+    for learner_server_reverb in learner_server_reverbs:
+        learner_server_reverb.terminate()
+
+    # trainer里的reverb server, model_file_saver等线程和进程不一定能正常退出, 直接结束进程
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,11 +12,13 @@ import time
 from framework.common.config.config_control import CONFIG
 from framework.common.logging.kaiwu_logger import KaiwuLogger, g_not_server_label
 from framework.common.ipc.reverb_util import RevervbUtil
-from framework.common.utils.common_func import set_schedule_event, get_random
+from framework.common.utils.common_func import set_schedule_event, get_random, TimeIt
 from framework.common.monitor.monitor_proxy import MonitorProxy
+from framework.common.monitor.histogram import LogLinearHistogram
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 # from framework.common.protocol.aisrv_learner_req_resp_pb2 import AisrvLearnerRequest
 from framework.common.ipc.zmq_util import ZmqServer
+from framework.common.utils.shared_memory_queue import SharedMemoryQueue
 import numpy as np
 from guppy import hpy
 import psutil, os
@@ -39,7 +41,7 @@ from framework.common.protocol.AisrvLearnerRequest import AisrvLearnerRequest
 LearnerServerZmq
 '''
 class LearnerServerZmq(multiprocessing.Process):
-    def __init__(self, learner_server_reverbs) -> None:
+    def __init__(self, learner_server_reverbs, sample_queue=None) -> None:
         super(LearnerServerZmq, self).__init__()
 
         self.zmq_server = ZmqServer(CONFIG.ip_address,  str(int(CONFIG.reverb_svr_port)-1))
@@ -52,9 +54,32 @@ class LearnerServerZmq(multiprocessing.Process):
         # LearnerServerReverb进程对象集合
         self.learner_server_reverbs = learner_server_reverbs
 
+        # 和LearnerServerReverb之间采用共享内存队列时, 只传递数组, 不再构造每行样本的dict
+        self.use_shared_memory_queue = (CONFIG.learner_reverb_queue_type == KaiwuDRLDefine.LEARNER_REVERB_QUEUE_TYPE_SHARED_MEMORY)
+
+        # learner进程内的样本池时, 直接写入learner的共享内存样本队列, 不经过LearnerServerReverb
+        self.sample_queue = sample_queue
+
+        # 写入样本队列成功和因为队列满而丢弃的样本数目, 周期性上报后清零
+        self.send_to_sample_queue_succ_cnt = 0
+        self.send_to_sample_queue_drop_cnt = 0
+
+        # 开启use_sample_staleness时, 样本带上aisrv发送的model_version
+        self.use_sample_staleness = int(CONFIG.use_sample_staleness)
+
         # 全局的PB解析对象
         # self.pb_req = AisrvLearnerRequest()
 
+    '''
+    aisrv按照样本发送的model_version, 形如(batch_size, 1), 没有该字段(旧版本的aisrv)或者数目不一致时按照未知版本-1
+    '''
+    @staticmethod
+    def request_model_versions(request, batch_size):
+        if request.ModelVersionLength() != batch_size:
+            return np.full((batch_size, 1), -1, dtype=np.int64)
+
+        return request.ModelVersionAsNumpy().astype(np.int64).reshape(batch_size, 1)
+
     def get_data_and_send_to_queue(self):
 
         # get sample data
@@ -81,16 +106,36 @@ class LearnerServerZmq(multiprocessing.Process):
             # fb解析
             request = AisrvLearnerRequest.GetRootAsAisrvLearnerRequest(data, 0)
             bs = request.BatchSize()
+            model_versions = self.request_model_versions(request, bs) if self.use_sample_staleness else None
+
+            if self.sample_queue:
+                # 非阻塞写入, 队列满时返回False, 该批样本被丢弃, model_version和样本写入同一个slot
+                if model_versions is not None:
+                    success = self.sample_queue.put_arrays([request.DataAsNumpy().reshape(bs, -1), model_versions], [np.float16, np.int64], block=False)
+                else:
+                    success = self.sample_queue.put_array(request.DataAsNumpy().reshape(bs, -1), np.float16, block=False)
+                if success:
+                    self.send_to_sample_queue_succ_cnt += bs
+                else:
+                    self.send_to_sample_queue_drop_cnt += bs
+                return
             
-            # reshape
-            datas = np.array(request.DataAsNumpy()).reshape(bs, -1)
-
-            # 发送样本时, 强制转换成float16
-            train_data = [{'input_datas': np.array(sample, dtype=np.float16)} for sample in datas]
+            # 共享内存队列, 直接在flatbuffer上reshape, put_data时一次性转换成float16写入共享内存
+            if self.use_shared_memory_queue:
+                train_data = request.DataAsNumpy().reshape(bs, -1)
+            else:
+                # reshape
+                datas = np.array(request.DataAsNumpy()).reshape(bs, -1)
+
+                # 发送样本时, 强制转换成float16
+                train_data = [{'input_datas': np.array(sample, dtype=np.float16)} for sample in datas]
+                if model_versions is not None:
+                    for sample, model_version in zip(train_data, model_versions):
+                        sample[KaiwuDRLDefine.SAMPLE_MODEL_VERSION] = model_version
 
             # 随机选择发送给learner_server_reverb
             idx = get_random(0, len(self.learner_server_reverbs) - 1)
-            self.learner_server_reverbs[idx].put_data(train_data)
+            self.learner_server_reverbs[idx].put_data(train_data, model_versions)
         
         except Exception as e:
             # 这里暂时没有请求aisrv请求是正常现象, 下一个循环接着处理
@@ -124,10 +169,29 @@ class LearnerServerZmq(multiprocessing.Process):
         self.zmq_server_stat_schedule()
     
     '''
-    周期性打印内存占用情况
+    周期性上报写入样本队列成功和丢弃的样本数目
     '''
     def zmq_server_stat(self):
-        pass
+        if not self.sample_queue:
+            return
+
+        succ_cnt, drop_cnt = self.send_to_sample_queue_succ_cnt, self.send_to_sample_queue_drop_cnt
+        self.send_to_sample_queue_succ_cnt = 0
+        self.send_to_sample_queue_drop_cnt = 0
+
+        if int(CONFIG.use_prometheus):
+            monitor_data = {
+                KaiwuDRLDefine.MONITOR_LEARNER_SAMPLE_QUEUE_SUCC_CNT : succ_cnt,
+                KaiwuDRLDefine.MONITOR_LEARNER_SAMPLE_QUEUE_DROP_CNT : drop_cnt,
+            }
+
+            self.monitor_proxy.put_data(monitor_data)
+
+        # 打印日志, 是为了确保进程正常, 1分钟打印1次性能可控
+        if drop_cnt:
+            self.logger.error(f'learner_server_zmq sample queue is full, succ_cnt is {succ_cnt}, drop_cnt is {drop_cnt}', g_not_server_label)
+        else:
+            self.logger.info(f'learner_server_zmq send sample queue stat, succ_cnt is {succ_cnt}, drop_cnt is {drop_cnt}', g_not_server_label)
 
         #h = hpy()
         #self.logger.info(h.heap())
@@ -208,9 +272,31 @@ class LearnerServerReverb(multiprocessing.Process):
         # index, 只是对第1个进行上报处理
         self.idx = idx
 
-        self.msg_queue = multiprocessing.Queue(CONFIG.queue_size)
+        '''
+        LearnerServerZmq --> LearnerServerReverb的样本队列
+        1. queue, multiprocessing.Queue, 传递每行样本的dict列表, 需要pickle/unpickle
+        2. shared_memory, SharedMemoryQueue, LearnerServerZmq将整个batch以float16写入共享内存, 本进程直接在共享内存上读取
+        '''
+        self.use_shared_memory_queue = (CONFIG.learner_reverb_queue_type == KaiwuDRLDefine.LEARNER_REVERB_QUEUE_TYPE_SHARED_MEMORY)
+        self.use_sample_staleness = int(CONFIG.use_sample_staleness)
+        if self.use_shared_memory_queue:
+            self.msg_queue = SharedMemoryQueue(int(CONFIG.learner_reverb_queue_size), int(CONFIG.learner_reverb_queue_slot_size))
+        else:
+            self.msg_queue = multiprocessing.Queue(CONFIG.queue_size)
     
-    def put_data(self, train_data):
+    '''
+    共享内存队列时train_data为(batch_size, dim)的数组, model_versions为(batch_size, 1)的数组或者None, 和样本写入同一个slot
+    multiprocessing.Queue时model_version已经放在每行样本的dict里
+    '''
+    def put_data(self, train_data, model_versions=None):
+        if self.use_shared_memory_queue:
+            if not len(train_data):
+                return False
+
+            if model_versions is not None:
+                return self.msg_queue.put_arrays([train_data, model_versions], [np.float16, np.int64], block=False)
+            return self.msg_queue.put_array(train_data, np.float16, block=False)
+
         if not train_data or self.msg_queue.full():
             return False
 
@@ -220,7 +306,20 @@ class LearnerServerReverb(multiprocessing.Process):
     def get_data(self):
         # 判断队列为空self.msg_queue.empty()时, 可能出现报错Connection reset by peer, 需要使用try-except形式
         try:
-            if not self.msg_queue.empty():
+            if self.use_shared_memory_queue:
+                # 每行样本是共享内存上的视图, 在下一次get_array之前有效, 发送给reverb server时完成拷贝
+                if self.use_sample_staleness:
+                    arrays = self.msg_queue.get_arrays([np.float16, np.int64], block=False)
+                    if arrays is not None:
+                        datas, model_versions = arrays
+                        self.train_data = [{'input_datas': sample, KaiwuDRLDefine.SAMPLE_MODEL_VERSION: model_version}
+                                           for sample, model_version in zip(datas, model_versions)]
+                else:
+                    datas = self.msg_queue.get_array(np.float16, block=False)
+                    if datas is not None:
+                        self.train_data = [{'input_datas': sample} for sample in datas]
+
+            elif not self.msg_queue.empty():
                 self.train_data = self.msg_queue.get()
         
         except Exception as e:
@@ -243,6 +342,7 @@ class LearnerServerReverb(multiprocessing.Process):
 
         # 必须放在这里赋值, 否则reverb client会卡住
         self.revervb_util = RevervbUtil(f'{self.learner_addr}:{self.learner_port}', self.logger)
+        self.use_reverb_batch_writer = int(CONFIG.use_reverb_batch_writer)
 
         self.reverb_table_names = ['{}_{}'.format(CONFIG.reverb_table_name, i) for i in range(int(CONFIG.reverb_table_size))]
         self.logger.info(f'learner_server_reverb_{self.idx} send reverb server tables is {self.reverb_table_names}', g_not_server_label)
@@ -257,8 +357,9 @@ class LearnerServerReverb(multiprocessing.Process):
 
         self.process_run_count = 0
         
-        # aisrv朝learner发送的最大样本大小 
-        self.max_sample_size = 0
+        # aisrv朝learner发送的样本大小(字节)和写入reverb server的耗时(微秒), 按照直方图统计, 上报后清零
+        self.sample_size_histogram = LogLinearHistogram(highest_trackable_value=1 << 34)
+        self.reverb_write_time_histogram = LogLinearHistogram()
 
     def reverb_server_stat(self):
         total_succ_cnt, total_error_cnt = self.revervb_util.get_send_to_reverb_server_stat()
@@ -275,12 +376,18 @@ class LearnerServerReverb(multiprocessing.Process):
             monitor_data  = {
                 KaiwuDRLDefine.MONITOR_SENDTO_REVERB_SUCC_CNT : total_succ_cnt,
                 KaiwuDRLDefine.MONITOR_SENDTO_REVERB_ERR_CNT : total_error_cnt, 
-                KaiwuDRLDefine.MONITOR_MAX_SAMPLE_SIZE : self.max_sample_size,
+                KaiwuDRLDefine.MONITOR_MAX_SAMPLE_SIZE : self.sample_size_histogram.max_value,
+                KaiwuDRLDefine.MONITOR_LEARNER_SAMPLE_SIZE_BYTES : self.sample_size_histogram.drain(),
+                KaiwuDRLDefine.MONITOR_LEARNER_REVERB_WRITE_TIME_US : self.reverb_write_time_histogram.drain(),
                 KaiwuDRLDefine.MONITOR_LEARNER_ZMQ_REVERB_QUEUE_LEN : msg_queue_size
             }
 
             self.monitor_proxy.put_data(monitor_data)
 
+        else:
+            self.sample_size_histogram.reset()
+            self.reverb_write_time_histogram.reset()
+
         # 打印日志, 是为了确保进程正常, 1分钟打印1次性能可控
         self.logger.info(f'learner_server_reverb_{self.idx} send reverb server stat, succ_cnt is {total_succ_cnt}, error_cnt is {total_error_cnt}', g_not_server_label)
 
@@ -297,6 +404,10 @@ class LearnerServerReverb(multiprocessing.Process):
         # use reverb client send sample data to reverb server
         self.send_msg_use_reverb_client()
 
+        # 批量写入时, 没有新样本也需要按照时间flush
+        if self.use_reverb_batch_writer:
+            self.revervb_util.flush_batch_writer(force=False)
+
         # 重新设置self.train_data为None
         self.train_data = None
 
@@ -330,6 +441,11 @@ class LearnerServerReverb(multiprocessing.Process):
             except Exception as e:
                 self.logger.error(f'learner_server_reverb_{self.idx} run error: {str(e)}, traceback.print_exc() is {traceback.format_exc()}', g_not_server_label)
 
+        # 进程退出前发送批量writer里还没有flush的样本, 否则会丢失最多reverb_batch_flush_interval_ms的样本
+        if self.use_reverb_batch_writer:
+            self.revervb_util.flush_batch_writer(force=True)
+            self.revervb_util.close_batch_writer()
+
     
     # use reverb client send msq to reverb server
     def send_msg_use_reverb_client(self):
@@ -337,14 +453,18 @@ class LearnerServerReverb(multiprocessing.Process):
             return
         
         # reverb_client发送
-        self.revervb_util.write_to_reverb_server_simple(self.reverb_table_names, self.train_data)
+        with TimeIt() as ti:
+            if self.use_reverb_batch_writer:
+                self.revervb_util.write_to_reverb_server_batch(self.reverb_table_names, self.train_data)
+            else:
+                self.revervb_util.write_to_reverb_server_simple(self.reverb_table_names, self.train_data)
+
+        self.reverb_write_time_histogram.record(ti.interval * 1000000)
 
-        # 更新最大样本大小
+        # 统计样本大小
         input_datas_list = self.train_data
         sample_size = 0
         for agent in input_datas_list:
             sample_size += agent['input_datas'].nbytes
 
-        # 更新最大样本大小
-        if sample_size > self.max_sample_size:
-            self.max_sample_size = sample_size
\ No newline at end of file
+        self.sample_size_histogram.record(sample_size)
\ No newline at end of file
@@ -25,6 +25,7 @@ from framework.common.alloc.alloc_proxy import AllocProxy
 from framework.common.monitor.monitor_proxy import MonitorProxy
 from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 from framework.common.ipc.zmq_util import ZmqServer, ZmqClient
+from framework.common.ipc.weight_broadcast import WeightBroadcastPublisher
 from framework.common.alloc.alloc_utils import AllocUtils
 
 class OnPolicyTrainer(Trainer):
@@ -46,6 +47,12 @@ class OnPolicyTrainer(Trainer):
         self.cached_local_step = -1
 
         self.local_step = Value('d', -1)
+
+        # learner进程内的样本池时, LearnerServerZmq --> learner的共享内存样本队列, 在learner.py里创建
+        self.sample_queue = None
+
+    def set_sample_queue(self, sample_queue):
+        self.sample_queue = sample_queue
     
     def create_model_wrapper(self):
         '''
@@ -162,6 +169,7 @@ class OnPolicyTrainer(Trainer):
         
         if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY and has_model_file_changed:
             self.current_sync_model_version_from_learner = model_file_id
+            self.replay_buffer_wrapper.set_current_model_version(model_file_id)
 
             if CONFIG.on_policy_by_way == KaiwuDRLDefine.ALGORITHM_ON_POLICY_WAY_TIME_INTERVAL:
                 self.learner_on_policy_process(True)
@@ -336,7 +344,11 @@ class OnPolicyTrainer(Trainer):
                         KaiwuDRLDefine.ON_POLICY_MESSAGE_VALUE: self.current_sync_model_version_from_learner, 
                     }
         
-        if is_train_success:
+        # 优先通过zmq PUB广播模型参数, 不成功时回退到modelpool
+        if is_train_success and self.learner_broadcast_weights_to_actor(send_data):
+            self.on_policy_learner_change_model_version_cnt += 1
+
+        elif is_train_success:
         
             # learner推送model文件到modelpool, 有重试机制
             learner_push_model_file_success = False
@@ -433,6 +445,43 @@ class OnPolicyTrainer(Trainer):
             self.on_policy_learner_recv_actor_error_cnt += 1
             return False
     
+    '''
+    learner通过zmq PUB将模型参数广播给actor, 再发送带有广播标志的model_version同步请求, actor收齐参数后直接设置到session里
+    下面情况返回False, 由调用方回退到modelpool流程:
+    1. 没有开启广播或者还没有连接上actor
+    2. model_wrapper不支持get_weights
+    3. 有actor没有收齐参数或者设置参数失败
+    '''
+    def learner_broadcast_weights_to_actor(self, send_data):
+        if not self.weight_publisher or not self.actor_zmq_client_map:
+            return False
+
+        try:
+            with TimeIt() as ti:
+                weights = self.model_wrapper.get_weights()
+                if not weights:
+                    return False
+
+                send_bytes = self.weight_publisher.publish(self.current_sync_model_version_from_learner, weights)
+
+        except Exception as e:
+            self.on_policy_weight_broadcast_error_cnt += 1
+            self.logger.error(f'train process learner broadcast weights error, as {str(e)}, traceback.print_exc() is {traceback.format_exc()}')
+            return False
+
+        broadcast_send_data = dict(send_data)
+        broadcast_send_data[KaiwuDRLDefine.ON_POLICY_MESSAGE_WEIGHT_BROADCAST] = True
+        if not self.learner_send_and_recv_actor_model_version_request_and_response(broadcast_send_data):
+            self.on_policy_weight_broadcast_error_cnt += 1
+            self.logger.error(f'train process learner broadcast weights model_version: {self.current_sync_model_version_from_learner} failed, so use modelpool')
+            return False
+
+        self.on_policy_weight_broadcast_success_cnt += 1
+        self.logger.info(f'train process learner broadcast weights model_version: {self.current_sync_model_version_from_learner} success, \
+            send {send_bytes} bytes, publish cost {ti.interval * 1000:.1f} ms')
+
+        return True
+
     # learner推送model文件到modelpool去, 加上重试机制
     def learner_push_model_to_modelpool(self):
         all_push_model_success = False
@@ -561,6 +610,22 @@ class OnPolicyTrainer(Trainer):
                 monitor_data[KaiwuDRLDefine.ON_POLICY_LEARNER_RECV_AISRV_SUCCESS_CNT] = self.on_policy_learner_recv_aisrv_success_count
                 monitor_data[KaiwuDRLDefine.ON_POLICY_LEARNER_RECV_ACTOR_ERROR_CNT] = self.on_policy_learner_recv_actor_error_cnt
                 monitor_data[KaiwuDRLDefine.ON_POLICY_LEARNER_RECV_ACTOR_SUCCESS_CNT] = self.on_policy_learner_recv_actor_success_cnt
+                monitor_data[KaiwuDRLDefine.ON_POLICY_WEIGHT_BROADCAST_ERROR_CNT] = self.on_policy_weight_broadcast_error_cnt
+                monitor_data[KaiwuDRLDefine.ON_POLICY_WEIGHT_BROADCAST_SUCCESS_CNT] = self.on_policy_weight_broadcast_success_cnt
+
+            # 预取的统计, 等待输入的耗时和训练的耗时, 用于判断是input-bound还是compute-bound
+            if self.replay_buffer_wrapper.use_prefetch:
+                prefetch_stat = self.replay_buffer_wrapper.get_prefetch_stat()
+                monitor_data[KaiwuDRLDefine.MONITOR_LEARNER_INPUT_WAIT_TIME_MS] = prefetch_stat['input_wait_time_ms']
+                monitor_data[KaiwuDRLDefine.MONITOR_LEARNER_COMPUTE_TIME_MS] = prefetch_stat['compute_time_ms']
+                monitor_data[KaiwuDRLDefine.MONITOR_LEARNER_INPUT_BOUND_RATIO] = prefetch_stat['input_bound_ratio']
+
+            # 样本的陈旧程度
+            if int(CONFIG.use_sample_staleness):
+                staleness_stat = self.replay_buffer_wrapper.get_staleness_stat()
+                monitor_data[KaiwuDRLDefine.MONITOR_LEARNER_SAMPLE_STALENESS] = staleness_stat['staleness_histogram']
+                monitor_data[KaiwuDRLDefine.MONITOR_LEARNER_STALE_SAMPLE_DROP_CNT] = staleness_stat['drop_count']
+                monitor_data[KaiwuDRLDefine.MONITOR_LEARNER_UNKNOWN_VERSION_SAMPLE_CNT] = staleness_stat['unknown_count']
 
             # 按照业务数据返回的map格式直接赋值, 然后去普罗米修斯监控上设置下展示字段即可
             for key, value in self.app_monitor_data.items():
@@ -663,7 +728,7 @@ class OnPolicyTrainer(Trainer):
             set_schedule_event(CONFIG.prometheus_stat_per_minutes, self.train_stat)
 
         # replay_buffer
-        self.replay_buffer_wrapper = ReplayBufferWrapper(self.tensor_names, self.tensor_dtypes, self.tensor_shapes, self.logger)
+        self.replay_buffer_wrapper = ReplayBufferWrapper(self.tensor_names, self.tensor_dtypes, self.tensor_shapes, self.logger, self.sample_queue)
         self.replay_buffer_wrapper.init()
         self.replay_buffer_wrapper.extra_threads()
 
@@ -692,6 +757,11 @@ class OnPolicyTrainer(Trainer):
                 self.actor_zmq_client_map = {}
                 self.aisrv_zmq_client_map = {}
 
+                # learner --> actor之间内存里同步模型参数, 见weight_broadcast.py
+                self.weight_publisher = None
+                if int(CONFIG.use_weight_broadcast):
+                    self.weight_publisher = WeightBroadcastPublisher(int(CONFIG.weight_broadcast_chunk_size))
+
                 # 下面是统计告警指标
                 self.on_policy_push_to_modelpool_error_count = 0
                 self.on_policy_push_to_modelpool_success_count = 0
@@ -700,6 +770,8 @@ class OnPolicyTrainer(Trainer):
                 self.on_policy_learner_recv_actor_error_cnt = 0
                 self.on_policy_learner_recv_actor_success_cnt = 0
                 self.on_policy_learner_change_model_version_cnt = 0
+                self.on_policy_weight_broadcast_error_cnt = 0
+                self.on_policy_weight_broadcast_success_cnt = 0
 
             else:
                 pass
@@ -777,6 +849,9 @@ class OnPolicyTrainer(Trainer):
             zmq_client.connect()
             self.actor_zmq_client_map[f'{actor_ip}:{int(CONFIG.zmq_server_port) + 100}'] = zmq_client
 
+            if self.weight_publisher:
+                self.weight_publisher.connect(actor_ip, int(CONFIG.zmq_server_port) + 200)
+
     '''
     on-policy场景下, learner与actor地址建立连接, 周期性的发送/接收心跳保活请求/响应
     '''
@@ -869,8 +944,17 @@ class OnPolicyTrainer(Trainer):
     2. 当满足batch_size即开始训练, 对reverb不做主动清空操作, 从reverb里拿取的数据是随机的, 这样增加了训练次数, 新的数据进来采用FIFO去替换掉旧的
     '''
     def train(self):
+        # 开启预取时, 样本池统计由预取线程刷新, on-policy只需要判断是否有准备好的批次
+        use_prefetch = self.replay_buffer_wrapper.use_prefetch
+        if use_prefetch and CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
+            if not self.replay_buffer_wrapper.prefetch_ready():
+                return False
+
+            self.train_detail()
+            return True
+
         reverb_insert_count = self.replay_buffer_wrapper.get_insert_stats()
-        current_size = self.replay_buffer_wrapper._replay_buffer.total_size(self.replay_buffer_wrapper._reverb_client)
+        current_size = self.replay_buffer_wrapper.get_current_size()
         
         # 标志本次是否真实的train
         is_train_success = False
@@ -895,6 +979,8 @@ class OnPolicyTrainer(Trainer):
         if CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_OFF_POLICY:
             condition = (current_size > int(CONFIG.replay_buffer_capacity)//int(CONFIG.preload_ratio)) and \
             (reverb_insert_count - self.last_input_ready_count) > (int(CONFIG.train_batch_size) / int(CONFIG.production_consume_ratio))
+            if use_prefetch:
+                condition = condition and self.replay_buffer_wrapper.prefetch_ready()
         
         elif CONFIG.algorithm_on_policy_or_off_policy == KaiwuDRLDefine.ALGORITHM_ON_POLICY:
             condition = current_size >= int(CONFIG.train_batch_size)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import numpy as np
+
+
+'''
+按照sgame_1v1的样本格式生成合成样本, 用于不启动gamecore, aisrv和actor时压测learner
+样本格式和sgame_sample_processor._reshape_lstm_batch_sample一致:
+1. 每帧按照DATA_SPLIT_SHAPE[:-2]切分为observation, reward, advantage, label*, prob*, weight*, is_train
+2. 每条样本是lstm_time_steps帧, 按照切分项依次存放该项所有帧的数据, 最后是lstm_cell和lstm_hidden_state
+3. observation前feature_dim维是特征, 按照obs_density的比例非0, 便于lz4压缩比和真实样本接近; 剩下的是legal_action, 全部合法
+4. label在对应的label_size范围内, prob为归一化的概率, weight和is_train为1
+'''
+class SyntheticSampleGenerator(object):
+
+    def __init__(self, data_split_shape, lstm_time_steps, label_size_list, feature_dim, obs_density=0.3, seed=None) -> None:
+        self.data_split_shape = [int(shape) for shape in data_split_shape]
+        self.lstm_time_steps = int(lstm_time_steps)
+        self.label_size_list = [int(size) for size in label_size_list]
+        self.feature_dim = int(feature_dim)
+        self.obs_density = float(obs_density)
+
+        label_count = len(self.label_size_list)
+        if len(self.data_split_shape) != 3 + 3 * label_count + 1 + 2:
+            raise ValueError(f'data_split_shape {self.data_split_shape} not match label_size_list {self.label_size_list}')
+
+        if self.data_split_shape[3 + label_count: 3 + 2 * label_count] != self.label_size_list:
+            raise ValueError(f'prob shape {self.data_split_shape[3 + label_count: 3 + 2 * label_count]} not match label_size_list {self.label_size_list}')
+
+        # 每帧的大小和每个切分项在帧里的偏移
+        self.frame_size = sum(self.data_split_shape[:-2])
+        self.frame_offsets = np.cumsum([0] + self.data_split_shape[:-2]).tolist()
+        self.lstm_size = sum(self.data_split_shape[-2:])
+
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def sample_dim(self):
+        return self.frame_size * self.lstm_time_steps + self.lstm_size
+
+    '''
+    返回形如(batch_size, frame_size)的每帧数据
+    '''
+    def frames(self, batch_size):
+        rng = self.rng
+        label_count = len(self.label_size_list)
+        shape = (batch_size, self.lstm_time_steps)
+        frames = np.zeros(shape + (self.frame_size, ), dtype=np.float32)
+
+        # observation, 稀疏的特征和全部合法的legal_action
+        feature = rng.standard_normal(shape + (self.feature_dim, ), dtype=np.float32)
+        feature *= rng.random(feature.shape, dtype=np.float32) < self.obs_density
+        frames[..., :self.feature_dim] = feature
+        frames[..., self.feature_dim:self.data_split_shape[0]] = 1
+
+        # reward, advantage
+        frames[..., self.frame_offsets[1]] = rng.standard_normal(shape, dtype=np.float32)
+        frames[..., self.frame_offsets[2]] = rng.standard_normal(shape, dtype=np.float32)
+
+        for i, label_size in enumerate(self.label_size_list):
+            frames[..., self.frame_offsets[3 + i]] = rng.integers(0, label_size, size=shape)
+
+            prob = rng.random(shape + (label_size, ), dtype=np.float32) + 1e-3
+            prob /= prob.sum(axis=-1, keepdims=True)
+            offset = self.frame_offsets[3 + label_count + i]
+            frames[..., offset:offset + label_size] = prob
+
+        # weight, is_train
+        frames[..., self.frame_offsets[3 + 2 * label_count]:] = 1
+
+        return frames
+
+    '''
+    返回形如(batch_size, sample_dim)的float32样本
+    '''
+    def sample_batch(self, batch_size):
+        frames = self.frames(batch_size)
+        samples = np.empty((batch_size, self.sample_dim), dtype=np.float32)
+
+        s_idx = 0
+        for i, split_shape in enumerate(self.data_split_shape[:-2]):
+            size = split_shape * self.lstm_time_steps
+            samples[:, s_idx:s_idx + size] = frames[..., self.frame_offsets[i]:self.frame_offsets[i + 1]].reshape(batch_size, -1)
+            s_idx += size
+
+        samples[:, s_idx:] = self.rng.standard_normal((batch_size, self.lstm_size), dtype=np.float32) * 0.1
+
+        return samples
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+
+import unittest
+import numpy as np
+from framework.server.learner.synthetic_sample import SyntheticSampleGenerator
+
+
+class SyntheticSampleGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        # 和conf/config.py里的ModelConfig一致
+        self.label_size_list = [12, 16, 16, 16, 16, 8]
+        self.data_split_shape = [809, 1, 1, 1, 1, 1, 1, 1, 1, 12, 16, 16, 16, 16, 8, 1, 1, 1, 1, 1, 1, 1, 512, 512]
+        self.generator = SyntheticSampleGenerator(self.data_split_shape, 16, self.label_size_list, 725, seed=0)
+
+    def split(self, samples):
+        cut_points = np.cumsum([shape * 16 for shape in self.data_split_shape[:-2]] + self.data_split_shape[-2:])[:-1]
+        return np.split(samples, cut_points, axis=1)
+
+    def test_layout(self):
+        samples = self.generator.sample_batch(4)
+        self.assertEqual(self.generator.sample_dim, 15552)
+        self.assertEqual(samples.shape, (4, 15552))
+        self.assertEqual(samples.dtype, np.float32)
+
+        datas = self.split(samples)
+        observation = datas[0].reshape(4, 16, 809)
+        np.testing.assert_array_equal(observation[..., 725:], np.ones((4, 16, 84)))
+
+        for i, label_size in enumerate(self.label_size_list):
+            label = datas[3 + i]
+            self.assertTrue(np.all((label >= 0) & (label < label_size)))
+            np.testing.assert_array_equal(label, np.round(label))
+
+            prob = datas[9 + i].reshape(4, 16, label_size)
+            np.testing.assert_allclose(prob.sum(axis=-1), np.ones((4, 16)), rtol=1e-5)
+
+        # weight, is_train
+        np.testing.assert_array_equal(np.concatenate(datas[15:22], axis=1), np.ones((4, 112)))
+
+    def test_invalid_shape(self):
+        with self.assertRaises(ValueError):
+            SyntheticSampleGenerator(self.data_split_shape[1:], 16, self.label_size_list, 725)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -47,6 +47,9 @@ class SgameExpr:
         self.next_value = 0
         self.next_value2 = 0
         self.lstm_info = None
+        # model_version of the actor which generated the sample, -1 means unknown
+        # 生成样本时actor的model_version, -1表示未知
+        self.model_version = -1
 
     def __str__(self) -> str:
         return f'frame_no {self.frame_no}, feature {self.feature}, next_feature {self.next_feature}, reward {self.reward }, reward2 {self.reward2}, \
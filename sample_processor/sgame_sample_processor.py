@@ -18,6 +18,7 @@ from sample_processor.sgame_expr import SgameExpr as RLDataInfo
 from conf.config import Config, ModelConfig
 from framework.interface.sample_processor import SampleProcessor
 from framework.common.config.config_control import CONFIG
+from framework.common.utils.kaiwudrl_define import KaiwuDRLDefine
 
 IS_CHECK = Config.IS_CHECK
 ACTION_DIM = Config.ACTION_DIM
@@ -108,9 +109,12 @@ class SgameSampleProcessor(SampleProcessor):
             sample = dict(zip(keys, values))
 
             
-            # select sample
-            # 删选样本
-            if not sample_model_version or not current_model_version:
+            # select sample, the learner filters samples by staleness when use_sample_staleness is set
+            # 删选样本, 开启use_sample_staleness时样本带上model_version, 由learner按照陈旧程度过滤
+            if int(CONFIG.use_sample_staleness):
+                model_version = -1 if sample_model_version is None else sample_model_version
+                self.save_sample(**sample, agent_id=i, game_id=self.game_id, uuid=None, model_version=model_version)
+            elif not sample_model_version or not current_model_version:
                 self.save_sample(**sample, agent_id=i, game_id=self.game_id, uuid=None)
             else:
                 if current_model_version == sample_model_version:
@@ -156,7 +160,8 @@ class SgameSampleProcessor(SampleProcessor):
         train_data_all = []
         train_data_prioritized = []
 
-        # agent_data:list[(frame_no,vec)]
+        # agent_data:list[(frame_no,vec,model_version)]
+        use_sample_staleness = int(CONFIG.use_sample_staleness)
         for agent_data in train_data:
             for sample in agent_data:
                 train_data_all.append({
@@ -165,6 +170,11 @@ class SgameSampleProcessor(SampleProcessor):
                     'input_datas': np.array(sample[1], dtype=np.float16)
                 })
 
+                # model_version can not be represented by float16, so send it as a separate int64 field
+                # model_version无法用float16表示, 作为单独的int64字段发送
+                if use_sample_staleness:
+                    train_data_all[-1][KaiwuDRLDefine.SAMPLE_MODEL_VERSION] = np.array([sample[2]], dtype=np.int64)
+
                 # priority of each sample
                 # 每个样本的优先级设置
                 train_data_prioritized.append(1.0)
@@ -186,7 +196,7 @@ class SgameSampleProcessor(SampleProcessor):
                     vec_feature, legal_action, action, reward, value, prob, sub_action,
                     lstm_cell, lstm_hidden,
                     done, agent_id, is_train=True,
-                    game_id=None, uuid=None):
+                    game_id=None, uuid=None, model_version=-1):
         """
         samples must saved by frame_no order
 
@@ -231,6 +241,7 @@ class SgameSampleProcessor(SampleProcessor):
         # np: (6)
         rl_data_info.sub_action = sub_action[action[0]]
         rl_data_info.is_train = False if action[0] < 0 else is_train
+        rl_data_info.model_version = model_version
 
         self.rl_data_map[agent_id][frame_no] = rl_data_info
         
@@ -284,12 +295,23 @@ class SgameSampleProcessor(SampleProcessor):
             s_idx += split_shape[0]
         return sample
 
+    # the older of two model_versions, an unknown one (less than 0) is ignored unless both are unknown
+    # 取两个model_version中较旧的, 未知版本(小于0)不参与比较, 都未知时返回-1
+    @staticmethod
+    def _oldest_model_version(model_version, frame_model_version):
+        if model_version < 0:
+            return frame_model_version
+        if frame_model_version < 0:
+            return model_version
+        return min(model_version, frame_model_version)
+
     def _format_data(self):
         sample_one_size = np.sum(self._data_shapes[:-2]) // self._LSTM_FRAME
         sample_lstm_size = np.sum(self._data_shapes[-2:])
         sample_batch = np.zeros([self._LSTM_FRAME, sample_one_size])
         sample_lstm = np.zeros([sample_lstm_size])
         first_frame_no = -1
+        model_version = -1
 
         for i in range(self.num_agents):
             cnt = 0
@@ -301,6 +323,11 @@ class SgameSampleProcessor(SampleProcessor):
                     # lstm层以及隐藏层
                     first_frame_no = rl_info.frame_no
                     sample_lstm = rl_info.lstm_info
+                    model_version = rl_info.model_version
+                else:
+                    # the model_version of a sample is the oldest known one of its frames
+                    # 样本的model_version取各帧中已知的最旧的
+                    model_version = self._oldest_model_version(model_version, rl_info.model_version)
 
                 # serilize one frame
                 # 序列化一帧
@@ -348,7 +375,7 @@ class SgameSampleProcessor(SampleProcessor):
                 if cnt == self._LSTM_FRAME:
                     cnt = 0
                     sample = self._reshape_lstm_batch_sample(sample_batch, sample_lstm)
-                    self.m_replay_buffer[i].append((first_frame_no, sample))
+                    self.m_replay_buffer[i].append((first_frame_no, sample, model_version))
                     # self.logger.debug(f'sample first_frame_no {first_frame_no} add sample success')
                 
             # Do not discard the tail sample
@@ -365,6 +392,9 @@ class SgameSampleProcessor(SampleProcessor):
                             # lstm cell & hidden
                             first_frame_no = rl_info.frame_no
                             sample_lstm = rl_info.lstm_info
+                            model_version = rl_info.model_version
+                        else:
+                            model_version = self._oldest_model_version(model_version, rl_info.model_version)
 
                         # serilize one frame
                         # 序列化一帧
@@ -413,7 +443,7 @@ class SgameSampleProcessor(SampleProcessor):
                         if cnt == self._LSTM_FRAME:
                             cnt = 0
                             sample = self._reshape_lstm_batch_sample(sample_batch, sample_lstm)
-                            self.m_replay_buffer[i].append((first_frame_no, sample))
+                            self.m_replay_buffer[i].append((first_frame_no, sample, model_version))
 
     def _clip_reward(self, reward, max=100, min=-100):
         if reward > max: